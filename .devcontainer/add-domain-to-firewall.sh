@@ -1,53 +1,108 @@
 #!/bin/bash
 set -euo pipefail
 
-# Adds a domain to the allowed-domains ipset
+# Adds domains to the allowed-domains ipset
 # Usage: add-domain-to-firewall.sh <domain>
+#        add-domain-to-firewall.sh --batch < <file>   (one domain per line, # comments)
+#
+# In batch mode the domains are resolved concurrently (at most $MAX_WORKERS
+# lookups at a time), so the cost follows the slowest lookup rather than the
+# sum of them. Their addresses are de-duplicated and added in one ipset
+# transaction with one audit record. Domains that fail to resolve are reported
+# and skipped; the batch only fails if none of them resolve. The list is read
+# from stdin, so it is opened with the caller's permissions rather than root's.
 
-# Audit log location - shared with init-firewall.sh
-AUDIT_LOG="/home/node/.claude/firewall-audit.log"
+MAX_WORKERS=16
+# Firewall events are appended to the audit log shared with the host
+source /usr/local/bin/audit-log.sh
 
-# Audit logging function
-audit_log() {
-    local event_type="$1"
-    shift
-    local details="$*"
-    echo "$(date -Iseconds) | $event_type | $details" >> "$AUDIT_LOG" 2>/dev/null || true
-}
-
-if [ $# -ne 1 ]; then
+usage() {
     echo "Usage: $0 <domain>" >&2
+    echo "       $0 --batch < <file>" >&2
     exit 1
-fi
+}
 
-DOMAIN="$1"
+BATCH=false
+if [ $# -eq 1 ] && [ "$1" = "--batch" ]; then
+    BATCH=true
+    mapfile -t DOMAINS < <(sed -e 's/#.*//' -e 's/^[[:space:]]*//' -e 's/[[:space:]]*$//' | grep -v '^$' | sort -u)
+elif [ $# -eq 1 ] && [ "$1" != "--batch" ]; then
+    DOMAINS=("$1")
+else
+    usage
+fi
 
 # Validate domain format (basic check)
-if [[ ! "$DOMAIN" =~ ^[a-zA-Z0-9]([a-zA-Z0-9.-]*[a-zA-Z0-9])?$ ]]; then
-    echo "ERROR: Invalid domain format: $DOMAIN" >&2
+VALID=()
+for domain in "${DOMAINS[@]}"; do
+    if [[ "$domain" =~ ^[a-zA-Z0-9]([a-zA-Z0-9.-]*[a-zA-Z0-9])?$ ]]; then
+        VALID+=("$domain")
+    elif $BATCH; then
+        echo "WARNING: Invalid domain format: $domain (skipping)" >&2
+    else
+        echo "ERROR: Invalid domain format: $domain" >&2
+        exit 1
+    fi
+done
+if [ ${#VALID[@]} -eq 0 ]; then
+    echo "ERROR: No valid domains to add" >&2
     exit 1
 fi
 
-# Resolve domain to IPs
-IPS=$(dig +noall +answer A "$DOMAIN" | awk '$4 == "A" {print $5}')
-if [ -z "$IPS" ]; then
-    echo "ERROR: Failed to resolve $DOMAIN" >&2
-    exit 1
-fi
+# Resolve all domains, $MAX_WORKERS at a time, into "domain<TAB>ip<TAB>expires" records
+WORK=$(mktemp -d)
+trap 'rm -rf "$WORK"' EXIT
+now=${EPOCHREALTIME%.*}
+for domain in "${VALID[@]}"; do
+    while [ "$(jobs -rp | wc -l)" -ge "$MAX_WORKERS" ]; do
+        wait -n || true
+    done
+    dig +noall +answer +time=5 +tries=2 A "$domain" > "$WORK/$domain" 2>/dev/null &
+done
+wait || true
 
-# Add each IP to the ipset
-while read -r ip; do
-    if [[ ! "$ip" =~ ^[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}$ ]]; then
-        echo "ERROR: Invalid IP from DNS for $DOMAIN: $ip" >&2
-        exit 1
+RECORDS="$WORK/records.tsv"
+FAILED=()
+for domain in "${VALID[@]}"; do
+    awk -v domain="$domain" -v now="$now" \
+        '$4 == "A" && $5 ~ /^[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+$/ {printf "%s\t%s\t%d\n", domain, $5, now + $2}' \
+        "$WORK/$domain" >> "$RECORDS"
+    if ! grep -q "^${domain//./\\.}"$'\t' "$RECORDS"; then
+        FAILED+=("$domain")
     fi
-    # Add to ipset (ignore if already exists)
-    if ipset add allowed-domains "$ip" 2>/dev/null; then
-        echo "Added $ip for $DOMAIN"
+done
+
+if [ ! -s "$RECORDS" ]; then
+    if $BATCH; then
+        echo "ERROR: Failed to resolve any of the ${#VALID[@]} domains" >&2
     else
-        echo "Already allowed: $ip for $DOMAIN"
+        echo "ERROR: Failed to resolve ${VALID[0]}" >&2
     fi
-done <<< "$IPS"
+    exit 1
+fi
+for domain in "${FAILED[@]}"; do
+    echo "WARNING: Failed to resolve $domain (skipping)" >&2
+done
 
-audit_log "DOMAIN_APPROVED" "domain=$DOMAIN ips=$IPS"
-echo "Domain $DOMAIN is now allowed"
+# Add the addresses in one transaction (existing entries are left alone)
+IPS=$(cut -f2 "$RECORDS" | sort -u)
+sed "s/^/add allowed-domains /" <<< "$IPS" | ipset restore -exist
+
+# Keep the domains' IPs current: in stub mode the stub resolver re-reads its
+# approved list when it changes and allowlists the domains as they are looked
+# up; otherwise the DNS refresh daemon re-resolves them
+APPROVED_FILE="/run/dns-stub/approved.txt"
+if [ -f "$APPROVED_FILE" ]; then
+    cut -f1 "$RECORDS" | sort -u >> "$APPROVED_FILE" || echo "WARNING: Failed to add domains to the DNS stub's allowlist" >&2
+elif [ -x /usr/local/bin/dns-refresh.sh ]; then
+    /usr/local/bin/dns-refresh.sh --add "$RECORDS" || echo "WARNING: Failed to register domains for DNS refresh" >&2
+fi
+
+IP_COUNT=$(wc -l <<< "$IPS")
+if $BATCH; then
+    audit_log "DOMAINS_APPROVED" "domains=$((${#VALID[@]} - ${#FAILED[@]}))" "ips=$IP_COUNT" "failed=${#FAILED[@]}"
+    echo "Allowed $((${#VALID[@]} - ${#FAILED[@]})) domains ($IP_COUNT addresses)"
+else
+    audit_log "DOMAIN_APPROVED" "domain=${VALID[0]}" "ips=$(paste -sd, <<< "$IPS")"
+    echo "Domain ${VALID[0]} is now allowed ($(paste -sd' ' <<< "$IPS"))"
+fi
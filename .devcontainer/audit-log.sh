@@ -0,0 +1,46 @@
+# shellcheck shell=bash
+# Sourced by the firewall scripts to append to the audit log.
+#
+# The log is shared by all instances: the host's ~/.cache/clankercage/audit is
+# mounted at /var/log/clankercage, and the CLI rotates, compresses and indexes
+# it (see clankercage.audit and `clankercage audit`). Records are JSON lines:
+#
+#   {"ts": "2026-01-01T12:00:00+00:00", "instance": "<id>", "event": "DOMAIN_APPROVED", "domain": "...", ...}
+#
+# Usage: audit_log EVENT [key=value ...]
+# Values are stored as strings. Each record is written with a single append
+# (no forks), so concurrent writers don't interleave.
+
+AUDIT_LOG="/var/log/clankercage/firewall-audit.jsonl"
+
+# The CLI writes the instance id into the runtime dir (sudo strips the environment)
+AUDIT_INSTANCE=""
+if [ -r /run/clankercage/instance ]; then
+    AUDIT_INSTANCE=$(</run/clankercage/instance)
+fi
+
+# JSON-quote $2 into the variable named $1
+_audit_quote() {
+    local s=${2//\\/\\\\}
+    s=${s//\"/\\\"}
+    s=${s//$'\n'/\\n}
+    s=${s//$'\t'/\\t}
+    printf -v "$1" '"%s"' "$s"
+}
+
+audit_log() {
+    local event="$1" TZ=UTC ts line key value pair
+    shift
+    [ -d "${AUDIT_LOG%/*}" ] || return 0
+    printf -v ts '%(%Y-%m-%dT%H:%M:%S)T+00:00' -1
+    _audit_quote value "$AUDIT_INSTANCE"
+    line="{\"ts\": \"$ts\", \"instance\": $value"
+    _audit_quote value "$event"
+    line+=", \"event\": $value"
+    for pair in "$@"; do
+        _audit_quote key "${pair%%=*}"
+        _audit_quote value "${pair#*=}"
+        line+=", $key: $value"
+    done
+    printf '%s}\n' "$line" >> "$AUDIT_LOG" 2>/dev/null || true
+}
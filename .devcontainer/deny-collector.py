@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Aggregate the container's denied egress for the host's metrics exporter.
+
+init-firewall.sh puts a rate-limited NFLOG rule right before the final REJECT
+of the OUTPUT chain, so only packets that are about to be rejected reach it -
+allowed traffic is accepted by earlier rules and never pays for the logging.
+This daemon receives those packets over netlink (only their first bytes are
+copied, enough for the IP and TCP/UDP headers), counts them per destination
+(address, protocol, port) and periodically writes the counts to the instance
+runtime dir, where `clankercage metrics` picks them up and exports them as
+OTLP metrics.
+
+Memory is bounded: at most MAX_DESTINATIONS destinations are tracked, packets
+to any others are only counted as overflow. Addresses are labelled with the
+domain they were resolved for when the DNS cache or the refresh daemon's
+records know it (e.g. an allowed domain whose CDN moved to a new address).
+
+Counts are samples: the rule logs at most --limit packets per second.
+
+Usage: deny-collector.py [--group N] [--output FILE] [--daemon]
+"""
+
+import argparse
+import errno
+import json
+import os
+import socket
+import struct
+import sys
+import time
+
+NFLOG_GROUP = 17
+OUTPUT = "/run/clankercage/denied.json"
+NAME_SOURCES = ("/var/cache/clankercage/dns.tsv", "/run/dns-refresh/records.tsv")
+MAX_DESTINATIONS = 256
+MAX_NAMES = 20000
+COPY_RANGE = 64         # bytes of each packet copied to us: IP header plus the start of TCP/UDP
+FLUSH_INTERVAL = 10     # seconds between writes while packets are being denied
+HEARTBEAT = 60          # seconds between writes otherwise, so the host knows we're alive
+
+# netlink / nfnetlink_log constants (linux/netlink.h, linux/netfilter/nfnetlink_log.h)
+NETLINK_NETFILTER = 12
+NLM_F_REQUEST = 0x1
+NLM_F_ACK = 0x4
+NLMSG_ERROR = 0x2
+NFNL_SUBSYS_ULOG = 4
+NFULNL_MSG_PACKET = 0
+NFULNL_MSG_CONFIG = 1
+NFULA_PAYLOAD = 9
+NFULA_CFG_CMD = 1
+NFULA_CFG_MODE = 2
+NFULA_CFG_TIMEOUT = 3
+NFULA_CFG_QTHRESH = 4
+NFULNL_CFG_CMD_BIND = 1
+NFULNL_CFG_CMD_PF_BIND = 3
+NFULNL_CFG_CMD_PF_UNBIND = 4
+NFULNL_COPY_PACKET = 2
+
+PROTOCOLS = {1: "icmp", 6: "tcp", 17: "udp"}
+
+
+def attribute(attr_type: int, payload: bytes) -> bytes:
+    """Encode a netlink attribute (padded to 4 bytes)."""
+    data = struct.pack("=HH", 4 + len(payload), attr_type) + payload
+    return data + b"\0" * (-len(data) % 4)
+
+
+def config_message(seq: int, family: int, res_id: int, attributes: bytes) -> bytes:
+    """Encode an nfnetlink_log config request."""
+    body = struct.pack("=BB", family, 0) + struct.pack(">H", res_id) + attributes
+    msg_type = (NFNL_SUBSYS_ULOG << 8) | NFULNL_MSG_CONFIG
+    return struct.pack("=IHHII", 16 + len(body), msg_type, NLM_F_REQUEST | NLM_F_ACK, seq, 0) + body
+
+
+def parse_attributes(data: bytes) -> dict[int, bytes]:
+    attributes = {}
+    offset = 0
+    while offset + 4 <= len(data):
+        length, attr_type = struct.unpack_from("=HH", data, offset)
+        if length < 4:
+            break
+        attributes[attr_type & 0x3FFF] = data[offset + 4:offset + length]
+        offset += (length + 3) & ~3
+    return attributes
+
+
+def parse_messages(data: bytes) -> tuple[list[bytes], list[int]]:
+    """Split a netlink datagram into logged packet payloads and error codes (0 for acks)."""
+    payloads, errors = [], []
+    offset = 0
+    while offset + 16 <= len(data):
+        length, msg_type = struct.unpack_from("=IH", data, offset)
+        if length < 16:
+            break
+        body = data[offset + 16:offset + length]
+        if msg_type == NLMSG_ERROR and len(body) >= 4:
+            errors.append(-struct.unpack_from("=i", body)[0])
+        elif msg_type == (NFNL_SUBSYS_ULOG << 8) | NFULNL_MSG_PACKET:
+            payload = parse_attributes(body[4:]).get(NFULA_PAYLOAD)
+            if payload:
+                payloads.append(payload)
+        offset += (length + 3) & ~3
+    return payloads, errors
+
+
+def parse_destination(packet: bytes) -> tuple[str, str, int] | None:
+    """(address, protocol, port) of an IPv4 packet, port 0 when it has none."""
+    if len(packet) < 20 or packet[0] >> 4 != 4:
+        return None
+    header_length = (packet[0] & 0xF) * 4
+    proto = PROTOCOLS.get(packet[9], str(packet[9]))
+    port = 0
+    if proto in ("tcp", "udp") and len(packet) >= header_length + 4:
+        port, = struct.unpack_from("!H", packet, header_length + 2)
+    return socket.inet_ntoa(packet[16:20]), proto, port
+
+
+def load_names(paths: tuple[str, ...] = NAME_SOURCES) -> dict[str, str]:
+    """Map addresses to domains from "domain<TAB>ip..." files (at most MAX_NAMES)."""
+    names = {}
+    for path in paths:
+        try:
+            with open(path) as f:
+                for line in f:
+                    fields = line.split("\t")
+                    if len(fields) >= 2 and len(names) < MAX_NAMES:
+                        names[fields[1].strip()] = fields[0]
+        except OSError:
+            continue
+    return names
+
+
+class Aggregator:
+    """Counts denied packets per destination, tracking at most max_destinations of them."""
+
+    def __init__(self, max_destinations: int = MAX_DESTINATIONS, now: float | None = None):
+        self.max_destinations = max_destinations
+        self.started = now or time.time()
+        self.counts: dict[tuple[str, str, int], list] = {}  # destination -> [count, last seen]
+        self.overflow = 0
+        self.dirty = False
+
+    def add(self, packet: bytes, now: float | None = None) -> None:
+        destination = parse_destination(packet)
+        if destination is None:
+            return
+        self.dirty = True
+        entry = self.counts.get(destination)
+        if entry is not None:
+            entry[0] += 1
+            entry[1] = now or time.time()
+        elif len(self.counts) < self.max_destinations:
+            self.counts[destination] = [1, now or time.time()]
+        else:
+            self.overflow += 1
+
+    def snapshot(self, names: dict[str, str], now: float | None = None) -> dict:
+        return {
+            "started": self.started,
+            "updated": now or time.time(),
+            "destinations": [
+                {"ip": ip, "proto": proto, "port": port, "domain": names.get(ip, ""), "count": count, "last": last}
+                for (ip, proto, port), (count, last) in sorted(self.counts.items())
+            ],
+            "overflow": self.overflow,
+        }
+
+
+def write_snapshot(path: str, snapshot: dict) -> None:
+    tmp = f"{path}.tmp.{os.getpid()}"
+    with open(tmp, "w") as f:
+        json.dump(snapshot, f)
+    os.replace(tmp, path)
+
+
+def open_nflog(group: int) -> socket.socket:
+    """Bind a netlink socket to an NFLOG group, copying COPY_RANGE bytes of each packet."""
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_NETFILTER)
+    sock.bind((0, 0))
+    requests = [
+        # Pre-3.17 kernels need the nfnetlink_log handler (re)bound for the family; newer ones ignore it
+        (socket.AF_INET, 0, attribute(NFULA_CFG_CMD, bytes([NFULNL_CFG_CMD_PF_UNBIND])), False),
+        (socket.AF_INET, 0, attribute(NFULA_CFG_CMD, bytes([NFULNL_CFG_CMD_PF_BIND])), False),
+        (socket.AF_UNSPEC, group, attribute(NFULA_CFG_CMD, bytes([NFULNL_CFG_CMD_BIND])), True),
+        (socket.AF_UNSPEC, group, attribute(NFULA_CFG_MODE, struct.pack(">IBB", COPY_RANGE, NFULNL_COPY_PACKET, 0))
+         + attribute(NFULA_CFG_QTHRESH, struct.pack(">I", 32))
+         + attribute(NFULA_CFG_TIMEOUT, struct.pack(">I", 100)), True),
+    ]
+    for seq, (family, res_id, attributes, required) in enumerate(requests, 1):
+        sock.send(config_message(seq, family, res_id, attributes))
+        _, errors = parse_messages(sock.recv(65536))
+        if required and any(errors):
+            sock.close()
+            raise OSError(errors[0], f"NFLOG group {group}: {os.strerror(errors[0])}")
+    return sock
+
+
+def run(sock: socket.socket, output: str, aggregator: Aggregator) -> None:
+    sock.settimeout(FLUSH_INTERVAL)
+    names, names_stamp = {}, None
+    last_write = 0.0
+    while True:
+        try:
+            payloads, _ = parse_messages(sock.recv(65536))
+            now = time.time()
+            for payload in payloads:
+                aggregator.add(payload, now)
+        except socket.timeout:
+            now = time.time()
+        except OSError as e:
+            if e.errno != errno.ENOBUFS:  # dropped on overrun - they're samples anyway
+                raise
+            now = time.time()
+
+        if now - last_write >= (FLUSH_INTERVAL if aggregator.dirty else HEARTBEAT):
+            stamp = tuple(_mtime(path) for path in NAME_SOURCES)
+            if stamp != names_stamp:
+                names, names_stamp = load_names(), stamp
+            try:
+                write_snapshot(output, aggregator.snapshot(names, now))
+            except OSError as e:
+                print(f"deny-collector: failed to write {output}: {e}", file=sys.stderr)
+            aggregator.dirty = False
+            last_write = now
+
+
+def _mtime(path: str) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return 0.0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Aggregate denied egress logged through NFLOG")
+    parser.add_argument("--group", type=int, default=NFLOG_GROUP)
+    parser.add_argument("--output", default=OUTPUT)
+    parser.add_argument("--daemon", action="store_true", help="Detach once the NFLOG group is bound")
+    args = parser.parse_args()
+
+    sock = open_nflog(args.group)
+    if args.daemon and os.fork():
+        os._exit(0)
+    if args.daemon:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1):
+            os.dup2(devnull, fd)
+    run(sock, args.output, Aggregator())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""DNS stub resolver that allowlists the addresses it hands out.
+
+Used by init-firewall.sh when the ruleset was compiled in stub mode
+(`clankercage --dns-stub`). It listens on 127.0.0.1:53 (UDP and TCP) and
+forwards every query to Docker's resolver at 127.0.0.11. When the question
+matches an allowed domain or wildcard pattern, the A records of the answer are
+added to the allowed-domains ipset with a timeout equal to their TTL *before*
+the answer is returned, so the client's connection is never rejected. Nothing
+has to be resolved up front, the set only holds addresses that were asked for,
+and rotating CDN addresses are current by construction.
+
+Queries for other domains are forwarded unchanged: the answer is of no use to
+the client, as the firewall rejects the connection.
+
+The allowed domains are re-read whenever a --patterns file changes: besides
+the ruleset's domains.txt, init-firewall.sh passes APPROVED_FILE, to which
+add-domain-to-firewall.sh appends the domains approved during the session.
+
+Usage: dns-stub.py --patterns FILE [--patterns FILE...] [--listen ADDR] [--port N] [--upstream ADDR] [--daemon]
+"""
+
+import argparse
+import os
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import threading
+
+IPSET_NAME = "allowed-domains"
+APPROVED_FILE = "/run/dns-stub/approved.txt"
+UPSTREAM_TIMEOUT = 5.0
+MIN_TIMEOUT = 60  # floor for set entry timeouts, so short TTLs don't expire before the client connects
+
+TYPE_A = 1
+RCODE_SERVFAIL = 2
+
+
+def read_name(message: bytes, offset: int) -> tuple[str, int]:
+    """Read a (possibly compressed) domain name. Returns (name, offset after the name)."""
+    labels = []
+    end = None
+    for _ in range(128):  # bounds compression loops
+        length = message[offset]
+        if length & 0xC0 == 0xC0:
+            if end is None:
+                end = offset + 2
+            offset = struct.unpack_from("!H", message, offset)[0] & 0x3FFF
+            continue
+        if length == 0:
+            return ".".join(labels).lower(), end if end is not None else offset + 1
+        labels.append(message[offset + 1:offset + 1 + length].decode("ascii", "replace"))
+        offset += 1 + length
+    raise ValueError("DNS name compression loop")
+
+
+def parse_question(message: bytes) -> tuple[str, int]:
+    """Return (name, type) of a message's first question."""
+    if len(message) < 12 or struct.unpack_from("!H", message, 4)[0] < 1:
+        raise ValueError("DNS message has no question")
+    name, offset = read_name(message, 12)
+    qtype, = struct.unpack_from("!H", message, offset)
+    return name, qtype
+
+
+def a_records(message: bytes) -> list[tuple[str, int]]:
+    """Return the (address, ttl) of every A record in a response's answer section."""
+    qdcount, ancount = struct.unpack_from("!HH", message, 4)
+    offset = 12
+    for _ in range(qdcount):
+        _, offset = read_name(message, offset)
+        offset += 4
+    records = []
+    for _ in range(ancount):
+        _, offset = read_name(message, offset)
+        rtype, _, ttl, rdlength = struct.unpack_from("!HHIH", message, offset)
+        offset += 10
+        if rtype == TYPE_A and rdlength == 4:
+            records.append((socket.inet_ntoa(message[offset:offset + 4]), ttl))
+        offset += rdlength
+    return records
+
+
+def servfail(query: bytes) -> bytes:
+    """Build a SERVFAIL response echoing the query's question."""
+    flags, = struct.unpack_from("!H", query, 2)
+    flags = 0x8000 | (flags & 0x7900) | 0x0080 | RCODE_SERVFAIL  # QR, keep opcode/RD, set RA
+    return query[:2] + struct.pack("!HHHHH", flags, struct.unpack_from("!H", query, 4)[0], 0, 0, 0) + query[12:]
+
+
+class Allowlist:
+    """Allowed domains ("example.com") and wildcard patterns ("*.example.com", any subdomain)."""
+
+    def __init__(self, patterns: list[str]):
+        self.domains = {p.lower() for p in patterns if not p.startswith("*.")}
+        self.suffixes = tuple(p[1:].lower() for p in patterns if p.startswith("*."))
+
+    @classmethod
+    def from_files(cls, paths: list[str]) -> "Allowlist":
+        """Read the patterns of every file (one per line, # comments); missing files are empty."""
+        patterns = []
+        for path in paths:
+            try:
+                with open(path) as f:
+                    patterns.extend(line.strip() for line in f if line.strip() and not line.startswith("#"))
+            except FileNotFoundError:
+                continue
+        return cls(patterns)
+
+    def matches(self, name: str) -> bool:
+        name = name.lower().rstrip(".")
+        return name in self.domains or name.endswith(self.suffixes)
+
+
+class ReloadingAllowlist:
+    """An Allowlist read from files and re-read when one of them changes (checked on every match)."""
+
+    def __init__(self, paths: list[str]):
+        self.paths = paths
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._allowlist = Allowlist([])
+
+    def _current_stamp(self) -> tuple:
+        stamp = []
+        for path in self.paths:
+            try:
+                info = os.stat(path)
+            except OSError:
+                stamp.append(None)
+                continue
+            stamp.append((info.st_ino, info.st_mtime_ns, info.st_size))
+        return tuple(stamp)
+
+    def matches(self, name: str) -> bool:
+        stamp = self._current_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                self._allowlist = Allowlist.from_files(self.paths)
+                self._stamp = stamp
+            allowlist = self._allowlist
+        return allowlist.matches(name)
+
+
+def ipset_add(entries: list[tuple[str, int]]) -> None:
+    """Add (address, timeout) entries to the set in one `ipset restore`, refreshing existing timeouts."""
+    script = "".join(f"add {IPSET_NAME} {ip} timeout {timeout}\n" for ip, timeout in entries)
+    subprocess.run(["ipset", "restore", "-exist"], input=script.encode(), check=True, capture_output=True)
+
+
+class Resolver:
+    """Forwards queries upstream and allowlists the answers for allowed domains."""
+
+    def __init__(self, allowlist: Allowlist, upstream: tuple[str, int], allow=ipset_add,
+                 timeout: float = UPSTREAM_TIMEOUT):
+        self.allowlist = allowlist
+        self.upstream = upstream
+        self.allow = allow
+        self.timeout = timeout
+
+    def forward_udp(self, query: bytes) -> bytes:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.settimeout(self.timeout)
+            sock.connect(self.upstream)
+            sock.send(query)
+            while True:
+                response = sock.recv(65535)
+                if response[:2] == query[:2]:
+                    return response
+
+    def forward_tcp(self, query: bytes) -> bytes:
+        with socket.create_connection(self.upstream, timeout=self.timeout) as sock:
+            sock.sendall(struct.pack("!H", len(query)) + query)
+            length, = struct.unpack("!H", recv_exactly(sock, 2))
+            return recv_exactly(sock, length)
+
+    def resolve(self, query: bytes, tcp: bool = False) -> bytes:
+        try:
+            name, qtype = parse_question(query)
+        except (ValueError, IndexError, struct.error):
+            return servfail(query) if len(query) >= 12 else b""
+        try:
+            response = self.forward_tcp(query) if tcp else self.forward_udp(query)
+        except OSError as e:
+            print(f"dns-stub: upstream failed for {name}: {e}", file=sys.stderr)
+            return servfail(query)
+
+        if qtype == TYPE_A and self.allowlist.matches(name):
+            try:
+                records = a_records(response)
+            except (ValueError, IndexError, struct.error):
+                records = []
+            if records:
+                try:
+                    self.allow([(ip, max(ttl, MIN_TIMEOUT)) for ip, ttl in records])
+                except (OSError, subprocess.CalledProcessError) as e:
+                    print(f"dns-stub: failed to allow {name}: {e}", file=sys.stderr)
+        return response
+
+
+def recv_exactly(sock: socket.socket, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed")
+        data += chunk
+    return data
+
+
+class UDPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        query, sock = self.request
+        response = self.server.resolver.resolve(query)
+        if response:
+            sock.sendto(response, self.client_address)
+
+
+class TCPHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        self.request.settimeout(30)
+        try:
+            while True:
+                length, = struct.unpack("!H", recv_exactly(self.request, 2))
+                response = self.server.resolver.resolve(recv_exactly(self.request, length), tcp=True)
+                if not response:
+                    return
+                self.request.sendall(struct.pack("!H", len(response)) + response)
+        except OSError:
+            return
+
+
+class UDPServer(socketserver.ThreadingUDPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve(resolver: Resolver, listen: str, port: int) -> tuple[UDPServer, TCPServer]:
+    """Bind the UDP and TCP servers (port 0 picks a free port for both). Call serve_forever() on each."""
+    udp = UDPServer((listen, port), UDPHandler)
+    port = udp.server_address[1]
+    tcp = TCPServer((listen, port), TCPHandler)
+    udp.resolver = tcp.resolver = resolver
+    return udp, tcp
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="DNS stub that allowlists answers for allowed domains")
+    parser.add_argument("--patterns", required=True, action="append",
+                        help="File of allowed domains and *.wildcard patterns (can be given several times)")
+    parser.add_argument("--listen", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=53)
+    parser.add_argument("--upstream", default="127.0.0.11")
+    parser.add_argument("--daemon", action="store_true", help="Detach once the sockets are bound")
+    args = parser.parse_args()
+
+    resolver = Resolver(ReloadingAllowlist(args.patterns), (args.upstream, 53))
+    udp, tcp = serve(resolver, args.listen, args.port)
+    # Fork only after binding, so the caller can point resolv.conf at us as soon as we return
+    if args.daemon and os.fork():
+        os._exit(0)
+    if args.daemon:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1):
+            os.dup2(devnull, fd)
+
+    threading.Thread(target=tcp.serve_forever, daemon=True).start()
+    udp.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,35 +2,31 @@
 set -euo pipefail  # Exit on error, undefined vars, and pipeline failures
 IFS=$'\n\t'       # Stricter word splitting
 
-# Audit log location - persisted across sessions via volume mount
-AUDIT_LOG="/home/node/.claude/firewall-audit.log"
-
-# Ensure audit log directory exists and is writable
-mkdir -p "$(dirname "$AUDIT_LOG")" 2>/dev/null || true
-
-# Audit logging - always writes to audit log file
-# Format: ISO8601 timestamp | event_type | details
-audit_log() {
-    local event_type="$1"
-    shift
-    local details="$*"
-    echo "$(date -Iseconds) | $event_type | $details" >> "$AUDIT_LOG" 2>/dev/null || true
-}
-
-# Disable IPv6 to prevent firewall bypass
-# IPv6 traffic would completely bypass our iptables rules since we only configure IPv4
-sysctl -w net.ipv6.conf.all.disable_ipv6=1 >/dev/null
-sysctl -w net.ipv6.conf.default.disable_ipv6=1 >/dev/null
-
 # Parse arguments
 VERBOSE=false
+VERIFY=async
+RESOLVER=static
 for arg in "$@"; do
     case $arg in
         --verbose|-v)
             VERBOSE=true
             ;;
+        --verify=*)
+            VERIFY="${arg#--verify=}"
+            ;;
+        --resolver=*)
+            RESOLVER="${arg#--resolver=}"
+            ;;
     esac
 done
+if [ "$VERIFY" != "async" ] && [ "$VERIFY" != "strict" ]; then
+    echo "ERROR: --verify must be async or strict, got: $VERIFY"
+    exit 1
+fi
+if [ "$RESOLVER" != "static" ] && [ "$RESOLVER" != "stub" ]; then
+    echo "ERROR: --resolver must be static or stub, got: $RESOLVER"
+    exit 1
+fi
 
 # Logging helper - only prints if verbose mode is enabled
 log() {
@@ -39,126 +35,182 @@ log() {
     fi
 }
 
-# Log firewall initialization
-audit_log "FIREWALL_INIT" "Starting firewall configuration"
+# Firewall events are appended to the audit log shared with the host
+source /usr/local/bin/audit-log.sh
 
-# 1. Extract Docker DNS info BEFORE any flushing
-DOCKER_DNS_RULES=$(iptables-save -t nat | grep "127\.0\.0\.11" || true)
+# Fail closed: if setup stops anywhere before the end, drop all traffic rather
+# than leave the container with whatever filtering (if any) it had
+fail_closed() {
+    local status=$?
+    [ $status -eq 0 ] && return 0
+    iptables -P INPUT DROP 2>/dev/null || true
+    iptables -P FORWARD DROP 2>/dev/null || true
+    iptables -P OUTPUT DROP 2>/dev/null || true
+    echo "ERROR: Firewall setup failed - all traffic is blocked"
+    exit $status
+}
+trap fail_closed EXIT
 
-# Flush existing rules and delete existing ipsets
-iptables -F
-iptables -X
-iptables -t nat -F
-iptables -t nat -X
-iptables -t mangle -F
-iptables -t mangle -X
-ipset destroy allowed-domains 2>/dev/null || true
+# Startup phase timing, reported to the host's `clankercage --timings` breakdown.
+# Each call closes the previous phase and opens a new one (no forks - uses $EPOCHREALTIME).
+PHASES_FILE="/run/clankercage/phases.tsv"
+PHASE_NAME=""
+PHASE_START=""
+phase() {
+    local now=$EPOCHREALTIME
+    if [ -n "$PHASE_NAME" ] && [ -d "${PHASES_FILE%/*}" ]; then
+        printf 'firewall.%s\t%s\t%s\n' "$PHASE_NAME" "$PHASE_START" "$now" >> "$PHASES_FILE" 2>/dev/null || true
+    fi
+    PHASE_NAME="${1:-}"
+    PHASE_START=$now
+}
 
-# 2. Selectively restore ONLY internal Docker DNS resolution
-if [ -n "$DOCKER_DNS_RULES" ]; then
-    log "Restoring Docker DNS rules..."
-    iptables -t nat -N DOCKER_OUTPUT 2>/dev/null || true
-    iptables -t nat -N DOCKER_POSTROUTING 2>/dev/null || true
-    echo "$DOCKER_DNS_RULES" | xargs -L 1 iptables -t nat
-else
-    log "No Docker DNS rules to restore"
-fi
+# Disable IPv6 to prevent firewall bypass
+# IPv6 traffic would bypass our IPv4-only iptables rules
+phase ipv6
+log "Disabling IPv6..."
+sysctl -w net.ipv6.conf.all.disable_ipv6=1 >/dev/null 2>&1 || true
+sysctl -w net.ipv6.conf.default.disable_ipv6=1 >/dev/null 2>&1 || true
 
-# First allow DNS and localhost before any restrictions
-# Allow outbound DNS
-iptables -A OUTPUT -p udp --dport 53 -j ACCEPT
-# Allow inbound DNS responses
-iptables -A INPUT -p udp --sport 53 -j ACCEPT
-# Allow outbound SSH
-iptables -A OUTPUT -p tcp --dport 22 -j ACCEPT
-# Allow inbound SSH responses
-iptables -A INPUT -p tcp --sport 22 -m state --state ESTABLISHED -j ACCEPT
-# Allow localhost
-iptables -A INPUT -i lo -j ACCEPT
-iptables -A OUTPUT -o lo -j ACCEPT
-
-# Create ipset with CIDR support
-ipset create allowed-domains hash:net
-
-# Fetch GitHub meta information and aggregate + add their IP ranges
-log "Fetching GitHub IP ranges..."
-gh_ranges=$(curl -s https://api.github.com/meta)
-if [ -z "$gh_ranges" ]; then
-    echo "WARNING: Failed to fetch GitHub IP ranges (continuing without them)"
-elif ! echo "$gh_ranges" | jq -e '.web and .api and .git' >/dev/null; then
-    echo "WARNING: GitHub API response missing required fields (continuing without them)"
-else
-    log "Processing GitHub IPs..."
-    github_cidrs=$(echo "$gh_ranges" | jq -r '(.web + .api + .git)[]' | aggregate -q)
-    while read -r cidr; do
-        if [[ ! "$cidr" =~ ^[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}/[0-9]{1,2}$ ]]; then
-            echo "WARNING: Invalid CIDR range from GitHub meta: $cidr (skipping)"
-            continue
-        fi
-        log "Adding GitHub range $cidr"
-        ipset add allowed-domains "$cidr"
-    done <<< "$github_cidrs"
-    audit_log "ALLOWLIST_ADD" "source=github cidrs=$(echo "$github_cidrs" | wc -l)"
+# Also block IPv6 at the firewall level as defense in depth
+if command -v ip6tables >/dev/null 2>&1; then
+    log "Setting IPv6 firewall to DROP all..."
+    ip6tables -P INPUT DROP 2>/dev/null || true
+    ip6tables -P FORWARD DROP 2>/dev/null || true
+    ip6tables -P OUTPUT DROP 2>/dev/null || true
 fi
 
-# Load whitelisted domains from file
-DOMAINS_FILE="/usr/local/share/whitelisted-domains.txt"
-DOMAINS=()
-if [ -f "$DOMAINS_FILE" ]; then
-    while IFS= read -r line || [ -n "$line" ]; do
-        # Skip empty lines and comments
-        [[ -z "$line" || "$line" =~ ^# ]] && continue
-        DOMAINS+=("$line")
-    done < "$DOMAINS_FILE"
-    log "Loaded ${#DOMAINS[@]} domains from $DOMAINS_FILE"
-    audit_log "ALLOWLIST_ADD" "source=whitelist domains=${#DOMAINS[@]}"
-else
-    echo "WARNING: Domains file not found at $DOMAINS_FILE"
-fi
+# The allowlist and rules are compiled on the host by the CLI (clankercage.firewall)
+# from the whitelist, the user-approved domains, GitHub's IP ranges and the DNS
+# cache; this script only applies them. The ruleset is loaded with one
+# `ipset restore` (the new set is built under a temporary name and swapped in)
+# and one `iptables-restore` (each table is replaced atomically), so traffic
+# never sees half-built chains or an empty set. Which ruleset to apply is named
+# in this instance's runtime dir, so concurrent sessions never swap rulesets.
+IPSET_NAME="allowed-domains"
+CACHE_DIR="/var/cache/clankercage"
+RUNTIME_DIR="/run/clankercage"
 
-# Resolve all domains in parallel for speed
-log "Resolving domains..."
-for domain in "${DOMAINS[@]}"; do
-    # Run dig in background, store PID
-    dig +noall +answer +time=5 +tries=2 A "$domain" > "/tmp/dns_$domain" &
-done
-wait  # Wait for all DNS lookups to complete
+# Containers not started by the CLI (a plain `devcontainer up`, the published
+# image) have no ruleset compiled on the host. Compile one here, in the same
+# format, from the whitelist, the user-approved domains, GitHub's IP ranges
+# and fresh DNS lookups.
+compile_standalone_ruleset() {
+    local tmp name domain gh_ranges create="hash:net"
+    local pattern='^[a-zA-Z0-9]([a-zA-Z0-9.-]*[a-zA-Z0-9])?$'
+    tmp=$(mktemp -d)
+    if [ "$RESOLVER" = "stub" ]; then
+        pattern='^(\*\.)?[a-zA-Z0-9]([a-zA-Z0-9.-]*[a-zA-Z0-9])?$'
+        create="hash:net timeout 0"
+    fi
+    cat /usr/local/share/whitelisted-domains.txt /home/node/.claude/.allowed-browser-domains 2>/dev/null \
+        | tr -d ' \r' | grep -E "$pattern" | sort -u > "$tmp/domains.txt" || true
 
-# Process results and add to ipset
-for domain in "${DOMAINS[@]}"; do
-    ips=$(awk '$4 == "A" {print $5}' "/tmp/dns_$domain")
-    rm -f "/tmp/dns_$domain"
+    gh_ranges=$(curl -s --max-time 10 https://api.github.com/meta || true)
+    if echo "$gh_ranges" | jq -e '.web and .api and .git' >/dev/null 2>&1; then
+        echo "$gh_ranges" | jq -r '(.web + .api + .git)[]' \
+            | grep -E '^[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}/[0-9]{1,2}$' | aggregate -q > "$tmp/cidrs.txt" || true
+    else
+        echo "WARNING: Failed to fetch GitHub IP ranges (continuing without them)"
+        : > "$tmp/cidrs.txt"
+    fi
 
-    if [ -z "$ips" ]; then
-        echo "WARNING: Failed to resolve $domain (skipping)"
-        continue
+    # Static mode resolves the domains now; the stub adds them as they are looked up
+    cp "$tmp/cidrs.txt" "$tmp/entries"
+    if [ "$RESOLVER" = "static" ]; then
+        mkdir "$tmp/dig"
+        while read -r domain; do
+            dig +noall +answer +time=5 +tries=2 A "$domain" > "$tmp/dig/$domain" 2>/dev/null &
+        done < "$tmp/domains.txt"
+        wait
+        cat "$tmp"/dig/* 2>/dev/null \
+            | awk '$4 == "A" && $5 ~ /^[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+$/ {print $5}' >> "$tmp/entries" || true
+        rm -rf "$tmp/dig"
     fi
+    {
+        echo "create $IPSET_NAME $create"
+        echo "create $IPSET_NAME-new $create"
+        echo "flush $IPSET_NAME-new"
+        sort -u "$tmp/entries" | sed "s/^/add $IPSET_NAME-new /"
+        echo "swap $IPSET_NAME-new $IPSET_NAME"
+        echo "destroy $IPSET_NAME-new"
+    } > "$tmp/ipset.restore"
+    rm -f "$tmp/entries"
+    # The same rules as clankercage.firewall.IPTABLES_TEMPLATE
+    cat > "$tmp/iptables.rules" <<RULES
+*filter
+:INPUT DROP [0:0]
+:FORWARD DROP [0:0]
+:OUTPUT DROP [0:0]
+-A INPUT -p udp --sport 53 -j ACCEPT
+-A INPUT -p tcp --sport 22 -m state --state ESTABLISHED -j ACCEPT
+-A INPUT -i lo -j ACCEPT
+-A INPUT -s @HOST_NETWORK@ -j ACCEPT
+-A INPUT -m state --state ESTABLISHED,RELATED -j ACCEPT
+-A OUTPUT -p udp --dport 53 -j ACCEPT
+-A OUTPUT -p tcp --dport 22 -j ACCEPT
+-A OUTPUT -o lo -j ACCEPT
+-A OUTPUT -d @HOST_NETWORK@ -j ACCEPT
+-A OUTPUT -m state --state ESTABLISHED,RELATED -j ACCEPT
+-A OUTPUT -m set --match-set $IPSET_NAME dst -j ACCEPT
+-A OUTPUT -j REJECT --reject-with icmp-admin-prohibited
+COMMIT
+*nat
+:PREROUTING ACCEPT [0:0]
+:INPUT ACCEPT [0:0]
+:OUTPUT ACCEPT [0:0]
+:POSTROUTING ACCEPT [0:0]
+:DOCKER_OUTPUT - [0:0]
+:DOCKER_POSTROUTING - [0:0]
+@DOCKER_DNS_RULES@
+COMMIT
+*mangle
+:PREROUTING ACCEPT [0:0]
+:INPUT ACCEPT [0:0]
+:FORWARD ACCEPT [0:0]
+:OUTPUT ACCEPT [0:0]
+:POSTROUTING ACCEPT [0:0]
+COMMIT
+RULES
+    echo "$RESOLVER" > "$tmp/resolver"
 
-    while read -r ip; do
-        if [[ ! "$ip" =~ ^[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}\.[0-9]{1,3}$ ]]; then
-            echo "ERROR: Invalid IP from DNS for $domain: $ip"
-            exit 1
-        fi
-        log "Adding $ip for $domain"
-        ipset add allowed-domains "$ip" 2>/dev/null || true  # Ignore duplicates
-    done < <(echo "$ips")
-done
+    name=$(cat "$tmp"/* | sha256sum | cut -c1-16)
+    mkdir -p "$CACHE_DIR/rulesets" "$RUNTIME_DIR"
+    if [ -d "$CACHE_DIR/rulesets/$name" ]; then
+        rm -rf "$tmp"
+    else
+        chmod 755 "$tmp"
+        mv "$tmp" "$CACHE_DIR/rulesets/$name"
+    fi
+    echo "$name" > "$RUNTIME_DIR/ruleset"
+}
+
+if [ ! -s "$RUNTIME_DIR/ruleset" ]; then
+    phase compile
+    log "No ruleset compiled by the CLI, compiling one in the container..."
+    compile_standalone_ruleset
+fi
+
+phase docker_dns
+RULESET_NAME=$(cat "$RUNTIME_DIR/ruleset" 2>/dev/null || true)
+RULESET_DIR="$CACHE_DIR/rulesets/$RULESET_NAME"
 
-# Load user-approved domains from previous sessions
-ALLOWED_FILE="/home/node/.claude/.allowed-browser-domains"
-if [ -f "$ALLOWED_FILE" ]; then
-    log "Loading user-approved domains..."
-    user_domain_count=0
-    while IFS= read -r domain || [ -n "$domain" ]; do
-        [ -z "$domain" ] && continue
-        [[ "$domain" =~ ^# ]] && continue  # Skip comments
-        /usr/local/bin/add-domain-to-firewall.sh "$domain" 2>/dev/null || true
-        ((user_domain_count++)) || true
-    done < "$ALLOWED_FILE"
-    audit_log "ALLOWLIST_ADD" "source=user-approved domains=$user_domain_count"
+if [[ ! "$RULESET_NAME" =~ ^[0-9a-f]+$ ]] || [ ! -f "$RULESET_DIR/ipset.restore" ] || [ ! -f "$RULESET_DIR/iptables.rules" ]; then
+    echo "ERROR: Invalid firewall ruleset for this instance: $RULESET_NAME"
+    exit 1
+fi
+# A stub ruleset starts nearly empty and a static one has no timeout support,
+# so applying one in the other mode would break the session
+if [ "$(cat "$RULESET_DIR/resolver" 2>/dev/null)" != "$RESOLVER" ]; then
+    echo "ERROR: Ruleset $RULESET_NAME was not compiled for the $RESOLVER resolver"
+    exit 1
 fi
 
+# Extract Docker DNS info - the only nat rules that are kept
+DOCKER_DNS_RULES=$(iptables-save -t nat | grep "127\.0\.0\.11" || true)
+
 # Get host IP from default route
+phase load
 HOST_IP=$(ip route | grep default | cut -d" " -f3)
 if [ -z "$HOST_IP" ]; then
     echo "ERROR: Failed to detect host IP"
@@ -168,46 +220,139 @@ fi
 HOST_NETWORK=$(echo "$HOST_IP" | sed "s/\.[0-9]*$/.0\/24/")
 log "Host network detected as: $HOST_NETWORK"
 
-# Set up remaining iptables rules
-iptables -A INPUT -s "$HOST_NETWORK" -j ACCEPT
-iptables -A OUTPUT -d "$HOST_NETWORK" -j ACCEPT
+log "Loading ruleset $RULESET_NAME ($(grep -c "^add " "$RULESET_DIR/ipset.restore") allowlist entries)..."
+ipset restore -exist < "$RULESET_DIR/ipset.restore"
 
-# Set default policies to DROP first
-iptables -P INPUT DROP
-iptables -P FORWARD DROP
-iptables -P OUTPUT DROP
+if [ -n "$DOCKER_DNS_RULES" ]; then
+    log "Restoring Docker DNS rules..."
+else
+    log "No Docker DNS rules to restore"
+fi
 
-# First allow established connections for already approved traffic
-iptables -A INPUT -m state --state ESTABLISHED,RELATED -j ACCEPT
-iptables -A OUTPUT -m state --state ESTABLISHED,RELATED -j ACCEPT
+# The compiled rules leave the host network and Docker's DNS rules as placeholders
+RULES=$(<"$RULESET_DIR/iptables.rules")
+RULES=${RULES//@HOST_NETWORK@/"$HOST_NETWORK"}
+RULES=${RULES//@DOCKER_DNS_RULES@/"$DOCKER_DNS_RULES"}
+iptables-restore <<< "$RULES"
 
-# Then allow only specific outbound traffic to allowed domains
-iptables -A OUTPUT -m set --match-set allowed-domains dst -j ACCEPT
+if [ "$RESOLVER" = "stub" ]; then
+    # On-demand mode: nothing was resolved up front. The stub resolver allowlists
+    # the answers for allowed domains (with a timeout of their TTL) as they are
+    # looked up, so point the container's resolver at it
+    phase dns_stub
+    log "Starting DNS stub resolver..."
+    pkill -f /usr/local/bin/dns-stub.py || true
+    # Domains approved during the session are appended to approved.txt (see add-domain-to-firewall.sh)
+    mkdir -p /run/dns-stub
+    : > /run/dns-stub/approved.txt
+    python3 /usr/local/bin/dns-stub.py --daemon --patterns "$RULESET_DIR/domains.txt" \
+        --patterns /run/dns-stub/approved.txt 2>>/run/dns-stub.log
+    # resolv.conf is bind-mounted by Docker, so it is rewritten in place rather than replaced
+    RESOLV_CONF=$(sed 's/^nameserver .*/nameserver 127.0.0.1/' /etc/resolv.conf | awk '!/^nameserver/ || !seen++')
+    printf '%s\n' "$RESOLV_CONF" > /etc/resolv.conf
+else
+    # Keep the allowlist in step with DNS for the rest of the session: dns-refresh.sh
+    # re-resolves domains as their records expire (starting with the ones that
+    # already have) and ages out IPs the domains no longer return
+    phase dns_refresh
+    log "Starting DNS refresh daemon..."
+    /usr/local/bin/dns-refresh.sh </dev/null >/dev/null 2>&1 &
+    disown 2>/dev/null || true  # the job may already have exited
+fi
 
-# Explicitly REJECT all other outbound traffic for immediate feedback
-iptables -A OUTPUT -j REJECT --reject-with icmp-admin-prohibited
+# Denied-egress telemetry: a rate-limited NFLOG rule right before the final REJECT
+# (so allowed traffic never reaches it) feeds deny-collector.py, which counts the
+# denied destinations for `clankercage metrics`. Added outside the compiled
+# ruleset, so a kernel without NFLOG support only loses the telemetry.
+phase telemetry
+pkill -f /usr/local/bin/deny-collector.py || true
+OUTPUT_RULES=$(iptables -S OUTPUT | grep -c "^-A OUTPUT")
+if iptables -I OUTPUT "$OUTPUT_RULES" -m limit --limit 20/second --limit-burst 100 \
+        -j NFLOG --nflog-group 17 --nflog-prefix clanker-denied 2>/dev/null \
+    && python3 /usr/local/bin/deny-collector.py --daemon --group 17 2>>/run/deny-collector.log; then
+    log "Denied-egress telemetry enabled"
+else
+    echo "WARNING: NFLOG is not available, denied egress will not be reported"
+fi
 
-audit_log "FIREWALL_READY" "Firewall configuration complete"
 log "Firewall configuration complete"
-log "Verifying firewall rules..."
+audit_log "FIREWALL_READY" "ruleset=$RULESET_NAME" "resolver=$RESOLVER" "verify=$VERIFY"
 
-# Run verification tests in parallel
-curl --connect-timeout 3 -s https://example.com >/dev/null 2>&1 &
-BLOCK_PID=$!
-curl --connect-timeout 3 -s https://api.github.com/zen >/dev/null 2>&1 &
-ALLOW_PID=$!
+# Verification status, for the host and for anyone debugging the container
+STATUS_FILE="/run/clankercage/firewall-status"
+write_status() {
+    [ -d "${STATUS_FILE%/*}" ] || return 0
+    printf '%s\n' "$@" > "$STATUS_FILE.tmp.$$" && mv "$STATUS_FILE.tmp.$$" "$STATUS_FILE" || true
+}
 
-# Check blocked test (should fail)
-if wait $BLOCK_PID; then
-    echo "ERROR: Firewall verification failed - was able to reach https://example.com"
+# Structural check, on the critical path: no network access, just the state we loaded.
+# Default-deny policies, the final REJECT, the allowlist rule, and an allowlist that
+# contains its first compiled entry but not a documentation address (TEST-NET-1).
+phase verify
+log "Verifying firewall rules..."
+STRUCTURE_ERRORS=()
+for chain in INPUT FORWARD OUTPUT; do
+    iptables -S "$chain" | grep -qx -- "-P $chain DROP" || STRUCTURE_ERRORS+=("$chain policy is not DROP")
+done
+iptables -C OUTPUT -j REJECT --reject-with icmp-admin-prohibited 2>/dev/null || STRUCTURE_ERRORS+=("REJECT rule missing")
+iptables -C OUTPUT -m set --match-set "$IPSET_NAME" dst -j ACCEPT 2>/dev/null || STRUCTURE_ERRORS+=("allowlist rule missing")
+KNOWN_ENTRY=$(awk -v set="$IPSET_NAME-new" '$1 == "add" && $2 == set {print $3; exit}' "$RULESET_DIR/ipset.restore")
+if [ -n "$KNOWN_ENTRY" ] && ! ipset test "$IPSET_NAME" "$KNOWN_ENTRY" >/dev/null 2>&1; then
+    STRUCTURE_ERRORS+=("$KNOWN_ENTRY missing from $IPSET_NAME")
+fi
+if ipset test "$IPSET_NAME" 192.0.2.1 >/dev/null 2>&1; then
+    STRUCTURE_ERRORS+=("$IPSET_NAME allows 192.0.2.1")
+fi
+if [ ${#STRUCTURE_ERRORS[@]} -gt 0 ]; then
+    DETAILS=$(IFS=';'; echo "${STRUCTURE_ERRORS[*]}")
+    audit_log "FIREWALL_VERIFY_FAILED" "check=structural" "errors=$DETAILS"
+    write_status "structural=failed" "errors=$DETAILS"
+    echo "ERROR: Firewall verification failed - $DETAILS"
     exit 1
-else
-    log "Firewall verification passed - unable to reach https://example.com as expected"
 fi
+log "Firewall structure verified"
 
-# Check allowed test (should succeed)
-if ! wait $ALLOW_PID; then
-    echo "WARNING: Firewall verification failed - unable to reach https://api.github.com (continuing anyway)"
+# Live probes: example.com must be blocked and api.github.com reachable. They
+# need the network, so unless --verify=strict they run in the background and
+# only report to the audit log and status file.
+probe_network() {
+    local blocked=ok allowed=ok
+    curl --connect-timeout 3 -s https://example.com >/dev/null 2>&1 &
+    local block_pid=$!
+    curl --connect-timeout 3 -s https://api.github.com/zen >/dev/null 2>&1 &
+    local allow_pid=$!
+    if wait $block_pid; then
+        blocked=failed
+    fi
+    if ! wait $allow_pid; then
+        allowed=failed
+    fi
+    if [ "$blocked" = ok ] && [ "$allowed" = ok ]; then
+        audit_log "FIREWALL_VERIFY" "blocked=$blocked" "allowed=$allowed"
+    else
+        audit_log "FIREWALL_VERIFY_FAILED" "check=probes" "blocked=$blocked" "allowed=$allowed"
+    fi
+    write_status "structural=ok" "probes=done" "blocked=$blocked" "allowed=$allowed"
+    [ "$blocked" = ok ] || return 1
+    [ "$allowed" = ok ] || return 2
+}
+
+if [ "$VERIFY" = "strict" ]; then
+    write_status "structural=ok" "probes=running"
+    status=0
+    probe_network || status=$?
+    if [ $status -eq 1 ]; then
+        echo "ERROR: Firewall verification failed - was able to reach https://example.com"
+        exit 1
+    elif [ $status -eq 2 ]; then
+        echo "WARNING: Firewall verification failed - unable to reach https://api.github.com (continuing anyway)"
+    else
+        log "Firewall verification passed"
+    fi
 else
-    log "Firewall verification passed - able to reach https://api.github.com as expected"
+    write_status "structural=ok" "probes=running"
+    probe_network </dev/null >/dev/null 2>&1 &
+    disown 2>/dev/null || true  # the job may already have exited
 fi
+
+phase
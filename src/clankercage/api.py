@@ -0,0 +1,443 @@
+"""Python API for running ClankerCage sessions.
+
+A Session is one sandboxed container, started with the same options as the
+CLI, that commands can be run in from asyncio code:
+
+    async with Session("/path/to/project", ["--resources", "auto"]) as session:
+        result = await session.run(["pnpm", "test"], timeout=600)
+        print(result.returncode, result.stdout.decode())
+
+        execution = await session.exec(["claude", "-p", "Fix the tests"])
+        async for chunk in execution.stdout:
+            ...
+        returncode = await execution.wait()
+
+Commands run through `docker exec` as asyncio subprocesses, so one event loop
+can drive many sessions and commands at once. Output is read in chunks into
+bounded queues: a consumer that falls behind stops the reading, and the
+command blocks on its output instead of the host buffering it without limit.
+Either iterate over `stdout`/`stderr` or pass on_stdout/on_stderr callbacks.
+With a timeout, or when the waiting task is cancelled, the command is killed
+inside the container as well (killing `docker exec` alone leaves it running).
+A PTY is only allocated with pty=True (stdout and stderr are then merged).
+With --exec-server, commands without a PTY go over one connection to the
+in-container command server instead (see exec_client), which takes a few
+milliseconds per command rather than a `docker exec`.
+
+Starting a session runs the CLI's pre-flight checks and container start in a
+worker thread; `clankercage` itself is a thin wrapper that starts a Session and
+hands the terminal to it with `os.execvp`.
+"""
+
+import argparse
+import asyncio
+import inspect
+import os
+import signal
+import subprocess
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Awaitable, Callable, Sequence
+
+from clankercage import cli, pool, registry, resources, timings
+from clankercage.exec_client import EXEC_SOCKET, Channel, ExecClient, ExecServerError
+from clankercage.launcher import NativeLauncher
+
+__all__ = [
+    "DEFAULT_BUFFER_CHUNKS",
+    "DEFAULT_MAX_OUTPUT",
+    "ExecResult",
+    "ExecTimeout",
+    "Execution",
+    "Session",
+    "SessionError",
+    "Stream",
+]
+
+CHUNK_SIZE = 64 * 1024
+# Chunks a stream holds before reading pauses (so at most 1 MiB per stream)
+DEFAULT_BUFFER_CHUNKS = 16
+# Bytes of each stream Session.run keeps; the rest is dropped (ExecResult.truncated)
+DEFAULT_MAX_OUTPUT = 16 * 1024 * 1024
+# Seconds a killed command gets to exit after SIGTERM before SIGKILL
+KILL_GRACE = 5
+
+OutputCallback = Callable[[bytes], Awaitable[None] | None]
+
+
+class SessionError(Exception):
+    """A session couldn't be started or used. The message is shown to the user."""
+
+
+class ExecTimeout(TimeoutError):
+    """A command outlived its timeout and was killed."""
+
+
+class Stream:
+    """Output of a command as an async iterator of byte chunks, with a bounded buffer."""
+
+    def __init__(self, max_chunks: int = DEFAULT_BUFFER_CHUNKS):
+        self._queue: asyncio.Queue[bytes | None] = asyncio.Queue(max_chunks)
+        self._closed = False
+
+    async def _put(self, chunk: bytes | None) -> None:
+        await self._queue.put(chunk)
+
+    def __aiter__(self) -> "Stream":
+        return self
+
+    async def __anext__(self) -> bytes:
+        if self._closed:
+            raise StopAsyncIteration
+        chunk = await self._queue.get()
+        if chunk is None:
+            self._closed = True
+            raise StopAsyncIteration
+        return chunk
+
+    async def read(self) -> bytes:
+        """Read until the command closes the stream."""
+        return b"".join([chunk async for chunk in self])
+
+
+@dataclass
+class ExecResult:
+    """A finished command's exit status and (possibly truncated) output."""
+
+    returncode: int
+    stdout: bytes
+    stderr: bytes
+    truncated: bool = False
+
+
+class Execution:
+    """A command running in a session. Create with Session.exec."""
+
+    def __init__(self, process: asyncio.subprocess.Process | Channel, kill: Callable[[], Awaitable[None]],
+                 stdout: Stream, stderr: Stream, readers: list[asyncio.Task], timeout: float | None):
+        self.process = process
+        self.stdout = stdout
+        self.stderr = stderr
+        self._kill = kill
+        self._readers = readers
+        self._timed_out = False
+        self._done = asyncio.ensure_future(self._finish())
+        self._watchdog = asyncio.get_running_loop().call_later(timeout, self._expire) if timeout is not None else None
+
+    @property
+    def returncode(self) -> int | None:
+        """The exit status once the command finished, else None."""
+        return self.process.returncode if self._done.done() else None
+
+    async def _finish(self) -> int:
+        returncode = await self.process.wait()
+        await asyncio.gather(*self._readers)
+        return returncode
+
+    def _expire(self) -> None:
+        self._timed_out = True
+        asyncio.ensure_future(self._kill())
+
+    async def wait(self) -> int:
+        """Wait for the command and return its exit status.
+
+        Raises ExecTimeout if it was killed for outliving its timeout. If the
+        waiting task is cancelled, the command is killed.
+        """
+        try:
+            returncode = await asyncio.shield(self._done)
+        except asyncio.CancelledError:
+            await asyncio.shield(self.cancel())
+            raise
+        if self._watchdog:
+            self._watchdog.cancel()
+        if self._timed_out:
+            raise ExecTimeout(f"command killed after its timeout (exit status {returncode})")
+        return returncode
+
+    async def cancel(self) -> None:
+        """Kill the command (in the container too) and wait for it to exit."""
+        if self._watchdog:
+            self._watchdog.cancel()
+        if not self._done.done():
+            await self._kill()
+        await self._done
+
+
+async def _read_into(reader: asyncio.StreamReader, stream: Stream, callback: OutputCallback | None) -> None:
+    while True:
+        try:
+            chunk = await reader.read(CHUNK_SIZE)
+        except OSError:
+            # EIO from a PTY whose other end closed
+            chunk = b""
+        if not chunk:
+            break
+        if callback is None:
+            await stream._put(chunk)
+        else:
+            result = callback(chunk)
+            if inspect.isawaitable(result):
+                await result
+    await stream._put(None)
+
+
+class Session:
+    """One sandboxed container and the commands run in it.
+
+    options are `clankercage` flags (e.g. ["--resources", "auto"]), with the
+    same CLANKERCAGE_* environment defaults as the CLI. Like the CLI, a session
+    claims a pre-warmed pool container or reuses one (--reuse) when it can.
+    Pass instance_id to pick the instance yourself (this skips the pool).
+    Nothing is printed unless quiet is False.
+    """
+
+    def __init__(self, project_dir: Path | str, options: Sequence[str] = (), *, args: argparse.Namespace | None = None,
+                 instance_id: str | None = None, quiet: bool = True):
+        self.project_dir = Path(project_dir).resolve()
+        self.options = list(options)
+        if args is None:
+            args, unknown = cli.create_parser().parse_known_args(self.options)
+            if unknown:
+                raise SessionError(f"Unknown options: {' '.join(unknown)}")
+            cli.apply_env_defaults(args)
+        self.args = args
+        self.instance_id = instance_id or os.environ.get("CLANKERCAGE_INSTANCE_ID")
+        self.quiet = quiet
+        self.config_path: Path | None = None
+        self._ruleset: Path | None = None
+        self._claimed = False
+        self._launcher: NativeLauncher | None = None
+        self._exec_client: ExecClient | None = None
+        self._exec_server_down = not self.args.exec_server
+
+    def _log(self, message: str) -> None:
+        if not self.quiet:
+            print(message)
+
+    def prepare(self) -> None:
+        """Run the pre-flight checks and pick the instance: a reused, pooled or new one (blocking)."""
+        try:
+            image_id, config, pkg_dir, self.config_path, self._ruleset = cli.preflight_session(
+                self.args, self.project_dir, self.quiet)
+        except cli.PreflightError as e:
+            raise SessionError(str(e)) from e
+
+        fingerprint = cli.config_fingerprint(config, self.project_dir, pkg_dir, image_id)
+        if self.args.reuse:
+            # Stable instance ID derived from the config - matching runs share a container
+            with timings.span("reuse.fingerprint"):
+                self.instance_id = fingerprint[:12]
+                cli.remove_stale_containers(self.project_dir, self.instance_id)
+        elif self.instance_id is None:
+            # Claim a pre-warmed container if `clankercage pool` is running for this project
+            pool_dir = pool.get_pool_dir(self.project_dir)
+            if pool.has_idle_members(pool_dir):
+                with timings.span("pool.claim"):
+                    claimed = pool.claim_member(pool_dir, fingerprint)
+                if claimed:
+                    self.instance_id, self.config_path = claimed
+                    self._claimed = True
+                    cli.spawn_pool_refill(self.project_dir, self.options)
+            # Unique instance ID - used for the container ID and runtime dir
+            self.instance_id = self.instance_id or uuid.uuid4().hex[:12]
+        registry.record(self.instance_id, project=str(self.project_dir), config_hash=fingerprint,
+                        workspace=str(self.config_path.parent.parent), flags=cli.recorded_flags(self.options),
+                        reuse=self.args.reuse)
+
+    def up(self) -> None:
+        """Create or start the container unless it was claimed from the pool (blocking)."""
+        if self.config_path is None:
+            raise SessionError("Session not prepared")
+        if self._claimed:
+            self._log(f"Using pre-warmed container (instance {self.instance_id})...")
+        else:
+            self._log(f"Starting devcontainer (instance {self.instance_id})...")
+            phases_file = cli.get_instance_runtime_dir(self.instance_id) / "phases.tsv"
+            try:
+                with timings.span("container.up", launcher=self.args.launcher):
+                    cli.devcontainer_up(self.config_path, self.project_dir, self.instance_id, self.quiet,
+                                        self.args.launcher, self.args.resources == resources.AUTO, self._ruleset)
+                    timings.load_container_phases(phases_file)
+            except resources.QueueTimeout as e:
+                registry.record(self.instance_id, state=registry.FAILED)
+                raise SessionError(str(e)) from e
+            except subprocess.CalledProcessError as e:
+                registry.record(self.instance_id, state=registry.FAILED)
+                output = e.stderr.decode(errors="replace") if isinstance(e.stderr, bytes) else e.stderr or ""
+                raise SessionError(f"Failed to start the container: {output.strip() or e}") from e
+        # Reused and pooled containers may have been up for a while; their start time comes from Docker
+        started = {} if self.args.reuse or self._claimed else {"started": time.time()}
+        registry.record(self.instance_id, state=registry.RUNNING, **started)
+        timings.report(self.instance_id)
+        self._launcher = NativeLauncher.from_config_file(self.config_path, self.project_dir,
+                                                         {"clanker.instance": self.instance_id})
+
+    def interactive_command(self, cmd: list[str]) -> list[str]:
+        """The command line that runs cmd attached to this terminal (what the CLI execs into)."""
+        try:
+            return cli.interactive_command(self.config_path, self.project_dir, self.instance_id, cmd,
+                                           self.args.launcher)
+        except RuntimeError as e:
+            raise SessionError(str(e)) from e
+
+    async def start(self) -> "Session":
+        """Prepare and start the session's container."""
+        await asyncio.to_thread(self.prepare)
+        await asyncio.to_thread(self.up)
+        return self
+
+    async def exec(self, cmd: Sequence[str], *, stdin: bytes | None = None, env: dict[str, str] | None = None,
+                   cwd: str | None = None, timeout: float | None = None, pty: bool = False,
+                   on_stdout: OutputCallback | None = None, on_stderr: OutputCallback | None = None,
+                   buffer_chunks: int = DEFAULT_BUFFER_CHUNKS) -> Execution:
+        """Start a command in the container (as the remote user, in the workspace or cwd).
+
+        Consume its output (the stdout/stderr streams, or callbacks), then
+        await Execution.wait() for the exit status. With pty=True the command
+        gets a terminal and stderr is merged into stdout.
+        """
+        if self._launcher is None:
+            raise SessionError("Session not started")
+        client = None if pty else await self._server()
+        if client is not None:
+            return await self._exec_on_server(client, cmd, stdin, env, cwd, timeout, on_stdout, on_stderr,
+                                              buffer_chunks)
+        exec_id = uuid.uuid4().hex[:12]
+        pid_file = f"/tmp/clankercage-exec-{exec_id}.pid"
+        # Record the command's shell PID so a timeout or cancel can kill it inside the container
+        wrapped = ["sh", "-c", f'echo $$ > {pid_file}; trap "rm -f {pid_file}" EXIT; "$@"', "sh", *cmd]
+        found = await asyncio.to_thread(self._launcher.find_container)
+        if found is None:
+            raise SessionError("Container not found - was it started?")
+        container_id = found[0]
+        docker_cmd = self._launcher.exec_command(wrapped, pty, env, cwd, container_id)
+
+        stdout, stderr = Stream(buffer_chunks), Stream(buffer_chunks)
+        loop = asyncio.get_running_loop()
+        if pty:
+            master, slave = os.openpty()
+            try:
+                process = await asyncio.create_subprocess_exec(*docker_cmd, stdin=slave, stdout=slave, stderr=slave)
+            finally:
+                os.close(slave)
+            reader = asyncio.StreamReader(limit=CHUNK_SIZE)
+            await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(master, "rb", 0))
+            if stdin:
+                os.write(master, stdin)
+            readers = [asyncio.ensure_future(_read_into(reader, stdout, on_stdout)),
+                       asyncio.ensure_future(stderr._put(None))]
+        else:
+            process = await asyncio.create_subprocess_exec(
+                *docker_cmd,
+                stdin=subprocess.PIPE if stdin is not None else subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                limit=CHUNK_SIZE,
+            )
+            if stdin is not None:
+                process.stdin.write(stdin)
+                await process.stdin.drain()
+                process.stdin.close()
+            readers = [asyncio.ensure_future(_read_into(process.stdout, stdout, on_stdout)),
+                       asyncio.ensure_future(_read_into(process.stderr, stderr, on_stderr))]
+
+
+        async def kill() -> None:
+            for sig in ("TERM", "KILL"):
+                # Signal the command's process tree, children before parents so none escape by being
+                # reparented; the wrapper shell then exits and removes its PID file
+                killer = await asyncio.create_subprocess_exec(
+                    "docker", "exec", container_id, "sh", "-c",
+                    f't() {{ for c in $(pgrep -P "$1"); do t "$c"; done; kill -{sig} "$1"; }}; '
+                    f'p=$(cat {pid_file} 2>/dev/null) && for c in $(pgrep -P "$p"); do t "$c"; done',
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                await killer.wait()
+                try:
+                    await asyncio.wait_for(asyncio.shield(process.wait()), KILL_GRACE)
+                    return
+                except asyncio.TimeoutError:
+                    continue
+            process.kill()
+
+        return Execution(process, kill, stdout, stderr, readers, timeout)
+
+    async def _server(self) -> ExecClient | None:
+        """The command server connection, or None to use docker exec."""
+        if self._exec_client is None and not self._exec_server_down:
+            try:
+                self._exec_client = await ExecClient.connect(cli.get_instance_runtime_dir(self.instance_id) / EXEC_SOCKET)
+            except ExecServerError as e:
+                self._exec_server_down = True
+                self._log(f"Warning: {e}, using docker exec")
+        return self._exec_client
+
+    async def _exec_on_server(self, client: ExecClient, cmd: Sequence[str], stdin: bytes | None,
+                              env: dict[str, str] | None, cwd: str | None, timeout: float | None,
+                              on_stdout: OutputCallback | None, on_stderr: OutputCallback | None,
+                              buffer_chunks: int) -> Execution:
+        try:
+            channel = await client.open(list(cmd), env, cwd or self._launcher.workspace_folder, stdin or b"")
+        except ExecServerError as e:
+            raise SessionError(str(e)) from e
+        stdout, stderr = Stream(buffer_chunks), Stream(buffer_chunks)
+        readers = [asyncio.ensure_future(_read_into(channel.stdout, stdout, on_stdout)),
+                   asyncio.ensure_future(_read_into(channel.stderr, stderr, on_stderr))]
+
+        async def kill() -> None:
+            # The server signals the command's process group
+            for signum in (signal.SIGTERM, signal.SIGKILL):
+                await channel.signal(signum)
+                try:
+                    await asyncio.wait_for(channel.wait(), KILL_GRACE)
+                    return
+                except asyncio.TimeoutError:
+                    continue
+
+        return Execution(channel, kill, stdout, stderr, readers, timeout)
+
+    async def run(self, cmd: Sequence[str], *, stdin: bytes | None = None, env: dict[str, str] | None = None,
+                  cwd: str | None = None, timeout: float | None = None, pty: bool = False,
+                  max_output: int = DEFAULT_MAX_OUTPUT) -> ExecResult:
+        """Run a command to completion and collect up to max_output bytes of each stream."""
+        kept = {"stdout": bytearray(), "stderr": bytearray()}
+        truncated = False
+
+        def collect(name: str) -> Callable[[bytes], None]:
+            def add(chunk: bytes) -> None:
+                nonlocal truncated
+                room = max_output - len(kept[name])
+                kept[name] += chunk[:max(room, 0)]
+                truncated = truncated or len(chunk) > room
+            return add
+
+        execution = await self.exec(cmd, stdin=stdin, env=env, cwd=cwd, timeout=timeout, pty=pty,
+                                    on_stdout=collect("stdout"), on_stderr=collect("stderr"))
+        returncode = await execution.wait()
+        return ExecResult(returncode, bytes(kept["stdout"]), bytes(kept["stderr"]), truncated)
+
+    async def stop(self, remove: bool = True) -> None:
+        """Remove the session's container (or only stop it, to keep its state)."""
+        if self.instance_id is None:
+            return
+        if self._exec_client is not None:
+            await self._exec_client.close()
+            self._exec_client = None
+        if remove:
+            await asyncio.to_thread(pool.remove_container, self.instance_id)
+            await asyncio.to_thread(registry.record, self.instance_id, state=registry.REMOVED)
+        elif self._launcher is not None:
+            found = await asyncio.to_thread(self._launcher.find_container)
+            if found:
+                await asyncio.to_thread(subprocess.run, ["docker", "stop", found[0]], capture_output=True)
+                await asyncio.to_thread(registry.record, self.instance_id, state=registry.STOPPED)
+        self._launcher = None
+
+    async def __aenter__(self) -> "Session":
+        return await self.start()
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
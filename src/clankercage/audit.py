@@ -0,0 +1,310 @@
+"""Rotation, compression and querying of the firewall audit log.
+
+Containers append JSON lines to ~/.cache/clankercage/audit/firewall-audit.jsonl
+(mounted at /var/log/clankercage, see devcontainer/audit-log.sh), one record per
+firewall event:
+
+  {"ts": "2026-01-01T12:00:00+00:00", "instance": "<id>", "event": "DOMAIN_APPROVED", "domain": "...", ...}
+
+Every CLI run calls maintain(), which keeps the directory bounded:
+
+  rotate    - once the active file exceeds MAX_BYTES or its first record is
+              older than MAX_AGE, it is renamed to firewall-audit-<UTC time>.jsonl.
+              Containers open the file for every append, so their next record
+              starts a new active file.
+  compress  - rotated files are gzipped (after ROTATE_GRACE, so an append that
+              opened the file just before the rename lands first) and recorded
+              in index.json with their time range and the events, instances and
+              domains they contain
+  retain    - at most MAX_ARCHIVES archives are kept, the oldest go first
+
+query() uses the index to open only the archives that can match, so searching
+months of logs costs about as much as reading the matching archives.
+"""
+
+import fcntl
+import gzip
+import json
+import os
+import re
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator
+
+__all__ = [
+    "ACTIVE_LOG",
+    "MAX_AGE",
+    "MAX_ARCHIVES",
+    "MAX_BYTES",
+    "format_record",
+    "maintain",
+    "parse_time",
+    "query",
+    "record_time",
+]
+
+ACTIVE_LOG = "firewall-audit.jsonl"
+INDEX_FILE = "index.json"
+# The pipe-delimited log written by older versions, imported as an archive once
+LEGACY_LOG = "firewall-audit.log"
+
+MAX_BYTES = 10 * 1024 * 1024
+MAX_AGE = 7 * 86400
+MAX_ARCHIVES = 100
+ROTATE_GRACE = 60
+
+_ARCHIVE_PATTERN = re.compile(r"^firewall-audit-(\d{8}T\d{6}Z)(?:-(\d+))?\.jsonl(\.gz)?$")
+_RELATIVE_PATTERN = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 7 * 86400}
+
+
+def record_time(record: dict) -> float:
+    """Epoch seconds of a record's timestamp (0 if it has none)."""
+    try:
+        return datetime.fromisoformat(record["ts"]).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return 0.0
+
+
+def parse_time(value: str, now: float | None = None) -> float:
+    """Parse a relative ("30m", "12h", "7d", "2w" ago) or ISO 8601 time to epoch seconds.
+
+    ISO times without an offset are local time. Raises ValueError for anything else.
+    """
+    match = _RELATIVE_PATTERN.match(value.strip())
+    if match:
+        return (now or time.time()) - float(match.group(1)) * _UNITS[match.group(2)]
+    return datetime.fromisoformat(value.strip().replace("Z", "+00:00")).timestamp()
+
+
+def format_record(record: dict) -> str:
+    """Render a record as one human-readable line."""
+    details = " ".join(f"{key}={value}" for key, value in record.items() if key not in ("ts", "instance", "event"))
+    return f"{record.get('ts', '?')}  {record.get('instance') or '-':<12}  {record.get('event', '?')}  {details}".rstrip()
+
+
+def _read_records(path: Path) -> Iterator[dict]:
+    """Yield the records of a (possibly gzipped) JSONL file, skipping torn or foreign lines."""
+    opener = gzip.open if path.suffix == ".gz" else open
+    try:
+        with opener(path, "rt", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if isinstance(record, dict):
+                    yield record
+    except FileNotFoundError:
+        return
+
+
+def _parse_legacy_line(line: str) -> dict | None:
+    """Convert a "ts | EVENT | key=value ..." line from the old log format."""
+    parts = line.rstrip("\n").split(" | ", 2)
+    if len(parts) < 2:
+        return None
+    try:
+        ts = datetime.strptime(parts[0], "%Y-%m-%dT%H:%M:%S%z").astimezone(timezone.utc)
+    except ValueError:
+        return None
+    record = {"ts": ts.isoformat(), "instance": "", "event": parts[1]}
+    for pair in (parts[2] if len(parts) > 2 else "").split():
+        key, sep, value = pair.partition("=")
+        if sep:
+            record[key] = value
+    return record
+
+
+def _archive_name(audit_dir: Path, now: float) -> Path:
+    stamp = time.strftime("%Y%m%dT%H%M%SZ", time.gmtime(now))
+    path = audit_dir / f"firewall-audit-{stamp}.jsonl"
+    n = 1
+    while path.exists() or path.with_name(path.name + ".gz").exists():
+        path = audit_dir / f"firewall-audit-{stamp}-{n}.jsonl"
+        n += 1
+    return path
+
+
+def _first_record_time(path: Path) -> float:
+    try:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                try:
+                    return record_time(json.loads(line))
+                except ValueError:
+                    continue
+    except FileNotFoundError:
+        pass
+    return 0.0
+
+
+def _load_index(audit_dir: Path) -> dict:
+    try:
+        index = json.loads((audit_dir / INDEX_FILE).read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+    return index if isinstance(index, dict) else {}
+
+
+def _save_index(audit_dir: Path, index: dict) -> None:
+    tmp = audit_dir / f".{INDEX_FILE}.{os.getpid()}"
+    tmp.write_text(json.dumps(index, indent=1, sort_keys=True) + "\n")
+    os.replace(tmp, audit_dir / INDEX_FILE)
+
+
+def _summarize(records: Iterator[dict]) -> dict:
+    """Index entry for an archive: its time range and the values it can be queried by."""
+    first = last = None
+    events, instances, domains = set(), set(), set()
+    count = 0
+    for record in records:
+        count += 1
+        ts = record_time(record)
+        if ts:
+            first = ts if first is None else min(first, ts)
+            last = ts if last is None else max(last, ts)
+        events.add(str(record.get("event", "")))
+        instances.add(str(record.get("instance", "")))
+        if record.get("domain"):
+            domains.add(str(record["domain"]).lower())
+    return {
+        "first": first or 0.0,
+        "last": last or 0.0,
+        "records": count,
+        "events": sorted(events),
+        "instances": sorted(instances),
+        "domains": sorted(domains),
+    }
+
+
+def _compress(path: Path) -> tuple[Path, dict]:
+    """Gzip a rotated file (atomically) and summarize it for the index."""
+    target = path.with_name(path.name + ".gz")
+    tmp = path.with_name(f".{target.name}.{os.getpid()}")
+    with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.replace(tmp, target)
+    path.unlink()
+    return target, _summarize(_read_records(target))
+
+
+def _import_legacy(audit_dir: Path, now: float) -> None:
+    legacy = audit_dir / LEGACY_LOG
+    if not legacy.is_file():
+        return
+    tmp = audit_dir / f".{LEGACY_LOG}.{os.getpid()}"
+    oldest = now
+    with open(legacy, encoding="utf-8", errors="replace") as src, open(tmp, "w") as dst:
+        for record in filter(None, map(_parse_legacy_line, src)):
+            oldest = min(oldest, record_time(record) or now)
+            dst.write(json.dumps(record) + "\n")
+    # Backdated, so it sorts before the JSONL archives and is compressed right away
+    target = _archive_name(audit_dir, oldest)
+    os.utime(tmp, (oldest, oldest))
+    os.replace(tmp, target)
+    legacy.unlink()
+
+
+def maintain(audit_dir: Path, max_bytes: int = MAX_BYTES, max_age: float = MAX_AGE,
+             max_archives: int = MAX_ARCHIVES, now: float | None = None) -> None:
+    """Rotate the active log, compress and index rotated files, and drop the oldest archives.
+
+    Skipped if another process is already doing it.
+    """
+    now = now or time.time()
+    if not audit_dir.is_dir():
+        return
+    with open(audit_dir / ".maintain.lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return
+        _import_legacy(audit_dir, now)
+
+        active = audit_dir / ACTIVE_LOG
+        try:
+            size = active.stat().st_size
+        except FileNotFoundError:
+            size = 0
+        if size >= max_bytes or (size and now - (_first_record_time(active) or now) > max_age):
+            archive = _archive_name(audit_dir, now)
+            os.rename(active, archive)
+            # Compression waits for ROTATE_GRACE from now, not from the last append
+            os.utime(archive, (now, now))
+
+        old_index = _load_index(audit_dir)
+        index = dict(old_index)
+        for path in _list_archives(audit_dir):
+            if path.suffix == ".gz" or now - path.stat().st_mtime < ROTATE_GRACE:
+                continue
+            target, summary = _compress(path)
+            index[target.name] = summary
+
+        archives = _list_archives(audit_dir)
+        for path in archives[:max(0, len(archives) - max_archives)]:
+            path.unlink(missing_ok=True)
+        # Drop entries of archives that are gone, and index any that were missed
+        present = {p.name for p in _list_archives(audit_dir) if p.suffix == ".gz"}
+        index = {name: entry for name, entry in index.items() if name in present}
+        for name in present - index.keys():
+            index[name] = _summarize(_read_records(audit_dir / name))
+        if index != old_index:
+            _save_index(audit_dir, index)
+
+
+def _list_archives(audit_dir: Path) -> list[Path]:
+    """Rotated files, oldest first."""
+    archives = []
+    for path in audit_dir.iterdir():
+        match = _ARCHIVE_PATTERN.match(path.name)
+        if match:
+            archives.append(((match.group(1), int(match.group(2) or "0")), path))
+    return [path for _, path in sorted(archives)]
+
+
+def _may_match(entry: dict, domain: str | None, event: str | None, instance: str | None,
+               since: float | None, until: float | None) -> bool:
+    if since is not None and entry.get("last", 0) < since:
+        return False
+    if until is not None and entry.get("first", 0) > until:
+        return False
+    if domain is not None and domain not in entry.get("domains", []):
+        return False
+    if event is not None and event not in entry.get("events", []):
+        return False
+    if instance is not None and not any(i.startswith(instance) for i in entry.get("instances", [])):
+        return False
+    return True
+
+
+def query(audit_dir: Path, domain: str | None = None, event: str | None = None, instance: str | None = None,
+          since: float | None = None, until: float | None = None) -> Iterator[dict]:
+    """Yield matching records, oldest first.
+
+    domain and event match exactly (case-insensitively), instance matches an ID prefix,
+    since/until are epoch seconds (inclusive).
+    """
+    domain = domain.lower() if domain else None
+    event = event.upper() if event else None
+    index = _load_index(audit_dir) if audit_dir.is_dir() else {}
+    sources = _list_archives(audit_dir) if audit_dir.is_dir() else []
+    sources.append(audit_dir / ACTIVE_LOG)
+    for path in sources:
+        entry = index.get(path.name)
+        if entry is not None and not _may_match(entry, domain, event, instance, since, until):
+            continue
+        for record in _read_records(path):
+            if domain is not None and str(record.get("domain", "")).lower() != domain:
+                continue
+            if event is not None and record.get("event") != event:
+                continue
+            if instance is not None and not str(record.get("instance", "")).startswith(instance):
+                continue
+            if since is not None or until is not None:
+                ts = record_time(record)
+                if (since is not None and ts < since) or (until is not None and ts > until):
+                    continue
+            yield record
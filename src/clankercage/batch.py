@@ -0,0 +1,302 @@
+"""Run many sessions in parallel from a job file (`clankercage batch`).
+
+A job file lists sessions to run, as JSON or TOML (Python 3.11+):
+
+  concurrency = 4                       # optional, --concurrency overrides it
+
+  [defaults]                            # optional, merged into every job
+  options = ["--resources", "auto"]     # clankercage flags
+  timeout = 1800                        # seconds
+  env = { CLANKERCAGE_GIT_USER_NAME = "ci" }
+
+  [[jobs]]
+  name = "lint-api"                     # optional, defaults to job-<n>
+  project = "../api"                    # relative to the job file
+  shell = "make lint"                   # a --shell command ...
+
+  [[jobs]]
+  project = "../web"
+  args = ["-p", "Fix the failing tests"]  # ... or arguments for claude
+
+(The JSON form has the same keys.) Every job is a separate `clankercage` run
+in its project directory with its own instance ID, so jobs never share a
+container, runtime dir or firewall log. Jobs start in file order, at most
+`concurrency` at a time; each one's output (stdout and stderr) streams to
+<output>/<name>.log and a summary with exit codes and timings is written to
+<output>/summary.json. A job that outlives its timeout is killed. Containers
+are removed once their job finishes unless --keep is given.
+"""
+
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable
+
+from clankercage import pool
+
+try:
+    import tomllib
+except ImportError:  # Python 3.10
+    tomllib = None
+
+__all__ = [
+    "DEFAULT_CONCURRENCY",
+    "Job",
+    "JobFileError",
+    "JobResult",
+    "Scheduler",
+    "command",
+    "load_jobs",
+    "write_summary",
+]
+
+DEFAULT_CONCURRENCY = 4
+# Seconds a killed job gets to exit after SIGTERM before SIGKILL
+KILL_GRACE = 10
+
+
+class JobFileError(ValueError):
+    """The job file is missing, unreadable or malformed. The message is shown to the user."""
+
+
+@dataclass
+class Job:
+    """One session to run."""
+
+    name: str
+    project: Path
+    shell: str | None = None
+    args: list[str] = field(default_factory=list)
+    options: list[str] = field(default_factory=list)
+    env: dict[str, str] = field(default_factory=dict)
+    timeout: float | None = None
+
+
+@dataclass
+class JobResult:
+    """How a job went.
+
+    status is ok, failed (non-zero exit), timeout, error (couldn't start) or
+    cancelled (the batch was interrupted first).
+    """
+
+    name: str
+    project: str
+    instance: str
+    status: str
+    exit_code: int | None
+    started: float
+    finished: float
+    duration: float
+    log: str
+
+
+def _parse(path: Path) -> dict:
+    try:
+        text = path.read_text()
+    except OSError as e:
+        raise JobFileError(f"Cannot read job file {path}: {e}") from e
+    if path.suffix == ".toml":
+        if tomllib is None:
+            raise JobFileError("TOML job files need Python 3.11 or newer, use JSON instead")
+        try:
+            return tomllib.loads(text)
+        except tomllib.TOMLDecodeError as e:
+            raise JobFileError(f"Invalid TOML in {path}: {e}") from e
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        raise JobFileError(f"Invalid JSON in {path}: {e}") from e
+    if not isinstance(data, dict):
+        raise JobFileError(f"{path}: expected an object with a \"jobs\" list")
+    return data
+
+
+def _job(index: int, entry: dict, defaults: dict, base_dir: Path) -> Job:
+    if not isinstance(entry, dict):
+        raise JobFileError(f"Job {index + 1}: expected a table/object")
+    merged = {**defaults, **entry, "env": {**defaults.get("env", {}), **entry.get("env", {})}}
+    name = str(merged.get("name") or f"job-{index + 1}")
+    if "project" not in merged:
+        raise JobFileError(f"Job {name}: missing \"project\"")
+    if merged.get("shell") and merged.get("args"):
+        raise JobFileError(f"Job {name}: give either \"shell\" or \"args\", not both")
+    if "/" in name or name.startswith("."):
+        raise JobFileError(f"Job {name}: names must not contain '/' or start with '.'")
+    project = (base_dir / str(merged["project"])).expanduser().resolve()
+    if not project.is_dir():
+        raise JobFileError(f"Job {name}: project directory {project} does not exist")
+    timeout = merged.get("timeout")
+    return Job(
+        name=name,
+        project=project,
+        shell=merged.get("shell"),
+        args=[str(a) for a in merged.get("args", [])],
+        options=[str(o) for o in merged.get("options", [])],
+        env={str(k): str(v) for k, v in merged["env"].items()},
+        timeout=float(timeout) if timeout is not None else None,
+    )
+
+
+def load_jobs(path: Path) -> tuple[list[Job], int | None]:
+    """Read a job file. Returns the jobs and the concurrency it asks for, if any."""
+    data = _parse(path)
+    entries = data.get("jobs")
+    if not isinstance(entries, list) or not entries:
+        raise JobFileError(f"{path}: no jobs")
+    defaults = data.get("defaults", {})
+    jobs = [_job(i, entry, defaults, path.parent) for i, entry in enumerate(entries)]
+    names = [job.name for job in jobs]
+    duplicates = sorted({n for n in names if names.count(n) > 1})
+    if duplicates:
+        raise JobFileError(f"Duplicate job names: {', '.join(duplicates)}")
+    concurrency = data.get("concurrency")
+    return jobs, int(concurrency) if concurrency is not None else None
+
+
+def command(job: Job) -> list[str]:
+    """The clankercage command line a job runs."""
+    cmd = [sys.executable, "-m", "clankercage.cli", *job.options]
+    if job.shell:
+        return cmd + ["--shell", job.shell]
+    return cmd + job.args
+
+
+class Scheduler:
+    """Runs jobs in order, at most `concurrency` at a time.
+
+    Each job runs as a `clankercage` process in its own process group, with its
+    instance ID chosen here (CLANKERCAGE_INSTANCE_ID), so a timed-out or
+    cancelled job can be killed together with its docker exec and its
+    container removed.
+    """
+
+    def __init__(self, output_dir: Path, concurrency: int = DEFAULT_CONCURRENCY, keep: bool = False):
+        self.output_dir = output_dir
+        self.concurrency = max(1, concurrency)
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._running: dict[str, subprocess.Popen] = {}
+        self._cancelled = False
+
+    def run(self, jobs: list[Job], on_done: Callable[[JobResult], None] | None = None) -> list[JobResult]:
+        """Run all jobs and return their results in job order.
+
+        on_done is called (from the calling thread) as each job finishes. On
+        KeyboardInterrupt, queued jobs are dropped and running ones killed.
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        results: dict[str, JobResult] = {}
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            futures = [executor.submit(self._run_job, job) for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                results[result.name] = result
+                if on_done:
+                    on_done(result)
+        except KeyboardInterrupt:
+            self.cancel()
+            raise
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return [results[job.name] for job in jobs if job.name in results]
+
+    def cancel(self) -> None:
+        """Stop starting jobs and kill the running ones."""
+        with self._lock:
+            self._cancelled = True
+            running = list(self._running.values())
+        for process in running:
+            _kill(process)
+
+    def _run_job(self, job: Job) -> JobResult:
+        instance_id = uuid.uuid4().hex[:12]
+        log_path = self.output_dir / f"{job.name}.log"
+        started = time.time()
+        with open(log_path, "wb") as log:
+            with self._lock:
+                if self._cancelled:
+                    return self._result(job, instance_id, "cancelled", None, started, log_path)
+                try:
+                    process = subprocess.Popen(
+                        command(job),
+                        cwd=job.project,
+                        env={**os.environ, **job.env, "CLANKERCAGE_INSTANCE_ID": instance_id},
+                        stdin=subprocess.DEVNULL,
+                        stdout=log,
+                        stderr=subprocess.STDOUT,
+                        start_new_session=True,
+                    )
+                except OSError as e:
+                    log.write(f"Failed to start: {e}\n".encode())
+                    return self._result(job, instance_id, "error", None, started, log_path)
+                self._running[job.name] = process
+            try:
+                exit_code = process.wait(timeout=job.timeout)
+                status = "ok" if exit_code == 0 else "failed"
+            except subprocess.TimeoutExpired:
+                exit_code = _kill(process)
+                status = "timeout"
+                log.write(f"\nclankercage batch: killed after {job.timeout:g}s\n".encode())
+            finally:
+                with self._lock:
+                    self._running.pop(job.name, None)
+        if not self.keep:
+            pool.remove_container(instance_id)
+        return self._result(job, instance_id, status, exit_code, started, log_path)
+
+    def _result(self, job: Job, instance_id: str, status: str, exit_code: int | None, started: float,
+                log_path: Path) -> JobResult:
+        finished = time.time()
+        return JobResult(
+            name=job.name,
+            project=str(job.project),
+            instance=instance_id,
+            status=status,
+            exit_code=exit_code,
+            started=started,
+            finished=finished,
+            duration=round(finished - started, 3),
+            log=str(log_path),
+        )
+
+
+def _kill(process: subprocess.Popen) -> int | None:
+    """Terminate a job's process group, escalating to SIGKILL. Returns its exit code."""
+    for sig in (signal.SIGTERM, signal.SIGKILL):
+        try:
+            os.killpg(process.pid, sig)
+        except ProcessLookupError:
+            break
+        try:
+            return process.wait(timeout=KILL_GRACE)
+        except subprocess.TimeoutExpired:
+            continue
+    return process.wait()
+
+
+def write_summary(path: Path, results: list[JobResult], started: float, finished: float) -> dict:
+    """Write the machine-readable batch summary and return it."""
+    counts: dict[str, int] = {}
+    for result in results:
+        counts[result.status] = counts.get(result.status, 0) + 1
+    summary = {
+        "started": started,
+        "finished": finished,
+        "duration": round(finished - started, 3),
+        "counts": counts,
+        "jobs": [asdict(result) for result in results],
+    }
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(json.dumps(summary, indent=2) + "\n")
+    os.rename(tmp, path)
+    return summary
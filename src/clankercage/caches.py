@@ -0,0 +1,81 @@
+"""Package-manager caches shared between instances.
+
+Every container would otherwise start with empty uv, npm, pnpm, pip, cargo and
+Go module caches, and parallel sessions would each download the same wheels
+and tarballs through the firewall. Unless --no-shared-cache is given, each
+tool's cache is a named volume (clankercage-cache-<tool>) mounted under
+/pkgcache in every instance, and the tool is pointed at it through its
+environment variable:
+
+  uv     UV_CACHE_DIR           pip    PIP_CACHE_DIR
+  npm    npm_config_cache       go     GOMODCACHE
+  pnpm   npm_config_store_dir
+
+Cargo has no variable for its download cache alone, and the rest of CARGO_HOME
+holds credentials.toml, config.toml and installed binaries, which must not be
+shared. So its volume is mounted over ~/.cargo/registry only.
+
+The volumes outlive the containers, so a repeated `uv sync` or `pnpm install`
+is served from the cache. The tools already cope with concurrent writers;
+devcontainer/cache-evict.py runs in the background at every start and keeps
+each cache under --shared-cache-size GiB by removing least recently used
+entries. Caches are shared by all sessions, so anything one session puts
+there is seen by the others.
+
+The image has to provide the mount points (owned by node, as a new volume
+takes its owner from its mount point) and cache-evict.py; images that do are
+labelled IMAGE_LABEL. Sessions on an older image start without shared caches.
+"""
+
+__all__ = [
+    "CONTAINER_CACHE_ROOT",
+    "DEFAULT_MAX_SIZE_GB",
+    "IMAGE_LABEL",
+    "TOOLS",
+    "VOLUME_PREFIX",
+    "container_env",
+    "evict_command",
+    "image_supports",
+    "mounts",
+]
+
+CONTAINER_CACHE_ROOT = "/pkgcache"
+VOLUME_PREFIX = "clankercage-cache-"
+DEFAULT_MAX_SIZE_GB = 5
+IMAGE_LABEL = "io.clankercage.shared-cache"
+
+# Tool -> (its cache directory in the container, the variable that points it there)
+TOOLS = {
+    "uv": (f"{CONTAINER_CACHE_ROOT}/uv", "UV_CACHE_DIR"),
+    "npm": (f"{CONTAINER_CACHE_ROOT}/npm", "npm_config_cache"),
+    "pnpm": (f"{CONTAINER_CACHE_ROOT}/pnpm", "npm_config_store_dir"),
+    "pip": (f"{CONTAINER_CACHE_ROOT}/pip", "PIP_CACHE_DIR"),
+    # The default CARGO_HOME is kept: only its registry is shared
+    "cargo": ("/home/node/.cargo/registry", None),
+    "go": (f"{CONTAINER_CACHE_ROOT}/go", "GOMODCACHE"),
+}
+
+
+def mounts() -> list[str]:
+    """Devcontainer mounts for the cache volumes."""
+    return [f"source={VOLUME_PREFIX}{tool},target={directory},type=volume" for tool, (directory, _) in TOOLS.items()]
+
+
+def container_env() -> dict[str, str]:
+    """Environment variables that point the tools at the shared caches."""
+    env = {variable: directory for directory, variable in TOOLS.values() if variable}
+    # The cache volume and /workspace are different filesystems, so uv can't hardlink; don't warn about it
+    env["UV_LINK_MODE"] = "copy"
+    return env
+
+
+def evict_command(max_size_gb: float) -> str:
+    """postStartCommand step that trims the caches in the background."""
+    dirs = " ".join(directory for directory, _ in TOOLS.values())
+    return (f"{{ python3 /usr/local/bin/cache-evict.py --max-size {int(max_size_gb * 2**30)} {dirs} "
+            f"</dev/null >>/tmp/cache-evict.log 2>&1 & }}")
+
+
+def image_supports(labels: dict | None) -> bool:
+    """Whether an image (by its labels) has the mount points and eviction script for the caches."""
+    return (labels or {}).get(IMAGE_LABEL) == "1"
@@ -0,0 +1,174 @@
+"""Resource usage of instance containers, read from their cgroup v2 files.
+
+`clankercage metrics` samples every running container labelled
+`clanker.instance` on each export. Rather than `docker stats` (a streaming API
+call per container), it reads the kernel's accounting files directly:
+
+  cpu.stat                         CPU time (user/system) and throttling
+  memory.current/.max/.events      memory usage, limit and OOM kills
+  pids.current/.max                processes and their limit
+  io.stat                          bytes and operations per device (summed)
+  {cpu,memory,io}.pressure         PSI stall time ("some" and "full")
+
+That is about ten small reads per instance per sample. Docker is only asked
+for the list of container IDs; each new container is inspected once, to find
+its cgroup (by ID under the systemd or cgroupfs layout, or through its init
+process) and its instance and project labels.
+
+This needs a Linux host with the unified (v2) hierarchy where the containers
+run - with Docker Desktop they run in a VM and no instances are found.
+"""
+
+import json
+import subprocess
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from clankercage.gc import parse_docker_time
+
+__all__ = [
+    "CGROUP_ROOT",
+    "Instance",
+    "InstanceTracker",
+    "find_cgroup",
+    "parse_io_stat",
+    "parse_keyed",
+    "parse_pressure",
+    "read_stats",
+]
+
+CGROUP_ROOT = Path("/sys/fs/cgroup")
+
+
+@dataclass
+class Instance:
+    """A running instance container and where its cgroup is."""
+
+    container_id: str
+    instance: str
+    project: str
+    started: float
+    cgroup: Path | None
+
+
+def find_cgroup(container_id: str, pid: int, root: Path = CGROUP_ROOT, proc: Path = Path("/proc")) -> Path | None:
+    """Locate a container's cgroup v2 directory, or None if it isn't visible from here."""
+    for candidate in (root / "system.slice" / f"docker-{container_id}.scope", root / "docker" / container_id):
+        if (candidate / "cgroup.controllers").exists():
+            return candidate
+    try:
+        lines = (proc / str(pid) / "cgroup").read_text().splitlines()
+    except OSError:
+        return None
+    for line in lines:
+        if line.startswith("0::"):
+            candidate = root / line[3:].lstrip("/")
+            if (candidate / "cgroup.controllers").exists():
+                return candidate
+    return None
+
+
+def parse_keyed(text: str) -> dict[str, int]:
+    """Parse a flat-keyed file ("key value" lines, e.g. cpu.stat, memory.events)."""
+    values = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(" ")
+        if value.strip().isdigit():
+            values[key] = int(value)
+    return values
+
+
+def parse_pressure(text: str) -> dict[str, int]:
+    """Total stall microseconds per level ("some", "full") of a PSI file."""
+    totals = {}
+    for line in text.splitlines():
+        level, *fields = line.split()
+        for field in fields:
+            key, _, value = field.partition("=")
+            if key == "total" and value.isdigit():
+                totals[level] = int(value)
+    return totals
+
+
+def parse_io_stat(text: str) -> dict[str, int]:
+    """Sum io.stat counters (rbytes, wbytes, rios, wios, ...) over all devices."""
+    totals: dict[str, int] = {}
+    for line in text.splitlines():
+        for field in line.split()[1:]:
+            key, _, value = field.partition("=")
+            if value.isdigit():
+                totals[key] = totals.get(key, 0) + int(value)
+    return totals
+
+
+def _read(path: Path) -> str | None:
+    try:
+        return path.read_text()
+    except OSError:
+        return None
+
+
+def _read_int(path: Path) -> int | None:
+    """Read a single-value file; None if missing or "max" (no limit)."""
+    text = _read(path)
+    return int(text) if text is not None and text.strip().isdigit() else None
+
+
+def read_stats(cgroup: Path) -> dict | None:
+    """Sample a cgroup. None once it is gone (the container stopped)."""
+    cpu = _read(cgroup / "cpu.stat")
+    if cpu is None:
+        return None
+    cpu_stat = parse_keyed(cpu)
+    return {
+        "cpu_user_usec": cpu_stat.get("user_usec", 0),
+        "cpu_system_usec": cpu_stat.get("system_usec", 0),
+        "cpu_throttled_usec": cpu_stat.get("throttled_usec", 0),
+        "memory_current": _read_int(cgroup / "memory.current"),
+        "memory_max": _read_int(cgroup / "memory.max"),
+        "oom_kills": parse_keyed(_read(cgroup / "memory.events") or "").get("oom_kill", 0),
+        "pids_current": _read_int(cgroup / "pids.current"),
+        "pids_max": _read_int(cgroup / "pids.max"),
+        "io": parse_io_stat(_read(cgroup / "io.stat") or ""),
+        "pressure": {
+            resource: parse_pressure(_read(cgroup / f"{resource}.pressure") or "")
+            for resource in ("cpu", "memory", "io")
+        },
+    }
+
+
+class InstanceTracker:
+    """Keeps the running instance containers and their cgroups, inspecting each container once."""
+
+    def __init__(self, root: Path = CGROUP_ROOT):
+        self.root = root
+        self.instances: dict[str, Instance] = {}
+
+    def refresh(self) -> list[Instance] | None:
+        """Update the list of running instances. None if Docker isn't reachable."""
+        result = subprocess.run(
+            ["docker", "ps", "-q", "--no-trunc", "--filter", "label=clanker.instance"],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            return None
+        running = result.stdout.split()
+        self.instances = {cid: inst for cid, inst in self.instances.items() if cid in running}
+        new = [cid for cid in running if cid not in self.instances]
+        if new:
+            result = subprocess.run(["docker", "container", "inspect"] + new, capture_output=True, text=True)
+            for container in json.loads(result.stdout or "[]"):
+                self.instances[container["Id"]] = self._instance(container)
+        return list(self.instances.values())
+
+    def _instance(self, container: dict) -> Instance:
+        labels = (container.get("Config") or {}).get("Labels") or {}
+        state = container.get("State") or {}
+        return Instance(
+            container_id=container["Id"],
+            instance=labels.get("clanker.instance", ""),
+            project=labels.get("devcontainer.local_folder", ""),
+            started=parse_docker_time(state.get("StartedAt", "")) or time.time(),
+            cgroup=find_cgroup(container["Id"], state.get("Pid", 0), self.root),
+        )
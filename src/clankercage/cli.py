@@ -1,15 +1,25 @@
 """CLI entry points for ClankerCage."""
 
 import argparse
+import copy
+import dataclasses
+import hashlib
 import json
 import os
 import shlex
 import shutil
+import sqlite3
 import subprocess
 import sys
+import time
 import uuid
 from pathlib import Path
 
+from clankercage import (audit, batch, caches, cgroups, firewall, gc, github_meta, instances, metrics, pool, preflight,
+                         registry, resources, timings)
+from clankercage.engine import DockerEngine, EngineError
+from clankercage.launcher import NativeLauncher
+
 __all__ = ["main", "shell_remote"]
 
 
@@ -18,27 +28,91 @@ def get_embedded_devcontainer_dir() -> Path:
     return Path(__file__).parent / "devcontainer"
 
 
-def get_workspace_dir(instance_id: str) -> Path:
-    """Get instance-specific workspace directory for devcontainer files.
+def get_cache_dir() -> Path:
+    """Get the ClankerCage cache directory (workspaces, runtime dirs, pools)."""
+    return Path.home() / ".cache" / "clankercage"
+
+
+def get_workspace_dir(key: str) -> Path:
+    """Get the workspace directory for a workspace key (see workspace_key).
 
-    Each instance gets its own directory to prevent race conditions when
-    multiple ClankerCage instances run with different configurations.
+    Workspaces are content-addressed: runs with identical devcontainer files
+    and config share one directory.
     """
-    return Path.home() / ".cache" / "clankercage" / f"workspace-{instance_id}"
+    return get_cache_dir() / f"workspace-{key}"
 
 
-def extract_devcontainer_files(instance_id: str) -> Path:
-    """Extract embedded devcontainer files to an instance-specific cache directory."""
-    workspace_dir = get_workspace_dir(instance_id)
-    devcontainer_dir = workspace_dir / ".devcontainer"
-    devcontainer_dir.mkdir(parents=True, exist_ok=True)
+def get_instance_runtime_dir(instance_id: str) -> Path:
+    """Get the per-instance runtime directory, mounted at /run/clankercage in the container.
+
+    Scripts inside the container use it to report back to the host (e.g. startup phases).
+    """
+    return get_cache_dir() / "run" / instance_id
+
+
+def get_firewall_cache_dir() -> Path:
+    """Get the host directory holding firewall caches shared by all instances.
+
+    Mounted at /var/cache/clankercage in the container (see init-firewall.sh).
+    """
+    return get_cache_dir() / "firewall"
 
-    pkg_dir = get_embedded_devcontainer_dir()
-    for f in pkg_dir.iterdir():
-        if f.is_file() and f.name != "__init__.py" and not f.name.endswith(".pyc"):
-            shutil.copy2(f, devcontainer_dir / f.name)
 
-    return workspace_dir
+def get_audit_dir() -> Path:
+    """Get the host directory holding the firewall audit log of all instances.
+
+    Mounted at /var/log/clankercage in the container.
+    """
+    return get_cache_dir() / "audit"
+
+
+def get_embedded_devcontainer_files() -> list[Path]:
+    """List the embedded devcontainer files that are copied into a workspace."""
+    return sorted(
+        f for f in get_embedded_devcontainer_dir().iterdir()
+        if f.is_file() and f.name != "__init__.py" and not f.name.endswith(".pyc")
+    )
+
+
+def workspace_key(rendered_config: str) -> str:
+    """Hash the embedded devcontainer files and the rendered devcontainer.json."""
+    digest = hashlib.sha256()
+    for f in get_embedded_devcontainer_files():
+        digest.update(f.name.encode())
+        digest.update(f.read_bytes())
+    digest.update(rendered_config.encode())
+    return digest.hexdigest()[:16]
+
+
+def materialize_workspace(config: dict) -> tuple[Path, Path]:
+    """Get the workspace for a config, extracting the devcontainer files if needed.
+
+    The directory is named after a hash of its contents, so an existing one is
+    reused as is (its mtime is bumped for `clankercage gc`). New workspaces are
+    assembled in a temporary directory and renamed into place, so concurrent
+    runs never see a partial copy.
+
+    Returns the workspace directory and the path of its devcontainer.json.
+    """
+    rendered = json.dumps(config, indent=2)
+    workspace_dir = get_workspace_dir(workspace_key(rendered))
+    runtime_config = workspace_dir / ".devcontainer" / "devcontainer.json"
+    if workspace_dir.is_dir():
+        os.utime(workspace_dir)
+        return workspace_dir, runtime_config
+
+    tmp_dir = workspace_dir.with_name(f".{workspace_dir.name}.{uuid.uuid4().hex[:8]}")
+    devcontainer_dir = tmp_dir / ".devcontainer"
+    devcontainer_dir.mkdir(parents=True)
+    for f in get_embedded_devcontainer_files():
+        shutil.copy2(f, devcontainer_dir / f.name)
+    (devcontainer_dir / "devcontainer.json").write_text(rendered)
+    try:
+        os.rename(tmp_dir, workspace_dir)
+    except OSError:
+        # Another run created the same workspace first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return workspace_dir, runtime_config
 
 
 def generate_ssh_config(runtime_dir: Path, ssh_key_name: str) -> Path:
@@ -55,6 +129,22 @@ def generate_ssh_config(runtime_dir: Path, ssh_key_name: str) -> Path:
     return ssh_config
 
 
+CONTAINER_RUNTIME_DIR = "/run/clankercage"
+CONTAINER_FIREWALL_CACHE_DIR = "/var/cache/clankercage"
+CONTAINER_AUDIT_DIR = "/var/log/clankercage"
+
+
+def timed_command(name: str, command: str, phases_file: str = f"{CONTAINER_RUNTIME_DIR}/phases.tsv") -> str:
+    """Wrap a postStartCommand step so it reports its duration for --timings.
+
+    The step's exit status is preserved; reporting failures are ignored.
+    """
+    return (
+        f"_t0=$(date +%s.%N) && {{ {command}; }} && "
+        f"{{ printf '%s\\t%s\\t%s\\n' bootstrap.{name} \"$_t0\" \"$(date +%s.%N)\" >> {phases_file} || true; }} 2>/dev/null"
+    )
+
+
 def modify_config(config: dict, args: argparse.Namespace, runtime_dir: Path, devcontainer_dir: Path | None = None, project_dir: Path | None = None) -> dict:
     """Modify devcontainer config with user-specific settings."""
 
@@ -107,8 +197,36 @@ def modify_config(config: dict, args: argparse.Namespace, runtime_dir: Path, dev
             "source=${localEnv:HOME}/.gnupg,target=/home/node/.gnupg,type=bind"
         )
 
+    # Share resolved firewall entries between instances and container restarts
+    firewall_cache_dir = get_firewall_cache_dir()
+    firewall_cache_dir.mkdir(parents=True, exist_ok=True)
+    config.setdefault("mounts", [])
+    config["mounts"].append(
+        f"source={firewall_cache_dir},target={CONTAINER_FIREWALL_CACHE_DIR},type=bind"
+    )
+
+    # Firewall changes are audited on the host (~/.claude is mounted read-only)
+    audit_dir = get_audit_dir()
+    audit_dir.mkdir(parents=True, exist_ok=True)
+    config["mounts"].append(f"source={audit_dir},target={CONTAINER_AUDIT_DIR},type=bind")
+
+    # Package-manager caches shared between instances (see caches)
+    if not args.no_shared_cache:
+        config["mounts"].extend(caches.mounts())
+        config.setdefault("containerEnv", {}).update(caches.container_env())
+
+    # Resource limits: a fixed profile, or per-instance variables sized at start (see resources)
+    config["runArgs"] = [a for a in config.get("runArgs", []) if not a.startswith(resources.LIMIT_ARGS)]
+    if args.resources == resources.AUTO:
+        auto = resources.auto_config()
+        config["runArgs"].extend(auto["runArgs"])
+        config.setdefault("containerEnv", {}).update(auto["containerEnv"])
+    else:
+        limits = resources.PROFILES[args.resources]
+        config["runArgs"].extend(limits.run_args())
+        config.setdefault("containerEnv", {})["NODE_OPTIONS"] = f"--max-old-space-size={limits.node_heap_mb}"
+
     # Add docker run flags (ports, volumes, env vars) to runArgs
-    config.setdefault("runArgs", [])
     if args.port:
         for port_mapping in args.port:
             # Support both HOST:CONTAINER and just PORT (same for both)
@@ -123,28 +241,98 @@ def modify_config(config: dict, args: argparse.Namespace, runtime_dir: Path, dev
             config["runArgs"].extend(["-e", env_var])
 
     # Build postStartCommand
-    commands = ["sudo /usr/local/bin/init-firewall.sh"]
+    # Live verification probes run in the background unless strict verification is asked for
+    init_firewall = "sudo /usr/local/bin/init-firewall.sh"
+    # The resolver mode is passed per instance (and, being part of the config, keeps reused
+    # and pooled containers from being handed to runs that asked for the other mode)
+    if args.dns_stub:
+        init_firewall += " --resolver=stub"
+    if args.verify_firewall == "strict":
+        init_firewall += " --verify=strict"
+    commands = [timed_command("firewall", init_firewall)]
+
+    if args.exec_server:
+        commands.append(timed_command("exec_server", " && ".join([
+            "{ pkill -f /usr/local/bin/exec-server.py || true; }",
+            "python3 /usr/local/bin/exec-server.py --daemon 2>>/tmp/exec-server.log",
+        ])))
+
+    if not args.no_shared_cache:
+        commands.append(timed_command("shared_cache", caches.evict_command(args.shared_cache_size)))
 
     if args.git_user_name:
-        commands.append(f"git config --global user.name {shlex.quote(args.git_user_name)}")
+        commands.append(timed_command("git_user_name", f"git config --global user.name {shlex.quote(args.git_user_name)}"))
 
     if args.git_user_email:
-        commands.append(f"git config --global user.email {shlex.quote(args.git_user_email)}")
+        commands.append(timed_command("git_user_email", f"git config --global user.email {shlex.quote(args.git_user_email)}"))
 
     if args.gpg_key_id:
-        commands.append(f"git config --global user.signingkey {shlex.quote(args.gpg_key_id)}")
-        commands.append("git config --global commit.gpgsign true")
-        commands.append("git config --global gpg.program gpg")
-        commands.append("gpg-connect-agent /bye >/dev/null 2>&1 || true")
+        commands.append(timed_command("gpg", " && ".join([
+            f"git config --global user.signingkey {shlex.quote(args.gpg_key_id)}",
+            "git config --global commit.gpgsign true",
+            "git config --global gpg.program gpg",
+            "(gpg-connect-agent /bye >/dev/null 2>&1 || true)",
+        ])))
 
     if args.gh_token:
-        commands.append(f"echo {shlex.quote(args.gh_token)} | gh auth login --with-token")
+        commands.append(timed_command("gh_auth", f"echo {shlex.quote(args.gh_token)} | gh auth login --with-token"))
 
     config["postStartCommand"] = " && ".join(commands)
 
     return config
 
 
+def config_fingerprint(config: dict, project_dir: Path, devcontainer_dir: Path | None = None, image_id: str | None = None) -> str:
+    """Hash the resolved devcontainer config into a stable fingerprint.
+
+    Covers everything baked into a container at creation time: the rendered
+    config (image, mounts, runArgs, postStartCommand), the project directory,
+    the local image ID and, for --build, the Dockerfile build context. Two runs
+    with the same inputs get the same fingerprint and can share a container.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps(config, sort_keys=True).encode())
+    digest.update(str(project_dir).encode())
+    digest.update((image_id or "").encode())
+    if "build" in config and devcontainer_dir:
+        for f in sorted(devcontainer_dir.iterdir()):
+            if f.is_file() and f.name != "devcontainer.json":
+                digest.update(f.name.encode())
+                digest.update(f.read_bytes())
+    return digest.hexdigest()
+
+
+def apply_instance_config(config: dict) -> dict:
+    """Add per-instance settings to a config.
+
+    Mounts the instance runtime directory and exposes the instance ID to the
+    container. Both are ${localEnv:...} references filled in by devcontainer_up,
+    so the rendered config (and its workspace) is shared between instances.
+    """
+    config.setdefault("mounts", []).append(
+        f"source=${{localEnv:CLANKERCAGE_RUNTIME_DIR}},target={CONTAINER_RUNTIME_DIR},type=bind"
+    )
+    config.setdefault("containerEnv", {})["CLANKERCAGE_INSTANCE"] = "${localEnv:CLANKERCAGE_INSTANCE}"
+    return config
+
+
+def instance_env(instance_id: str, ruleset: Path | None = None) -> dict[str, str]:
+    """Create the instance runtime directory and return the variables apply_instance_config refers to.
+
+    They are passed to the launcher rather than set in os.environ, so one
+    process can start several instances at once (see clankercage.api). The
+    name of the firewall ruleset compiled for this run is written next to
+    them, for init-firewall.sh to apply.
+    """
+    runtime_dir = get_instance_runtime_dir(instance_id)
+    runtime_dir.mkdir(parents=True, exist_ok=True)
+    # For the audit log - the firewall scripts run under sudo, which strips the environment
+    (runtime_dir / "instance").write_text(f"{instance_id}\n")
+    if ruleset is not None:
+        (runtime_dir / "ruleset").write_text(f"{ruleset.name}\n")
+    return {"CLANKERCAGE_RUNTIME_DIR": str(runtime_dir), "CLANKERCAGE_INSTANCE": instance_id}
+
+
 def create_parser() -> argparse.ArgumentParser:
     """Create the argument parser."""
     parser = argparse.ArgumentParser(
@@ -159,6 +347,24 @@ def create_parser() -> argparse.ArgumentParser:
     parser.add_argument("--build", action="store_true", help="Build from local Dockerfile instead of using pre-built image")
     parser.add_argument("--shell", metavar="CMD", help="Run a shell command instead of claude (for testing)")
     parser.add_argument("--safe-mode", action="store_true", help="Run Claude with permission prompts enabled (more interruptions, extra safety)")
+    parser.add_argument("--reuse", action="store_true", help="Reattach to an existing container with the same config (recreated when the config changes)")
+    parser.add_argument("--timings", action="store_true",
+                        help="Print a per-phase startup timing breakdown (see CLANKERCAGE_TRACE for JSON/OTLP output)")
+    parser.add_argument("--launcher", choices=["native", "devcontainer-cli"],
+                        help="Start containers with docker directly (native, default) or via npx @devcontainers/cli")
+    parser.add_argument("--verify-firewall", choices=["async", "strict"],
+                        help="Probe the network in the background after the firewall is up (async, default), or block startup on the probes (strict)")
+    parser.add_argument("--dns-stub", action="store_true",
+                        help="Allowlist domains as they are looked up through a resolver in the container instead of resolving them all at start")
+    parser.add_argument("--exec-server", action="store_true",
+                        help="Run a command server in the container so API sessions can start commands without docker exec")
+    parser.add_argument("--resources", choices=[*resources.PROFILES, resources.AUTO],
+                        help=f"Container CPU/memory/process limits: a fixed profile ({resources.DEFAULT_PROFILE} by default), "
+                             "or auto to size them from the host and the other running sessions")
+    parser.add_argument("--no-shared-cache", action="store_true",
+                        help="Give the container its own empty package-manager caches instead of the volumes shared between sessions")
+    parser.add_argument("--shared-cache-size", type=float, metavar="GB",
+                        help=f"Size cap of each shared package-manager cache (default: {caches.DEFAULT_MAX_SIZE_GB})")
     # Docker run flags - passed directly to runArgs
     parser.add_argument("-p", "--port", action="append", metavar="HOST:CONTAINER",
                         help="Map a port from host to container (can be specified multiple times)")
@@ -169,6 +375,32 @@ def create_parser() -> argparse.ArgumentParser:
     return parser
 
 
+# Options kept in the instance registry (and shown by `ps --json`). Anything else can
+# carry secrets: --gh-token, -e VAR=VALUE, --shell commands, claude's own arguments
+RECORDED_SWITCHES = frozenset({"--build", "--safe-mode", "--reuse", "--timings", "--dns-stub", "--exec-server",
+                               "--no-shared-cache"})
+RECORDED_VALUE_OPTIONS = frozenset({"--launcher", "--verify-firewall", "--resources", "--shared-cache-size",
+                                    "-p", "--port"})
+
+
+def recorded_flags(options: list[str]) -> list[str]:
+    """The subset of a run's options that is safe to store in the instance registry.
+
+    Short options with an attached value ("-p8080") are recorded split ("-p", "8080").
+    """
+    flags = []
+    values = iter(options)
+    for option in values:
+        name, sep, _ = option.partition("=")
+        if not option.startswith("--") and option[:2] in RECORDED_VALUE_OPTIONS and len(option) > 2:
+            flags.extend([option[:2], option[2:]])
+        elif option in RECORDED_SWITCHES:
+            flags.append(option)
+        elif name in RECORDED_VALUE_OPTIONS:
+            flags.extend([option] if sep else [option, next(values, "")])
+    return flags
+
+
 def apply_env_defaults(args: argparse.Namespace) -> None:
     """Apply environment variable defaults to args."""
     args.ssh_key_file = args.ssh_key_file or os.environ.get("CLANKERCAGE_SSH_KEY")
@@ -176,49 +408,84 @@ def apply_env_defaults(args: argparse.Namespace) -> None:
     args.git_user_email = args.git_user_email or os.environ.get("CLANKERCAGE_GIT_USER_EMAIL")
     args.gh_token = args.gh_token or os.environ.get("CLANKERCAGE_GH_TOKEN")
     args.gpg_key_id = args.gpg_key_id or os.environ.get("CLANKERCAGE_GPG_KEY_ID")
+    args.launcher = args.launcher or os.environ.get("CLANKERCAGE_LAUNCHER", "native")
+    args.trace = os.environ.get("CLANKERCAGE_TRACE") or ("1" if args.timings else None)
+    args.reuse = args.reuse or os.environ.get("CLANKERCAGE_REUSE", "").lower() in ("1", "true", "yes")
+    args.verify_firewall = args.verify_firewall or os.environ.get("CLANKERCAGE_VERIFY_FIREWALL", "async")
+    args.dns_stub = args.dns_stub or os.environ.get("CLANKERCAGE_DNS_STUB", "").lower() in ("1", "true", "yes")
+    args.exec_server = args.exec_server or os.environ.get("CLANKERCAGE_EXEC_SERVER", "").lower() in ("1", "true", "yes")
+    args.resources = args.resources or os.environ.get("CLANKERCAGE_RESOURCES", resources.DEFAULT_PROFILE)
+    args.no_shared_cache = args.no_shared_cache or os.environ.get("CLANKERCAGE_NO_SHARED_CACHE", "").lower() in ("1", "true", "yes")
+    args.shared_cache_size = args.shared_cache_size or float(
+        os.environ.get("CLANKERCAGE_SHARED_CACHE_SIZE", caches.DEFAULT_MAX_SIZE_GB))
 
 
-def run_devcontainer(config_path: Path, workspace_dir: Path, project_dir: Path, claude_args: list[str], shell_cmd: str | None = None, safe_mode: bool = False, instance_id: str | None = None) -> None:
-    """Run the devcontainer with claude or a shell command.
+DEVCONTAINER_CMD = ["npx", "-y", "@devcontainers/cli"]
 
-    Each invocation uses a unique instance ID for both the config directory
-    and container label, allowing multiple clanker instances to run simultaneously.
-    """
-    devcontainer_cmd = ["npx", "-y", "@devcontainers/cli"]
 
-    # Use provided instance ID or generate one (for backwards compatibility)
-    if instance_id is None:
-        instance_id = uuid.uuid4().hex[:12]
-    id_label = f"clanker.instance={instance_id}"
+def instance_limits_env(instance_id: str, quiet: bool = False) -> dict[str, str]:
+    """Size an `auto` instance and return the variables resources.auto_config refers to.
+
+    Waits while the host is short of memory; raises resources.QueueTimeout if
+    it stays short for CLANKERCAGE_QUEUE_TIMEOUT seconds.
+    """
+    timeout = float(os.environ.get("CLANKERCAGE_QUEUE_TIMEOUT", resources.DEFAULT_QUEUE_TIMEOUT))
+    with timings.span("resources"):
+        limits = resources.size_instance(get_cache_dir() / "run", instance_id, timeout,
+                                         notify=(lambda _: None) if quiet else print)
+    return limits.env()
 
-    if shell_cmd:
-        run_cmd = ["bash", "-c", shell_cmd]
-    elif safe_mode:
-        run_cmd = ["claude"] + claude_args
-    else:
-        run_cmd = ["claude", "--dangerously-skip-permissions"] + claude_args
 
-    print(f"Starting devcontainer (instance {instance_id})...")
+def devcontainer_up(config_path: Path, project_dir: Path, instance_id: str, quiet: bool = False, launcher: str = "native",
+                    auto_resources: bool = False, ruleset: Path | None = None) -> None:
+    """Create or start the container for an instance and run its lifecycle commands.
 
-    up_cmd = devcontainer_cmd + [
+    The container's bootstrap phases from earlier starts are cleared first, so
+    phases.tsv only ever holds the current start (reused containers restart).
+    """
+    env = instance_env(instance_id, ruleset)
+    (get_instance_runtime_dir(instance_id) / "phases.tsv").unlink(missing_ok=True)
+    if auto_resources:
+        env.update(instance_limits_env(instance_id, quiet))
+    if launcher == "native":
+        NativeLauncher.from_config_file(config_path, project_dir, {"clanker.instance": instance_id}, env).up(quiet)
+        return
+
+    up_cmd = DEVCONTAINER_CMD + [
         "up",
         "--workspace-folder", str(project_dir),
         "--config", str(config_path),
-        "--id-label", id_label,
+        "--id-label", f"clanker.instance={instance_id}",
     ]
 
-    subprocess.run(up_cmd, check=True)
+    subprocess.run(up_cmd, check=True, capture_output=quiet, env={**os.environ, **env})
 
-    exec_cmd = devcontainer_cmd + [
+
+def session_command(claude_args: list[str], shell_cmd: str | None = None, safe_mode: bool = False) -> list[str]:
+    """The command a session runs in the container: claude, or a --shell command."""
+    if shell_cmd:
+        return ["bash", "-c", shell_cmd]
+    if safe_mode:
+        return ["claude"] + claude_args
+    return ["claude", "--dangerously-skip-permissions"] + claude_args
+
+
+def interactive_command(config_path: Path, project_dir: Path, instance_id: str, run_cmd: list[str], launcher: str = "native") -> list[str]:
+    """The command line that runs run_cmd in an instance, attached to this terminal.
+
+    The "native" launcher talks to docker directly; "devcontainer-cli" goes
+    through `npx @devcontainers/cli`.
+    """
+    if launcher == "native":
+        native = NativeLauncher.from_config_file(config_path, project_dir, {"clanker.instance": instance_id})
+        return native.exec_command(run_cmd)
+    return DEVCONTAINER_CMD + [
         "exec",
         "--workspace-folder", str(project_dir),
         "--config", str(config_path),
-        "--id-label", id_label,
+        "--id-label", f"clanker.instance={instance_id}",
     ] + run_cmd
 
-    # Use execvp to replace process for clean TTY passthrough
-    os.execvp("npx", exec_cmd)
-
 
 IMAGE_NAME = "ghcr.io/clankerbot/clankercage:latest"
 
@@ -244,9 +511,45 @@ def get_container_info(image_name: str) -> dict:
     return {"build_time": build_time, "source": source}
 
 
-def print_container_info(image_name: str) -> None:
+def parse_image_labels(labels: dict | None) -> dict:
+    """Get container build info from an image's label dict (Engine API inspect).
+
+    Returns dict with 'build_time' and 'source' keys, like get_container_info.
+    """
+    labels = labels or {}
+    return {
+        "build_time": labels.get("org.opencontainers.image.created") or "unknown",
+        "source": labels.get("org.opencontainers.image.source.type") or "local",
+    }
+
+
+def remove_stale_containers(project_dir: Path, instance_id: str) -> None:
+    """Remove reusable containers for this project whose fingerprint no longer matches.
+
+    Docker cannot change the mounts or run flags of an existing container, so
+    when the config changes the old container is dropped and a new one created.
+    The candidates are looked up in the instance registry by project.
+    """
+    try:
+        with registry.Registry() as reg:
+            instances.sync(reg)
+            found = reg.query(project=str(project_dir), states=registry.LIVE_STATES, reuse=True)
+    except sqlite3.Error as e:
+        print(f"Warning: instance registry not readable: {e}", file=sys.stderr)
+        return
+    stale = [i for i in found if i.instance_id != instance_id and i.container_id]
+
+    if stale:
+        print(f"Config changed, removing {len(stale)} outdated container(s)...")
+        subprocess.run(["docker", "rm", "-f"] + [i.container_id for i in stale], capture_output=True)
+        for instance in stale:
+            registry.record(instance.instance_id, state=registry.REMOVED)
+
+
+def print_container_info(image_name: str, info: dict | None = None) -> None:
     """Print container build information on startup."""
-    info = get_container_info(image_name)
+    if info is None:
+        info = get_container_info(image_name)
 
     source_display = "GitHub Container Registry (ghcr.io)" if info["source"] == "ghcr.io" else "Local build"
     build_time_display = info["build_time"] if info["build_time"] != "unknown" else "Unknown"
@@ -257,96 +560,588 @@ def print_container_info(image_name: str) -> None:
     print()
 
 
-def check_docker_accessible() -> None:
-    """Check if Docker is running and accessible. Exit with error if not."""
+def print_docker_error() -> None:
+    """Print the Docker-not-accessible banner."""
+    print(
+        "\n"
+        "╔════════════════════════════════════════════════════════════════╗\n"
+        "║  ERROR: Docker is not running or not accessible               ║\n"
+        "╠════════════════════════════════════════════════════════════════╣\n"
+        "║  ClankerCage requires Docker to run.                          ║\n"
+        "║                                                                ║\n"
+        "║  Please ensure:                                               ║\n"
+        "║    1. Docker is installed                                     ║\n"
+        "║    2. Docker daemon is running                                ║\n"
+        "║    3. You have permission to access Docker                    ║\n"
+        "║       (try: sudo usermod -aG docker $USER)                    ║\n"
+        "╚════════════════════════════════════════════════════════════════╝\n",
+        file=sys.stderr
+    )
+
+
+def shared_cache_unsupported(args: argparse.Namespace, image: dict | None) -> bool:
+    """Whether shared caches are wanted but the image (inspect data) has no mount points for them."""
+    return not args.no_shared_cache and image is not None and not caches.image_supports(
+        (image.get("Config") or {}).get("Labels"))
+
+
+def prepare_config(args: argparse.Namespace, project_dir: Path, image: dict | None = None) -> tuple[dict, Path]:
+    """Load the embedded devcontainer.json and apply the user's settings.
+
+    image is the inspect data of the image the container will run (None with
+    --build); shared caches are left out if it predates their mount points.
+    Returns the modified config and the embedded devcontainer directory.
+    """
+    if shared_cache_unsupported(args, image):
+        args = copy.copy(args)
+        args.no_shared_cache = True
+    # Setup runtime directory for SSH config etc (shared, not instance-specific)
+    runtime_dir = Path.home() / ".claude" / "clankercage-runtime"
+    runtime_dir.mkdir(parents=True, exist_ok=True)
+
+    pkg_dir = get_embedded_devcontainer_dir()
+    with timings.span("modify_config"):
+        config = json.loads((pkg_dir / "devcontainer.json").read_text())
+        config = modify_config(config, args, runtime_dir, pkg_dir, project_dir)
+    if args.reuse:
+        config["runArgs"].extend([
+            "--label", "clanker.reuse=true",
+            "--label", f"clanker.project={project_dir}",
+        ])
+    return config, pkg_dir
+
+
+def print_pull_progress(message: dict) -> None:
+    """Print one line per layer status change while pulling (skips byte-level progress ticks)."""
+    if message.get("progressDetail"):
+        return
+    layer = message.get("id")
+    status = message.get("status", "")
+    print(f"  {layer}: {status}" if layer else f"  {status}")
+
+
+class PreflightError(Exception):
+    """A pre-flight check failed. The message is shown to the user."""
+
+
+class DockerUnavailable(PreflightError):
+    """Docker is not running or not accessible."""
+
+
+def check_ssh_key(args: argparse.Namespace) -> None:
+    """Raise PreflightError if --ssh-key-file points at a missing file."""
+    if args.ssh_key_file and not Path(args.ssh_key_file).exists():
+        raise PreflightError(f"SSH key not found at {args.ssh_key_file}")
+
+
+def inspect_image_with_cli(image_name: str) -> dict | None:
+    """Inspect a local image via the docker CLI, or return None if it isn't present."""
     result = subprocess.run(
-        ["docker", "info"],
+        ["docker", "image", "inspect", image_name],
         capture_output=True,
         text=True
     )
     if result.returncode != 0:
-        print(
-            "\n"
-            "╔════════════════════════════════════════════════════════════════╗\n"
-            "║  ERROR: Docker is not running or not accessible               ║\n"
-            "╠════════════════════════════════════════════════════════════════╣\n"
-            "║  ClankerCage requires Docker to run.                          ║\n"
-            "║                                                                ║\n"
-            "║  Please ensure:                                               ║\n"
-            "║    1. Docker is installed                                     ║\n"
-            "║    2. Docker daemon is running                                ║\n"
-            "║    3. You have permission to access Docker                    ║\n"
-            "║       (try: sudo usermod -aG docker $USER)                    ║\n"
-            "╚════════════════════════════════════════════════════════════════╝\n",
-            file=sys.stderr
-        )
-        sys.exit(1)
+        return None
+    return json.loads(result.stdout)[0]
 
 
-def pull_docker_image_if_needed() -> None:
-    """Pull the Docker image if not already present."""
-    result = subprocess.run(
-        ["docker", "image", "inspect", IMAGE_NAME],
-        capture_output=True
-    )
-    if result.returncode != 0:
+def probe_docker(engine: DockerEngine | None, image_name: str | None) -> dict | None:
+    """Check Docker is accessible and inspect image_name in the same round trip.
+
+    Returns the image's inspect data, or None if it isn't present (or no image
+    was given, with --build). Raises DockerUnavailable if the daemon doesn't answer.
+    """
+    if engine is None:
+        result = subprocess.run(["docker", "info"], capture_output=True, text=True)
+        if result.returncode != 0:
+            raise DockerUnavailable(result.stderr.strip())
+        return inspect_image_with_cli(image_name) if image_name else None
+
+    try:
+        if image_name is None:
+            engine.ping()
+            return None
+        return engine.inspect_image(image_name)
+    except EngineError as e:
+        raise DockerUnavailable(str(e)) from e
+
+
+def ensure_image(engine: DockerEngine | None, image_name: str, image: dict | None, quiet: bool = False) -> dict:
+    """Pull the image if it isn't present yet and return its inspect data."""
+    if image is not None:
+        return image
+    if not quiet:
         print("Pulling Docker image...")
-        subprocess.run(["docker", "pull", IMAGE_NAME], check=True)
+    if engine is None:
+        if subprocess.run(["docker", "pull", image_name], capture_output=quiet).returncode != 0:
+            raise PreflightError(f"Failed to pull {image_name}")
+        return inspect_image_with_cli(image_name) or {}
+    try:
+        engine.pull_image(image_name, (lambda _: None) if quiet else print_pull_progress)
+        return engine.inspect_image(image_name) or {}
+    except EngineError as e:
+        raise PreflightError(str(e)) from e
+
+
+def prepare_workspace(config: dict) -> tuple[Path, Path]:
+    """Add the per-instance settings to a config and materialize its workspace."""
+    with timings.span("workspace"):
+        return materialize_workspace(apply_instance_config(config))
+
+
+def refresh_github_ranges() -> str | None:
+    """Refresh the cached GitHub IP ranges for the firewall. Returns a warning, if any."""
+    interval = float(os.environ.get("CLANKERCAGE_GITHUB_META_INTERVAL", github_meta.DEFAULT_REFRESH_INTERVAL))
+    try:
+        github_meta.refresh_github_cidrs(get_firewall_cache_dir(), interval)
+    except github_meta.GitHubMetaError as e:
+        return f"{e} (only GitHub domains from the whitelist will be reachable)"
+    return None
+
+
+def compile_firewall(stub: bool = False) -> Path:
+    """Compile the firewall ruleset the container applies (see firewall.build_ruleset)."""
+    with timings.span("firewall_compile"):
+        try:
+            return firewall.build_ruleset(get_firewall_cache_dir(), [
+                get_embedded_devcontainer_dir() / "whitelisted-domains.txt",
+                Path.home() / ".claude" / ".allowed-browser-domains",
+            ], stub=stub, run_dir=get_cache_dir() / "run")
+        except OSError as e:
+            raise PreflightError(f"Failed to compile the firewall ruleset: {e}") from e
+
+
+def maintain_audit_log() -> str | None:
+    """Rotate, compress and index the firewall audit log. Returns a warning, if any."""
+    with timings.span("audit_maintain"):
+        try:
+            audit.maintain(get_audit_dir())
+        except OSError as e:
+            return f"Failed to rotate the firewall audit log: {e}"
+    return None
+
+
+def preflight_session(args: argparse.Namespace, project_dir: Path,
+                      quiet: bool = False) -> tuple[str | None, dict, Path, Path, Path]:
+    """Validate args, check Docker, get the image and build the config concurrently.
+
+    The Docker probe (a single image inspect over the socket when possible),
+    the image pull, SSH key validation, config generation, workspace
+    extraction, the GitHub IP range refresh, the firewall compile and the
+    audit log rotation run as a dependency graph on a thread pool, so a pull
+    overlaps the local work. Only
+    the pull prints while the graph runs; warnings and the container info are
+    printed afterwards so output stays in a fixed order (nothing is printed
+    with quiet). Raises the first failed check's PreflightError (in the order
+    the checks are listed).
+
+    Returns (image ID or None with --build, config, embedded devcontainer dir,
+    path of the workspace devcontainer.json, compiled firewall ruleset dir).
+    """
+    engine = DockerEngine.from_env()
+    image_name = None if args.build else IMAGE_NAME
+    tasks: dict[str, preflight.Task] = {
+        "ssh_key": ((), lambda _: check_ssh_key(args)),
+        "docker_check": ((), lambda _: probe_docker(engine, image_name)),
+        # The config depends on the image: an image without the shared cache mount points gets none
+        "config": (("image_pull",) if image_name else (), lambda r: prepare_config(args, project_dir, r.get("image_pull"))),
+        "workspace": (("config",), lambda r: prepare_workspace(r["config"][0])),
+        "github_meta": ((), lambda _: refresh_github_ranges()),
+        "firewall": (("github_meta",), lambda _: compile_firewall(args.dns_stub)),
+        "audit": ((), lambda _: maintain_audit_log()),
+    }
+    if image_name:
+        tasks["image_pull"] = (("docker_check",), lambda r: ensure_image(engine, image_name, r["docker_check"], quiet))
+
+    try:
+        results = preflight.run_tasks(tasks)
+    finally:
+        if engine is not None:
+            engine.close()
+
+    for warning in (results["github_meta"], results["audit"]):
+        if warning and not quiet:
+            print(f"Warning: {warning}", file=sys.stderr)
+
+    config, pkg_dir = results["config"]
+    if args.build:
+        if not quiet:
+            print("Container image: Local build (--build flag)")
+            print()
+        image_id = None
+    else:
+        image = results["image_pull"]
+        if shared_cache_unsupported(args, image) and not quiet:
+            print("Warning: the container image has no shared package-manager cache mount points "
+                  "(pull a newer image); starting with empty caches", file=sys.stderr)
+        if not quiet:
+            print_container_info(IMAGE_NAME, parse_image_labels((image.get("Config") or {}).get("Labels")))
+        image_id = image.get("Id")
+    _, runtime_config = results["workspace"]
+    return image_id, config, pkg_dir, runtime_config, results["firewall"]
+
+
+def exit_on_preflight_error(error: PreflightError) -> None:
+    """Show a pre-flight failure (the Docker banner, or the message) and exit."""
+    if isinstance(error, DockerUnavailable):
+        print_docker_error()
+    else:
+        print(f"Error: {error}", file=sys.stderr)
+    sys.exit(1)
+
+
+def run_preflight(args: argparse.Namespace, project_dir: Path) -> tuple[str | None, dict, Path, Path, Path]:
+    """Run preflight_session, exiting with the Docker banner or an error message if a check fails."""
+    try:
+        return preflight_session(args, project_dir)
+    except PreflightError as e:
+        exit_on_preflight_error(e)
+        raise
+
+
+def spawn_pool_refill(project_dir: Path, options: list[str]) -> None:
+    """Top the project's pool back up in a detached background process (booted with the session's options)."""
+    subprocess.Popen(
+        [sys.executable, "-m", "clankercage.cli", "pool", "--once"] + options,
+        cwd=project_dir,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
 
 
-def main() -> None:
-    """
-    Main entry point - runs Claude Code in a sandboxed devcontainer.
+def start_pool_member(config: dict, project_dir: Path, pool_dir: Path, fingerprint: str, launcher: str = "native",
+                      auto_resources: bool = False, ruleset: Path | None = None) -> str:
+    """Boot one container (firewall, git/gpg setup) and register it as idle."""
+    instance_id = uuid.uuid4().hex[:12]
+    member_config = copy.deepcopy(config)
+    member_config["runArgs"].extend(["--label", f"clanker.pool={fingerprint[:12]}"])
+    _, runtime_config = materialize_workspace(member_config)
+    registry.record(instance_id, project=str(project_dir), config_hash=fingerprint,
+                    workspace=str(runtime_config.parent.parent))
+    devcontainer_up(runtime_config, project_dir, instance_id, quiet=True, launcher=launcher, auto_resources=auto_resources,
+                    ruleset=ruleset)
+    registry.record(instance_id, state=registry.RUNNING, started=time.time())
+    pool.register_member(pool_dir, instance_id, fingerprint, runtime_config)
+    return instance_id
 
-    Uses embedded devcontainer files from the package.
-    With --build, builds from Dockerfile. Without, uses pre-built image.
+
+POOL_POLL_INTERVAL = 10
+
+
+def pool_main(argv: list[str]) -> None:
+    """Keep a pool of pre-warmed containers for the current project.
+
+    Members are booted with the same options a plain `clankercage` run would
+    use, so pass the same flags (or env vars) you run sessions with.
     """
     parser = create_parser()
-    args, claude_args = parser.parse_known_args()
+    parser.prog = "clankercage pool"
+    parser.description = "Keep pre-warmed containers ready for the current project"
+    parser.add_argument("--size", type=int, default=int(os.environ.get("CLANKERCAGE_POOL_SIZE", pool.DEFAULT_POOL_SIZE)),
+                        help=f"Number of idle containers to keep (default: {pool.DEFAULT_POOL_SIZE})")
+    parser.add_argument("--ttl", type=float, default=float(os.environ.get("CLANKERCAGE_POOL_TTL", pool.DEFAULT_POOL_TTL)),
+                        help=f"Seconds an idle container is kept before being recycled (default: {pool.DEFAULT_POOL_TTL})")
+    parser.add_argument("--once", action="store_true", help="Refill the pool once and exit instead of running as a daemon")
+    args, _ = parser.parse_known_args(argv)
     apply_env_defaults(args)
 
-    if args.ssh_key_file and not Path(args.ssh_key_file).exists():
-        print(f"Error: SSH key not found at {args.ssh_key_file}", file=sys.stderr)
+    project_dir = Path.cwd().resolve()
+    image_id, config, pkg_dir, _, ruleset = run_preflight(args, project_dir)
+    fingerprint = config_fingerprint(config, project_dir, pkg_dir, image_id)
+    pool_dir = pool.get_pool_dir(project_dir)
+
+    while True:
+        with pool.fill_lock(pool_dir) as acquired:
+            if acquired:
+                for instance_id in pool.reap_members(pool_dir, fingerprint, args.ttl):
+                    print(f"Recycling idle container (instance {instance_id})")
+                    pool.remove_container(instance_id)
+                while pool.idle_count(pool_dir, fingerprint) < args.size:
+                    try:
+                        instance_id = start_pool_member(config, project_dir, pool_dir, fingerprint, args.launcher,
+                                                        args.resources == resources.AUTO, ruleset)
+                    except resources.QueueTimeout as e:
+                        print(f"Warning: not pre-warming more containers for now: {e}", file=sys.stderr)
+                        break
+                    print(f"Pre-warmed container ready (instance {instance_id})")
+        if args.once:
+            break
+        time.sleep(POOL_POLL_INTERVAL)
+
+
+def gc_main(argv: list[str]) -> None:
+    """Remove unused workspaces, runtime dirs, instance containers and bash history volumes."""
+    parser = argparse.ArgumentParser(
+        prog="clankercage gc",
+        description="Remove cached workspaces, stopped containers and orphaned volumes left by earlier sessions",
+    )
+    parser.add_argument("--max-age", type=float, default=float(os.environ.get("CLANKERCAGE_GC_MAX_AGE", gc.DEFAULT_MAX_AGE_DAYS)),
+                        metavar="DAYS", help=f"Remove anything unused for longer than this (default: {gc.DEFAULT_MAX_AGE_DAYS})")
+    parser.add_argument("--keep", type=int, default=int(os.environ.get("CLANKERCAGE_GC_KEEP", gc.DEFAULT_KEEP_WORKSPACES)),
+                        help=f"Keep at most this many workspaces, least recently used go first (default: {gc.DEFAULT_KEEP_WORKSPACES})")
+    parser.add_argument("--dry-run", action="store_true", help="Only list what would be removed")
+    args = parser.parse_args(argv)
+
+    keep_configs = pool.idle_config_paths()
+    try:
+        reg = registry.Registry()
+    except sqlite3.Error as e:
+        print(f"Warning: instance registry not readable: {e}", file=sys.stderr)
+        reg = None
+    if reg is not None:
+        instances.sync(reg)
+        # Native launcher containers have no devcontainer.config_file label; the registry knows their workspace
+        active = reg.query(states=(registry.STARTING, registry.RUNNING, registry.PAUSED))
+        keep_configs |= {Path(i.workspace) / ".devcontainer" / "devcontainer.json" for i in active if i.workspace}
+
+    result = gc.collect(get_cache_dir(), args.max_age * 86400, args.keep, keep_configs, args.dry_run)
+    verb = "Would remove" if args.dry_run else "Removed"
+    print(f"{verb} {len(result.workspaces)} workspace(s), {len(result.runtime_dirs)} runtime dir(s), "
+          f"{len(result.containers)} container(s), {len(result.volumes)} volume(s)")
+    if reg is not None:
+        if not args.dry_run:
+            pruned = reg.prune(time.time() - args.max_age * 86400)
+            if pruned:
+                print(f"Forgot {pruned} removed instance(s) from the registry")
+        reg.close()
+
+
+def audit_main(argv: list[str]) -> None:
+    """Query the firewall audit log of all instances."""
+    parser = argparse.ArgumentParser(
+        prog="clankercage audit",
+        description="Search the firewall audit log (domain approvals, DNS refreshes, verification results)",
+    )
+    parser.add_argument("--domain", help="Only records for this domain")
+    parser.add_argument("--event", help="Only records of this event type (e.g. DOMAIN_APPROVED, DNS_REFRESH)")
+    parser.add_argument("--instance", help="Only records from this instance (ID or prefix)")
+    parser.add_argument("--since", metavar="TIME", help="Only records at or after TIME (ISO 8601, or relative: 30m, 12h, 7d, 2w)")
+    parser.add_argument("--until", metavar="TIME", help="Only records at or before TIME")
+    parser.add_argument("--json", action="store_true", help="Print the matching records as JSON lines")
+    args = parser.parse_args(argv)
+
+    try:
+        since = audit.parse_time(args.since) if args.since else None
+        until = audit.parse_time(args.until) if args.until else None
+    except ValueError as e:
+        parser.error(f"invalid time: {e}")
+
+    audit_dir = get_audit_dir()
+    warning = maintain_audit_log()
+    if warning:
+        print(f"Warning: {warning}", file=sys.stderr)
+    for record in audit.query(audit_dir, args.domain, args.event, args.instance, since, until):
+        print(json.dumps(record) if args.json else audit.format_record(record))
+
+
+def metrics_main(argv: list[str]) -> None:
+    """Export the running sessions' metrics to an OTLP collector until interrupted."""
+    parser = argparse.ArgumentParser(
+        prog="clankercage metrics",
+        description="Export session metrics (container resources, denied egress) to the OTLP collector in grafana/",
+    )
+    parser.add_argument("--endpoint", default=os.environ.get("CLANKERCAGE_OTLP_ENDPOINT", metrics.DEFAULT_OTLP_ENDPOINT),
+                        help=f"OTLP/HTTP collector (default: {metrics.DEFAULT_OTLP_ENDPOINT})")
+    parser.add_argument("--interval", type=float,
+                        default=float(os.environ.get("CLANKERCAGE_METRICS_INTERVAL", metrics.DEFAULT_INTERVAL)),
+                        help=f"Seconds between exports (default: {metrics.DEFAULT_INTERVAL:g})")
+    parser.add_argument("--once", action="store_true", help="Export once and exit instead of running as a daemon")
+    args = parser.parse_args(argv)
+
+    tracker = cgroups.InstanceTracker()
+    failing = docker_down = False
+    while True:
+        tracked = tracker.refresh()
+        if tracked is None and not docker_down:
+            print("Warning: Docker is not accessible, only exporting denied egress", file=sys.stderr)
+        docker_down = tracked is None
+        payload = metrics.collect(get_cache_dir() / "run", tracked)
+        if payload["resourceMetrics"]:
+            try:
+                metrics.export(args.endpoint, payload)
+                failing = False
+            except OSError as e:
+                if not failing:
+                    print(f"Warning: failed to export metrics to {args.endpoint}: {e}", file=sys.stderr)
+                failing = True
+        if args.once:
+            break
+        time.sleep(args.interval)
+
+
+def batch_main(argv: list[str]) -> None:
+    """Run the sessions of a job file in parallel."""
+    parser = argparse.ArgumentParser(
+        prog="clankercage batch",
+        description="Run many sessions in parallel from a JSON or TOML job file",
+    )
+    parser.add_argument("job_file", type=Path, help="Job file (see clankercage.batch for the format)")
+    parser.add_argument("--concurrency", type=int, help="Jobs run at once (default: the job file's, "
+                        f"else CLANKERCAGE_BATCH_CONCURRENCY or {batch.DEFAULT_CONCURRENCY})")
+    parser.add_argument("--output", type=Path,
+                        help="Directory for the job logs and summary.json (default: a new dir under ~/.cache/clankercage/batch)")
+    parser.add_argument("--keep", action="store_true", help="Keep each job's container instead of removing it when the job ends")
+    args = parser.parse_args(argv)
+
+    try:
+        jobs, file_concurrency = batch.load_jobs(args.job_file)
+    except batch.JobFileError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    concurrency = args.concurrency or file_concurrency or int(
+        os.environ.get("CLANKERCAGE_BATCH_CONCURRENCY", batch.DEFAULT_CONCURRENCY))
+    output_dir = args.output or get_cache_dir() / "batch" / time.strftime("%Y%m%d-%H%M%S")
+
+    def report(result: batch.JobResult) -> None:
+        code = "" if result.exit_code is None else f", exit {result.exit_code}"
+        print(f"[{result.status}] {result.name} (instance {result.instance}, {result.duration:.1f}s{code})")
+
+    print(f"Running {len(jobs)} job(s), {concurrency} at a time - logs in {output_dir}")
+    scheduler = batch.Scheduler(output_dir, concurrency, args.keep)
+    started = time.time()
+    try:
+        results = scheduler.run(jobs, report)
+    except KeyboardInterrupt:
+        print("Interrupted, stopped the running jobs", file=sys.stderr)
+        sys.exit(130)
+    summary = batch.write_summary(output_dir / "summary.json", results, started, time.time())
+    print(f"{summary['counts'].get('ok', 0)}/{len(jobs)} job(s) succeeded - summary in {output_dir / 'summary.json'}")
+    if summary["counts"].get("ok", 0) != len(jobs):
         sys.exit(1)
 
-    # Check Docker is running before proceeding
-    check_docker_accessible()
-
-    # Pull image if not building locally and image doesn't exist
-    if not args.build:
-        pull_docker_image_if_needed()
-        print_container_info(IMAGE_NAME)
-    else:
-        print("Container image: Local build (--build flag)")
-        print()
 
-    # Capture current working directory (the project to mount)
-    project_dir = Path.cwd().resolve()
+def ps_main(argv: list[str]) -> None:
+    """List instance containers with their uptime."""
+    parser = argparse.ArgumentParser(
+        prog="clankercage ps",
+        description="List running sessions (the candidates for clankercage attach)",
+    )
+    parser.add_argument("-a", "--all", action="store_true", help="Also list stopped containers")
+    parser.add_argument("--history", action="store_true",
+                        help="Also list removed and failed instances still in the registry")
+    parser.add_argument("--json", action="store_true", help="Print one JSON object per instance")
+    args = parser.parse_args(argv)
+
+    try:
+        found = instances.list_instances(include_stopped=args.all, include_removed=args.history)
+    except sqlite3.Error as e:
+        print(f"Error: instance registry unavailable: {e}", file=sys.stderr)
+        sys.exit(1)
+    if found is None:
+        print_docker_error()
+        sys.exit(1)
+    now = time.time()
+    if args.json:
+        for instance in found:
+            print(json.dumps({**dataclasses.asdict(instance), "uptime": instances.uptime(instance, now)}))
+        return
+    print(f"{'INSTANCE':<14}{'STATE':<13}{'UPTIME':<9}PROJECT")
+    for instance in found:
+        state = "idle (pool)" if instance.pooled else instance.state
+        print(f"{instance.instance_id:<14}{state:<13}{instances.uptime(instance, now):<9}{instance.project}")
+
+
+def attach_main(argv: list[str]) -> None:
+    """Open a terminal session in a running instance, skipping the whole startup."""
+    parser = argparse.ArgumentParser(
+        prog="clankercage attach",
+        description="Reattach to a running session: continue its Claude conversation, or open a shell",
+    )
+    parser.add_argument("instance", nargs="?", help="Instance ID or unique prefix (default: the newest one for --project)")
+    parser.add_argument("--project", type=Path, default=Path.cwd(), metavar="DIR",
+                        help="Attach to the newest running instance of this project (default: the current directory)")
+    parser.add_argument("--shell", action="store_true", help="Open a login shell instead of continuing Claude")
+    parser.add_argument("--safe-mode", action="store_true", help="Run Claude with permission prompts enabled")
+    parser.epilog = "Arguments after -- are passed to claude."
+    claude_args = []
+    if "--" in argv:
+        argv, claude_args = argv[:argv.index("--")], argv[argv.index("--") + 1:]
+    args = parser.parse_args(argv)
+
+    try:
+        found = instances.list_instances()
+    except sqlite3.Error as e:
+        print(f"Error: instance registry unavailable: {e}", file=sys.stderr)
+        sys.exit(1)
+    if found is None:
+        print_docker_error()
+        sys.exit(1)
+    try:
+        instance = instances.find_instance(found, args.instance, args.project.resolve())
+    except instances.InstanceNotFound as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
 
-    # Generate unique instance ID early - used for both cache dir and container ID
-    instance_id = uuid.uuid4().hex[:12]
+    if args.shell:
+        run_cmd = ["sh", "-c", 'exec "${SHELL:-bash}" -l']
+    else:
+        run_cmd = session_command(["--continue"] + claude_args, safe_mode=args.safe_mode)
+    print(f"Attaching to instance {instance.instance_id} (up {instances.uptime(instance)})...")
+    cmd = instances.attach_command(instance, run_cmd, tty=sys.stdin.isatty() and sys.stdout.isatty())
+    os.execvp(cmd[0], cmd)
 
-    # Extract embedded devcontainer files to instance-specific cache directory
-    # This prevents race conditions when multiple instances run concurrently
-    cache_dir = extract_devcontainer_files(instance_id)
-    devcontainer_dir = cache_dir / ".devcontainer"
-    source_config = devcontainer_dir / "devcontainer.json"
 
-    # Setup runtime directory for SSH config etc (shared, not instance-specific)
-    runtime_dir = Path.home() / ".claude" / "clankercage-runtime"
-    runtime_dir.mkdir(parents=True, exist_ok=True)
+def main() -> None:
+    """
+    Main entry point - runs Claude Code in a sandboxed devcontainer.
 
-    # Load and modify config
-    config = json.loads(source_config.read_text())
-    config = modify_config(config, args, runtime_dir, devcontainer_dir, project_dir)
+    Uses embedded devcontainer files from the package.
+    With --build, builds from Dockerfile. Without, uses pre-built image.
+    """
+    if sys.argv[1:2] == ["pool"]:
+        pool_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["gc"]:
+        gc_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["audit"]:
+        audit_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["metrics"]:
+        metrics_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["batch"]:
+        batch_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["ps"]:
+        ps_main(sys.argv[2:])
+        return
+    if sys.argv[1:2] == ["attach"]:
+        attach_main(sys.argv[2:])
+        return
 
-    # Write modified config back to the temp devcontainer dir
-    runtime_config = devcontainer_dir / "devcontainer.json"
-    runtime_config.write_text(json.dumps(config, indent=2))
+    parser = create_parser()
+    args, claude_args = parser.parse_known_args()
+    apply_env_defaults(args)
+    if args.trace:
+        timings.enable(args.trace)
+
+    # api builds on this module, so it is imported here rather than at the top
+    from clankercage import api
+
+    # The project to mount is the current working directory
+    session = api.Session(Path.cwd().resolve(), sys.argv[1:], args=args, quiet=False)
+    try:
+        session.prepare()
+        session.up()
+        cmd = session.interactive_command(session_command(claude_args, args.shell, args.safe_mode))
+    except api.SessionError as e:
+        if isinstance(e.__cause__, PreflightError):
+            exit_on_preflight_error(e.__cause__)
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
 
-    run_devcontainer(runtime_config, cache_dir, project_dir, claude_args, args.shell, args.safe_mode, instance_id)
+    # Replace this process for clean TTY passthrough
+    os.execvp(cmd[0], cmd)
 
 
 def shell_remote() -> None:
     """Alias for main() - for clankercage-remote entry point."""
     main()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Keep the package-manager caches shared between instances under a size cap.
+
+The uv, npm, pnpm, pip and Go module caches and cargo's registry are Docker
+volumes mounted in every instance (under /pkgcache, and over ~/.cargo/registry),
+so what one session downloaded is a cache hit for the next. The tools are safe
+with several containers writing at once: they write entries under temporary
+names and rename them into place (cargo marks a crate extracted only once it
+is complete), and the file locks of uv and Go work across containers because a
+volume is a single filesystem on the Docker host. None of them ever shrinks its cache, so
+the postStartCommand runs this script in the background.
+
+For each cache over --max-size, the least recently used entries are removed
+until it is below LOW_WATERMARK of the cap. An entry is what the tool treats
+as present or missing as a whole (see ENTRIES: an unpacked wheel, a content
+file, an extracted crate or module), so a removed entry is only a cache miss.
+Entries are renamed out of the way before they are deleted, so no tool sees
+one half-deleted, and entries used in the last MIN_IDLE seconds are kept. One
+instance evicts a cache at a time (a lock file in the cache); the others skip it.
+
+Usage: cache-evict.py --max-size BYTES DIR...
+"""
+
+import argparse
+import fcntl
+import os
+import shutil
+import stat
+import sys
+import time
+import uuid
+from pathlib import Path
+
+LOCK_FILE = ".clankercage-evict.lock"
+TRASH_PREFIX = ".clankercage-evicting-"
+LOW_WATERMARK = 0.8
+MIN_IDLE = 3600
+
+# Entry patterns per cache directory name; caches not listed evict top-level items
+ENTRIES = {
+    "uv": ("*/*",),
+    "npm": ("_cacache/content-v2/*/*/*/*", "_cacache/index-v5/*/*/*"),
+    "pnpm": ("*/files/*/*", "*/index/*/*"),
+    "pip": ("http-v2/*/*/*/*/*/*", "wheels/*/*/*/*/*"),
+    "registry": ("cache/*/*", "src/*/*"),
+    "go": ("**/*@*",),
+}
+
+
+def usage(path: Path) -> tuple[int, float]:
+    """Bytes allocated to a file or directory tree, and when it was last used.
+
+    Use is the latest access or change of a file in it. The access times of
+    directories don't count: listing them (as this does) updates those.
+    """
+    try:
+        info = path.lstat()
+    except OSError:
+        return 0, 0.0
+    if not stat.S_ISDIR(info.st_mode):
+        return info.st_blocks * 512, max(info.st_atime, info.st_mtime)
+    total, used = info.st_blocks * 512, info.st_mtime
+    for root, dirs, files in os.walk(path):
+        for name in dirs + files:
+            try:
+                child = os.lstat(os.path.join(root, name))
+            except OSError:
+                continue
+            total += child.st_blocks * 512
+            used = max(used, child.st_mtime if stat.S_ISDIR(child.st_mode) else max(child.st_atime, child.st_mtime))
+    return total, used
+
+
+def entries(cache: Path) -> list[Path]:
+    """A cache's entries; matches nested in another entry (e.g. in an extracted module) are skipped."""
+    found = set()
+    for pattern in ENTRIES.get(cache.name, ("*",)):
+        for path in cache.glob(pattern):
+            if not any(part.startswith(".clankercage") for part in path.relative_to(cache).parts):
+                found.add(path)
+    return [path for path in found if not any(parent in found for parent in path.parents)]
+
+
+def _make_writable(function, path, _) -> None:
+    # Go makes its extracted modules read-only; deleting needs write access to the directories
+    os.chmod(os.path.dirname(path), 0o700)
+    if os.path.isdir(path) and not os.path.islink(path):
+        os.chmod(path, 0o700)
+    function(path)
+
+
+def remove(path: Path) -> None:
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, onerror=_make_writable)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def evict(cache: Path, max_size: int, now: float | None = None) -> list[Path]:
+    """Remove least recently used entries until the cache is below LOW_WATERMARK of max_size.
+
+    Returns the removed entries; none if another instance is evicting this cache.
+    """
+    now = now or time.time()
+    with open(cache / LOCK_FILE, "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return []
+        # Left over by an eviction that was interrupted
+        for trash in cache.glob(f"{TRASH_PREFIX}*"):
+            remove(trash)
+        total, _ = usage(cache)
+        if total <= max_size:
+            return []
+        candidates = []
+        for path in entries(cache):
+            size, used = usage(path)
+            candidates.append((used, size, path))
+        removed = []
+        for used, size, path in sorted(candidates):
+            if total <= max_size * LOW_WATERMARK or now - used < MIN_IDLE:
+                break
+            trash = cache / f"{TRASH_PREFIX}{uuid.uuid4().hex}"
+            try:
+                path.rename(trash)
+            except OSError:
+                continue
+            remove(trash)
+            total -= size
+            removed.append(path)
+        return removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evict least recently used entries from shared package caches")
+    parser.add_argument("--max-size", type=int, required=True, help="Size cap of each cache in bytes")
+    parser.add_argument("caches", nargs="+", type=Path)
+    args = parser.parse_args()
+
+    os.nice(19)
+    for cache in args.caches:
+        if cache.is_dir():
+            removed = evict(cache, args.max_size)
+            if removed:
+                print(f"cache-evict: removed {len(removed)} entries from {cache}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+#!/bin/bash
+set -euo pipefail
+IFS=$'\n\t'
+
+# Keeps the allowed-domains ipset in step with DNS while the container runs.
+# CDN-backed domains rotate their IPs, so a set resolved once at start slowly
+# goes stale. Started in the background by init-firewall.sh, this re-resolves
+# each allowed domain when its records expire, adds new IPs right away and
+# drops IPs once the domain has stopped returning them for $GRACE seconds.
+# Changes are applied by building the whole set under a temporary name and
+# swapping it in, and logged to the audit log.
+#
+# Usage: dns-refresh.sh            run the refresh loop (one instance per container)
+#        dns-refresh.sh --add FILE track the "domain<TAB>ip<TAB>expires" records in FILE
+#                                  (used by add-domain-to-firewall.sh)
+
+IPSET_NAME="allowed-domains"
+CACHE_DIR="/var/cache/clankercage"
+# The ruleset init-firewall.sh applied for this instance
+RULESET_DIR="$CACHE_DIR/rulesets/$(cat /run/clankercage/ruleset 2>/dev/null || true)"
+DNS_CACHE="$CACHE_DIR/dns.tsv"
+
+# Tracked domains and their records ("domain<TAB>ip<TAB>expires<TAB>last_seen")
+STATE_DIR="/run/dns-refresh"
+DOMAINS="$STATE_DIR/domains.txt"
+RECORDS="$STATE_DIR/records.tsv"
+
+GRACE=900       # seconds an IP stays allowed after its domain stopped returning it
+MIN_TTL=30      # floor for record TTLs, so short-TTL domains don't keep us busy
+RETRY=60        # seconds before retrying a domain that failed to resolve
+MAX_SLEEP=300   # upper bound between passes
+
+# Firewall events are appended to the audit log shared with the host
+source /usr/local/bin/audit-log.sh
+
+# Resolve domains in parallel, printing "domain<TAB>ip<TAB>expires" per A record
+resolve_domains() {
+    local now=${EPOCHREALTIME%.*} tmp domain
+    tmp=$(mktemp -d)
+    for domain in "$@"; do
+        dig +noall +answer +time=5 +tries=2 A "$domain" > "$tmp/$domain" 2>/dev/null &
+    done
+    wait
+    for domain in "$@"; do
+        awk -v domain="$domain" -v now="$now" -v min_ttl="$MIN_TTL" \
+            '$4 == "A" && $5 ~ /^[0-9]+\.[0-9]+\.[0-9]+\.[0-9]+$/ {printf "%s\t%s\t%d\n", domain, $5, now + ($2 > min_ttl ? $2 : min_ttl)}' \
+            "$tmp/$domain"
+    done
+    rm -rf "$tmp"
+}
+
+# Replace the shared cache's records of every domain in $1; domains that failed to resolve keep theirs
+update_dns_cache() {
+    [ -d "$CACHE_DIR" ] || return 0
+    (
+        flock 9
+        touch "$DNS_CACHE"
+        awk -F'\t' 'NR == FNR {fresh[$1] = 1; print; next} !($1 in fresh)' "$1" "$DNS_CACHE" > "$DNS_CACHE.tmp.$$"
+        chmod 644 "$DNS_CACHE.tmp.$$"
+        mv "$DNS_CACHE.tmp.$$" "$DNS_CACHE"
+    ) 9>>"$CACHE_DIR/dns.lock" || echo "WARNING: Failed to update DNS cache" >&2
+}
+
+# Merge fresh records ($1) into the tracked ones and print the changes as
+# "+|-<TAB>domain<TAB>ip". With $2 = age, IPs of the refreshed domains that
+# weren't seen for $GRACE seconds are dropped. Call with the state lock held.
+merge_records() {
+    local now=${EPOCHREALTIME%.*}
+    awk -F'\t' -v OFS='\t' -v now="$now" -v grace="$GRACE" -v age="${2:-}" -v out="$RECORDS.tmp" '
+        FILENAME == ARGV[1] {fresh[$1 OFS $2] = $3; refreshed[$1] = 1; next}
+        {
+            key = $1 OFS $2
+            if (key in fresh) {
+                print $1, $2, fresh[key], now > out
+                seen[key] = 1
+            } else if (age && ($1 in refreshed) && now - $4 > grace) {
+                print "-", $1, $2
+            } else {
+                print > out
+            }
+        }
+        END {
+            for (key in fresh) {
+                if (!(key in seen)) {
+                    print key, fresh[key], now > out
+                    print "+", key
+                }
+            }
+            close(out)
+        }' "$1" "$RECORDS"
+    touch "$RECORDS.tmp"
+    mv "$RECORDS.tmp" "$RECORDS"
+    cut -f1 "$1" | sort -u - "$DOMAINS" -o "$DOMAINS"
+}
+
+# Rebuild the set from the static entries and the tracked records and swap it in
+apply_set() {
+    {
+        echo "create $IPSET_NAME hash:net"
+        echo "create $IPSET_NAME-new hash:net"
+        echo "flush $IPSET_NAME-new"
+        { cat "$RULESET_DIR/cidrs.txt" 2>/dev/null || true; cut -f2 "$RECORDS"; } | sort -u | sed "s/^/add $IPSET_NAME-new /"
+        echo "swap $IPSET_NAME-new $IPSET_NAME"
+        echo "destroy $IPSET_NAME-new"
+    } | ipset restore -exist
+}
+
+# Audit the changes in $1 ("+|-<TAB>domain<TAB>ip") as one record per domain
+audit_changes() {
+    local domain
+    for domain in $(cut -f2 "$1" | sort -u); do
+        audit_log "DNS_REFRESH" "domain=$domain" \
+            "added=$(awk -F'\t' -v d="$domain" '$1 == "+" && $2 == d {printf "%s%s", sep, $3; sep = ","}' "$1")" \
+            "removed=$(awk -F'\t' -v d="$domain" '$1 == "-" && $2 == d {printf "%s%s", sep, $3; sep = ","}' "$1")"
+    done
+}
+
+mkdir -p "$STATE_DIR"
+exec 9>>"$STATE_DIR/state.lock"
+
+if [ "${1:-}" = "--add" ]; then
+    flock 9
+    touch "$DOMAINS" "$RECORDS"
+    # The caller audits the addition
+    merge_records "$2" > /dev/null
+    exit 0
+fi
+
+exec 8>>"$STATE_DIR/daemon.lock"
+if ! flock -n 8; then
+    echo "dns-refresh is already running" >&2
+    exit 0
+fi
+
+# Track the ruleset's domains, starting from the records it was compiled from
+flock 9
+now=${EPOCHREALTIME%.*}
+touch "$DOMAINS" "$RECORDS"
+sort -u "$RULESET_DIR/domains.txt" "$DOMAINS" -o "$DOMAINS"
+if [ ! -s "$RECORDS" ] && [ -f "$DNS_CACHE" ]; then
+    awk -F'\t' -v OFS='\t' -v now="$now" 'FILENAME == ARGV[1] {tracked[$1] = 1; next} $1 in tracked {print $1, $2, $3, now}' \
+        "$DOMAINS" "$DNS_CACHE" > "$RECORDS"
+fi
+flock -u 9
+audit_log "DNS_REFRESH_START" "domains=$(wc -l < "$DOMAINS")" "records=$(wc -l < "$RECORDS")"
+
+declare -A RETRY_AT=()
+while true; do
+    now=${EPOCHREALTIME%.*}
+
+    # A domain is due once its newest record has expired (stale IPs kept for the grace period don't count)
+    DUE=()
+    for domain in $(awk -F'\t' -v now="$now" '
+            FILENAME == ARGV[1] {tracked[$1] = 1; next}
+            $3 > latest[$1] {latest[$1] = $3}
+            END {for (d in tracked) if (latest[d] <= now) print d}' "$DOMAINS" "$RECORDS"); do
+        if [ "${RETRY_AT[$domain]:-0}" -le "$now" ]; then
+            DUE+=("$domain")
+        fi
+    done
+
+    if [ ${#DUE[@]} -gt 0 ]; then
+        fresh=$(mktemp)
+        changes=$(mktemp)
+        resolve_domains "${DUE[@]}" > "$fresh"
+        for domain in "${DUE[@]}"; do
+            if grep -q "^${domain//./\\.}"$'\t' "$fresh"; then
+                unset "RETRY_AT[$domain]"
+            else
+                # Keep the old IPs while DNS is failing
+                RETRY_AT[$domain]=$((now + RETRY))
+            fi
+        done
+        flock 9
+        merge_records "$fresh" age > "$changes"
+        if [ -s "$changes" ]; then
+            apply_set
+        fi
+        flock -u 9
+        audit_changes "$changes"
+        update_dns_cache "$fresh"
+        rm -f "$fresh" "$changes"
+    fi
+
+    # Sleep until the next record expires or a failed domain is retried
+    next=$(awk -F'\t' '$3 > latest[$1] {latest[$1] = $3} END {for (d in latest) if (!min || latest[d] < min) min = latest[d]; print min + 0}' "$RECORDS")
+    for retry in "${RETRY_AT[@]}"; do
+        if [ "$next" -eq 0 ] || [ "$retry" -lt "$next" ]; then
+            next=$retry
+        fi
+    done
+    now=${EPOCHREALTIME%.*}
+    delay=$((next - now))
+    if [ "$next" -eq 0 ] || [ "$delay" -gt "$MAX_SLEEP" ]; then
+        delay=$MAX_SLEEP
+    elif [ "$delay" -lt 1 ]; then
+        delay=1
+    fi
+    sleep "$delay"
+done
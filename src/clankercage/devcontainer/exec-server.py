@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""Run commands for the host over a unix socket (`clankercage --exec-server`).
+
+`docker exec` costs a round trip through the Docker daemon and a new process
+set up by the runtime for every command, which dominates when tooling runs
+thousands of short commands in a session. This server is started once by the
+postStartCommand, listens on a socket in the instance runtime dir (bind
+mounted from the host) and runs each requested command as a plain child
+process, so the per-command overhead is a fork/exec and a few frames.
+
+Many commands run at once over one connection. Every frame is
+
+    stream id (u32) | type (u8) | payload length (u32) | payload
+
+with big-endian integers. The client picks a new stream id per command:
+
+    OPEN    client  JSON {"argv": [...], "env": {...}, "cwd": "..."}
+    STDIN   client  bytes for the command's stdin; an empty payload closes it
+    SIGNAL  client  signal number (i32), sent to the command's process group
+    ACK     client  bytes of output consumed (u32), returning window credit
+    STDOUT  server  output bytes
+    STDERR  server  output bytes
+    EXIT    server  exit status (i32, negative signal number if killed);
+                    always the last frame of a stream
+
+A command may have at most WINDOW bytes of output in flight; the server stops
+reading its pipes until the client acknowledges them, so a slow consumer
+blocks its own command rather than the connection or the server's memory.
+Commands start in their own session (killing the group also gets their
+children) and commands of a closed connection are killed. A command that
+can't be started gets its error on stderr and exit status 127 (or 126).
+
+The socket is only accessible to the user running the server (the container's
+remote user, which owns the runtime dir).
+
+Usage: exec-server.py [--socket PATH] [--daemon]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+
+SOCKET = "/run/clankercage/exec.sock"
+HEADER = struct.Struct(">IBI")
+OPEN, STDIN, SIGNAL, ACK, STDOUT, STDERR, EXIT = range(1, 8)
+CHUNK_SIZE = 64 * 1024
+WINDOW = 1024 * 1024
+MAX_FRAME = 16 * 1024 * 1024
+
+
+def frame(stream_id: int, kind: int, payload: bytes = b"") -> bytes:
+    return HEADER.pack(stream_id, kind, len(payload)) + payload
+
+
+class Command:
+    """One running command and its output window."""
+
+    def __init__(self, connection: "Connection", stream_id: int):
+        self.connection = connection
+        self.stream_id = stream_id
+        self.process: asyncio.subprocess.Process | None = None
+        self.stdin: asyncio.Queue[bytes] = asyncio.Queue()
+        self.credit = WINDOW
+        self.credit_changed = asyncio.Event()
+        self.pending_signal: int | None = None
+
+    async def run(self, payload: bytes) -> None:
+        try:
+            request = json.loads(payload)
+            self.process = await asyncio.create_subprocess_exec(
+                *request["argv"],
+                env={**os.environ, **request.get("env", {})},
+                cwd=request.get("cwd") or None,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                start_new_session=True,
+            )
+        except (OSError, KeyError, TypeError, ValueError) as e:  # ValueError covers bad JSON
+            returncode = 126 if isinstance(e, PermissionError) else 127
+            await self.connection.send(self.stream_id, STDERR, f"exec-server: {e}\n".encode())
+            await self.connection.send(self.stream_id, EXIT, struct.pack(">i", returncode))
+            return
+        if self.pending_signal is not None:
+            self.signal(self.pending_signal)
+        feeder = asyncio.ensure_future(self._feed_stdin())
+        await asyncio.gather(self._pump(self.process.stdout, STDOUT), self._pump(self.process.stderr, STDERR))
+        returncode = await self.process.wait()
+        feeder.cancel()
+        await self.connection.send(self.stream_id, EXIT, struct.pack(">i", returncode))
+
+    async def _feed_stdin(self) -> None:
+        stdin = self.process.stdin
+        try:
+            while data := await self.stdin.get():
+                stdin.write(data)
+                await stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            stdin.close()
+
+    async def _pump(self, pipe: asyncio.StreamReader, kind: int) -> None:
+        while chunk := await pipe.read(CHUNK_SIZE):
+            while self.credit <= 0:
+                self.credit_changed.clear()
+                await self.credit_changed.wait()
+            self.credit -= len(chunk)
+            await self.connection.send(self.stream_id, kind, chunk)
+
+    def acknowledge(self, size: int) -> None:
+        self.credit += size
+        self.credit_changed.set()
+
+    def signal(self, signum: int) -> None:
+        if self.process is None:
+            # Still starting: deliver it once the process exists
+            self.pending_signal = signum
+        elif self.process.returncode is None:
+            try:
+                os.killpg(self.process.pid, signum)
+            except (ProcessLookupError, PermissionError):
+                pass
+
+
+class Connection:
+    """A client connection and the commands it started."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.commands: dict[int, Command] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    async def send(self, stream_id: int, kind: int, payload: bytes) -> None:
+        if self.writer.is_closing():
+            return
+        self.writer.write(frame(stream_id, kind, payload))
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+    async def serve(self) -> None:
+        try:
+            while True:
+                stream_id, kind, length = HEADER.unpack(await self.reader.readexactly(HEADER.size))
+                if length > MAX_FRAME:
+                    break
+                self.dispatch(stream_id, kind, await self.reader.readexactly(length))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            for command in self.commands.values():
+                command.signal(signal.SIGKILL)
+            self.writer.close()
+
+    def dispatch(self, stream_id: int, kind: int, payload: bytes) -> None:
+        command = self.commands.get(stream_id)
+        if kind == OPEN and command is None:
+            command = self.commands[stream_id] = Command(self, stream_id)
+            task = asyncio.ensure_future(command.run(payload))
+            self.tasks.add(task)
+            task.add_done_callback(lambda t: self._finished(stream_id, t))
+        elif command is None:
+            return
+        elif kind == STDIN:
+            command.stdin.put_nowait(payload)
+        elif kind == SIGNAL:
+            command.signal(struct.unpack(">i", payload)[0])
+        elif kind == ACK:
+            command.acknowledge(struct.unpack(">I", payload)[0])
+
+    def _finished(self, stream_id: int, task: asyncio.Task) -> None:
+        self.tasks.discard(task)
+        self.commands.pop(stream_id, None)
+        if not task.cancelled() and task.exception():
+            print(f"exec-server: command {stream_id} failed: {task.exception()!r}", file=sys.stderr)
+
+
+def listen(path: str) -> socket.socket:
+    """Bind the server socket, replacing a stale one from a previous container start."""
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        sock.bind(path)
+    finally:
+        os.umask(old_umask)
+    sock.listen(128)
+    return sock
+
+
+async def serve(sock: socket.socket) -> None:
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await Connection(reader, writer).serve()
+
+    server = await asyncio.start_unix_server(handle, sock=sock, limit=CHUNK_SIZE)
+    async with server:
+        await server.serve_forever()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run commands for the host over a unix socket")
+    parser.add_argument("--socket", default=SOCKET)
+    parser.add_argument("--daemon", action="store_true", help="Detach once the socket is bound")
+    args = parser.parse_args()
+
+    sock = listen(args.socket)
+    if args.daemon and os.fork():
+        os._exit(0)
+    if args.daemon:
+        os.setsid()
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1):
+            os.dup2(devnull, fd)
+    asyncio.run(serve(sock))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Minimal Docker Engine API client over the Docker socket.
+
+Talks HTTP/1.1 to /var/run/docker.sock (or a unix:// / plain tcp:// DOCKER_HOST)
+using only the standard library, reusing a single keep-alive connection. This
+lets the CLI check Docker, inspect the image and read its labels with one
+request instead of forking several `docker` processes.
+
+Setups the client can't handle (TLS, ssh://, Docker contexts without a local
+socket) make from_env() return None, and callers fall back to the docker CLI.
+"""
+
+import http.client
+import json
+import os
+import socket
+from typing import Callable, Iterator
+from urllib.parse import quote, urlencode, urlparse
+
+__all__ = ["DockerEngine", "EngineError", "split_image_reference"]
+
+DEFAULT_SOCKET = "/var/run/docker.sock"
+API_VERSION = "v1.41"
+
+
+class EngineError(Exception):
+    """Raised when the Docker daemon is unreachable or returns an error."""
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection that connects to a unix socket instead of host:port."""
+
+    def __init__(self, socket_path: str, timeout: float | None = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self) -> None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        self.sock = sock
+
+
+def split_image_reference(image: str) -> tuple[str, str]:
+    """Split an image reference into (repository, tag), defaulting the tag to latest."""
+    name, _, tag = image.rpartition(":")
+    # A colon before the last slash is a registry port, not a tag
+    if not name or "/" in tag:
+        return image, "latest"
+    return name, tag
+
+
+class DockerEngine:
+    """Docker Engine API client with a single reusable connection."""
+
+    def __init__(self, connection: http.client.HTTPConnection):
+        self._connection = connection
+
+    @classmethod
+    def from_env(cls, timeout: float = 30) -> "DockerEngine | None":
+        """Create a client from DOCKER_HOST, or None if only the docker CLI can reach the daemon."""
+        docker_host = os.environ.get("DOCKER_HOST", f"unix://{DEFAULT_SOCKET}")
+        url = urlparse(docker_host)
+        if url.scheme == "unix":
+            if not os.path.exists(url.path):
+                return None
+            return cls(UnixHTTPConnection(url.path, timeout=timeout))
+        if url.scheme == "tcp" and not os.environ.get("DOCKER_TLS_VERIFY"):
+            return cls(http.client.HTTPConnection(url.hostname, url.port or 2375, timeout=timeout))
+        return None
+
+    def close(self) -> None:
+        self._connection.close()
+
+    def _send(self, method: str, path: str, query: dict | None = None) -> http.client.HTTPResponse:
+        url = f"/{API_VERSION}{path}"
+        if query:
+            url += "?" + urlencode(query)
+        try:
+            self._connection.request(method, url, headers={"Host": "docker"})
+            return self._connection.getresponse()
+        except (OSError, http.client.HTTPException) as e:
+            self._connection.close()
+            raise EngineError(f"Cannot connect to the Docker daemon: {e}") from e
+
+    def request(self, method: str, path: str, query: dict | None = None) -> tuple[int, object]:
+        """Make a request and return (status, decoded JSON body or None)."""
+        response = self._send(method, path, query)
+        body = response.read()
+        data = json.loads(body) if body and "json" in response.getheader("Content-Type", "") else None
+        if response.status >= 500:
+            message = data.get("message") if isinstance(data, dict) else body.decode(errors="replace")
+            raise EngineError(f"Docker daemon error: {message}")
+        return response.status, data
+
+    def ping(self) -> None:
+        """Raise EngineError unless the daemon answers."""
+        status, _ = self.request("GET", "/_ping")
+        if status != 200:
+            raise EngineError(f"Docker daemon ping failed with status {status}")
+
+    def info(self) -> dict:
+        """System-wide information: among others NCPU, MemTotal and Name (the daemon's host name)."""
+        status, data = self.request("GET", "/info")
+        if status != 200 or not isinstance(data, dict):
+            raise EngineError(f"Docker info failed with status {status}")
+        return data
+
+    def inspect_image(self, image: str) -> dict | None:
+        """Inspect a local image, or return None if it isn't present.
+
+        Doubles as a ping - a daemon that can't be reached raises EngineError.
+        """
+        status, data = self.request("GET", f"/images/{quote(image, safe='')}/json")
+        if status == 404:
+            return None
+        if status != 200:
+            raise EngineError(f"Image inspect failed with status {status}")
+        return data
+
+    def list_containers(self, labels: dict[str, str | None] | None = None, include_stopped: bool = True) -> list[dict]:
+        """List containers, optionally filtered by labels (a None value matches any value)."""
+        query = {"all": "true" if include_stopped else "false"}
+        if labels:
+            query["filters"] = json.dumps({"label": [k if v is None else f"{k}={v}" for k, v in labels.items()]})
+        _, data = self.request("GET", "/containers/json", query)
+        return data or []
+
+    def inspect_container(self, container_id: str) -> dict | None:
+        """Inspect a container, or return None if it no longer exists."""
+        status, data = self.request("GET", f"/containers/{quote(container_id, safe='')}/json")
+        if status == 404:
+            return None
+        if status != 200:
+            raise EngineError(f"Container inspect failed with status {status}")
+        return data
+
+    def container_events(self, since: float, until: float, labels: dict[str, str | None] | None = None) -> list[dict]:
+        """Container events between two Unix times, optionally filtered by labels like list_containers."""
+        filters = {"type": ["container"]}
+        if labels:
+            filters["label"] = [k if v is None else f"{k}={v}" for k, v in labels.items()]
+        query = {"since": f"{since:.9f}", "until": f"{until:.9f}", "filters": json.dumps(filters)}
+        return list(self.stream("GET", "/events", query))
+
+    def stream(self, method: str, path: str, query: dict | None = None) -> Iterator[dict]:
+        """Yield JSON messages from a streaming endpoint as they arrive."""
+        response = self._send(method, path, query)
+        if response.status != 200:
+            body = response.read().decode(errors="replace")
+            raise EngineError(f"Docker daemon returned {response.status}: {body}")
+        for line in response:
+            if line.strip():
+                yield json.loads(line)
+
+    def pull_image(self, image: str, progress: Callable[[dict], None] | None = None) -> None:
+        """Pull an image, passing each progress message to the callback."""
+        repository, tag = split_image_reference(image)
+        for message in self.stream("POST", "/images/create", {"fromImage": repository, "tag": tag}):
+            if "error" in message:
+                raise EngineError(f"Pull failed: {message['error']}")
+            if progress:
+                progress(message)
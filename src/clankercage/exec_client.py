@@ -0,0 +1,166 @@
+"""Client for the in-container command server (devcontainer/exec-server.py).
+
+With --exec-server the container runs a small server on a unix socket in the
+instance runtime dir, so the host can start commands without a `docker exec`
+per command. One connection carries any number of concurrent commands; see
+the server's docstring for the framing. The constants below must match it.
+
+    client = await ExecClient.connect(runtime_dir / EXEC_SOCKET)
+    channel = await client.open(["make", "test"], cwd="/workspace")
+    output = await channel.stdout.read(65536)
+    returncode = await channel.wait()
+
+Output is acknowledged as it is read from channel.stdout/stderr, which is what
+lets the server send more: a command whose output isn't read pauses once
+WINDOW bytes are in flight. Unix sockets don't cross the VM boundary of Docker
+Desktop, so connect() fails there and callers fall back to `docker exec`.
+"""
+
+import asyncio
+import json
+import struct
+from pathlib import Path
+
+__all__ = ["EXEC_SOCKET", "Channel", "ExecClient", "ExecServerError"]
+
+# Name of the socket in the instance runtime dir
+EXEC_SOCKET = "exec.sock"
+HEADER = struct.Struct(">IBI")
+OPEN, STDIN, SIGNAL, ACK, STDOUT, STDERR, EXIT = range(1, 8)
+CHUNK_SIZE = 64 * 1024
+
+
+class ExecServerError(ConnectionError):
+    """The command server is unreachable or the connection to it was lost."""
+
+
+class _Output:
+    """A command's stdout or stderr, with the StreamReader.read interface."""
+
+    def __init__(self, channel: "Channel"):
+        self._channel = channel
+        self._reader = asyncio.StreamReader()
+
+    async def read(self, n: int = -1) -> bytes:
+        data = await self._reader.read(n)
+        if data:
+            self._channel._client._send(self._channel.stream_id, ACK, struct.pack(">I", len(data)))
+        return data
+
+
+class Channel:
+    """One command started over an ExecClient connection."""
+
+    def __init__(self, client: "ExecClient", stream_id: int):
+        self._client = client
+        self.stream_id = stream_id
+        self.stdout = _Output(self)
+        self.stderr = _Output(self)
+        self.returncode: int | None = None
+        self._exited: asyncio.Future[int] = asyncio.get_running_loop().create_future()
+
+    async def write_stdin(self, data: bytes) -> None:
+        if data:
+            self._client._send(self.stream_id, STDIN, data)
+            await self._client._drain()
+
+    async def close_stdin(self) -> None:
+        self._client._send(self.stream_id, STDIN)
+        await self._client._drain()
+
+    async def signal(self, signum: int) -> None:
+        """Signal the command's process group."""
+        if self.returncode is None:
+            self._client._send(self.stream_id, SIGNAL, struct.pack(">i", signum))
+            await self._client._drain()
+
+    async def wait(self) -> int:
+        """Wait for the exit status (negative signal number if the command was killed)."""
+        return await asyncio.shield(self._exited)
+
+    def _exit(self, returncode: int) -> None:
+        self.returncode = returncode
+        self.stdout._reader.feed_eof()
+        self.stderr._reader.feed_eof()
+        self._exited.set_result(returncode)
+
+    def _lost(self, error: Exception) -> None:
+        self.stdout._reader.feed_eof()
+        self.stderr._reader.feed_eof()
+        self._exited.set_exception(error)
+
+
+class ExecClient:
+    """A connection to a command server."""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._reader = reader
+        self._writer = writer
+        self._channels: dict[int, Channel] = {}
+        self._next_id = 1
+        self._error: ExecServerError | None = None
+        self._receiver = asyncio.ensure_future(self._receive())
+
+    @classmethod
+    async def connect(cls, path: Path | str) -> "ExecClient":
+        try:
+            reader, writer = await asyncio.open_unix_connection(str(path), limit=CHUNK_SIZE)
+        except OSError as e:
+            raise ExecServerError(f"Cannot connect to the command server at {path}: {e}") from e
+        return cls(reader, writer)
+
+    async def open(self, argv: list[str], env: dict[str, str] | None = None, cwd: str | None = None,
+                   stdin: bytes | None = None) -> Channel:
+        """Start a command. stdin, if given, is written and closed; otherwise the command's stdin stays open."""
+        if self._error:
+            raise self._error
+        stream_id = self._next_id
+        self._next_id += 1
+        channel = self._channels[stream_id] = Channel(self, stream_id)
+        self._send(stream_id, OPEN, json.dumps({"argv": list(argv), "env": env or {}, "cwd": cwd}).encode())
+        if stdin is not None:
+            if stdin:
+                self._send(stream_id, STDIN, stdin)
+            self._send(stream_id, STDIN)
+        await self._drain()
+        return channel
+
+    async def close(self) -> None:
+        """Close the connection; the server kills commands still running on it."""
+        self._writer.close()
+        try:
+            await self._writer.wait_closed()
+        except ConnectionError:
+            pass
+        await self._receiver
+
+    def _send(self, stream_id: int, kind: int, payload: bytes = b"") -> None:
+        if not self._writer.is_closing():
+            self._writer.write(HEADER.pack(stream_id, kind, len(payload)) + payload)
+
+    async def _drain(self) -> None:
+        try:
+            await self._writer.drain()
+        except ConnectionError as e:
+            raise ExecServerError(f"Lost the command server connection: {e}") from e
+
+    async def _receive(self) -> None:
+        try:
+            while True:
+                stream_id, kind, length = HEADER.unpack(await self._reader.readexactly(HEADER.size))
+                payload = await self._reader.readexactly(length)
+                channel = self._channels.get(stream_id)
+                if channel is None:
+                    continue
+                if kind == STDOUT:
+                    channel.stdout._reader.feed_data(payload)
+                elif kind == STDERR:
+                    channel.stderr._reader.feed_data(payload)
+                elif kind == EXIT:
+                    del self._channels[stream_id]
+                    channel._exit(struct.unpack(">i", payload)[0])
+        except (asyncio.IncompleteReadError, ConnectionError) as e:
+            self._error = ExecServerError(f"Lost the command server connection: {e}")
+        for channel in self._channels.values():
+            channel._lost(self._error)
+        self._channels.clear()
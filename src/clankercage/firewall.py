@@ -0,0 +1,308 @@
+"""Compile the container firewall policy into a ruleset artifact on the host.
+
+The policy is built from whitelisted-domains.txt, the user-approved domains in
+~/.claude/.allowed-browser-domains, GitHub's IP ranges (see github_meta) and the
+shared DNS cache. Compiling it on the host means it is computed once, reused by
+every instance with the same inputs, and testable without a privileged container.
+
+A ruleset is a directory under ~/.cache/clankercage/firewall/rulesets/<hash>/,
+named after a hash of its inputs, with:
+
+  ipset.restore   - builds the allowlist under a temporary name and swaps it in
+  iptables.rules  - iptables-restore payload; @HOST_NETWORK@ and @DOCKER_DNS_RULES@
+                    are filled in by init-firewall.sh, the only container-specific parts
+  domains.txt     - the allowed domains, refreshed in the container as their TTLs expire
+  cidrs.txt       - the static allowlist entries (GitHub's ranges), kept by those refreshes
+  resolver        - "static", or "stub" for the on-demand mode below
+
+In stub mode nothing is resolved up front: the set starts with only the static
+entries and dns-stub.py, a resolver on 127.0.0.1 in the container, adds the IPs
+it answers for allowed domains with a timeout of their TTL. domains.txt then
+also lists wildcard patterns ("*.example.com" matches any subdomain), which
+static mode can't resolve and skips.
+
+Each instance applies the ruleset compiled for its own run: the CLI writes the
+ruleset's name to the instance runtime directory, where init-firewall.sh looks
+it up (concurrent runs may compile different rulesets, so there is no shared
+"current" one). Output is deterministic: the same inputs always produce
+byte-identical files.
+
+The DNS cache (dns.tsv) holds "domain<TAB>ip<TAB>expires" lines. It is written by
+the container, which knows the record TTLs; domains missing from it are resolved
+here with the system resolver and cached for DEFAULT_TTL seconds.
+"""
+
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+__all__ = [
+    "DEFAULT_TTL",
+    "build_ruleset",
+    "compile_ruleset",
+    "load_domains",
+    "read_dns_cache",
+    "resolve_domains",
+    "ruleset_hash",
+    "update_dns_cache",
+]
+
+IPSET_NAME = "allowed-domains"
+DEFAULT_TTL = 300
+RESOLVE_TIMEOUT = 5.0
+KEEP_RULESETS = 10
+# Bumped when the files in a ruleset change, so rulesets from older versions are recompiled
+RULESET_FORMAT = "3"
+
+DNS_CACHE_FILE = "dns.tsv"
+GITHUB_CIDRS_FILE = "github-cidrs.txt"
+RULESETS_DIR = "rulesets"
+
+_DOMAIN_PATTERN = re.compile(r"^[a-zA-Z0-9]([a-zA-Z0-9.-]*[a-zA-Z0-9])?$")
+_WILDCARD_PATTERN = re.compile(r"^\*\.[a-zA-Z0-9]([a-zA-Z0-9.-]*[a-zA-Z0-9])?$")
+_IPV4_PATTERN = re.compile(r"^\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}(/\d{1,2})?$")
+
+IPTABLES_TEMPLATE = """\
+*filter
+:INPUT DROP [0:0]
+:FORWARD DROP [0:0]
+:OUTPUT DROP [0:0]
+-A INPUT -p udp --sport 53 -j ACCEPT
+-A INPUT -p tcp --sport 22 -m state --state ESTABLISHED -j ACCEPT
+-A INPUT -i lo -j ACCEPT
+-A INPUT -s @HOST_NETWORK@ -j ACCEPT
+-A INPUT -m state --state ESTABLISHED,RELATED -j ACCEPT
+-A OUTPUT -p udp --dport 53 -j ACCEPT
+-A OUTPUT -p tcp --dport 22 -j ACCEPT
+-A OUTPUT -o lo -j ACCEPT
+-A OUTPUT -d @HOST_NETWORK@ -j ACCEPT
+-A OUTPUT -m state --state ESTABLISHED,RELATED -j ACCEPT
+-A OUTPUT -m set --match-set {ipset} dst -j ACCEPT
+-A OUTPUT -j REJECT --reject-with icmp-admin-prohibited
+COMMIT
+*nat
+:PREROUTING ACCEPT [0:0]
+:INPUT ACCEPT [0:0]
+:OUTPUT ACCEPT [0:0]
+:POSTROUTING ACCEPT [0:0]
+:DOCKER_OUTPUT - [0:0]
+:DOCKER_POSTROUTING - [0:0]
+@DOCKER_DNS_RULES@
+COMMIT
+*mangle
+:PREROUTING ACCEPT [0:0]
+:INPUT ACCEPT [0:0]
+:FORWARD ACCEPT [0:0]
+:OUTPUT ACCEPT [0:0]
+:POSTROUTING ACCEPT [0:0]
+COMMIT
+"""
+
+
+def load_domains(path: Path, wildcards: bool = False) -> list[str]:
+    """Read a domains file (one per line, # comments), skipping invalid entries.
+
+    Wildcard patterns ("*.example.com") are skipped unless wildcards is True.
+    """
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        return []
+    domains = []
+    for line in lines:
+        domain = line.strip()
+        if _DOMAIN_PATTERN.match(domain) or (wildcards and _WILDCARD_PATTERN.match(domain)):
+            domains.append(domain)
+    return domains
+
+
+def _load_cidrs(path: Path) -> list[str]:
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        return []
+    return [line.strip() for line in lines if _IPV4_PATTERN.match(line.strip())]
+
+
+def read_dns_cache(cache_dir: Path) -> dict[str, list[tuple[str, int]]]:
+    """Read the DNS cache as {domain: [(ip, expires)]}. Expired entries are kept."""
+    cache: dict[str, list[tuple[str, int]]] = {}
+    try:
+        lines = (cache_dir / DNS_CACHE_FILE).read_text().splitlines()
+    except OSError:
+        return cache
+    for line in lines:
+        parts = line.split("\t")
+        if len(parts) != 3 or not _IPV4_PATTERN.match(parts[1]) or not parts[2].isdigit():
+            continue
+        cache.setdefault(parts[0], []).append((parts[1], int(parts[2])))
+    return cache
+
+
+def update_dns_cache(cache_dir: Path, records: dict[str, list[str]], ttl: int = DEFAULT_TTL) -> None:
+    """Replace the cached IPs of the given domains, under the lock the container uses too."""
+    if not records:
+        return
+    expires = int(time.time()) + ttl
+    lock_fd = os.open(cache_dir / "dns.lock", os.O_RDONLY | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(lock_fd, fcntl.LOCK_EX)
+        cache = read_dns_cache(cache_dir)
+        for domain, ips in records.items():
+            cache[domain] = [(ip, expires) for ip in ips]
+        lines = [f"{domain}\t{ip}\t{exp}\n" for domain in sorted(cache) for ip, exp in cache[domain]]
+        tmp = cache_dir / f"{DNS_CACHE_FILE}.tmp.{os.getpid()}"
+        tmp.write_text("".join(lines))
+        tmp.chmod(0o644)
+        os.replace(tmp, cache_dir / DNS_CACHE_FILE)
+    finally:
+        os.close(lock_fd)
+
+
+def _resolve(domain: str) -> list[str]:
+    try:
+        infos = socket.getaddrinfo(domain, None, socket.AF_INET, socket.SOCK_STREAM)
+    except OSError:
+        return []
+    return sorted({info[4][0] for info in infos})
+
+
+def resolve_domains(domains: list[str], timeout: float = RESOLVE_TIMEOUT) -> dict[str, list[str]]:
+    """Resolve A records for domains concurrently. Domains that fail or time out are left out."""
+    if not domains:
+        return {}
+    executor = ThreadPoolExecutor(max_workers=min(16, len(domains)))
+    futures = {executor.submit(_resolve, domain): domain for domain in domains}
+    done, _ = wait(futures, timeout=timeout)
+    # Lookups still running after the timeout are abandoned (getaddrinfo can't be cancelled)
+    executor.shutdown(wait=False)
+    return {futures[f]: f.result() for f in done if f.result()}
+
+
+def ruleset_hash(domains: list[str], cidrs: list[str], cache: dict[str, list[tuple[str, int]]],
+                 stub: bool = False) -> str:
+    """Hash the compiler inputs. Cache expiry times don't affect the output and are left out."""
+    digest = hashlib.sha256(RULESET_FORMAT.encode())
+    digest.update(b"stub" if stub else b"static")
+    digest.update(IPTABLES_TEMPLATE.encode())
+    digest.update("\n".join(sorted(set(domains))).encode())
+    digest.update("\n".join(cidrs).encode())
+    for domain in sorted(set(domains)):
+        ips = sorted({ip for ip, _ in cache.get(domain, [])})
+        digest.update(f"\n{domain}={','.join(ips)}".encode())
+    return digest.hexdigest()[:16]
+
+
+def _numeric(entry: str) -> tuple[int, ...]:
+    # Sort addresses numerically so the output (and diffs between rulesets) read naturally
+    return tuple(int(part) for part in re.split(r"[./]", entry))
+
+
+def compile_ruleset(domains: list[str], cidrs: list[str], cache: dict[str, list[tuple[str, int]]],
+                    stub: bool = False) -> dict[str, str]:
+    """Compile the policy into the ruleset files ({file name: content})."""
+    entries = set(cidrs)
+    if not stub:
+        for domain in set(domains):
+            entries.update(ip for ip, _ in cache.get(domain, []))
+    ordered = sorted(entries, key=_numeric)
+
+    # The stub adds entries with a timeout, which needs a set created with timeout support
+    # (a timeout of 0 keeps the static entries permanent)
+    create = "hash:net timeout 0" if stub else "hash:net"
+    ipset_lines = [
+        f"create {IPSET_NAME} {create}",
+        f"create {IPSET_NAME}-new {create}",
+        f"flush {IPSET_NAME}-new",
+        *(f"add {IPSET_NAME}-new {entry}" for entry in ordered),
+        f"swap {IPSET_NAME}-new {IPSET_NAME}",
+        f"destroy {IPSET_NAME}-new",
+    ]
+    return {
+        "ipset.restore": "\n".join(ipset_lines) + "\n",
+        "iptables.rules": IPTABLES_TEMPLATE.format(ipset=IPSET_NAME),
+        "domains.txt": "".join(f"{domain}\n" for domain in sorted(set(domains))),
+        "cidrs.txt": "".join(f"{cidr}\n" for cidr in sorted(set(cidrs), key=_numeric)),
+        "resolver": "stub\n" if stub else "static\n",
+    }
+
+
+def _rulesets_in_use(run_dir: Path | None) -> set[str]:
+    """Names of the rulesets applied by instances with a runtime directory under run_dir."""
+    names = set()
+    for path in run_dir.glob("*/ruleset") if run_dir else []:
+        try:
+            names.add(path.read_text().strip())
+        except OSError:
+            continue
+    return names
+
+
+def _prune_rulesets(rulesets_dir: Path, keep: set[str]) -> None:
+    """Remove all but the KEEP_RULESETS most recently used rulesets, and any not in keep.
+
+    Temporary directories of compiles in progress (".<hash>.<pid>") are left alone.
+    Other runs prune concurrently, so entries may vanish at any point.
+    """
+    rulesets = []
+    for path in rulesets_dir.iterdir():
+        if path.name.startswith("."):
+            continue
+        try:
+            rulesets.append((path.stat().st_mtime, path))
+        except FileNotFoundError:
+            continue
+    rulesets.sort(reverse=True)
+    for _, path in rulesets[KEEP_RULESETS:]:
+        if path.name not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def build_ruleset(cache_dir: Path, domain_files: list[Path], resolve: bool = True, stub: bool = False,
+                  run_dir: Path | None = None) -> Path:
+    """Compile the ruleset for the current inputs, reusing it if it exists.
+
+    Domains missing from the DNS cache are resolved first unless resolve is
+    False or stub is True (see the module docstring). Old rulesets are pruned,
+    except those named in an instance runtime directory under run_dir: the
+    refresh and stub resolver of a running instance keep reading its files.
+    Returns the ruleset directory.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    domains = sorted({domain for path in domain_files for domain in load_domains(path, wildcards=stub)})
+    cidrs = _load_cidrs(cache_dir / GITHUB_CIDRS_FILE)
+    cache = {} if stub else read_dns_cache(cache_dir)
+
+    if resolve and not stub:
+        missing = [domain for domain in domains if domain not in cache]
+        resolved = resolve_domains(missing)
+        if resolved:
+            update_dns_cache(cache_dir, resolved)
+            cache = read_dns_cache(cache_dir)
+
+    rulesets_dir = cache_dir / RULESETS_DIR
+    ruleset_dir = rulesets_dir / ruleset_hash(domains, cidrs, cache, stub)
+    if ruleset_dir.is_dir():
+        os.utime(ruleset_dir)
+    else:
+        tmp_dir = rulesets_dir / f".{ruleset_dir.name}.{os.getpid()}"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        for name, content in compile_ruleset(domains, cidrs, cache, stub).items():
+            (tmp_dir / name).write_text(content)
+        tmp_dir.chmod(0o755)
+        try:
+            os.rename(tmp_dir, ruleset_dir)
+        except OSError:
+            # Compiled concurrently by another run - the contents are identical
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not ruleset_dir.is_dir():
+            raise OSError(f"Failed to write the firewall ruleset {ruleset_dir}")
+
+    _prune_rulesets(rulesets_dir, _rulesets_in_use(run_dir) | {ruleset_dir.name})
+    return ruleset_dir
@@ -0,0 +1,197 @@
+"""Garbage collection for ClankerCage's cache directory and Docker resources.
+
+Every session leaves things behind: a workspace directory with the rendered
+devcontainer files, a runtime directory, a stopped container labelled
+`clanker.instance` and a `claude-code-bashhistory-*` volume. `clankercage gc`
+removes them according to two policies:
+
+  age  - anything unused for longer than --max-age (workspaces by mtime, which
+         every run that uses a workspace bumps; containers by the time they
+         stopped; volumes by creation, once no container uses them)
+  LRU  - at most --keep workspaces are kept, least recently used go first
+
+Running containers, workspaces of idle pool members or existing containers,
+and volumes still attached to a container are never removed.
+"""
+
+import json
+import shutil
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+
+__all__ = [
+    "DEFAULT_KEEP_WORKSPACES",
+    "DEFAULT_MAX_AGE_DAYS",
+    "GcResult",
+    "collect",
+    "parse_docker_time",
+    "select_containers",
+    "select_runtime_dirs",
+    "select_volumes",
+    "select_workspaces",
+]
+
+DEFAULT_MAX_AGE_DAYS = 7
+DEFAULT_KEEP_WORKSPACES = 50
+
+# Leftovers younger than this may belong to a run that is still starting up
+STARTUP_GRACE = 3600
+
+BASH_HISTORY_VOLUME_PREFIX = "claude-code-bashhistory-"
+
+
+@dataclass
+class GcResult:
+    """What a gc run removed (or would remove, with dry_run)."""
+
+    workspaces: list[Path] = field(default_factory=list)
+    runtime_dirs: list[Path] = field(default_factory=list)
+    containers: list[str] = field(default_factory=list)
+    volumes: list[str] = field(default_factory=list)
+
+
+def parse_docker_time(value: str) -> float:
+    """Parse a Docker RFC 3339 timestamp (nanosecond precision) to epoch seconds. 0 if unset."""
+    if not value or value.startswith("0001-"):
+        return 0.0
+    value = value.replace("Z", "+00:00")
+    main, sep, rest = value.partition(".")
+    if sep:
+        # Trim fractional seconds to microseconds for fromisoformat
+        digits = len(rest) - len(rest.lstrip("0123456789"))
+        value = f"{main}.{rest[:min(digits, 6)]}{rest[digits:]}"
+    return datetime.fromisoformat(value).timestamp()
+
+
+def select_workspaces(cache_dir: Path, max_age: float, keep: int, in_use: set[Path], now: float | None = None) -> list[Path]:
+    """Pick workspace directories to remove by age and LRU.
+
+    Also picks temporary directories left behind by interrupted extractions.
+    """
+    now = now or time.time()
+    selected = [
+        p for p in cache_dir.glob(".workspace-*")
+        if p.is_dir() and now - p.stat().st_mtime > STARTUP_GRACE
+    ]
+    workspaces = sorted(
+        (p for p in cache_dir.glob("workspace-*") if p.is_dir()),
+        key=lambda p: p.stat().st_mtime,
+        reverse=True,
+    )
+    for rank, workspace in enumerate(workspaces):
+        if workspace in in_use:
+            continue
+        if rank >= keep or now - workspace.stat().st_mtime > max_age:
+            selected.append(workspace)
+    return selected
+
+
+def select_runtime_dirs(cache_dir: Path, instances: set[str], now: float | None = None) -> list[Path]:
+    """Pick instance runtime directories whose container no longer exists."""
+    now = now or time.time()
+    run_dir = cache_dir / "run"
+    if not run_dir.is_dir():
+        return []
+    return [
+        p for p in run_dir.iterdir()
+        if p.is_dir() and p.name not in instances and now - p.stat().st_mtime > STARTUP_GRACE
+    ]
+
+
+def select_containers(containers: list[dict], max_age: float, now: float | None = None) -> list[dict]:
+    """Pick stopped instance containers (docker inspect data) idle for longer than max_age."""
+    now = now or time.time()
+    selected = []
+    for container in containers:
+        state = container.get("State") or {}
+        if state.get("Running") or state.get("Restarting"):
+            continue
+        last_used = parse_docker_time(state.get("FinishedAt", "")) or parse_docker_time(container.get("Created", ""))
+        if now - last_used > max_age:
+            selected.append(container)
+    return selected
+
+
+def select_volumes(volumes: list[dict], max_age: float, now: float | None = None) -> list[dict]:
+    """Pick orphaned bash history volumes (docker volume inspect data) older than max_age."""
+    now = now or time.time()
+    return [
+        v for v in volumes
+        if v.get("Name", "").startswith(BASH_HISTORY_VOLUME_PREFIX)
+        and now - parse_docker_time(v.get("CreatedAt", "")) > max_age
+    ]
+
+
+def _labels(container: dict) -> dict:
+    return (container.get("Config") or {}).get("Labels") or {}
+
+
+def _docker_json(args: list[str]) -> list[dict] | None:
+    """Run a docker command that lists IDs, then inspect them. None if Docker isn't reachable."""
+    result = subprocess.run(["docker"] + args, capture_output=True, text=True)
+    if result.returncode != 0:
+        return None
+    ids = result.stdout.split()
+    if not ids:
+        return []
+    kind = "volume" if args[0] == "volume" else "container"
+    result = subprocess.run(["docker", kind, "inspect"] + ids, capture_output=True, text=True)
+    # Objects can disappear between listing and inspecting; inspect still prints the rest
+    return json.loads(result.stdout or "[]")
+
+
+def collect(cache_dir: Path, max_age: float, keep: int, keep_configs: set[Path], dry_run: bool = False,
+            log: Callable[[str], None] = print) -> GcResult:
+    """Remove unused workspaces, runtime dirs, instance containers and bash history volumes.
+
+    keep_configs are devcontainer.json paths still needed (e.g. by idle pool members).
+    """
+    result = GcResult()
+    verb = "Would remove" if dry_run else "Removing"
+
+    containers = _docker_json(["ps", "-aq", "--filter", "label=clanker.instance"])
+    docker_available = containers is not None
+    if not docker_available:
+        # Without the container list every runtime dir looks orphaned, including
+        # those of running instances (their exec socket, CPU reservation, ...)
+        log("Warning: Docker is not accessible, only cleaning workspaces (runtime directories are kept)")
+        containers = []
+
+    for container in select_containers(containers, max_age):
+        name = container.get("Name", "").lstrip("/") or container["Id"][:12]
+        log(f"{verb} container {name}")
+        result.containers.append(container["Id"])
+    if result.containers and not dry_run:
+        subprocess.run(["docker", "rm"] + result.containers, capture_output=True)
+
+    remaining = [c for c in containers if c["Id"] not in result.containers]
+    instances = {_labels(c).get("clanker.instance", "") for c in remaining}
+    in_use = {p.parent.parent for p in keep_configs}
+    for container in remaining:
+        config_file = _labels(container).get("devcontainer.config_file")
+        if config_file:
+            in_use.add(Path(config_file).parent.parent)
+
+    for path in select_workspaces(cache_dir, max_age, keep, in_use):
+        log(f"{verb} workspace {path}")
+        result.workspaces.append(path)
+    for path in select_runtime_dirs(cache_dir, instances) if docker_available else []:
+        log(f"{verb} runtime directory {path}")
+        result.runtime_dirs.append(path)
+    if not dry_run:
+        for path in result.workspaces + result.runtime_dirs:
+            shutil.rmtree(path, ignore_errors=True)
+
+    volumes = _docker_json(["volume", "ls", "-q", "--filter", "dangling=true",
+                            "--filter", f"name={BASH_HISTORY_VOLUME_PREFIX}"]) or []
+    for volume in select_volumes(volumes, max_age):
+        log(f"{verb} volume {volume['Name']}")
+        result.volumes.append(volume["Name"])
+    if result.volumes and not dry_run:
+        subprocess.run(["docker", "volume", "rm"] + result.volumes, capture_output=True)
+
+    return result
@@ -0,0 +1,129 @@
+"""Conditional, cached fetch of GitHub's IP ranges for the firewall allowlist.
+
+The firewall allows GitHub's web, api and git ranges from https://api.github.com/meta.
+Instead of every container fetching the (large) payload on start, the CLI keeps the
+aggregated IPv4 CIDR list in the host firewall cache dir:
+
+  github-meta.json   - {"etag", "checked", "cidrs"}, the state of the last fetch
+  github-cidrs.txt   - one CIDR per line, read by init-firewall.sh
+
+The list is revalidated with If-None-Match at most once per interval, and concurrent
+CLI runs serialize on a lock so only one of them talks to GitHub. When the fetch
+fails the cached list keeps being used.
+"""
+
+import fcntl
+import ipaddress
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+__all__ = [
+    "DEFAULT_REFRESH_INTERVAL",
+    "GitHubMetaError",
+    "META_URL",
+    "aggregate_cidrs",
+    "refresh_github_cidrs",
+]
+
+META_URL = "https://api.github.com/meta"
+DEFAULT_REFRESH_INTERVAL = 3600
+
+META_FILE = "github-meta.json"
+CIDRS_FILE = "github-cidrs.txt"
+
+
+class GitHubMetaError(Exception):
+    """Raised when the ranges can't be fetched and nothing is cached."""
+
+
+def aggregate_cidrs(meta: dict) -> list[str]:
+    """Collapse the web, api and git IPv4 ranges of a meta payload into a sorted CIDR list."""
+    missing = [key for key in ("web", "api", "git") if not isinstance(meta.get(key), list)]
+    if missing:
+        raise ValueError(f"GitHub meta response is missing {', '.join(missing)}")
+    networks = []
+    for cidr in meta["web"] + meta["api"] + meta["git"]:
+        try:
+            network = ipaddress.ip_network(cidr)
+        except ValueError:
+            continue
+        if network.version == 4:
+            networks.append(network)
+    return [str(n) for n in ipaddress.collapse_addresses(networks)]
+
+
+def _load(cache_dir: Path) -> dict | None:
+    try:
+        state = json.loads((cache_dir / META_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(state, dict) or not isinstance(state.get("cidrs"), list):
+        return None
+    return state
+
+
+def _write_atomic(path: Path, text: str) -> None:
+    tmp = path.with_name(f".{path.name}.{os.getpid()}")
+    tmp.write_text(text)
+    tmp.chmod(0o644)
+    os.replace(tmp, path)
+
+
+def _save(cache_dir: Path, state: dict) -> None:
+    # The CIDR list goes first: the meta file marks the refresh as done
+    _write_atomic(cache_dir / CIDRS_FILE, "".join(f"{cidr}\n" for cidr in state["cidrs"]))
+    _write_atomic(cache_dir / META_FILE, json.dumps(state))
+
+
+def _fetch(url: str, etag: str | None, timeout: float) -> tuple[list[str], str | None] | None:
+    """GET the meta payload. Returns (cidrs, etag), or None if unchanged (304)."""
+    headers = {"Accept": "application/vnd.github+json"}
+    if etag:
+        headers["If-None-Match"] = etag
+    request = urllib.request.Request(url, headers=headers)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            meta = json.loads(response.read())
+            return aggregate_cidrs(meta), response.headers.get("ETag")
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        raise
+
+
+def refresh_github_cidrs(cache_dir: Path, interval: float = DEFAULT_REFRESH_INTERVAL, url: str = META_URL,
+                         timeout: float = 5.0) -> list[str]:
+    """Return GitHub's aggregated IPv4 ranges, revalidating the cached list if it is due.
+
+    Raises GitHubMetaError if the fetch fails and there is no cached list to fall back to.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    state = _load(cache_dir)
+    if state and time.time() - state.get("checked", 0) < interval:
+        return state["cidrs"]
+
+    with open(cache_dir / "github-meta.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        # Another CLI run may have refreshed the list while we waited for the lock
+        state = _load(cache_dir)
+        if state and time.time() - state.get("checked", 0) < interval:
+            return state["cidrs"]
+
+        try:
+            fetched = _fetch(url, state.get("etag") if state else None, timeout)
+        except (OSError, ValueError) as e:
+            if state:
+                return state["cidrs"]
+            raise GitHubMetaError(f"Failed to fetch GitHub IP ranges: {e}") from e
+
+        if fetched is None:
+            state = {**state, "checked": time.time()}
+        else:
+            cidrs, etag = fetched
+            state = {"etag": etag, "checked": time.time(), "cidrs": cidrs}
+        _save(cache_dir, state)
+        return state["cidrs"]
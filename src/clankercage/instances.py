@@ -0,0 +1,213 @@
+"""Find instance containers for `clankercage ps` and `clankercage attach`.
+
+Containers outlive the terminal that started them, so a dropped session can
+be picked up again with a plain `docker exec` into the running container: no
+image pull, config rendering or `devcontainer up`. Instances are found by
+their `clanker.instance` label, over the Engine API when the Docker socket is
+reachable (one request to list and one per container to inspect) and with the
+docker CLI otherwise. The project comes from the devcontainer CLI's
+`devcontainer.local_folder` label or, for the native launcher, from the
+workspace bind mount.
+
+Listing goes through the instance registry (see registry.py): sync() brings
+it up to date with the Docker events since the last call, and only falls
+back to inspecting every container when those may be incomplete.
+"""
+
+import json
+import subprocess
+import time
+from pathlib import Path
+
+from clankercage import pool, registry
+from clankercage.engine import DockerEngine, EngineError
+from clankercage.gc import parse_docker_time
+from clankercage.registry import Instance
+
+__all__ = [
+    "Instance",
+    "InstanceNotFound",
+    "attach_command",
+    "find_instance",
+    "format_uptime",
+    "from_container",
+    "list_instances",
+    "sync",
+    "uptime",
+]
+
+DEFAULT_USER = "node"
+DEFAULT_WORKSPACE = "/workspace"
+
+
+class InstanceNotFound(LookupError):
+    """No (single) instance matches. The message is shown to the user."""
+
+
+def from_container(container: dict, idle: set[str] = frozenset()) -> Instance:
+    """Build an Instance from `docker container inspect` output."""
+    config = container.get("Config") or {}
+    labels = config.get("Labels") or {}
+    state = container.get("State") or {}
+    workspace_folder = config.get("WorkingDir") or DEFAULT_WORKSPACE
+    project = labels.get("devcontainer.local_folder") or labels.get("clanker.project") or next(
+        (m.get("Source", "") for m in container.get("Mounts") or [] if m.get("Destination") == workspace_folder), "")
+    instance_id = labels.get("clanker.instance", "")
+    return Instance(
+        instance_id=instance_id,
+        container_id=container["Id"],
+        project=project,
+        state=registry.state_from_docker(state.get("Status", "")),
+        started=parse_docker_time(state.get("StartedAt", "")),
+        user=config.get("User") or DEFAULT_USER,
+        workspace_folder=workspace_folder,
+        pooled=instance_id in idle,
+        reuse=labels.get("clanker.reuse") == "true",
+    )
+
+
+def _inspect_all(include_stopped: bool) -> list[dict] | None:
+    engine = DockerEngine.from_env(timeout=10)
+    if engine is not None:
+        try:
+            listed = engine.list_containers({"clanker.instance": None}, include_stopped)
+            return [c for c in (engine.inspect_container(entry["Id"]) for entry in listed) if c]
+        except EngineError:
+            pass
+        finally:
+            engine.close()
+    try:
+        result = subprocess.run(
+            ["docker", "ps", "-q", "--no-trunc", "--filter", "label=clanker.instance"] + (["-a"] if include_stopped else []),
+            capture_output=True, text=True,
+        )
+    except FileNotFoundError:
+        return None
+    if result.returncode != 0:
+        return None
+    if not result.stdout.split():
+        return []
+    result = subprocess.run(["docker", "container", "inspect"] + result.stdout.split(), capture_output=True, text=True)
+    # Containers can disappear between listing and inspecting; inspect still prints the rest
+    return json.loads(result.stdout or "[]")
+
+
+def _inspect_one(container_id: str) -> Instance | None:
+    engine = DockerEngine.from_env(timeout=10)
+    if engine is not None:
+        try:
+            container = engine.inspect_container(container_id)
+            return from_container(container) if container else None
+        except EngineError:
+            pass
+        finally:
+            engine.close()
+    result = subprocess.run(["docker", "container", "inspect", container_id], capture_output=True, text=True)
+    containers = json.loads(result.stdout or "[]")
+    return from_container(containers[0]) if containers else None
+
+
+def _events(since: float, until: float) -> list[dict] | None:
+    engine = DockerEngine.from_env(timeout=10)
+    if engine is not None:
+        try:
+            return engine.container_events(since, until, {"clanker.instance": None})
+        except EngineError:
+            pass
+        finally:
+            engine.close()
+    try:
+        result = subprocess.run(
+            ["docker", "events", "--since", f"{since:.9f}", "--until", f"{until:.9f}", "--filter", "type=container",
+             "--filter", "label=clanker.instance", "--format", "{{json .}}"],
+            capture_output=True, text=True,
+        )
+    except FileNotFoundError:
+        return None
+    if result.returncode != 0:
+        return None
+    return [json.loads(line) for line in result.stdout.splitlines() if line.strip()]
+
+
+def sync(reg: registry.Registry, now: float | None = None) -> bool:
+    """Bring the registry up to date with Docker. False if Docker isn't reachable."""
+    now = now or time.time()
+    if now - reg.checkpoint("scanned") < registry.FULL_SCAN_INTERVAL:
+        events = _events(reg.checkpoint("events"), now)
+        if events is None:
+            return False
+        if len(events) < registry.EVENT_BUFFER:
+            reg.apply_events(events, now, inspect=_inspect_one)
+            return True
+    containers = _inspect_all(include_stopped=True)
+    if containers is None:
+        return False
+    reg.apply_scan([from_container(c) for c in containers], now)
+    return True
+
+
+def list_instances(include_stopped: bool = False, include_removed: bool = False) -> list[Instance] | None:
+    """Instances from the registry, most recently started first. None if Docker isn't reachable."""
+    with registry.Registry() as reg:
+        if not sync(reg):
+            return None
+        if include_removed:
+            states = None
+        elif include_stopped:
+            states = registry.LIVE_STATES
+        else:
+            states = (registry.STARTING, registry.RUNNING, registry.PAUSED)
+        instances = reg.query(states=states)
+    idle = pool.idle_instances()
+    for instance in instances:
+        instance.pooled = instance.instance_id in idle
+    return instances
+
+
+def find_instance(instances: list[Instance], ref: str | None = None, project: Path | None = None) -> Instance:
+    """Pick the instance to attach to: by ID (or unique prefix), else the newest one running for project.
+
+    Idle pool members are never picked for a project; they belong to the next session.
+    """
+    if ref:
+        matches = [i for i in instances if i.instance_id.startswith(ref)]
+        if not matches:
+            raise InstanceNotFound(f"No instance matches {ref!r} (see `clankercage ps`)")
+        if len(matches) > 1:
+            ids = ", ".join(i.instance_id for i in matches)
+            raise InstanceNotFound(f"{ref!r} matches several instances: {ids}")
+        if not matches[0].running:
+            raise InstanceNotFound(f"Instance {matches[0].instance_id} is {matches[0].state}, not running")
+        return matches[0]
+    candidates = [i for i in instances if i.running and not i.pooled and i.project == str(project)]
+    if not candidates:
+        raise InstanceNotFound(f"No running instance for {project} (see `clankercage ps`)")
+    return candidates[0]
+
+
+def attach_command(instance: Instance, cmd: list[str], tty: bool) -> list[str]:
+    """The `docker exec` command line that runs cmd in an instance as its user, in the workspace."""
+    args = ["docker", "exec", "-i"] + (["-t"] if tty else [])
+    return args + ["-u", instance.user, "-w", instance.workspace_folder, instance.container_id] + cmd
+
+
+def format_uptime(seconds: float) -> str:
+    """Compact duration: 45s, 12m, 3h05m, 2d04h."""
+    seconds = int(max(seconds, 0))
+    if seconds < 60:
+        return f"{seconds}s"
+    minutes = seconds // 60
+    if minutes < 60:
+        return f"{minutes}m"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours}h{minutes:02d}m"
+    days, hours = divmod(hours, 24)
+    return f"{days}d{hours:02d}h"
+
+
+def uptime(instance: Instance, now: float | None = None) -> str:
+    """How long a running instance has been up, or its state."""
+    if not instance.running or not instance.started:
+        return instance.state
+    return format_uptime((now or time.time()) - instance.started)
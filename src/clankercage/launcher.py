@@ -0,0 +1,295 @@
+"""Native Docker launcher for devcontainer.json configs.
+
+Translates the subset of devcontainer.json that ClankerCage uses (image/build,
+runArgs, mounts, workspaceMount, containerEnv, remoteUser, updateRemoteUserUID,
+workspaceFolder, postStartCommand, waitFor) into direct `docker` create/start/exec calls, so
+starting or exec-ing into a session does not pay for `npx` package resolution
+and a Node startup. Containers carry the same id labels as ones created by
+the devcontainers CLI, so either path can find and reuse them.
+"""
+
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+
+from clankercage import timings
+
+__all__ = ["NativeLauncher", "get_devcontainer_id"]
+
+# Keeps the container alive without depending on the image's entrypoint (same as the devcontainers CLI)
+KEEPALIVE_SCRIPT = "echo Container started\ntrap \"exit 0\" 15\nwhile sleep 1 & wait $!; do :; done"
+
+_VARIABLE_PATTERN = re.compile(r"\$\{([^}]+)\}")
+
+# Derived image giving remoteUser the host user's uid/gid (the devcontainers CLI's
+# updateRemoteUserUID step). Files the user owns in the image are handed over too,
+# so its home and the mount points it writes to (workspace, volumes) stay writable.
+# A uid taken by another user is left alone; a taken gid keeps the old group.
+UPDATE_UID_DOCKERFILE = """\
+ARG BASE_IMAGE
+FROM $BASE_IMAGE
+USER root
+ARG REMOTE_USER
+ARG NEW_UID
+ARG NEW_GID
+RUN eval "$(sed -n "s/^${REMOTE_USER}:[^:]*:\\([^:]*\\):\\([^:]*\\):.*/OLD_UID=\\1; OLD_GID=\\2/p" /etc/passwd)"; \\
+    EXISTING_USER=$(awk -F: -v uid="$NEW_UID" '$3 == uid {print $1}' /etc/passwd); \\
+    EXISTING_GROUP=$(awk -F: -v gid="$NEW_GID" '$3 == gid {print $1}' /etc/group); \\
+    if [ -z "$OLD_UID" ]; then \\
+        echo "Remote user $REMOTE_USER not found"; \\
+    elif [ "$OLD_UID" != "$NEW_UID" ] && [ -n "$EXISTING_USER" ]; then \\
+        echo "UID $NEW_UID is taken by $EXISTING_USER"; \\
+    else \\
+        if [ "$OLD_GID" != "$NEW_GID" ] && [ -n "$EXISTING_GROUP" ]; then NEW_GID=$OLD_GID; fi; \\
+        sed -i "s/^\\(${REMOTE_USER}:[^:]*:\\)[^:]*:[^:]*/\\1${NEW_UID}:${NEW_GID}/" /etc/passwd; \\
+        sed -i "s/^\\([^:]*:[^:]*:\\)${OLD_GID}:/\\1${NEW_GID}:/" /etc/group; \\
+        [ "$OLD_UID" = "$NEW_UID" ] || find / -xdev -user "$OLD_UID" -exec chown -h "$NEW_UID" {} +; \\
+        [ "$OLD_GID" = "$NEW_GID" ] || find / -xdev -group "$OLD_GID" -exec chgrp -h "$NEW_GID" {} +; \\
+    fi
+ARG IMAGE_USER
+USER $IMAGE_USER
+"""
+
+
+def get_devcontainer_id(id_labels: dict[str, str]) -> str:
+    """Compute ${devcontainerId} from the id labels, following the devcontainers CLI scheme."""
+    labels = json.dumps({k: id_labels[k] for k in sorted(id_labels)}, separators=(",", ":"))
+    value = int(hashlib.sha256(labels.encode()).hexdigest(), 16)
+    digits = "0123456789abcdefghijklmnopqrstuv"
+    encoded = ""
+    while value:
+        value, remainder = divmod(value, 32)
+        encoded = digits[remainder] + encoded
+    return encoded.rjust(52, "0")
+
+
+class NativeLauncher:
+    """Create, start and exec into a devcontainer using the docker CLI directly."""
+
+    def __init__(self, config: dict, config_dir: Path, project_dir: Path, id_labels: dict[str, str] | None = None,
+                 local_env: dict[str, str] | None = None):
+        self.config_dir = config_dir
+        self.project_dir = project_dir
+        # ${localEnv:...} values that take precedence over os.environ (per-instance settings)
+        self.local_env = local_env or {}
+        self.id_labels = id_labels or {
+            "devcontainer.local_folder": str(project_dir),
+            "devcontainer.config_file": str(config_dir / "devcontainer.json"),
+        }
+        self.workspace_folder = config.get("workspaceFolder", f"/workspaces/{project_dir.name}")
+        self.config = self._substitute(config)
+        self.remote_user = self.config.get("remoteUser")
+
+    @classmethod
+    def from_config_file(cls, config_path: Path, project_dir: Path, id_labels: dict[str, str] | None = None,
+                         local_env: dict[str, str] | None = None) -> "NativeLauncher":
+        """Create a launcher from a devcontainer.json on disk."""
+        return cls(json.loads(config_path.read_text()), config_path.parent, project_dir, id_labels, local_env)
+
+    def _substitute(self, value):
+        """Resolve ${localEnv:...}, ${devcontainerId} and workspace variables recursively."""
+        if isinstance(value, dict):
+            return {k: self._substitute(v) for k, v in value.items()}
+        if isinstance(value, list):
+            return [self._substitute(v) for v in value]
+        if not isinstance(value, str):
+            return value
+
+        def replace(match: re.Match) -> str:
+            name, _, arg = match.group(1).partition(":")
+            if name == "localEnv":
+                var, _, default = arg.partition(":")
+                return self.local_env.get(var, os.environ.get(var, default))
+            if name == "localWorkspaceFolder":
+                return str(self.project_dir)
+            if name == "localWorkspaceFolderBasename":
+                return self.project_dir.name
+            if name == "containerWorkspaceFolder":
+                return self.workspace_folder
+            if name == "devcontainerId":
+                return get_devcontainer_id(self.id_labels)
+            return match.group(0)
+
+        return _VARIABLE_PATTERN.sub(replace, value)
+
+    def _label_filters(self) -> list[str]:
+        filters = []
+        for key, value in self.id_labels.items():
+            filters.extend(["--filter", f"label={key}={value}"])
+        return filters
+
+    def find_container(self) -> tuple[str, str] | None:
+        """Find the container for these id labels. Returns (container_id, state) or None."""
+        result = subprocess.run(
+            ["docker", "ps", "-a", *self._label_filters(), "--format", "{{.ID}}|{{.State}}"],
+            capture_output=True,
+            text=True
+        )
+        if result.returncode != 0 or not result.stdout.strip():
+            return None
+        container_id, _, state = result.stdout.splitlines()[0].partition("|")
+        return container_id, state
+
+    def build_image(self, quiet: bool = False) -> str:
+        """Build the image for a `build` config, skipping the build when the context is unchanged."""
+        build = self.config["build"]
+        context = (self.config_dir / build.get("context", ".")).resolve()
+        dockerfile = (self.config_dir / build.get("dockerfile", "Dockerfile")).resolve()
+
+        digest = hashlib.sha256(dockerfile.read_bytes())
+        for f in sorted(context.rglob("*")):
+            # The rendered config differs per instance but never affects the image
+            if f.is_file() and f.name != "devcontainer.json":
+                digest.update(str(f.relative_to(context)).encode())
+                digest.update(f.read_bytes())
+        image = f"clankercage-local:{digest.hexdigest()[:12]}"
+
+        if subprocess.run(["docker", "image", "inspect", image], capture_output=True).returncode != 0:
+            build_cmd = ["docker", "build", "-t", image, "-f", str(dockerfile)]
+            for key, value in build.get("args", {}).items():
+                build_cmd.extend(["--build-arg", f"{key}={value}"])
+            subprocess.run(build_cmd + [str(context)], check=True, capture_output=quiet)
+        return image
+
+    def remap_user_image(self, image: str, quiet: bool = False) -> str:
+        """Derive an image whose remoteUser has the host user's uid/gid, like updateRemoteUserUID.
+
+        Only applies on Linux, where bind mounts keep host ownership; returns the
+        image unchanged elsewhere and for root. The result is tagged by the base
+        image ID and the ids, so the check and the build happen once per image
+        (an image whose ids already match is just tagged).
+        """
+        if (not sys.platform.startswith("linux") or not self.config.get("updateRemoteUserUID", True)
+                or not self.remote_user or self.remote_user == "root" or os.getuid() == 0):
+            return image
+        uid, gid = os.getuid(), os.getgid()
+        result = subprocess.run(
+            ["docker", "image", "inspect", "--format", "{{.Id}}|{{.Config.User}}", image],
+            capture_output=True, text=True, check=True
+        )
+        image_id, _, image_user = result.stdout.strip().partition("|")
+        tag = hashlib.sha256(f"{image_id}|{self.remote_user}|{uid}|{gid}".encode()).hexdigest()[:12]
+        remapped = f"clankercage-uid:{tag}"
+        if subprocess.run(["docker", "image", "inspect", remapped], capture_output=True).returncode == 0:
+            return remapped
+
+        ids = subprocess.run(
+            ["docker", "run", "--rm", "--user", "root", "--entrypoint", "id", image, self.remote_user],
+            capture_output=True, text=True
+        )
+        if ids.returncode == 0 and f"uid={uid}(" in ids.stdout and f"gid={gid}(" in ids.stdout:
+            subprocess.run(["docker", "tag", image, remapped], check=True, capture_output=True)
+            return remapped
+
+        build_args = {"BASE_IMAGE": image, "REMOTE_USER": self.remote_user, "NEW_UID": str(uid),
+                      "NEW_GID": str(gid), "IMAGE_USER": image_user or "root"}
+        build_cmd = ["docker", "build", "-t", remapped]
+        for key, value in build_args.items():
+            build_cmd.extend(["--build-arg", f"{key}={value}"])
+        subprocess.run(build_cmd + ["-"], input=UPDATE_UID_DOCKERFILE, text=True, check=True, capture_output=quiet)
+        return remapped
+
+    def create_args(self, image: str) -> list[str]:
+        """Render the `docker create` command line for the config."""
+        args = ["docker", "create"]
+        for key, value in self.id_labels.items():
+            args.extend(["--label", f"{key}={value}"])
+        for key, value in self.config.get("containerEnv", {}).items():
+            args.extend(["-e", f"{key}={value}"])
+        workspace_mount = self.config.get(
+            "workspaceMount", f"type=bind,source={self.project_dir},target={self.workspace_folder}"
+        )
+        args.extend(["--mount", workspace_mount])
+        for mount in self.config.get("mounts", []):
+            args.extend(["--mount", mount])
+        args.extend(self.config.get("runArgs", []))
+        args.extend(["--entrypoint", "/bin/sh", image, "-c", KEEPALIVE_SCRIPT])
+        return args
+
+    def _run_lifecycle_command(self, container_id: str, name: str, quiet: bool) -> None:
+        command = self.config.get(name)
+        if not command:
+            return
+        cmd = command if isinstance(command, list) else ["/bin/sh", "-c", command]
+        exec_args = ["docker", "exec"]
+        if self.remote_user:
+            exec_args.extend(["-u", self.remote_user])
+        exec_args.extend(["-w", self.workspace_folder])
+
+        if self.config.get("waitFor") == name:
+            subprocess.run(exec_args + [container_id] + cmd, check=True, capture_output=quiet)
+        else:
+            # Not waited for - let it finish in the background like the devcontainers CLI does
+            subprocess.run(exec_args + ["-d", container_id] + cmd, check=True, capture_output=True)
+
+    def up(self, quiet: bool = False) -> str:
+        """Create or start the container and run postStartCommand. Returns the container ID.
+
+        A running container is reused as-is; a stopped one is started again.
+        """
+        existing = self.find_container()
+        if existing and existing[1] == "running":
+            return existing[0]
+
+        if existing:
+            container_id = existing[0]
+        else:
+            if "build" in self.config:
+                with timings.span("container.build"):
+                    image = self.build_image(quiet)
+            else:
+                image = self.config["image"]
+            with timings.span("container.remap_uid"):
+                image = self.remap_user_image(image, quiet)
+            with timings.span("container.create"):
+                result = subprocess.run(self.create_args(image), check=True, capture_output=True, text=True)
+            container_id = result.stdout.strip()
+
+        with timings.span("container.start"):
+            subprocess.run(["docker", "start", container_id], check=True, capture_output=True)
+        with timings.span("container.postStartCommand"):
+            self._run_lifecycle_command(container_id, "postStartCommand", quiet)
+        return container_id
+
+    def exec_command(self, cmd: list[str], tty: bool | None = None, env: dict[str, str] | None = None,
+                     cwd: str | None = None, container_id: str | None = None) -> list[str]:
+        """Render a `docker exec` command line running cmd as remoteUser in the workspace (or cwd).
+
+        The container is looked up by its id labels unless container_id is given.
+        """
+        if container_id is None:
+            found = self.find_container()
+            if found is None:
+                raise RuntimeError("Container not found - was it started?")
+            container_id = found[0]
+        if tty is None:
+            tty = sys.stdin.isatty() and sys.stdout.isatty()
+
+        args = ["docker", "exec", "-i"]
+        if tty:
+            args.append("-t")
+        if self.remote_user:
+            args.extend(["-u", self.remote_user])
+        for key, value in (env or {}).items():
+            args.extend(["-e", f"{key}={value}"])
+        args.extend(["-w", cwd or self.workspace_folder, container_id])
+        return args + cmd
+
+    def exec(self, cmd: list[str], timeout: float | None = None) -> subprocess.CompletedProcess:
+        """Run a command in the container and capture its output."""
+        return subprocess.run(
+            self.exec_command(cmd, tty=False),
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+
+    def down(self) -> None:
+        """Remove the container."""
+        found = self.find_container()
+        if found:
+            subprocess.run(["docker", "rm", "-f", found[0]], capture_output=True)
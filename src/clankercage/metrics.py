@@ -0,0 +1,195 @@
+"""Session metrics for the bundled Prometheus/Grafana stack (see grafana/).
+
+`clankercage metrics` runs next to the sessions and periodically exports what
+they report as OTLP/HTTP metrics to the collector in grafana/ (default
+http://localhost:4318):
+
+  clankercage.firewall.denied   packets rejected by the container firewall, per
+                                destination address, protocol, port and (when
+                                known) domain - sampled by a rate-limited NFLOG
+                                rule and counted by deny-collector.py into
+                                denied.json in the instance runtime dir
+  clankercage.container.*       CPU, memory, pids, block I/O and PSI stall time
+                                of each instance container, read from its
+                                cgroup (see cgroups)
+
+Every instance is exported as its own resource (clanker.instance, and
+clanker.project when the container is running here), with cumulative
+counters. Snapshots that haven't been updated for STALE_AFTER seconds belong
+to stopped containers and are skipped.
+"""
+
+import json
+import time
+import urllib.request
+from pathlib import Path
+
+from clankercage import cgroups
+
+__all__ = [
+    "DEFAULT_INTERVAL",
+    "DEFAULT_OTLP_ENDPOINT",
+    "DENIED_FILE",
+    "collect",
+    "container_metrics",
+    "denied_metrics",
+    "export",
+    "read_snapshot",
+]
+
+DEFAULT_OTLP_ENDPOINT = "http://localhost:4318"
+DEFAULT_INTERVAL = 15.0
+DENIED_FILE = "denied.json"
+# deny-collector.py rewrites its snapshot at least every minute while it runs
+STALE_AFTER = 300
+
+
+def _attributes(values: dict) -> list[dict]:
+    return [
+        {"key": k, "value": {"intValue": str(v)} if isinstance(v, int) else {"stringValue": str(v)}}
+        for k, v in values.items()
+    ]
+
+
+def read_snapshot(path: Path, now: float | None = None) -> dict | None:
+    """Read a collector snapshot, or None if it is missing, unreadable or stale."""
+    now = now or time.time()
+    try:
+        snapshot = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    if not isinstance(snapshot, dict) or now - snapshot.get("updated", 0) > STALE_AFTER:
+        return None
+    return snapshot
+
+
+def _point(value: int | float, attributes: dict | None = None, start: str | None = None, end: str = "") -> dict:
+    point = {"attributes": _attributes(attributes or {}), "timeUnixNano": end}
+    if start is not None:
+        point["startTimeUnixNano"] = start
+    if isinstance(value, int):
+        point["asInt"] = str(value)
+    else:
+        point["asDouble"] = value
+    return point
+
+
+def _sum(name: str, unit: str, description: str, points: list[dict]) -> dict:
+    return {"name": name, "unit": unit, "description": description,
+            "sum": {"dataPoints": points, "aggregationTemporality": 2, "isMonotonic": True}}
+
+
+def _gauge(name: str, unit: str, description: str, points: list[dict]) -> dict:
+    return {"name": name, "unit": unit, "description": description, "gauge": {"dataPoints": points}}
+
+
+def denied_metrics(snapshot: dict) -> list[dict]:
+    """Encode a deny-collector snapshot as OTLP metrics."""
+    start = str(int(snapshot["started"] * 1e9))
+    end = str(int(snapshot["updated"] * 1e9))
+    points = [
+        _point(d["count"], {
+            "destination.address": d["ip"],
+            "destination.port": d["port"],
+            "network.transport": d["proto"],
+            "destination.domain": d.get("domain") or "unknown",
+        }, start, end)
+        for d in snapshot.get("destinations", [])
+    ]
+    if snapshot.get("overflow"):
+        # Destinations beyond the collector's limit, counted together
+        points.append(_point(snapshot["overflow"], {
+            "destination.address": "other",
+            "destination.port": 0,
+            "network.transport": "other",
+            "destination.domain": "unknown",
+        }, start, end))
+    return [_sum("clankercage.firewall.denied", "{packet}", "Packets rejected by the container firewall (sampled)", points)]
+
+
+def container_metrics(stats: dict, started: float, now: float) -> list[dict]:
+    """Encode a cgroup sample (see cgroups.read_stats) as OTLP metrics."""
+    start, end = str(int(started * 1e9)), str(int(now * 1e9))
+    prefix = "clankercage.container"
+    metrics = [
+        _sum(f"{prefix}.cpu.time", "s", "CPU time consumed", [
+            _point(stats["cpu_user_usec"] / 1e6, {"cpu.mode": "user"}, start, end),
+            _point(stats["cpu_system_usec"] / 1e6, {"cpu.mode": "system"}, start, end),
+        ]),
+        _sum(f"{prefix}.cpu.throttled_time", "s", "Time the CPU quota held the container back",
+             [_point(stats["cpu_throttled_usec"] / 1e6, None, start, end)]),
+        _sum(f"{prefix}.memory.oom_kills", "{process}", "Processes killed for exceeding the memory limit",
+             [_point(stats["oom_kills"], None, start, end)]),
+        _sum(f"{prefix}.io", "By", "Block I/O", [
+            _point(stats["io"].get("rbytes", 0), {"disk.io.direction": "read"}, start, end),
+            _point(stats["io"].get("wbytes", 0), {"disk.io.direction": "write"}, start, end),
+        ]),
+        _sum(f"{prefix}.io.operations", "{operation}", "Block I/O operations", [
+            _point(stats["io"].get("rios", 0), {"disk.io.direction": "read"}, start, end),
+            _point(stats["io"].get("wios", 0), {"disk.io.direction": "write"}, start, end),
+        ]),
+        _sum(f"{prefix}.pressure.stall_time", "s", "Time tasks were stalled on a resource (PSI)", [
+            _point(total / 1e6, {"resource": resource, "level": level}, start, end)
+            for resource, levels in stats["pressure"].items()
+            for level, total in levels.items()
+        ]),
+    ]
+    # Usage and limits are only reported when the kernel has them ("max" means no limit)
+    for name, unit, description, key in (
+        (f"{prefix}.memory.usage", "By", "Memory in use", "memory_current"),
+        (f"{prefix}.memory.limit", "By", "Memory limit", "memory_max"),
+        (f"{prefix}.pids.count", "{process}", "Processes and threads", "pids_current"),
+        (f"{prefix}.pids.limit", "{process}", "Process limit", "pids_max"),
+    ):
+        if stats.get(key) is not None:
+            metrics.append(_gauge(name, unit, description, [_point(stats[key], end=end)]))
+    return metrics
+
+
+def collect(run_dir: Path, instances: list[cgroups.Instance] | None = None, now: float | None = None) -> dict:
+    """Build an OTLP ExportMetricsServiceRequest for all running instances.
+
+    Combines the denied-egress snapshots in the runtime dirs with cgroup samples
+    of the given instance containers.
+    """
+    now = now or time.time()
+    resources: dict[str, dict] = {}
+
+    def resource(instance: str) -> dict:
+        if instance not in resources:
+            resources[instance] = {"attributes": {"service.name": "clankercage", "clanker.instance": instance},
+                                   "metrics": []}
+        return resources[instance]
+
+    for runtime_dir in sorted(run_dir.iterdir()) if run_dir.is_dir() else []:
+        snapshot = read_snapshot(runtime_dir / DENIED_FILE, now)
+        if snapshot is not None:
+            resource(runtime_dir.name)["metrics"].extend(denied_metrics(snapshot))
+    for instance in instances or []:
+        stats = cgroups.read_stats(instance.cgroup) if instance.cgroup else None
+        if stats is None:
+            continue
+        entry = resource(instance.instance)
+        if instance.project:
+            entry["attributes"]["clanker.project"] = instance.project
+        entry["metrics"].extend(container_metrics(stats, instance.started, now))
+
+    return {"resourceMetrics": [
+        {
+            "resource": {"attributes": _attributes(entry["attributes"])},
+            "scopeMetrics": [{"scope": {"name": "clankercage"}, "metrics": entry["metrics"]}],
+        }
+        for _, entry in sorted(resources.items())
+    ]}
+
+
+def export(endpoint: str, payload: dict) -> None:
+    """POST an OTLP/JSON metrics request to a collector."""
+    request = urllib.request.Request(
+        endpoint.rstrip("/") + "/v1/metrics",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=5):
+        pass
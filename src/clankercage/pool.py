@@ -0,0 +1,193 @@
+"""Pre-warmed container pool for instant session start.
+
+Pool members are containers that already ran `devcontainer up` (firewall,
+git/gpg setup) and are waiting to be claimed. Docker cannot add a bind mount
+to an existing container, so each pool belongs to one project directory and
+members are only handed out to runs whose config fingerprint matches.
+
+Member state lives in marker files under ~/.cache/clankercage/pool/<project>/:
+  <instance_id>.idle      - booted and waiting (JSON: fingerprint, config, created)
+  <instance_id>.claimed   - taken by a session (removed right after the claim)
+  <instance_id>.reaping   - being removed after its idle TTL expired
+
+Claims are a single os.rename() of the .idle file, which is atomic, so any
+number of concurrent CLI processes can race for members safely.
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import subprocess
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+__all__ = [
+    "DEFAULT_POOL_SIZE",
+    "DEFAULT_POOL_TTL",
+    "claim_member",
+    "fill_lock",
+    "get_pool_dir",
+    "get_pool_root",
+    "has_idle_members",
+    "idle_config_paths",
+    "idle_count",
+    "idle_instances",
+    "reap_members",
+    "register_member",
+    "remove_container",
+]
+
+DEFAULT_POOL_SIZE = 2
+DEFAULT_POOL_TTL = 3600
+
+
+def get_pool_root() -> Path:
+    """Get the directory holding the state of every project's pool."""
+    return Path.home() / ".cache" / "clankercage" / "pool"
+
+
+def get_pool_dir(project_dir: Path) -> Path:
+    """Get the pool state directory for a project."""
+    project_hash = hashlib.sha256(str(project_dir).encode()).hexdigest()[:12]
+    return get_pool_root() / project_hash
+
+
+def _read_member(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def register_member(pool_dir: Path, instance_id: str, fingerprint: str, config_path: Path) -> None:
+    """Mark a booted container as idle and available for claiming."""
+    pool_dir.mkdir(parents=True, exist_ok=True)
+    member = {"fingerprint": fingerprint, "config": str(config_path), "created": time.time()}
+    # Write then rename so claimers never see a partially written file
+    tmp = pool_dir / f"{instance_id}.tmp"
+    tmp.write_text(json.dumps(member))
+    os.rename(tmp, pool_dir / f"{instance_id}.idle")
+
+
+def has_idle_members(pool_dir: Path) -> bool:
+    """Cheap check (no Docker calls) whether a pool has any idle members at all."""
+    try:
+        return any(name.endswith(".idle") for name in os.listdir(pool_dir))
+    except FileNotFoundError:
+        return False
+
+
+def _idle_members(pool_dir: Path) -> list[tuple[str, dict]]:
+    """Idle members sorted oldest first."""
+    members = []
+    for path in pool_dir.glob("*.idle"):
+        member = _read_member(path)
+        if member is not None:
+            members.append((path.stem, member))
+    return sorted(members, key=lambda m: m[1].get("created", 0))
+
+
+def idle_count(pool_dir: Path, fingerprint: str) -> int:
+    """Count idle members matching a config fingerprint."""
+    return sum(1 for _, m in _idle_members(pool_dir) if m.get("fingerprint") == fingerprint)
+
+
+def idle_config_paths() -> set[Path]:
+    """Configs of idle members across all pools (their workspaces must be kept)."""
+    paths = set()
+    for path in get_pool_root().glob("*/*.idle"):
+        member = _read_member(path)
+        if member and member.get("config"):
+            paths.add(Path(member["config"]))
+    return paths
+
+
+def idle_instances() -> set[str]:
+    """Instance IDs of idle members across all pools."""
+    return {path.stem for path in get_pool_root().glob("*/*.idle")}
+
+
+def claim_member(pool_dir: Path, fingerprint: str) -> tuple[str, Path] | None:
+    """Atomically claim an idle member with a matching fingerprint.
+
+    Returns (instance_id, config_path), or None if no member is available.
+    """
+    for instance_id, member in _idle_members(pool_dir):
+        if member.get("fingerprint") != fingerprint:
+            continue
+        claimed = pool_dir / f"{instance_id}.claimed"
+        try:
+            os.rename(pool_dir / f"{instance_id}.idle", claimed)
+        except FileNotFoundError:
+            # Another process won the race for this member
+            continue
+        claimed.unlink(missing_ok=True)
+        if not _container_running(instance_id):
+            remove_container(instance_id)
+            continue
+        return instance_id, Path(member["config"])
+    return None
+
+
+def reap_members(pool_dir: Path, fingerprint: str, ttl: float) -> list[str]:
+    """Take idle members that outlived the TTL or have a stale fingerprint out of the pool.
+
+    Returns the instance IDs whose containers should be removed.
+    """
+    now = time.time()
+    reaped = []
+    for instance_id, member in _idle_members(pool_dir):
+        if member.get("fingerprint") == fingerprint and now - member.get("created", 0) < ttl:
+            continue
+        reaping = pool_dir / f"{instance_id}.reaping"
+        try:
+            os.rename(pool_dir / f"{instance_id}.idle", reaping)
+        except FileNotFoundError:
+            continue
+        reaping.unlink(missing_ok=True)
+        reaped.append(instance_id)
+    return reaped
+
+
+@contextmanager
+def fill_lock(pool_dir: Path) -> Iterator[bool]:
+    """Non-blocking exclusive lock for refilling a pool.
+
+    Yields True if this process holds the lock, False if another filler is
+    already running (in which case the caller should skip refilling).
+    """
+    pool_dir.mkdir(parents=True, exist_ok=True)
+    with open(pool_dir / ".fill.lock", "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _container_running(instance_id: str) -> bool:
+    result = subprocess.run(
+        ["docker", "ps", "-q", "--filter", f"label=clanker.instance={instance_id}"],
+        capture_output=True,
+        text=True
+    )
+    return result.returncode == 0 and bool(result.stdout.strip())
+
+
+def remove_container(instance_id: str) -> None:
+    """Remove the container for an instance, running or not."""
+    result = subprocess.run(
+        ["docker", "ps", "-aq", "--filter", f"label=clanker.instance={instance_id}"],
+        capture_output=True,
+        text=True
+    )
+    container_ids = result.stdout.split()
+    if container_ids:
+        subprocess.run(["docker", "rm", "-f"] + container_ids, capture_output=True)
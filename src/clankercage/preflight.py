@@ -0,0 +1,66 @@
+"""Run independent pre-flight steps concurrently as a small dependency graph.
+
+Each task is a callable that receives the results of the tasks it depends on.
+Tasks start as soon as their dependencies finish, on a thread pool, so the
+Docker probe, image pull, config generation and file extraction overlap.
+
+Results are returned by name and tasks are expected not to print (except for
+progress that only one task produces, like a pull), so output ordering stays
+deterministic. If tasks fail, no new tasks are started and the error of the
+first failed task in declaration order is raised.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable
+
+from clankercage import timings
+
+__all__ = ["Task", "run_tasks"]
+
+# (dependency names, callable taking {dependency name: result})
+Task = tuple[tuple[str, ...], Callable[[dict[str, Any]], Any]]
+
+
+def _run(name: str, fn: Callable[[dict[str, Any]], Any], inputs: dict[str, Any], context: list[int]) -> Any:
+    with timings.adopt(context), timings.span(f"preflight.{name}"):
+        return fn(inputs)
+
+
+def run_tasks(tasks: dict[str, Task], max_workers: int = 4) -> dict[str, Any]:
+    """Run tasks respecting dependencies and return {name: result}."""
+    for name, (deps, _) in tasks.items():
+        unknown = [d for d in deps if d not in tasks]
+        if unknown:
+            raise ValueError(f"Task {name!r} depends on unknown task(s): {', '.join(unknown)}")
+
+    results: dict[str, Any] = {}
+    errors: dict[str, BaseException] = {}
+    pending = dict(tasks)
+    running: dict[Future, str] = {}
+    context = timings.context()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            if not errors:
+                for name in list(pending):
+                    deps, fn = pending[name]
+                    if all(d in results for d in deps):
+                        del pending[name]
+                        inputs = {d: results[d] for d in deps}
+                        running[executor.submit(_run, name, fn, inputs, context)] = name
+            if not running:
+                if pending and not errors:
+                    raise ValueError(f"Dependency cycle between tasks: {', '.join(pending)}")
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except BaseException as e:
+                    errors[name] = e
+
+    if errors:
+        first = next(name for name in tasks if name in errors)
+        raise errors[first]
+    return results
@@ -0,0 +1,320 @@
+"""Registry of instances in a SQLite database (~/.cache/clankercage/instances.db).
+
+Every instance the CLI starts gets a row, written in its own transaction at
+each lifecycle step: when the instance is picked (project, config hash,
+workspace, flags), when its container is up and when it fails or is removed.
+Containers also change behind the CLI's back (a session exits, `docker rm`,
+a reboot), so the registry is reconciled lazily from Docker's event stream
+before it is read: only the events since the last reconciliation are fetched,
+which takes a single request instead of inspecting every container. A full
+scan seeds the registry (including containers started by older versions) and
+runs again when the events may be incomplete: after FULL_SCAN_INTERVAL, or
+when as many events came back as the daemon keeps.
+
+Rows are kept after their container is removed, as history; gc prunes them.
+Lookups by project and state go through indexes, so `ps` and `attach` stay
+fast with hundreds of past instances.
+
+The database is in WAL mode with a busy timeout, so concurrent CLI processes
+(batch runs, pool refills) can read and write it at the same time.
+"""
+
+import json
+import sqlite3
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+__all__ = [
+    "FULL_SCAN_INTERVAL",
+    "Instance",
+    "Registry",
+    "get_registry_path",
+    "record",
+    "state_from_docker",
+]
+
+SCHEMA_VERSION = 1
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS instances (
+    instance_id TEXT PRIMARY KEY,
+    container_id TEXT NOT NULL DEFAULT '',
+    project TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL,
+    started REAL NOT NULL DEFAULT 0,
+    user TEXT NOT NULL DEFAULT 'node',
+    workspace_folder TEXT NOT NULL DEFAULT '/workspace',
+    reuse INTEGER NOT NULL DEFAULT 0,
+    config_hash TEXT NOT NULL DEFAULT '',
+    workspace TEXT NOT NULL DEFAULT '',
+    flags TEXT NOT NULL DEFAULT '[]',
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS instances_project_state ON instances (project, state);
+CREATE INDEX IF NOT EXISTS instances_state_updated ON instances (state, updated);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL NOT NULL);
+"""
+
+# Container states; "starting" and "failed" are only set by the CLI
+STARTING, RUNNING, PAUSED, STOPPED, REMOVED, FAILED = "starting", "running", "paused", "stopped", "removed", "failed"
+LIVE_STATES = (STARTING, RUNNING, PAUSED, STOPPED)
+
+# Seconds between full scans (the daemon only keeps its most recent events)
+FULL_SCAN_INTERVAL = 3600
+# A reconciliation that returns this many events may have missed some
+EVENT_BUFFER = 256
+# Rows still starting this recently are not marked removed for lack of a container
+STARTING_GRACE = 600
+
+EVENT_STATES = {
+    "create": STOPPED,
+    "start": RUNNING,
+    "restart": RUNNING,
+    "unpause": RUNNING,
+    "pause": PAUSED,
+    "die": STOPPED,
+    "stop": STOPPED,
+    "destroy": REMOVED,
+}
+
+COLUMNS = ("instance_id", "container_id", "project", "state", "started", "user", "workspace_folder", "reuse",
+           "config_hash", "workspace", "flags", "created", "updated")
+
+
+def get_registry_path() -> Path:
+    """Get the path of the registry database."""
+    return Path.home() / ".cache" / "clankercage" / "instances.db"
+
+
+def record(instance_id: str, path: Path | None = None, **fields) -> None:
+    """Record a lifecycle step. The registry is bookkeeping, so a failure only warns."""
+    try:
+        with Registry(path) as registry:
+            registry.record(instance_id, **fields)
+    except sqlite3.Error as e:
+        print(f"Warning: instance registry not updated: {e}", file=sys.stderr)
+
+
+def state_from_docker(status: str) -> str:
+    """Map a Docker container status to a registry state."""
+    if status in ("running", "restarting"):
+        return RUNNING
+    if status == "paused":
+        return PAUSED
+    if status == "removing":
+        return REMOVED
+    return STOPPED
+
+
+@dataclass
+class Instance:
+    """An instance as recorded in the registry (or found by a Docker scan)."""
+
+    instance_id: str
+    container_id: str
+    project: str
+    state: str
+    started: float
+    user: str = "node"
+    workspace_folder: str = "/workspace"
+    pooled: bool = False
+    reuse: bool = False
+    config_hash: str = ""
+    workspace: str = ""
+    flags: list[str] = field(default_factory=list)
+    created: float = 0.0
+    updated: float = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self.state == RUNNING
+
+
+class Registry:
+    """A connection to the registry database."""
+
+    def __init__(self, path: Path | None = None):
+        self.path = path or get_registry_path()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        if self._db.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            with self._transaction():
+                # Not executescript(), which commits first
+                for statement in SCHEMA.split(";"):
+                    self._db.execute(statement)
+                self._db.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self._db.close()
+
+    def __enter__(self) -> "Registry":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def _transaction(self):
+        return _Transaction(self._db)
+
+    def _upsert(self, instance_id: str, fields: dict, now: float) -> None:
+        if "flags" in fields:
+            fields["flags"] = json.dumps(list(fields["flags"]))
+        if "reuse" in fields:
+            fields["reuse"] = int(bool(fields["reuse"]))
+        names = [name for name in fields if name in COLUMNS and name not in ("instance_id", "created", "updated")]
+        insert = ["instance_id", "created", "updated", *names]
+        updates = ", ".join(f"{name} = excluded.{name}" for name in ["updated", *names])
+        self._db.execute(
+            f"INSERT INTO instances ({', '.join(insert)}) VALUES ({', '.join('?' * len(insert))}) "
+            f"ON CONFLICT (instance_id) DO UPDATE SET {updates}",
+            [instance_id, now, now, *(fields[name] for name in names)],
+        )
+
+    def record(self, instance_id: str, **fields) -> None:
+        """Create or update an instance's row (a lifecycle step) in one transaction."""
+        with self._transaction():
+            if not self._known(instance_id):
+                fields.setdefault("state", STARTING)
+            self._upsert(instance_id, fields, time.time())
+
+    def _known(self, instance_id: str) -> bool:
+        return self._db.execute("SELECT 1 FROM instances WHERE instance_id = ?", (instance_id,)).fetchone() is not None
+
+    def get(self, instance_id: str) -> Instance | None:
+        row = self._db.execute("SELECT * FROM instances WHERE instance_id = ?", (instance_id,)).fetchone()
+        return _instance(row) if row else None
+
+    def query(self, project: str | None = None, states: Iterable[str] | None = None, reuse: bool | None = None,
+              prefix: str | None = None) -> list[Instance]:
+        """Instances matching all given filters, most recently started first."""
+        clauses, params = [], []
+        if project is not None:
+            clauses.append("project = ?")
+            params.append(project)
+        if states is not None:
+            states = list(states)
+            clauses.append(f"state IN ({', '.join('?' * len(states))})")
+            params.extend(states)
+        if reuse is not None:
+            clauses.append("reuse = ?")
+            params.append(int(reuse))
+        if prefix:
+            # A range on the primary key rather than LIKE, which would need escaping
+            clauses.append("instance_id >= ? AND instance_id < ?")
+            params.extend([prefix, prefix + "\uffff"])
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._db.execute(f"SELECT * FROM instances {where} ORDER BY started DESC, created DESC", params)
+        return [_instance(row) for row in rows]
+
+    def checkpoint(self, key: str) -> float:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0.0
+
+    def apply_scan(self, found: list[Instance], now: float | None = None) -> None:
+        """Replace the Docker-side state with a full scan; rows without a container are marked removed."""
+        now = now or time.time()
+        seen = {instance.instance_id for instance in found}
+        with self._transaction():
+            for instance in found:
+                self._upsert(instance.instance_id, _docker_fields(instance), now)
+            live = self._db.execute(
+                f"SELECT instance_id, state, updated FROM instances WHERE state IN ({', '.join('?' * len(LIVE_STATES))})",
+                LIVE_STATES,
+            ).fetchall()
+            for row in live:
+                if row["instance_id"] in seen or (row["state"] == STARTING and now - row["updated"] < STARTING_GRACE):
+                    continue
+                self._upsert(row["instance_id"], {"state": REMOVED}, now)
+            self._set_checkpoint("scanned", now)
+            self._set_checkpoint("events", now)
+
+    def apply_events(self, events: list[dict], until: float, inspect=None) -> None:
+        """Apply container events (Engine API format) up to `until`.
+
+        Events for instances the registry doesn't know yet are passed to
+        inspect(container_id), which returns an Instance or None.
+        """
+        now = time.time()
+        with self._transaction():
+            for event in events:
+                attributes = (event.get("Actor") or {}).get("Attributes") or {}
+                instance_id = attributes.get("clanker.instance")
+                state = EVENT_STATES.get(event.get("Action") or event.get("status", ""))
+                if not instance_id or state is None:
+                    continue
+                fields = {"state": state, "container_id": event.get("id") or (event.get("Actor") or {}).get("ID", "")}
+                if state == RUNNING and event.get("Action") == "start":
+                    fields["started"] = event.get("timeNano", 0) / 1e9 or event.get("time", now)
+                if not self._known(instance_id):
+                    found = inspect(fields["container_id"]) if inspect and state != REMOVED else None
+                    if found is None:
+                        continue
+                    fields = {**_docker_fields(found), **fields}
+                self._upsert(instance_id, fields, now)
+            self._set_checkpoint("events", until)
+
+    def prune(self, before: float) -> int:
+        """Forget removed or failed instances last updated before `before`. Returns how many."""
+        with self._transaction():
+            cursor = self._db.execute(
+                "DELETE FROM instances WHERE state IN (?, ?) AND updated < ?", (REMOVED, FAILED, before)
+            )
+            return cursor.rowcount
+
+    def _set_checkpoint(self, key: str, value: float) -> None:
+        self._db.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = max(value, excluded.value)",
+            (key, value),
+        )
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK, so writers queue on the busy timeout instead of deadlocking."""
+
+    def __init__(self, db: sqlite3.Connection):
+        self._db = db
+
+    def __enter__(self) -> None:
+        self._db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, *_) -> None:
+        self._db.execute("ROLLBACK" if exc_type else "COMMIT")
+
+
+def _docker_fields(instance: Instance) -> dict:
+    fields = {
+        "container_id": instance.container_id,
+        "state": instance.state,
+        "started": instance.started,
+        "user": instance.user,
+        "workspace_folder": instance.workspace_folder,
+    }
+    if instance.project:
+        fields["project"] = instance.project
+    if instance.reuse:
+        fields["reuse"] = True
+    return fields
+
+
+def _instance(row: sqlite3.Row) -> Instance:
+    return Instance(
+        instance_id=row["instance_id"],
+        container_id=row["container_id"],
+        project=row["project"],
+        state=row["state"],
+        started=row["started"],
+        user=row["user"],
+        workspace_folder=row["workspace_folder"],
+        reuse=bool(row["reuse"]),
+        config_hash=row["config_hash"],
+        workspace=row["workspace"],
+        flags=json.loads(row["flags"]),
+        created=row["created"],
+        updated=row["updated"],
+    )
@@ -0,0 +1,356 @@
+"""Container resource limits: fixed profiles and host-aware `auto` sizing.
+
+--resources (CLANKERCAGE_RESOURCES) picks the limits a session container gets:
+
+  small      2 CPUs, 4 GiB memory, 256 processes
+  standard   4 CPUs, 8 GiB memory, 500 processes (default)
+  large      8 CPUs, 16 GiB memory, 1000 processes
+  auto       sized when the instance starts, from the host and the other
+             instances
+
+A fixed profile is written into the config's runArgs. With `auto`, runArgs
+refer to ${localEnv:CLANKERCAGE_...} variables instead, filled in per
+instance by size_instance, so the rendered config (and the reuse/pool
+fingerprint) doesn't change with the number of running sessions:
+
+  - the Docker host's CPUs and 3/4 of its memory are split evenly between the running
+    `clanker.instance` containers and the new one, within the small..large
+    bounds
+  - each instance is pinned to its own contiguous slice of CPUs
+    (--cpuset-cpus), so sessions don't share cores and keep their caches; when
+    the host has no free slice left it only gets a --cpus quota
+  - while the host is short of memory (little available, or memory pressure
+    stalls), new instances wait for running ones to free some
+
+In every mode Node's heap (NODE_OPTIONS=--max-old-space-size) is half the
+memory limit, leaving the rest for the tools Claude runs.
+
+The Docker host is the machine the daemon runs on: with Docker Desktop or a
+remote DOCKER_HOST that is a VM or another machine, so its CPUs and memory
+come from the daemon's /info rather than from this machine (see docker_host).
+Only when the daemon runs here is this machine's memory pressure waited on.
+
+Allocations are recorded in the instance runtime dir (resources.json) under a
+lock, so concurrent starts get disjoint CPU slices and a reused container keeps
+its limits. Instances waiting for memory don't hold the lock. Runtime dirs of stopped containers are removed by `clankercage gc`.
+"""
+
+import fcntl
+import json
+import os
+import socket
+import subprocess
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Callable
+
+from clankercage.engine import DockerEngine, EngineError
+
+__all__ = [
+    "AUTO",
+    "DEFAULT_PROFILE",
+    "DEFAULT_QUEUE_TIMEOUT",
+    "LIMIT_ARGS",
+    "PROFILES",
+    "Limits",
+    "QueueTimeout",
+    "allocate_cpus",
+    "auto_config",
+    "auto_limits",
+    "docker_host",
+    "format_cpuset",
+    "host_cpus",
+    "memory_pressure",
+    "parse_cpuset",
+    "read_meminfo",
+    "size_instance",
+]
+
+GIB = 1024 ** 3
+
+
+@dataclass
+class Limits:
+    """Resource limits of one container."""
+
+    cpus: int
+    memory: int
+    pids: int
+    cpuset: str = ""
+
+    @property
+    def node_heap_mb(self) -> int:
+        """Node's old-space size: half the memory limit."""
+        return self.memory // 2 // 1024 ** 2
+
+    def run_args(self) -> list[str]:
+        args = [f"--memory={self.memory // 1024 ** 2}m", f"--cpus={self.cpus}", f"--pids-limit={self.pids}"]
+        if self.cpuset:
+            args.append(f"--cpuset-cpus={self.cpuset}")
+        return args
+
+    def env(self) -> dict[str, str]:
+        """The variables the runArgs of an auto_config refer to."""
+        return {
+            "CLANKERCAGE_MEMORY": f"{self.memory // 1024 ** 2}m",
+            "CLANKERCAGE_CPUS": str(self.cpus),
+            "CLANKERCAGE_PIDS_LIMIT": str(self.pids),
+            "CLANKERCAGE_CPUSET": self.cpuset,
+            "CLANKERCAGE_NODE_HEAP_MB": str(self.node_heap_mb),
+        }
+
+
+PROFILES = {
+    "small": Limits(cpus=2, memory=4 * GIB, pids=256),
+    "standard": Limits(cpus=4, memory=8 * GIB, pids=500),
+    "large": Limits(cpus=8, memory=16 * GIB, pids=1000),
+}
+DEFAULT_PROFILE = "standard"
+AUTO = "auto"
+
+# runArgs prefixes a profile replaces in the embedded devcontainer.json
+LIMIT_ARGS = ("--memory=", "--cpus=", "--pids-limit=", "--cpuset-cpus=")
+
+# Share of host memory handed out to instances; the rest is left to the host
+HOST_MEMORY_SHARE = 0.75
+# New instances wait while less than this is available...
+QUEUE_MIN_AVAILABLE = 2 * GIB
+# ...or tasks spent more than this share of the last 10s stalled on memory (PSI)
+QUEUE_MAX_PRESSURE = 10.0
+QUEUE_POLL_INTERVAL = 5.0
+DEFAULT_QUEUE_TIMEOUT = 600.0
+# A reservation counts while its container is running, or this long after it was made (still starting)
+STARTING_GRACE = 300
+RESOURCES_FILE = "resources.json"
+
+
+class QueueTimeout(Exception):
+    """The host stayed short of memory for longer than the queue timeout."""
+
+
+def auto_config() -> dict:
+    """runArgs and containerEnv for `auto`, filled in per instance by size_instance."""
+    return {
+        "runArgs": [
+            "--memory=${localEnv:CLANKERCAGE_MEMORY}",
+            "--cpus=${localEnv:CLANKERCAGE_CPUS}",
+            "--pids-limit=${localEnv:CLANKERCAGE_PIDS_LIMIT}",
+            "--cpuset-cpus=${localEnv:CLANKERCAGE_CPUSET}",
+        ],
+        "containerEnv": {"NODE_OPTIONS": "--max-old-space-size=${localEnv:CLANKERCAGE_NODE_HEAP_MB}"},
+    }
+
+
+def parse_cpuset(text: str) -> list[int]:
+    """Parse a cpuset list ("0-3,8") into CPU numbers."""
+    cpus = []
+    for part in text.split(","):
+        start, _, end = part.strip().partition("-")
+        if start.isdigit():
+            cpus.extend(range(int(start), int(end if end.isdigit() else start) + 1))
+    return cpus
+
+
+def format_cpuset(cpus: list[int]) -> str:
+    """Format CPU numbers as a cpuset list, collapsing runs into ranges."""
+    ranges: list[list[int]] = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+def host_cpus() -> list[int]:
+    """CPUs this process (and so Docker on this host) may use."""
+    try:
+        return sorted(os.sched_getaffinity(0))
+    except AttributeError:
+        return list(range(os.cpu_count() or 1))
+
+
+def read_meminfo(path: Path = Path("/proc/meminfo")) -> dict[str, int]:
+    """Host memory in bytes: MemTotal and MemAvailable. Empty if unavailable."""
+    try:
+        lines = path.read_text().splitlines()
+    except OSError:
+        return {}
+    values = {}
+    for line in lines:
+        key, _, value = line.partition(":")
+        fields = value.split()
+        if key in ("MemTotal", "MemAvailable") and fields and fields[0].isdigit():
+            values[key] = int(fields[0]) * 1024
+    return values
+
+
+def _daemon_info() -> dict | None:
+    engine = DockerEngine.from_env()
+    if engine is not None:
+        try:
+            return engine.info()
+        except EngineError:
+            return None
+        finally:
+            engine.close()
+    try:
+        result = subprocess.run(["docker", "info", "--format", "{{json .}}"], capture_output=True, text=True)
+        info = json.loads(result.stdout) if result.returncode == 0 else None
+    except (OSError, ValueError):
+        return None
+    return info if isinstance(info, dict) else None
+
+
+def docker_host(info: dict | None = None) -> tuple[list[int], int | None, bool]:
+    """CPUs and total memory of the Docker host, and whether the daemon runs on this machine.
+
+    They come from the daemon's /info (NCPU, MemTotal), whose CPUs cpusets number
+    0..NCPU-1. If the daemon can't be asked, this machine is assumed.
+    """
+    info = info if info is not None else _daemon_info()
+    if not info or not isinstance(info.get("NCPU"), int) or info["NCPU"] < 1:
+        return host_cpus(), read_meminfo().get("MemTotal"), True
+    local = info.get("Name") == socket.gethostname()
+    cpus = host_cpus() if local else []
+    # This machine's numbering is only valid when it is the Docker host and shows all its CPUs
+    if len(cpus) != info["NCPU"]:
+        cpus = list(range(info["NCPU"]))
+    memory = info.get("MemTotal")
+    return cpus, memory if isinstance(memory, int) and memory > 0 else None, local
+
+
+def memory_pressure(path: Path = Path("/proc/pressure/memory")) -> float:
+    """Share (percent) of the last 10s some tasks were stalled on memory. 0 without PSI."""
+    try:
+        text = path.read_text()
+    except OSError:
+        return 0.0
+    for line in text.splitlines():
+        if line.startswith("some "):
+            for field in line.split()[1:]:
+                key, _, value = field.partition("=")
+                if key == "avg10":
+                    return float(value)
+    return 0.0
+
+
+def auto_limits(cpu_count: int, memory_total: int, others: int) -> Limits:
+    """Split the host between `others` running instances and a new one, within the profile bounds."""
+    low, high = PROFILES["small"], PROFILES["large"]
+    share = others + 1
+    cpus = max(low.cpus, min(high.cpus, cpu_count // share))
+    # Whole 256 MiB steps keep the limit (and so Node's heap) readable
+    step = 256 * 1024 ** 2
+    usable = int(memory_total * HOST_MEMORY_SHARE) // step * step
+    memory = max(low.memory, min(high.memory, usable // share // step * step))
+    # Never more than the host can give a single instance
+    memory = min(memory, max(usable, step))
+    pids = max(low.pids, min(high.pids, PROFILES["standard"].pids * cpus // PROFILES["standard"].cpus))
+    return Limits(cpus=min(cpus, cpu_count), memory=memory, pids=pids)
+
+
+def allocate_cpus(available: list[int], taken: set[int], count: int) -> list[int]:
+    """Pick `count` free CPUs, preferring a contiguous run. Empty if not enough are free.
+
+    Neighbouring CPU numbers usually share caches, so a contiguous slice keeps
+    an instance's threads close together.
+    """
+    free = [cpu for cpu in available if cpu not in taken]
+    if len(free) < count:
+        return []
+    for i in range(len(free) - count + 1):
+        window = free[i:i + count]
+        if window[-1] - window[0] == count - 1:
+            return window
+    return free[:count]
+
+
+def _running_instances() -> set[str] | None:
+    result = subprocess.run(
+        ["docker", "ps", "--filter", "label=clanker.instance", "--format", '{{.Label "clanker.instance"}}'],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return None
+    return set(result.stdout.split())
+
+
+def _read_reservation(runtime_dir: Path) -> dict | None:
+    try:
+        reservation = json.loads((runtime_dir / RESOURCES_FILE).read_text())
+    except (OSError, ValueError):
+        return None
+    return reservation if isinstance(reservation, dict) else None
+
+
+def _wait_for_memory(timeout: float, notify: Callable[[str], None]) -> None:
+    deadline = time.monotonic() + timeout
+    waiting = False
+    while True:
+        available = read_meminfo().get("MemAvailable")
+        pressure = memory_pressure()
+        if (available is None or available >= QUEUE_MIN_AVAILABLE) and pressure < QUEUE_MAX_PRESSURE:
+            return
+        if time.monotonic() >= deadline:
+            raise QueueTimeout(f"host still short of memory after {timeout:g}s "
+                               f"({(available or 0) / GIB:.1f} GiB available, {pressure:g}% stalled)")
+        if not waiting:
+            notify(f"Host is short of memory ({(available or 0) / GIB:.1f} GiB available, {pressure:g}% stalled), "
+                   "waiting for other sessions to free some...")
+            waiting = True
+        time.sleep(QUEUE_POLL_INTERVAL)
+
+
+def size_instance(run_dir: Path, instance_id: str, queue_timeout: float = DEFAULT_QUEUE_TIMEOUT,
+                  notify: Callable[[str], None] = print, now: float | None = None,
+                  host: tuple[list[int], int | None, bool] | None = None) -> Limits:
+    """Size an `auto` instance and record its reservation in its runtime dir.
+
+    An instance that already has a reservation (a reused container) keeps it.
+    Otherwise waits while the Docker host is short of memory (raises
+    QueueTimeout), then splits the host (see docker_host; `host` overrides it)
+    between the live instances and this one. Allocations are serialized by a
+    lock, so CPU slices never overlap; it is released while waiting, so other
+    starts aren't held up by one that is queued.
+    """
+    runtime_dir = run_dir / instance_id
+    runtime_dir.mkdir(parents=True, exist_ok=True)
+    lock_path = run_dir / ".resources.lock"
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        existing = _read_reservation(runtime_dir)
+    if existing is not None:
+        return Limits(**{k: existing[k] for k in ("cpus", "memory", "pids", "cpuset")})
+
+    cpus, memory_total, local = host or docker_host()
+    if local:
+        _wait_for_memory(queue_timeout, notify)
+
+    with open(lock_path, "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        now = now or time.time()
+        running = _running_instances() or set()
+        live = set(running)
+        taken: set[int] = set()
+        for other in run_dir.iterdir():
+            reservation = _read_reservation(other) if other.name != instance_id else None
+            if reservation is None:
+                continue
+            if other.name in running or now - reservation.get("reserved", 0) < STARTING_GRACE:
+                live.add(other.name)
+                if reservation.get("pinned"):
+                    taken.update(parse_cpuset(reservation.get("cpuset", "")))
+        live.discard(instance_id)
+
+        limits = auto_limits(len(cpus), memory_total or PROFILES[DEFAULT_PROFILE].memory, len(live))
+        pinned = allocate_cpus(cpus, taken, limits.cpus)
+        # Without a free slice the instance isn't pinned and shares all CPUs under its --cpus quota
+        limits.cpuset = format_cpuset(pinned or cpus)
+        reservation = {**asdict(limits), "pinned": bool(pinned), "reserved": now}
+        tmp = runtime_dir / f".{RESOURCES_FILE}.tmp"
+        tmp.write_text(json.dumps(reservation))
+        os.rename(tmp, runtime_dir / RESOURCES_FILE)
+        return limits
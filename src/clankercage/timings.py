@@ -0,0 +1,251 @@
+"""Per-phase startup timing for ClankerCage sessions.
+
+Phases are recorded as spans with monotonic timestamps while the CLI runs.
+Scripts inside the container (init-firewall.sh, the postStartCommand steps)
+append their own phases to phases.tsv in the instance runtime directory as
+`name<TAB>start<TAB>end` lines with wall-clock seconds; those are merged in
+after `devcontainer up` returns.
+
+Tracing is off unless enabled with --timings or CLANKERCAGE_TRACE:
+  CLANKERCAGE_TRACE=1                  print the breakdown table
+  CLANKERCAGE_TRACE=/path/trace.json   also write the spans as JSON
+  CLANKERCAGE_TRACE=otlp[=URL]         also export to an OTLP/HTTP collector
+                                       (default http://localhost:4318, see grafana/)
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterator
+
+__all__ = ["Span", "Tracer", "adopt", "context", "enable", "enabled", "load_container_phases", "report", "span"]
+
+DEFAULT_OTLP_ENDPOINT = "http://localhost:4318"
+
+
+@dataclass
+class Span:
+    """A timed phase. Times are monotonic nanoseconds."""
+
+    name: str
+    start_ns: int
+    end_ns: int = 0
+    depth: int = 0
+    parent: int | None = None
+    source: str = "host"
+    attributes: dict = field(default_factory=dict)
+
+    @property
+    def duration_ns(self) -> int:
+        return self.end_ns - self.start_ns
+
+
+class Tracer:
+    """Collects spans for one CLI run. Disabled tracers record nothing.
+
+    Spans may be recorded from several threads; each thread nests spans on its
+    own stack (see adopt() for continuing a parent span in a worker thread).
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.destination: str | None = None
+        self.spans: list[Span] = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._origin_ns = time.monotonic_ns()
+        # Offset to convert between monotonic and wall-clock time (container phases use wall clock)
+        self._wall_offset_ns = time.time_ns() - self._origin_ns
+
+    def enable(self, destination: str | None = None) -> None:
+        self.enabled = True
+        self.destination = destination
+
+    @property
+    def _stack(self) -> list[int]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    def context(self) -> list[int]:
+        """The calling thread's open spans, to hand to adopt() in another thread."""
+        return list(self._stack)
+
+    @contextmanager
+    def adopt(self, context: list[int]) -> Iterator[None]:
+        """Nest spans recorded by this thread under the spans open in context."""
+        saved = self._stack
+        self._local.stack = list(context)
+        try:
+            yield
+        finally:
+            self._local.stack = saved
+
+    @contextmanager
+    def span(self, name: str, **attributes) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+        parent = self._stack[-1] if self._stack else None
+        with self._lock:
+            index = len(self.spans)
+            self.spans.append(Span(name, time.monotonic_ns(), depth=len(self._stack), parent=parent, attributes=attributes))
+        self._stack.append(index)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            self.spans[index].end_ns = time.monotonic_ns()
+
+    def add_wall_span(self, name: str, start_s: float, end_s: float, source: str = "container") -> None:
+        """Record a phase measured elsewhere in wall-clock seconds, nested under the current span."""
+        start_ns = int(start_s * 1e9) - self._wall_offset_ns
+        end_ns = int(end_s * 1e9) - self._wall_offset_ns
+        if start_ns < self._origin_ns:
+            # Left over from an earlier start of a reused container
+            return
+        parent = self._stack[-1] if self._stack else None
+        with self._lock:
+            self.spans.append(Span(name, start_ns, end_ns, depth=len(self._stack), parent=parent, source=source))
+
+    def format_table(self) -> str:
+        """Render the spans as a breakdown table, ordered by start time."""
+        end_ns = max((s.end_ns for s in self.spans), default=self._origin_ns)
+        lines = [
+            f"Startup timings (total {(end_ns - self._origin_ns) / 1e9:.3f}s)",
+            f"  {'phase':<44} {'start':>9} {'duration':>9}",
+        ]
+        for s in sorted(self.spans, key=lambda s: (s.start_ns, s.depth)):
+            name = "  " * s.depth + s.name
+            lines.append(
+                f"  {name:<44} {(s.start_ns - self._origin_ns) / 1e9:>8.3f}s {s.duration_ns / 1e9:>8.3f}s"
+            )
+        return "\n".join(lines)
+
+    def to_json(self) -> dict:
+        return {
+            "started_at": (self._origin_ns + self._wall_offset_ns) / 1e9,
+            "spans": [
+                {
+                    "name": s.name,
+                    "source": s.source,
+                    "start_ms": (s.start_ns - self._origin_ns) / 1e6,
+                    "duration_ms": s.duration_ns / 1e6,
+                    "parent": self.spans[s.parent].name if s.parent is not None else None,
+                    "attributes": s.attributes,
+                }
+                for s in self.spans
+            ],
+        }
+
+    def to_otlp(self, resource: dict[str, str]) -> dict:
+        """Encode the spans as an OTLP/JSON ExportTraceServiceRequest."""
+        trace_id = os.urandom(16).hex()
+        span_ids = [os.urandom(8).hex() for _ in self.spans]
+        otlp_spans = []
+        for i, s in enumerate(self.spans):
+            attributes = {"clanker.source": s.source, **s.attributes}
+            otlp_span = {
+                "traceId": trace_id,
+                "spanId": span_ids[i],
+                "name": s.name,
+                "kind": 1,
+                "startTimeUnixNano": str(s.start_ns + self._wall_offset_ns),
+                "endTimeUnixNano": str(s.end_ns + self._wall_offset_ns),
+                "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in attributes.items()],
+            }
+            if s.parent is not None:
+                otlp_span["parentSpanId"] = span_ids[s.parent]
+            otlp_spans.append(otlp_span)
+        return {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": [{"key": k, "value": {"stringValue": v}} for k, v in resource.items()],
+                },
+                "scopeSpans": [{"scope": {"name": "clankercage"}, "spans": otlp_spans}],
+            }]
+        }
+
+
+_TRACER = Tracer()
+
+
+def enable(destination: str | None = None) -> None:
+    """Turn on tracing for this run. destination is the CLANKERCAGE_TRACE value, if any."""
+    _TRACER.enable(destination)
+
+
+def enabled() -> bool:
+    return _TRACER.enabled
+
+
+def span(name: str, **attributes):
+    """Context manager timing one phase (no-op unless tracing is enabled)."""
+    return _TRACER.span(name, **attributes)
+
+
+def context() -> list[int]:
+    """The spans open in the calling thread (see Tracer.adopt)."""
+    return _TRACER.context()
+
+
+def adopt(context: list[int]):
+    """Context manager nesting a worker thread's spans under another thread's open spans."""
+    return _TRACER.adopt(context)
+
+
+def load_container_phases(phases_file: Path) -> None:
+    """Merge phases reported by the container bootstrap scripts."""
+    if not _TRACER.enabled:
+        return
+    try:
+        lines = phases_file.read_text().splitlines()
+    except OSError:
+        return
+    for line in lines:
+        parts = line.split("\t")
+        if len(parts) != 3:
+            continue
+        try:
+            _TRACER.add_wall_span(parts[0], float(parts[1]), float(parts[2]))
+        except ValueError:
+            continue
+
+
+def _export_otlp(endpoint: str, payload: dict) -> None:
+    request = urllib.request.Request(
+        endpoint.rstrip("/") + "/v1/traces",
+        data=json.dumps(payload).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=5):
+        pass
+
+
+def report(instance_id: str | None = None) -> None:
+    """Print the breakdown table and write/export the spans if requested."""
+    if not _TRACER.enabled:
+        return
+    print(_TRACER.format_table(), file=sys.stderr)
+
+    destination = _TRACER.destination or ""
+    if destination.endswith(".json"):
+        Path(destination).write_text(json.dumps(_TRACER.to_json(), indent=2))
+        print(f"Timings written to {destination}", file=sys.stderr)
+    elif destination.startswith("otlp"):
+        endpoint = destination.partition("=")[2] or DEFAULT_OTLP_ENDPOINT
+        resource = {"service.name": "clankercage"}
+        if instance_id:
+            resource["clanker.instance"] = instance_id
+        try:
+            _export_otlp(endpoint, _TRACER.to_otlp(resource))
+        except OSError as e:
+            print(f"Warning: failed to export timings to {endpoint}: {e}", file=sys.stderr)
+    print(file=sys.stderr)
@@ -4,67 +4,65 @@ Shared pytest fixtures for integration tests.
 All tests spin up a real devcontainer and run commands inside it.
 """
 
+import json
+import shutil
 import subprocess
 import tempfile
+import uuid
 from pathlib import Path
 from typing import Generator
 
 import pytest
 
+from clankercage.cli import (CONTAINER_FIREWALL_CACHE_DIR, apply_instance_config, compile_firewall,
+                             get_firewall_cache_dir, get_instance_runtime_dir, instance_env)
+from clankercage.launcher import NativeLauncher
+
 
 class DevContainer:
-    """Helper class to manage a devcontainer lifecycle."""
+    """Helper class to manage a devcontainer lifecycle.
+
+    Uses the native launcher, so each exec is a plain `docker exec` rather than
+    an `npx @devcontainers/cli` invocation. Like the CLI, it mounts an instance
+    runtime directory and the firewall cache and compiles the ruleset the
+    container's firewall applies.
+    """
 
     def __init__(self, workspace_dir: str, config_path: Path):
         self.workspace_dir = workspace_dir
         self.config_path = config_path
+        self.instance_id = f"test{uuid.uuid4().hex[:8]}"
+        config = json.loads(config_path.read_text())
+        mounts = config.get("mounts", [])
+        if not any("CLANKERCAGE_RUNTIME_DIR" in mount for mount in mounts):
+            apply_instance_config(config)
+        if not any(f"target={CONTAINER_FIREWALL_CACHE_DIR}," in mount for mount in config["mounts"]):
+            get_firewall_cache_dir().mkdir(parents=True, exist_ok=True)
+            config["mounts"].append(f"source={get_firewall_cache_dir()},target={CONTAINER_FIREWALL_CACHE_DIR},type=bind")
+        env = instance_env(self.instance_id, compile_firewall())
+        self.launcher = NativeLauncher(config, config_path.parent, Path(workspace_dir), local_env=env)
         self._started = False
 
     def start(self) -> None:
         """Start the devcontainer."""
-        result = subprocess.run(
-            [
-                "npx", "-y", "@devcontainers/cli", "up",
-                "--workspace-folder", self.workspace_dir,
-                "--config", str(self.config_path),
-            ],
-            capture_output=True,
-            text=True,
-            timeout=300,
-        )
-        if result.returncode != 0:
-            raise RuntimeError(f"Failed to start container: {result.stderr}")
+        try:
+            self.launcher.up(quiet=True)
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Failed to start container: {e.stderr}") from e
         self._started = True
 
     def exec(self, command: str, timeout: int = 60) -> subprocess.CompletedProcess:
         """Execute a command inside the container."""
         if not self._started:
             raise RuntimeError("Container not started")
-        return subprocess.run(
-            [
-                "npx", "-y", "@devcontainers/cli", "exec",
-                "--workspace-folder", self.workspace_dir,
-                "--config", str(self.config_path),
-                "bash", "-c", command,
-            ],
-            capture_output=True,
-            text=True,
-            timeout=timeout,
-        )
+        return self.launcher.exec(["bash", "-c", command], timeout=timeout)
 
     def stop(self) -> None:
         """Stop the devcontainer."""
         if self._started:
-            subprocess.run(
-                [
-                    "npx", "-y", "@devcontainers/cli", "down",
-                    "--workspace-folder", self.workspace_dir,
-                    "--config", str(self.config_path),
-                ],
-                capture_output=True,
-                timeout=60,
-            )
+            self.launcher.down()
             self._started = False
+        shutil.rmtree(get_instance_runtime_dir(self.instance_id), ignore_errors=True)
 
 
 @pytest.fixture(scope="module")
@@ -102,3 +100,11 @@ def git_repo(devcontainer: DevContainer) -> str:
     if result.returncode != 0:
         pytest.fail(f"Failed to create git repo: {result.stderr}")
     return result.stdout.strip().split("\n")[-1]
+
+
+@pytest.fixture(autouse=True)
+def instance_registry(tmp_path_factory, monkeypatch) -> Path:
+    """Point the instance registry at a fresh database, so no test writes to ~/.cache."""
+    path = tmp_path_factory.mktemp("registry") / "instances.db"
+    monkeypatch.setattr("clankercage.registry.get_registry_path", lambda: path)
+    return path
@@ -0,0 +1,174 @@
+"""
+Tests for the Python session API.
+
+These tests verify that:
+- Commands stream output through bounded async iterators or callbacks
+- Exit codes and stdin are passed through, output beyond max_output is dropped
+- A timeout or cancellation kills the command inside the container
+- A PTY is only allocated when asked for
+- Sessions reject unknown options and commands before they start
+- A missing container is reported as a SessionError
+
+A stand-in `docker` on PATH runs `docker exec <container> CMD...` as a local
+process, so no container is needed.
+"""
+
+import asyncio
+import os
+import time
+from pathlib import Path
+
+import pytest
+
+from clankercage import api
+
+FAKE_DOCKER = """#!/bin/sh
+# docker exec [-i] [-t] CONTAINER CMD... -> CMD...
+shift
+while [ "${1#-}" != "$1" ]; do shift; done
+shift
+exec "$@"
+"""
+
+
+class FakeLauncher:
+    container = ("container1", "running")
+
+    def exec_command(self, cmd, tty=None, env=None, cwd=None, container_id=None):
+        return ["docker", "exec", "-i"] + (["-t"] if tty else []) + [container_id or self.container[0]] + list(cmd)
+
+    def find_container(self):
+        return self.container
+
+
+@pytest.fixture
+def session(tmp_path: Path, monkeypatch) -> api.Session:
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    (bin_dir / "docker").write_text(FAKE_DOCKER)
+    (bin_dir / "docker").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+    monkeypatch.setattr(api, "KILL_GRACE", 1)
+    started = api.Session(tmp_path)
+    started._launcher = FakeLauncher()
+    return started
+
+
+def process_alive(marker: str) -> bool:
+    for pid in os.listdir("/proc"):
+        try:
+            if pid.isdigit() and marker.encode() in Path(f"/proc/{pid}/cmdline").read_bytes():
+                return True
+        except OSError:
+            continue
+    return False
+
+
+def describe_exec():
+    """Unit tests for running commands."""
+
+    @pytest.mark.asyncio
+    async def it_collects_output_exit_code_and_stdin(session: api.Session):
+        result = await session.run(["sh", "-c", "cat; echo err >&2; exit 3"], stdin=b"hello\n")
+
+        assert result == api.ExecResult(3, b"hello\n", b"err\n")
+
+    @pytest.mark.asyncio
+    async def it_streams_more_output_than_the_buffer_holds(session: api.Session):
+        execution = await session.exec(["sh", "-c", "head -c 3000000 /dev/zero"], buffer_chunks=2)
+
+        received = 0
+        async for chunk in execution.stdout:
+            received += len(chunk)
+
+        assert received == 3000000
+        assert await execution.stderr.read() == b""
+        assert await execution.wait() == 0
+
+    @pytest.mark.asyncio
+    async def it_passes_output_to_callbacks(session: api.Session):
+        lines = []
+
+        async def on_stdout(chunk: bytes) -> None:
+            lines.append(chunk)
+
+        execution = await session.exec(["echo", "hi"], on_stdout=on_stdout)
+
+        assert await execution.wait() == 0
+        assert b"".join(lines) == b"hi\n"
+
+    @pytest.mark.asyncio
+    async def it_drops_output_beyond_max_output(session: api.Session):
+        result = await session.run(["sh", "-c", "printf 0123456789"], max_output=4)
+
+        assert (result.stdout, result.truncated) == (b"0123", True)
+
+    @pytest.mark.asyncio
+    async def it_only_allocates_a_pty_when_asked(session: api.Session):
+        check = ["sh", "-c", "[ -t 1 ] && echo tty || echo pipe"]
+
+        assert (await session.run(check)).stdout == b"pipe\n"
+        assert (await session.run(check, pty=True)).stdout.strip() == b"tty"
+
+
+def describe_killing():
+    """Unit tests for timeouts and cancellation."""
+
+    @pytest.mark.asyncio
+    async def it_kills_the_command_after_its_timeout(session: api.Session):
+        marker = f"sleep {int(time.time() * 1000) % 100000 + 200000}"
+        started = time.monotonic()
+
+        with pytest.raises(api.ExecTimeout):
+            await session.run(["sh", "-c", marker], timeout=0.3)
+
+        assert time.monotonic() - started < 5
+        assert not process_alive(marker)
+
+    @pytest.mark.asyncio
+    async def it_kills_the_command_when_the_waiter_is_cancelled(session: api.Session):
+        marker = f"sleep {int(time.time() * 1000) % 100000 + 300000}"
+        execution = await session.exec(["sh", "-c", marker])
+        waiter = asyncio.ensure_future(execution.wait())
+        await asyncio.sleep(0.2)
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+
+        assert execution.returncode is not None
+        assert not process_alive(marker)
+
+
+def describe_session():
+    """Unit tests for session setup."""
+
+    def it_rejects_unknown_options(tmp_path: Path):
+        with pytest.raises(api.SessionError, match="--nope"):
+            api.Session(tmp_path, ["--nope"])
+
+    def it_parses_cli_options(tmp_path: Path):
+        session = api.Session(tmp_path, ["--resources", "auto", "--shell", "true"], instance_id="abc")
+
+        assert (session.args.resources, session.instance_id) == ("auto", "abc")
+
+    @pytest.mark.asyncio
+    async def it_requires_a_started_session(tmp_path: Path):
+        with pytest.raises(api.SessionError, match="not started"):
+            await api.Session(tmp_path).exec(["true"])
+
+    @pytest.mark.asyncio
+    async def it_reports_a_missing_container(session: api.Session):
+        session._launcher.container = None
+
+        with pytest.raises(api.SessionError, match="Container not found"):
+            await session.exec(["true"])
+
+    def it_reports_a_missing_container_for_interactive_commands(tmp_path: Path, monkeypatch):
+        def missing(*_):
+            raise RuntimeError("Container not found - was it started?")
+
+        monkeypatch.setattr("clankercage.cli.interactive_command", missing)
+
+        with pytest.raises(api.SessionError, match="Container not found"):
+            api.Session(tmp_path).interactive_command(["claude"])
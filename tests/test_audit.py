@@ -0,0 +1,197 @@
+"""
+Tests for the firewall audit log.
+
+These tests verify that:
+- audit-log.sh writes one valid JSON record per event, escaping values
+- The active log is rotated by size and age, then compressed and indexed
+- Only the newest archives are kept
+- Queries filter by domain, event, instance and time, using the index to skip archives
+- Logs in the old pipe-delimited format are imported
+"""
+
+import gzip
+import json
+import subprocess
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from clankercage import audit
+
+HELPER = Path(__file__).parent.parent / "src" / "clankercage" / "devcontainer" / "audit-log.sh"
+T0 = 1767268800.0  # 2026-01-01T12:00:00Z
+
+
+def record(ts: float, event: str, instance: str = "abc123", **fields) -> dict:
+    iso = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(ts))
+    return {"ts": iso, "instance": instance, "event": event, **fields}
+
+
+def write_log(path: Path, records: list[dict]) -> None:
+    with open(path, "a") as f:
+        for r in records:
+            f.write(json.dumps(r) + "\n")
+
+
+def archives(audit_dir: Path) -> list[str]:
+    return sorted(p.name for p in audit_dir.glob("firewall-audit-*"))
+
+
+def run_helper(tmp_path: Path, *args: str) -> list[dict]:
+    log = tmp_path / "audit.jsonl"
+    script = f'source "{HELPER}"; AUDIT_LOG="{log}"; AUDIT_INSTANCE=i1; audit_log "$@"'
+    subprocess.run(["bash", "-c", script, "audit_log", *args], check=True)
+    return [json.loads(line) for line in log.read_text().splitlines()]
+
+
+@pytest.fixture
+def audit_dir(tmp_path: Path) -> Path:
+    path = tmp_path / "audit"
+    path.mkdir()
+    return path
+
+
+def describe_audit_log_helper():
+    """Tests for the shell helper the firewall scripts source."""
+
+    def it_writes_json_lines(tmp_path: Path):
+        records = run_helper(tmp_path, "DOMAIN_APPROVED", "domain=example.com", "ips=10.0.0.1,10.0.0.2")
+
+        assert len(records) == 1
+        assert records[0]["instance"] == "i1"
+        assert records[0]["event"] == "DOMAIN_APPROVED"
+        assert records[0]["domain"] == "example.com"
+        assert records[0]["ips"] == "10.0.0.1,10.0.0.2"
+        assert records[0]["ts"].endswith("+00:00")
+        assert abs(audit.record_time(records[0]) - time.time()) < 5
+
+    def it_escapes_values(tmp_path: Path):
+        records = run_helper(tmp_path, "FIREWALL_VERIFY_FAILED", 'errors=a "quoted"\\path\tand\nnewline=x')
+
+        assert records[0]["errors"] == 'a "quoted"\\path\tand\nnewline=x'
+
+
+def describe_maintain():
+    """Unit tests for rotation, compression and retention."""
+
+    def it_leaves_a_small_recent_log_alone(audit_dir: Path):
+        write_log(audit_dir / audit.ACTIVE_LOG, [record(T0, "FIREWALL_READY")])
+
+        audit.maintain(audit_dir, now=T0 + 60)
+
+        assert (audit_dir / audit.ACTIVE_LOG).exists()
+        assert archives(audit_dir) == []
+
+    def it_rotates_by_size_and_compresses_after_a_grace_period(audit_dir: Path):
+        write_log(audit_dir / audit.ACTIVE_LOG, [record(T0, "DOMAIN_APPROVED", domain="example.com")])
+
+        audit.maintain(audit_dir, max_bytes=10, now=T0 + 60)
+        assert not (audit_dir / audit.ACTIVE_LOG).exists()
+        assert archives(audit_dir) == ["firewall-audit-20260101T120100Z.jsonl"]
+
+        audit.maintain(audit_dir, max_bytes=10, now=T0 + 60 + audit.ROTATE_GRACE + 1)
+        assert archives(audit_dir) == ["firewall-audit-20260101T120100Z.jsonl.gz"]
+        with gzip.open(audit_dir / "firewall-audit-20260101T120100Z.jsonl.gz", "rt") as f:
+            assert json.loads(f.read())["domain"] == "example.com"
+        index = json.loads((audit_dir / "index.json").read_text())
+        assert index["firewall-audit-20260101T120100Z.jsonl.gz"] == {
+            "first": T0, "last": T0, "records": 1,
+            "events": ["DOMAIN_APPROVED"], "instances": ["abc123"], "domains": ["example.com"],
+        }
+
+    def it_rotates_by_age(audit_dir: Path):
+        write_log(audit_dir / audit.ACTIVE_LOG, [record(T0, "FIREWALL_READY")])
+
+        audit.maintain(audit_dir, max_age=3600, now=T0 + 7200)
+
+        assert len(archives(audit_dir)) == 1
+
+    def it_keeps_only_the_newest_archives(audit_dir: Path):
+        for hour in range(4):
+            now = T0 + hour * 3600
+            write_log(audit_dir / audit.ACTIVE_LOG, [record(now, "FIREWALL_READY")])
+            audit.maintain(audit_dir, max_bytes=1, max_archives=2, now=now)
+
+        audit.maintain(audit_dir, max_archives=2, now=T0 + 4 * 3600)
+
+        assert archives(audit_dir) == [
+            "firewall-audit-20260101T140000Z.jsonl.gz",
+            "firewall-audit-20260101T150000Z.jsonl.gz",
+        ]
+        assert sorted(json.loads((audit_dir / "index.json").read_text())) == archives(audit_dir)
+
+    def it_imports_the_old_log_format(audit_dir: Path):
+        (audit_dir / "firewall-audit.log").write_text(
+            "2026-01-01T13:00:00+0100 | DOMAIN_APPROVED | domain=example.com ips=10.0.0.1\n"
+            "garbage\n"
+        )
+
+        audit.maintain(audit_dir, now=T0 + 86400)
+
+        assert not (audit_dir / "firewall-audit.log").exists()
+        assert list(audit.query(audit_dir)) == [
+            {"ts": "2026-01-01T12:00:00+00:00", "instance": "", "event": "DOMAIN_APPROVED",
+             "domain": "example.com", "ips": "10.0.0.1"},
+        ]
+
+
+def describe_query():
+    """Unit tests for filtering and index use."""
+
+    @pytest.fixture
+    def populated(audit_dir: Path) -> Path:
+        write_log(audit_dir / audit.ACTIVE_LOG, [
+            record(T0, "DOMAIN_APPROVED", domain="old.example.com"),
+            record(T0 + 60, "DNS_REFRESH", instance="def456", domain="old.example.com", added="10.0.0.1"),
+        ])
+        audit.maintain(audit_dir, max_bytes=1, now=T0 + 120)
+        audit.maintain(audit_dir, now=T0 + 120 + audit.ROTATE_GRACE + 1)
+        write_log(audit_dir / audit.ACTIVE_LOG, [
+            record(T0 + 86400, "DOMAIN_APPROVED", domain="New.example.com"),
+            record(T0 + 86460, "FIREWALL_READY"),
+        ])
+        return audit_dir
+
+    def it_returns_all_records_oldest_first(populated: Path):
+        events = [r["event"] for r in audit.query(populated)]
+
+        assert events == ["DOMAIN_APPROVED", "DNS_REFRESH", "DOMAIN_APPROVED", "FIREWALL_READY"]
+
+    def it_filters_by_domain_and_event(populated: Path):
+        assert [r["ts"] for r in audit.query(populated, domain="new.example.com")] == ["2026-01-02T12:00:00+00:00"]
+        assert [r["domain"] for r in audit.query(populated, event="dns_refresh")] == ["old.example.com"]
+
+    def it_filters_by_instance_prefix(populated: Path):
+        assert [r["event"] for r in audit.query(populated, instance="def")] == ["DNS_REFRESH"]
+
+    def it_filters_by_time_range(populated: Path):
+        records = list(audit.query(populated, since=T0 + 30, until=T0 + 86400))
+
+        assert [r["event"] for r in records] == ["DNS_REFRESH", "DOMAIN_APPROVED"]
+
+    def it_skips_archives_the_index_rules_out(populated: Path):
+        with patch("clankercage.audit._read_records", wraps=audit._read_records) as read:
+            list(audit.query(populated, domain="new.example.com"))
+
+        assert [p.name for (p,), _ in read.call_args_list] == [audit.ACTIVE_LOG]
+
+    def it_handles_a_missing_directory(tmp_path: Path):
+        assert list(audit.query(tmp_path / "missing")) == []
+
+
+def describe_parse_time():
+    """Unit tests for --since/--until values."""
+
+    def it_parses_relative_times():
+        assert audit.parse_time("90m", now=T0) == T0 - 5400
+        assert audit.parse_time("7d", now=T0) == T0 - 7 * 86400
+
+    def it_parses_iso_times():
+        assert audit.parse_time("2026-01-01T12:00:00Z") == T0
+        assert audit.parse_time("2026-01-01T13:00:00+01:00") == T0
+
+    def it_rejects_anything_else():
+        with pytest.raises(ValueError):
+            audit.parse_time("yesterday")
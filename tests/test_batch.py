@@ -0,0 +1,153 @@
+"""
+Tests for batch runs.
+
+These tests verify that:
+- JSON and TOML job files are read, with defaults merged into every job
+- Malformed job files are rejected with a message
+- Jobs run with their own instance ID, environment and log
+- At most `concurrency` jobs run at once, results keep job order
+- Jobs past their timeout are killed, and the summary records every job
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from clankercage import batch
+
+
+def python_job(tmp_path: Path, name: str, code: str, **kwargs) -> batch.Job:
+    return batch.Job(name=name, project=tmp_path, shell=code, **kwargs)
+
+
+def fake_command(job: batch.Job) -> list[str]:
+    """Run the job's "shell" as Python instead of starting a session."""
+    return [sys.executable, "-c", job.shell]
+
+
+def describe_load_jobs():
+    """Unit tests for reading job files."""
+
+    def it_reads_json_and_merges_defaults(tmp_path: Path):
+        (tmp_path / "api").mkdir()
+        path = tmp_path / "jobs.json"
+        path.write_text(json.dumps({
+            "concurrency": 2,
+            "defaults": {"options": ["--resources", "auto"], "timeout": 60, "env": {"A": "1"}},
+            "jobs": [
+                {"name": "lint", "project": "api", "shell": "make lint", "env": {"B": 2}},
+                {"project": "api", "args": ["-p", "hello"], "timeout": 5},
+            ],
+        }))
+
+        jobs, concurrency = batch.load_jobs(path)
+
+        assert concurrency == 2
+        assert jobs[0] == batch.Job("lint", tmp_path / "api", "make lint", [], ["--resources", "auto"],
+                                    {"A": "1", "B": "2"}, 60.0)
+        assert (jobs[1].name, jobs[1].args, jobs[1].timeout) == ("job-2", ["-p", "hello"], 5.0)
+
+    @pytest.mark.skipif(batch.tomllib is None, reason="tomllib needs Python 3.11")
+    def it_reads_toml(tmp_path: Path):
+        path = tmp_path / "jobs.toml"
+        path.write_text('[[jobs]]\nproject = "."\nshell = "true"\n')
+
+        jobs, concurrency = batch.load_jobs(path)
+
+        assert concurrency is None
+        assert (jobs[0].project, jobs[0].shell) == (tmp_path, "true")
+
+    @pytest.mark.parametrize("content, message", [
+        ("{", "Invalid JSON"),
+        ('{"jobs": []}', "no jobs"),
+        ('{"jobs": [{"shell": "true"}]}', "missing \"project\""),
+        ('{"jobs": [{"project": "missing"}]}', "does not exist"),
+        ('{"jobs": [{"project": ".", "shell": "a", "args": ["b"]}]}', "not both"),
+        ('{"jobs": [{"project": ".", "name": "a"}, {"project": ".", "name": "a"}]}', "Duplicate"),
+        ('{"jobs": [{"project": ".", "name": "../a"}]}', "names must not"),
+    ])
+    def it_rejects_malformed_files(tmp_path: Path, content: str, message: str):
+        path = tmp_path / "jobs.json"
+        path.write_text(content)
+
+        with pytest.raises(batch.JobFileError, match=message):
+            batch.load_jobs(path)
+
+
+def describe_command():
+    """Unit tests for the per-job command line."""
+
+    def it_runs_clankercage_with_the_job_options(tmp_path: Path):
+        job = batch.Job("a", tmp_path, shell="make", options=["--resources", "small"])
+
+        assert batch.command(job)[1:] == ["-m", "clankercage.cli", "--resources", "small", "--shell", "make"]
+        assert batch.command(batch.Job("b", tmp_path, args=["-p", "hi"]))[-2:] == ["-p", "hi"]
+
+
+def describe_scheduler():
+    """Unit tests for running jobs."""
+
+    @pytest.fixture(autouse=True)
+    def no_docker():
+        with patch("clankercage.batch.command", side_effect=fake_command), \
+             patch("clankercage.batch.pool.remove_container") as remove:
+            yield remove
+
+    def it_logs_output_and_exit_codes_per_job(tmp_path: Path, no_docker):
+        jobs = [
+            python_job(tmp_path, "ok", "import os; print(os.environ['CLANKERCAGE_INSTANCE_ID'], os.environ['X'])",
+                       env={"X": "from-job"}),
+            python_job(tmp_path, "fails", "import sys; print('boom', file=sys.stderr); sys.exit(3)"),
+        ]
+        done = []
+
+        results = batch.Scheduler(tmp_path / "out", concurrency=2).run(jobs, done.append)
+
+        assert [(r.name, r.status, r.exit_code) for r in results] == [("ok", "ok", 0), ("fails", "failed", 3)]
+        assert (tmp_path / "out" / "ok.log").read_text() == f"{results[0].instance} from-job\n"
+        assert (tmp_path / "out" / "fails.log").read_text() == "boom\n"
+        assert sorted(r.name for r in done) == ["fails", "ok"]
+        assert sorted(c.args[0] for c in no_docker.call_args_list) == sorted(r.instance for r in results)
+
+    def it_limits_concurrency(tmp_path: Path):
+        code = "import time; print(time.time()); time.sleep(0.3); print(time.time())"
+        jobs = [python_job(tmp_path, f"j{i}", code) for i in range(4)]
+
+        batch.Scheduler(tmp_path / "out", concurrency=2).run(jobs)
+
+        spans = [tuple(map(float, (tmp_path / "out" / f"j{i}.log").read_text().split())) for i in range(4)]
+        for start, _ in spans:
+            assert sum(1 for s, e in spans if s <= start < e) <= 2
+
+    def it_kills_jobs_past_their_timeout(tmp_path: Path):
+        job = python_job(tmp_path, "slow", "import time; time.sleep(30)", timeout=0.2)
+
+        started = time.monotonic()
+        result, = batch.Scheduler(tmp_path / "out").run([job])
+
+        assert result.status == "timeout"
+        assert time.monotonic() - started < 10
+        assert "killed after 0.2s" in (tmp_path / "out" / "slow.log").read_text()
+
+    def it_keeps_containers_when_asked(tmp_path: Path, no_docker):
+        batch.Scheduler(tmp_path / "out", keep=True).run([python_job(tmp_path, "a", "pass")])
+
+        no_docker.assert_not_called()
+
+
+def describe_write_summary():
+    """Unit tests for the summary file."""
+
+    def it_counts_statuses(tmp_path: Path):
+        result = batch.JobResult("a", "/p", "abc", "ok", 0, 1.0, 2.5, 1.5, "/out/a.log")
+
+        batch.write_summary(tmp_path / "summary.json", [result], 1.0, 3.0)
+
+        summary = json.loads((tmp_path / "summary.json").read_text())
+        assert summary["counts"] == {"ok": 1}
+        assert summary["duration"] == 2.0
+        assert summary["jobs"][0]["instance"] == "abc"
@@ -0,0 +1,161 @@
+"""
+Tests for the package-manager caches shared between instances.
+
+These tests verify that:
+- Sessions mount a cache volume per tool and point the tools at them unless --no-shared-cache is given
+- Images without the cache mount points start without shared caches
+- Eviction removes least recently used entries until the cache is under the cap
+- Recently used entries, entries of a cache being evicted elsewhere and nested matches are left alone
+- Read-only entries (Go modules) and leftovers of an interrupted eviction are removed
+"""
+
+import fcntl
+import importlib.util
+import os
+import subprocess
+from pathlib import Path
+
+from clankercage import caches
+from clankercage.cli import apply_env_defaults, create_parser, modify_config, prepare_config
+
+SCRIPT = Path(__file__).parent.parent / "src" / "clankercage" / "devcontainer" / "cache-evict.py"
+_spec = importlib.util.spec_from_file_location("cache_evict", SCRIPT)
+cache_evict = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(cache_evict)
+
+NOW = 1_000_000.0
+DAY = 86400
+
+
+def session_config(tmp_path: Path, monkeypatch, *options: str) -> dict:
+    monkeypatch.setattr("clankercage.cli.get_cache_dir", lambda: tmp_path / "cache")
+    args = create_parser().parse_args(list(options))
+    apply_env_defaults(args)
+    return modify_config({}, args, tmp_path)
+
+
+def entry(path: Path, size: int, used: float) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(os.urandom(size))
+    os.utime(path, (used, used))
+    return path
+
+
+def describe_shared_cache_config():
+    """Unit tests for mounting the caches into sessions."""
+
+    def it_mounts_a_volume_per_tool_and_points_the_tools_at_it(tmp_path: Path, monkeypatch):
+        config = session_config(tmp_path, monkeypatch, "--shared-cache-size", "2")
+
+        assert "source=clankercage-cache-uv,target=/pkgcache/uv,type=volume" in config["mounts"]
+        assert len([m for m in config["mounts"] if caches.VOLUME_PREFIX in m]) == len(caches.TOOLS)
+        assert config["containerEnv"]["UV_CACHE_DIR"] == "/pkgcache/uv"
+        assert config["containerEnv"]["GOMODCACHE"] == "/pkgcache/go"
+        assert f"cache-evict.py --max-size {2 * 2**30} /pkgcache/uv" in config["postStartCommand"]
+
+    def it_shares_only_cargos_registry(tmp_path: Path, monkeypatch):
+        config = session_config(tmp_path, monkeypatch)
+
+        assert "source=clankercage-cache-cargo,target=/home/node/.cargo/registry,type=volume" in config["mounts"]
+        assert "CARGO_HOME" not in config["containerEnv"]
+        assert "/home/node/.cargo/registry" in config["postStartCommand"]
+
+    def it_can_be_turned_off(tmp_path: Path, monkeypatch):
+        monkeypatch.setenv("CLANKERCAGE_NO_SHARED_CACHE", "1")
+        config = session_config(tmp_path, monkeypatch)
+
+        assert not [m for m in config["mounts"] if caches.VOLUME_PREFIX in m]
+        assert "UV_CACHE_DIR" not in config.get("containerEnv", {})
+        assert "cache-evict.py" not in config["postStartCommand"]
+
+    def it_leaves_the_caches_out_on_images_without_the_mount_points(tmp_path: Path, monkeypatch):
+        monkeypatch.setattr("clankercage.cli.get_cache_dir", lambda: tmp_path / "cache")
+        args = create_parser().parse_args([])
+        apply_env_defaults(args)
+
+        old, _ = prepare_config(args, tmp_path, {"Config": {"Labels": {}}})
+        new, _ = prepare_config(args, tmp_path, {"Config": {"Labels": {caches.IMAGE_LABEL: "1"}}})
+
+        assert not [m for m in old["mounts"] if caches.VOLUME_PREFIX in m]
+        assert "cache-evict.py" not in old["postStartCommand"]
+        assert new["containerEnv"]["UV_CACHE_DIR"] == "/pkgcache/uv"
+        assert not args.no_shared_cache
+
+    def it_runs_eviction_in_the_background(tmp_path: Path, monkeypatch):
+        (tmp_path / "python3").write_text("#!/bin/sh\nsleep 5\n")
+        (tmp_path / "python3").chmod(0o755)
+        monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+        command = caches.evict_command(1).replace("/tmp/cache-evict.log", str(tmp_path / "log"))
+
+        result = subprocess.run(["sh", "-c", command + " && echo started"], capture_output=True, text=True, timeout=2)
+
+        assert result.stdout == "started\n"
+
+
+def describe_evict():
+    """Unit tests for devcontainer/cache-evict.py."""
+
+    def it_removes_the_least_recently_used_entries_until_under_the_cap(tmp_path: Path):
+        cache = tmp_path / "npm"
+        content = cache / "_cacache" / "content-v2" / "sha512"
+        oldest = entry(content / "aa" / "bb" / "1", 40_000, NOW - 3 * DAY)
+        older = entry(content / "aa" / "cc" / "2", 40_000, NOW - 2 * DAY)
+        newer = entry(content / "dd" / "ee" / "3", 40_000, NOW - DAY)
+
+        removed = cache_evict.evict(cache, 100_000, now=NOW)
+
+        assert removed == [oldest, older]
+        assert newer.exists() and not oldest.exists() and not older.exists()
+
+    def it_leaves_a_cache_under_the_cap_alone(tmp_path: Path):
+        cache = tmp_path / "pip"
+        kept = entry(cache / "http-v2" / "a" / "b" / "c" / "d" / "e" / "f", 40_000, NOW - 30 * DAY)
+
+        assert cache_evict.evict(cache, 100_000, now=NOW) == []
+        assert kept.exists()
+
+    def it_keeps_entries_in_use(tmp_path: Path):
+        cache = tmp_path / "uv"
+        recent = entry(cache / "archive-v0" / "abc" / "pkg.py", 200_000, NOW - 60)
+        os.utime(recent.parent, (NOW - 60, NOW - 60))
+
+        assert cache_evict.evict(cache, 100_000, now=NOW) == []
+        assert recent.exists()
+
+    def it_skips_a_cache_another_instance_is_evicting(tmp_path: Path):
+        cache = tmp_path / "uv"
+        old = entry(cache / "archive-v0" / "abc" / "pkg.py", 200_000, NOW - 3 * DAY)
+        with open(cache / cache_evict.LOCK_FILE, "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            assert cache_evict.evict(cache, 100_000, now=NOW) == []
+
+        assert old.exists()
+
+    def it_removes_read_only_go_modules_as_a_whole(tmp_path: Path):
+        cache = tmp_path / "go"
+        module = cache / "github.com" / "acme" / "lib@v1.2.0"
+        entry(module / "sub@dir" / "lib.go", 200_000, NOW - 3 * DAY)
+        for path in (module / "sub@dir", module):
+            path.chmod(0o555)
+            os.utime(path, (NOW - 3 * DAY, NOW - 3 * DAY))
+
+        assert cache_evict.evict(cache, 100_000, now=NOW) == [module]
+        assert not module.exists()
+        assert not list(cache.glob(f"{cache_evict.TRASH_PREFIX}*"))
+
+    def it_removes_cargo_crates_from_the_registry(tmp_path: Path):
+        cache = tmp_path / "registry"
+        crate = entry(cache / "cache" / "index.crates.io-6f17d22bba15001f" / "serde-1.0.0.crate", 200_000, NOW - 3 * DAY)
+        index = entry(cache / "index" / "index.crates.io-6f17d22bba15001f" / "config.json", 1000, NOW - 3 * DAY)
+
+        assert cache_evict.evict(cache, 100_000, now=NOW) == [crate]
+        assert index.exists()
+
+    def it_finishes_an_interrupted_eviction(tmp_path: Path):
+        cache = tmp_path / "pnpm"
+        entry(cache / f"{cache_evict.TRASH_PREFIX}x" / "file", 1000, NOW)
+
+        cache_evict.evict(cache, 100_000, now=NOW)
+
+        assert not (cache / f"{cache_evict.TRASH_PREFIX}x").exists()
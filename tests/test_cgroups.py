@@ -0,0 +1,144 @@
+"""
+Tests for the cgroup v2 sampler.
+
+These tests verify that:
+- cgroup files (flat-keyed, PSI, io.stat, single values) are parsed
+- Unlimited ("max") limits and missing controllers are left out
+- A container's cgroup is found by ID or through its init process
+- New containers are inspected once, stopped ones are dropped
+"""
+
+import json
+import subprocess
+from pathlib import Path
+from unittest.mock import patch
+
+from clankercage import cgroups
+
+CPU_STAT = "usage_usec 5000000\nuser_usec 3000000\nsystem_usec 2000000\nnr_periods 10\nnr_throttled 2\nthrottled_usec 250000\n"
+PRESSURE = "some avg10=1.50 avg60=0.80 avg300=0.20 total=1200000\nfull avg10=0.00 avg60=0.00 avg300=0.00 total=300000\n"
+IO_STAT = "8:0 rbytes=1000 wbytes=2000 rios=10 wios=20 dbytes=0 dios=0\n8:16 rbytes=500 wbytes=0 rios=5 wios=0 dbytes=0 dios=0\n"
+
+
+def make_cgroup(path: Path, **files: str) -> Path:
+    path.mkdir(parents=True)
+    (path / "cgroup.controllers").write_text("cpu io memory pids\n")
+    for name, content in files.items():
+        (path / name.replace("_", ".", 1)).write_text(content)
+    return path
+
+
+def container(cid: str, instance: str, pid: int = 0) -> dict:
+    return {
+        "Id": cid,
+        "Config": {"Labels": {"clanker.instance": instance, "devcontainer.local_folder": "/home/me/project"}},
+        "State": {"Pid": pid, "StartedAt": "2026-01-01T12:00:00.123456789Z"},
+    }
+
+
+def describe_parsers():
+    """Unit tests for the cgroup file formats."""
+
+    def it_parses_flat_keyed_files():
+        assert cgroups.parse_keyed("oom 1\noom_kill 2\nbad\n") == {"oom": 1, "oom_kill": 2}
+
+    def it_parses_psi_totals():
+        assert cgroups.parse_pressure(PRESSURE) == {"some": 1200000, "full": 300000}
+
+    def it_sums_io_stat_over_devices():
+        assert cgroups.parse_io_stat(IO_STAT) == {"rbytes": 1500, "wbytes": 2000, "rios": 15, "wios": 20, "dbytes": 0, "dios": 0}
+
+
+def describe_read_stats():
+    """Unit tests for sampling a cgroup."""
+
+    def it_reads_cpu_memory_pids_io_and_pressure(tmp_path: Path):
+        cgroup = make_cgroup(
+            tmp_path / "cg",
+            cpu_stat=CPU_STAT, memory_current="1048576\n", memory_max="8589934592\n",
+            memory_events="low 0\nhigh 0\nmax 3\noom 1\noom_kill 1\n", pids_current="42\n", pids_max="500\n",
+            io_stat=IO_STAT, cpu_pressure=PRESSURE, memory_pressure=PRESSURE,
+        )
+
+        stats = cgroups.read_stats(cgroup)
+
+        assert stats["cpu_user_usec"] == 3000000
+        assert stats["cpu_system_usec"] == 2000000
+        assert stats["cpu_throttled_usec"] == 250000
+        assert stats["memory_current"] == 1048576
+        assert stats["memory_max"] == 8589934592
+        assert stats["oom_kills"] == 1
+        assert (stats["pids_current"], stats["pids_max"]) == (42, 500)
+        assert stats["io"]["rbytes"] == 1500
+        assert stats["pressure"] == {"cpu": {"some": 1200000, "full": 300000},
+                                     "memory": {"some": 1200000, "full": 300000}, "io": {}}
+
+    def it_leaves_out_unlimited_and_missing_values(tmp_path: Path):
+        cgroup = make_cgroup(tmp_path / "cg", cpu_stat=CPU_STAT, memory_max="max\n")
+
+        stats = cgroups.read_stats(cgroup)
+
+        assert stats["memory_max"] is None
+        assert stats["pids_current"] is None
+
+    def it_returns_none_for_a_removed_cgroup(tmp_path: Path):
+        assert cgroups.read_stats(tmp_path / "gone") is None
+
+
+def describe_find_cgroup():
+    """Unit tests for locating a container's cgroup."""
+
+    def it_finds_the_systemd_scope(tmp_path: Path):
+        scope = make_cgroup(tmp_path / "system.slice" / "docker-abc.scope")
+
+        assert cgroups.find_cgroup("abc", 0, tmp_path) == scope
+
+    def it_finds_the_cgroupfs_directory(tmp_path: Path):
+        directory = make_cgroup(tmp_path / "docker" / "abc")
+
+        assert cgroups.find_cgroup("abc", 0, tmp_path) == directory
+
+    def it_falls_back_to_the_init_process(tmp_path: Path):
+        nested = make_cgroup(tmp_path / "cg" / "user.slice" / "custom" / "abc")
+        (tmp_path / "proc" / "1234").mkdir(parents=True)
+        (tmp_path / "proc" / "1234" / "cgroup").write_text("0::/user.slice/custom/abc\n")
+
+        assert cgroups.find_cgroup("abc", 1234, tmp_path / "cg", tmp_path / "proc") == nested
+
+    def it_returns_none_when_not_visible(tmp_path: Path):
+        assert cgroups.find_cgroup("abc", 1234, tmp_path, tmp_path) is None
+
+
+def describe_instance_tracker():
+    """Unit tests for tracking running instance containers."""
+
+    def it_inspects_new_containers_once_and_drops_stopped_ones(tmp_path: Path):
+        make_cgroup(tmp_path / "system.slice" / "docker-c1.scope")
+        calls = []
+
+        def fake_run(cmd, **kwargs):
+            calls.append(cmd)
+            if cmd[1] == "ps":
+                return subprocess.CompletedProcess(cmd, 0, stdout=running)
+            inspected = [container(cid, f"inst-{cid}") for cid in cmd[3:]]
+            return subprocess.CompletedProcess(cmd, 0, stdout=json.dumps(inspected))
+
+        tracker = cgroups.InstanceTracker(tmp_path)
+        with patch("clankercage.cgroups.subprocess.run", side_effect=fake_run):
+            running = "c1\nc2\n"
+            first = tracker.refresh()
+            running = "c1\n"
+            second = tracker.refresh()
+
+        assert [i.instance for i in first] == ["inst-c1", "inst-c2"]
+        assert first[0].cgroup == tmp_path / "system.slice" / "docker-c1.scope"
+        assert first[0].project == "/home/me/project"
+        assert first[0].started == 1767268800.123456
+        assert first[1].cgroup is None
+        assert [i.instance for i in second] == ["inst-c1"]
+        assert [c[1:3] for c in calls] == [["ps", "-q"], ["container", "inspect"], ["ps", "-q"]]
+
+    def it_reports_an_unreachable_docker():
+        with patch("clankercage.cgroups.subprocess.run",
+                   return_value=subprocess.CompletedProcess([], 1, stdout="")):
+            assert cgroups.InstanceTracker().refresh() is None
@@ -13,7 +13,9 @@ from unittest import mock
 
 import pytest
 
-from clankercage.cli import get_container_info
+from clankercage import registry
+from clankercage.cli import (config_fingerprint, devcontainer_up, get_container_info, materialize_workspace,
+                             recorded_flags, remove_stale_containers)
 
 
 def describe_get_container_info():
@@ -80,6 +82,152 @@ def describe_get_container_info():
         assert info["source"] == "local"
 
 
+def describe_config_fingerprint():
+    """Unit tests for config_fingerprint function."""
+
+    def it_is_stable_for_identical_configs(tmp_path: Path):
+        """Same config and project always produce the same fingerprint."""
+        config = {"image": "img", "mounts": ["a", "b"], "runArgs": ["--cpus=4"]}
+        reordered = {"runArgs": ["--cpus=4"], "mounts": ["a", "b"], "image": "img"}
+
+        assert config_fingerprint(config, tmp_path) == config_fingerprint(reordered, tmp_path)
+
+    def it_changes_when_mounts_change(tmp_path: Path):
+        """Adding a mount (e.g. an SSH key) yields a new fingerprint."""
+        before = {"image": "img", "mounts": ["a"]}
+        after = {"image": "img", "mounts": ["a", "source=/key,target=/home/node/.ssh/key"]}
+
+        assert config_fingerprint(before, tmp_path) != config_fingerprint(after, tmp_path)
+
+    def it_changes_with_project_dir_and_image(tmp_path: Path):
+        """Different project directories or image IDs never share a container."""
+        config = {"image": "img"}
+        base = config_fingerprint(config, tmp_path, image_id="sha256:aaa")
+
+        assert config_fingerprint(config, tmp_path / "other", image_id="sha256:aaa") != base
+        assert config_fingerprint(config, tmp_path, image_id="sha256:bbb") != base
+
+    def it_includes_build_context_for_local_builds(tmp_path: Path):
+        """With --build, editing the Dockerfile invalidates the fingerprint."""
+        context = tmp_path / "ctx"
+        context.mkdir()
+        dockerfile = context / "Dockerfile"
+        dockerfile.write_text("FROM base:1")
+        config = {"build": {"dockerfile": "Dockerfile", "context": "."}}
+
+        before = config_fingerprint(config, tmp_path, context)
+        dockerfile.write_text("FROM base:2")
+
+        assert config_fingerprint(config, tmp_path, context) != before
+
+
+def record_reusable(project: Path, *instance_ids: str) -> None:
+    for instance_id in instance_ids:
+        registry.record(instance_id, project=str(project), reuse=True, container_id=f"c-{instance_id}",
+                        state=registry.STOPPED)
+
+
+def describe_remove_stale_containers():
+    """Unit tests for remove_stale_containers function."""
+
+    def it_removes_only_containers_with_other_fingerprints(tmp_path: Path):
+        """Containers for the current fingerprint are kept, others removed."""
+        record_reusable(tmp_path, "abc123", "old456")
+        record_reusable(tmp_path / "other", "other789")
+
+        with mock.patch("clankercage.cli.instances.sync"), mock.patch("subprocess.run") as run:
+            remove_stale_containers(tmp_path, "abc123")
+
+        assert run.call_args_list[-1].args[0] == ["docker", "rm", "-f", "c-old456"]
+        with registry.Registry() as reg:
+            assert reg.get("old456").state == registry.REMOVED
+
+    def it_does_nothing_when_up_to_date(tmp_path: Path):
+        """No docker rm when the only container matches."""
+        record_reusable(tmp_path, "abc123")
+
+        with mock.patch("clankercage.cli.instances.sync"), mock.patch("subprocess.run") as run:
+            remove_stale_containers(tmp_path, "abc123")
+
+        assert run.call_count == 0
+
+
+def describe_recorded_flags():
+    """Unit tests for the options kept in the instance registry."""
+
+    def it_keeps_settings_and_drops_secrets():
+        options = ["--reuse", "--gh-token", "ghp_secret", "--resources=auto", "-e", "API_KEY=secret",
+                   "--shell", "echo secret", "-p", "8080:80", "--launcher", "native", "--print", "a prompt"]
+
+        assert recorded_flags(options) == ["--reuse", "--resources=auto", "-p", "8080:80", "--launcher", "native"]
+
+    def it_splits_short_options_with_attached_values():
+        options = ["-p8080:80", "-eAPI_KEY=secret", "-vsecret:/data", "--reuse"]
+
+        assert recorded_flags(options) == ["-p", "8080:80", "--reuse"]
+
+    def it_drops_secrets_given_with_equals():
+        assert recorded_flags(["--gh-token=ghp_secret", "--env=API_KEY=secret", "--dns-stub"]) == ["--dns-stub"]
+
+
+def describe_devcontainer_up():
+    """Unit tests for starting an instance's container."""
+
+    def it_clears_phases_from_earlier_starts(tmp_path: Path, monkeypatch):
+        """phases.tsv is removed before the start, so a restart doesn't report old phases."""
+        monkeypatch.setattr("clankercage.cli.get_instance_runtime_dir", lambda instance_id: tmp_path)
+        (tmp_path / "phases.tsv").write_text("firewall.load\t1.0\t2.0\n")
+
+        with mock.patch("clankercage.cli.NativeLauncher") as launcher:
+            devcontainer_up(tmp_path / "devcontainer.json", tmp_path, "abc123")
+
+        launcher.from_config_file.return_value.up.assert_called_once()
+        assert not (tmp_path / "phases.tsv").exists()
+
+    def it_names_the_instances_own_ruleset(tmp_path: Path, monkeypatch):
+        """The ruleset compiled for this run is recorded in the instance's runtime dir."""
+        monkeypatch.setattr("clankercage.cli.get_instance_runtime_dir", lambda instance_id: tmp_path)
+
+        with mock.patch("clankercage.cli.NativeLauncher"):
+            devcontainer_up(tmp_path / "devcontainer.json", tmp_path, "abc123", ruleset=tmp_path / "rulesets" / "0123abcd")
+
+        assert (tmp_path / "ruleset").read_text() == "0123abcd\n"
+
+
+def describe_materialize_workspace():
+    """Unit tests for the content-addressed workspace cache."""
+
+    def it_shares_a_workspace_between_identical_configs(tmp_path: Path, monkeypatch):
+        monkeypatch.setattr(Path, "home", lambda: tmp_path)
+        first, config_path = materialize_workspace({"image": "img"})
+        second, _ = materialize_workspace({"image": "img"})
+
+        assert first == second
+        assert (first / ".devcontainer" / "init-firewall.sh").exists()
+        assert '"image": "img"' in config_path.read_text()
+        assert len(list((tmp_path / ".cache" / "clankercage").iterdir())) == 1
+
+    def it_uses_a_new_workspace_when_the_config_changes(tmp_path: Path, monkeypatch):
+        monkeypatch.setattr(Path, "home", lambda: tmp_path)
+        first, _ = materialize_workspace({"image": "img"})
+        second, _ = materialize_workspace({"image": "other"})
+
+        assert first != second
+
+    def it_keeps_the_winner_when_another_run_created_it_first(tmp_path: Path, monkeypatch):
+        """A lost rename race leaves the existing workspace and no temp dir."""
+        monkeypatch.setattr(Path, "home", lambda: tmp_path)
+        workspace, _ = materialize_workspace({"image": "img"})
+        marker = workspace / "marker"
+        marker.touch()
+
+        with mock.patch("pathlib.Path.is_dir", return_value=False):
+            materialize_workspace({"image": "img"})
+
+        assert marker.exists()
+        assert [p.name for p in (tmp_path / ".cache" / "clankercage").iterdir()] == [workspace.name]
+
+
 @pytest.fixture
 def workspace_path(tmp_path: Path) -> Path:
     """Create a tmp_path that's accessible to container's node user (UID 1000).
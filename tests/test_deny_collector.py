@@ -0,0 +1,119 @@
+"""
+Tests for the in-container denied-egress collector (devcontainer/deny-collector.py).
+
+These tests verify that:
+- NFLOG packet messages are parsed into destinations (address, protocol, port)
+- Netlink errors and acks are reported
+- Counts are aggregated per destination with a bounded number of destinations
+- Snapshots label addresses with known domains
+"""
+
+import importlib.util
+import json
+import socket
+import struct
+from pathlib import Path
+
+SCRIPT = Path(__file__).parent.parent / "src" / "clankercage" / "devcontainer" / "deny-collector.py"
+_spec = importlib.util.spec_from_file_location("deny_collector", SCRIPT)
+deny_collector = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(deny_collector)
+
+
+def ip_packet(dst: str, proto: int = 6, port: int = 443) -> bytes:
+    header = struct.pack("!BBHHHBBH4s4s", 0x45, 0, 40, 0, 0, 64, proto, 0, socket.inet_aton("172.17.0.2"),
+                         socket.inet_aton(dst))
+    return header + struct.pack("!HH", 40000, port) + b"\0" * 16
+
+
+def nflog_message(payload: bytes) -> bytes:
+    body = struct.pack("=BB", socket.AF_INET, 0) + struct.pack(">H", 17)
+    body += deny_collector.attribute(10, b"clanker-denied\0") + deny_collector.attribute(deny_collector.NFULA_PAYLOAD, payload)
+    msg_type = (deny_collector.NFNL_SUBSYS_ULOG << 8) | deny_collector.NFULNL_MSG_PACKET
+    return struct.pack("=IHHII", 16 + len(body), msg_type, 0, 0, 0) + body
+
+
+def error_message(code: int) -> bytes:
+    body = struct.pack("=i", -code) + b"\0" * 16
+    return struct.pack("=IHHII", 16 + len(body), deny_collector.NLMSG_ERROR, 0, 1, 0) + body
+
+
+def describe_parse_messages():
+    """Unit tests for netlink parsing."""
+
+    def it_extracts_packet_payloads_from_a_batch():
+        first, second = ip_packet("203.0.113.5"), ip_packet("198.51.100.7", proto=17, port=53)
+
+        payloads, errors = deny_collector.parse_messages(nflog_message(first) + nflog_message(second))
+
+        assert payloads == [first, second]
+        assert errors == []
+
+    def it_reports_errors_and_acks():
+        _, errors = deny_collector.parse_messages(error_message(0) + error_message(1))
+
+        assert errors == [0, 1]
+
+
+def describe_parse_destination():
+    """Unit tests for IPv4 header parsing."""
+
+    def it_reads_tcp_and_udp_ports():
+        assert deny_collector.parse_destination(ip_packet("203.0.113.5")) == ("203.0.113.5", "tcp", 443)
+        assert deny_collector.parse_destination(ip_packet("203.0.113.5", proto=17, port=123)) == ("203.0.113.5", "udp", 123)
+
+    def it_uses_port_zero_for_icmp():
+        assert deny_collector.parse_destination(ip_packet("203.0.113.5", proto=1)) == ("203.0.113.5", "icmp", 0)
+
+    def it_ignores_non_ipv4_payloads():
+        assert deny_collector.parse_destination(b"\x60" + b"\0" * 39) is None
+        assert deny_collector.parse_destination(b"\x45\0") is None
+
+
+def describe_aggregator():
+    """Unit tests for bounded aggregation."""
+
+    def it_counts_packets_per_destination():
+        aggregator = deny_collector.Aggregator(now=100.0)
+        for _ in range(3):
+            aggregator.add(ip_packet("203.0.113.5"), now=110.0)
+        aggregator.add(ip_packet("203.0.113.5", port=80), now=120.0)
+
+        snapshot = aggregator.snapshot({"203.0.113.5": "blocked.example.com"}, now=130.0)
+
+        assert snapshot["started"] == 100.0
+        assert snapshot["updated"] == 130.0
+        assert snapshot["destinations"] == [
+            {"ip": "203.0.113.5", "proto": "tcp", "port": 80, "domain": "blocked.example.com", "count": 1, "last": 120.0},
+            {"ip": "203.0.113.5", "proto": "tcp", "port": 443, "domain": "blocked.example.com", "count": 3, "last": 110.0},
+        ]
+
+    def it_counts_destinations_beyond_the_limit_as_overflow():
+        aggregator = deny_collector.Aggregator(max_destinations=2)
+        for host in range(1, 6):
+            aggregator.add(ip_packet(f"203.0.113.{host}"))
+        aggregator.add(ip_packet("203.0.113.1"))
+
+        snapshot = aggregator.snapshot({})
+
+        assert [(d["ip"], d["count"]) for d in snapshot["destinations"]] == [("203.0.113.1", 2), ("203.0.113.2", 1)]
+        assert snapshot["overflow"] == 3
+
+
+def describe_load_names():
+    """Unit tests for address-to-domain labels."""
+
+    def it_reads_the_dns_cache_and_refresh_records(tmp_path: Path):
+        (tmp_path / "dns.tsv").write_text("api.example.com\t10.0.0.1\t100\n")
+        (tmp_path / "records.tsv").write_text("cdn.example.com\t10.0.0.2\t100\t90\nbroken\n")
+
+        names = deny_collector.load_names((str(tmp_path / "dns.tsv"), str(tmp_path / "records.tsv"), str(tmp_path / "missing")))
+
+        assert names == {"10.0.0.1": "api.example.com", "10.0.0.2": "cdn.example.com"}
+
+    def it_writes_snapshots_atomically(tmp_path: Path):
+        path = tmp_path / "denied.json"
+        deny_collector.write_snapshot(str(path), {"overflow": 0})
+
+        assert json.loads(path.read_text()) == {"overflow": 0}
+        assert [p.name for p in tmp_path.iterdir()] == ["denied.json"]
@@ -0,0 +1,232 @@
+"""
+Tests for the in-container DNS stub resolver (devcontainer/dns-stub.py).
+
+These tests run the stub against a local fake upstream resolver and verify that:
+- Answers for allowed domains and wildcard patterns are allowlisted before they are returned
+- Set entries time out with the record TTL (with a floor)
+- Domains approved at runtime are picked up without restarting the stub
+- Other domains are forwarded without touching the set
+- Upstream failures are answered with SERVFAIL
+- Queries over UDP and TCP are served
+- The CLI passes the resolver mode to init-firewall.sh per instance
+"""
+
+import importlib.util
+import socket
+import socketserver
+import struct
+import threading
+from pathlib import Path
+
+import pytest
+
+from clankercage.cli import apply_env_defaults, create_parser, modify_config
+
+SCRIPT = Path(__file__).parent.parent / "src" / "clankercage" / "devcontainer" / "dns-stub.py"
+_spec = importlib.util.spec_from_file_location("dns_stub", SCRIPT)
+dns_stub = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(dns_stub)
+
+# name -> [(address, ttl)] served by the fake upstream (through a CNAME, like a CDN)
+ZONE = {
+    "registry.example.com": [("10.0.0.1", 120), ("10.0.0.2", 120)],
+    "eu.cdn.example.net": [("10.0.1.1", 5)],
+    "blocked.example.org": [("10.0.2.1", 300)],
+}
+
+
+def encode_name(name: str) -> bytes:
+    return b"".join(bytes([len(label)]) + label.encode() for label in name.split(".")) + b"\0"
+
+
+def build_query(name: str, qtype: int = 1, query_id: int = 0x1234) -> bytes:
+    return struct.pack("!HHHHHH", query_id, 0x0100, 1, 0, 0, 0) + encode_name(name) + struct.pack("!HH", qtype, 1)
+
+
+def build_response(query: bytes) -> bytes:
+    """Answer a query from ZONE: a CNAME to edge.cdn.test, then its A records."""
+    name, qtype = dns_stub.parse_question(query)
+    question = query[12:]
+    records = ZONE.get(name, []) if qtype == 1 else []
+    answers = b""
+    if records:
+        target = encode_name("edge.cdn.test")
+        answers += b"\xc0\x0c" + struct.pack("!HHIH", 5, 1, 300, len(target)) + target
+        target_offset = 12 + len(question) + 12
+        for ip, ttl in records:
+            answers += struct.pack("!HHHIH", 0xC000 | target_offset, 1, 1, ttl, 4) + socket.inet_aton(ip)
+    ancount = len(records) + 1 if records else 0
+    return query[:2] + struct.pack("!HHHHH", 0x8180, 1, ancount, 0, 0) + question + answers
+
+
+class FakeUpstreamUDP(socketserver.BaseRequestHandler):
+    def handle(self):
+        query, sock = self.request
+        if self.server.fail:
+            return
+        sock.sendto(build_response(query), self.client_address)
+
+
+class FakeUpstreamTCP(socketserver.BaseRequestHandler):
+    def handle(self):
+        length, = struct.unpack("!H", dns_stub.recv_exactly(self.request, 2))
+        response = build_response(dns_stub.recv_exactly(self.request, length))
+        self.request.sendall(struct.pack("!H", len(response)) + response)
+
+
+def start(server: socketserver.BaseServer) -> None:
+    threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+
+@pytest.fixture
+def upstream():
+    """A fake upstream resolver on UDP and TCP (same port)."""
+    udp = socketserver.ThreadingUDPServer(("127.0.0.1", 0), FakeUpstreamUDP)
+    udp.fail = False
+    tcp = socketserver.ThreadingTCPServer(("127.0.0.1", udp.server_address[1]), FakeUpstreamTCP)
+    start(udp)
+    start(tcp)
+    yield udp
+    for server in (udp, tcp):
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def allowed():
+    """Entries passed to the set (instead of running ipset)."""
+    return []
+
+
+@pytest.fixture
+def resolver(upstream, allowed):
+    allowlist = dns_stub.Allowlist(["registry.example.com", "*.cdn.example.net"])
+    return dns_stub.Resolver(allowlist, upstream.server_address, allow=allowed.extend, timeout=0.5)
+
+
+def describe_allowlist():
+    """Unit tests for domain and wildcard matching."""
+
+    def it_matches_exact_domains_case_insensitively():
+        allowlist = dns_stub.Allowlist(["registry.example.com"])
+
+        assert allowlist.matches("Registry.Example.com.")
+        assert not allowlist.matches("sub.registry.example.com")
+
+    def it_matches_any_subdomain_of_a_wildcard_but_not_the_apex():
+        allowlist = dns_stub.Allowlist(["*.example.net"])
+
+        assert allowlist.matches("cdn.example.net")
+        assert allowlist.matches("eu.cdn.example.net")
+        assert not allowlist.matches("example.net")
+        assert not allowlist.matches("badexample.net")
+
+
+def describe_reloading_allowlist():
+    """Unit tests for re-reading the pattern files."""
+
+    def it_picks_up_domains_appended_at_runtime(tmp_path: Path):
+        domains = tmp_path / "domains.txt"
+        domains.write_text("registry.example.com\n")
+        approved = tmp_path / "approved.txt"
+        allowlist = dns_stub.ReloadingAllowlist([str(domains), str(approved)])
+
+        assert allowlist.matches("registry.example.com")
+        assert not allowlist.matches("blocked.example.org")
+
+        approved.write_text("blocked.example.org\n")
+
+        assert allowlist.matches("blocked.example.org")
+        assert allowlist.matches("registry.example.com")
+
+
+def describe_resolver():
+    """Unit tests for forwarding and allowlisting."""
+
+    def it_allowlists_domains_approved_after_it_started(tmp_path: Path, upstream, allowed):
+        approved = tmp_path / "approved.txt"
+        approved.write_text("")
+        allowlist = dns_stub.ReloadingAllowlist([str(approved)])
+        resolver = dns_stub.Resolver(allowlist, upstream.server_address, allow=allowed.extend, timeout=0.5)
+        resolver.resolve(build_query("blocked.example.org"))
+        assert allowed == []
+
+        # What add-domain-to-firewall.sh does in stub mode
+        with approved.open("a") as f:
+            f.write("blocked.example.org\n")
+        resolver.resolve(build_query("blocked.example.org"))
+
+        assert allowed == [("10.0.2.1", 300)]
+
+    def it_allowlists_answers_before_returning_them(resolver, allowed):
+        response = resolver.resolve(build_query("registry.example.com"))
+
+        assert allowed == [("10.0.0.1", 120), ("10.0.0.2", 120)]
+        assert dns_stub.a_records(response) == [("10.0.0.1", 120), ("10.0.0.2", 120)]
+
+    def it_applies_a_floor_to_short_ttls(resolver, allowed):
+        resolver.resolve(build_query("eu.cdn.example.net"))
+
+        assert allowed == [("10.0.1.1", dns_stub.MIN_TIMEOUT)]
+
+    def it_forwards_other_domains_without_allowlisting(resolver, allowed):
+        response = resolver.resolve(build_query("blocked.example.org"))
+
+        assert allowed == []
+        assert dns_stub.a_records(response) == [("10.0.2.1", 300)]
+
+    def it_ignores_non_a_queries(resolver, allowed):
+        resolver.resolve(build_query("registry.example.com", qtype=28))
+
+        assert allowed == []
+
+    def it_answers_servfail_when_upstream_is_down(resolver, upstream, allowed):
+        upstream.fail = True
+        response = resolver.resolve(build_query("registry.example.com"))
+
+        assert response[:2] == b"\x12\x34"
+        assert struct.unpack_from("!H", response, 2)[0] & 0xF == dns_stub.RCODE_SERVFAIL
+        assert allowed == []
+
+
+def describe_serve():
+    """End-to-end tests through the stub's sockets."""
+
+    def it_serves_udp_and_tcp(resolver, allowed):
+        udp, tcp = dns_stub.serve(resolver, "127.0.0.1", 0)
+        start(udp)
+        start(tcp)
+        try:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                sock.settimeout(2)
+                sock.sendto(build_query("registry.example.com"), udp.server_address)
+                udp_response = sock.recv(65535)
+
+            query = build_query("eu.cdn.example.net", query_id=7)
+            with socket.create_connection(tcp.server_address, timeout=2) as sock:
+                sock.sendall(struct.pack("!H", len(query)) + query)
+                length, = struct.unpack("!H", dns_stub.recv_exactly(sock, 2))
+                tcp_response = dns_stub.recv_exactly(sock, length)
+        finally:
+            for server in (udp, tcp):
+                server.shutdown()
+                server.server_close()
+
+        assert dns_stub.a_records(udp_response) == [("10.0.0.1", 120), ("10.0.0.2", 120)]
+        assert tcp_response[:2] == b"\x00\x07"
+        assert ("10.0.1.1", dns_stub.MIN_TIMEOUT) in allowed
+
+
+def describe_resolver_mode():
+    """Unit tests for how the CLI selects the resolver mode."""
+
+    def it_passes_the_mode_to_init_firewall(tmp_path: Path, monkeypatch):
+        monkeypatch.setattr("clankercage.cli.get_cache_dir", lambda: tmp_path / "cache")
+        commands = {}
+        for options in ([], ["--dns-stub"]):
+            args = create_parser().parse_args(options)
+            apply_env_defaults(args)
+            commands[bool(options)] = modify_config({}, args, tmp_path)["postStartCommand"]
+
+        assert "init-firewall.sh --resolver=stub" in commands[True]
+        assert "--resolver" not in commands[False]
@@ -0,0 +1,194 @@
+"""
+Tests for the Docker Engine API client.
+
+These tests run the client against a fake Docker daemon on a local unix
+socket and verify that:
+- One connection is reused across requests
+- Image inspect reports missing images and exposes labels
+- Pull progress is streamed message by message
+"""
+
+import json
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+
+import pytest
+
+from clankercage.engine import DockerEngine, EngineError, UnixHTTPConnection, split_image_reference
+
+IMAGE = {
+    "Id": "sha256:abc",
+    "Config": {"Labels": {"org.opencontainers.image.created": "2025-01-15T10:30:00Z",
+                          "org.opencontainers.image.source.type": "ghcr.io"}},
+}
+
+
+class FakeDockerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status: int, payload) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.connections.add(id(self.connection))
+        self.server.paths.append(self.path)
+        if self.path == "/v1.41/_ping":
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"OK")
+        elif self.path.startswith("/v1.41/images/ghcr.io%2Fclankerbot%2Fclankercage%3Alatest/json"):
+            self._json(200, IMAGE)
+        elif self.path.startswith("/v1.41/images/"):
+            self._json(404, {"message": "No such image"})
+        elif self.path == "/v1.41/info":
+            self._json(200, {"NCPU": 6, "MemTotal": 8 * 1024 ** 3, "Name": "docker-desktop"})
+        elif self.path.startswith("/v1.41/containers/json"):
+            self._json(200, [{"Id": "c1", "Labels": {"clanker.instance": "abc123"}}])
+        elif self.path == "/v1.41/containers/c1/json":
+            self._json(200, {"Id": "c1", "State": {"Status": "running"}})
+        else:
+            self._json(404, {"message": "not found"})
+
+    def do_POST(self):
+        self.server.paths.append(self.path)
+        messages = [{"status": "Pulling from clankerbot/clankercage", "id": "latest"},
+                    {"status": "Downloading", "id": "l1", "progressDetail": {"current": 1, "total": 2}},
+                    {"status": "Pull complete", "id": "l1"}]
+        if "fromImage=broken" in self.path:
+            messages.append({"error": "manifest unknown"})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for message in messages:
+            chunk = (json.dumps(message) + "\r\n").encode()
+            self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+@pytest.fixture
+def fake_daemon(tmp_path: Path):
+    """A fake Docker daemon listening on a unix socket."""
+    socket_path = str(tmp_path / "docker.sock")
+    server = socketserver.ThreadingUnixStreamServer(socket_path, FakeDockerHandler)
+    server.daemon_threads = True
+    server.paths = []
+    server.connections = set()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server, socket_path
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def engine(fake_daemon):
+    _, socket_path = fake_daemon
+    client = DockerEngine(UnixHTTPConnection(socket_path, timeout=5))
+    yield client
+    client.close()
+
+
+def describe_docker_engine():
+    """Unit tests for DockerEngine against a fake daemon."""
+
+    def it_inspects_present_and_missing_images(engine: DockerEngine):
+        """Present images return the inspect payload, missing ones None."""
+        assert engine.inspect_image("ghcr.io/clankerbot/clankercage:latest") == IMAGE
+        assert engine.inspect_image("missing:latest") is None
+
+    def it_reports_the_daemons_cpus_and_memory(engine: DockerEngine):
+        info = engine.info()
+
+        assert (info["NCPU"], info["MemTotal"]) == (6, 8 * 1024 ** 3)
+
+    def it_reuses_one_connection(engine: DockerEngine, fake_daemon):
+        """Several requests share a single keep-alive connection."""
+        server, _ = fake_daemon
+        engine.ping()
+        engine.inspect_image("ghcr.io/clankerbot/clankercage:latest")
+        engine.list_containers({"clanker.instance": "abc123"})
+
+        assert len(server.connections) == 1
+
+    def it_filters_containers_by_label(engine: DockerEngine, fake_daemon):
+        """Label filters are sent as a JSON filters query."""
+        server, _ = fake_daemon
+        containers = engine.list_containers({"clanker.instance": "abc123"})
+
+        assert containers[0]["Id"] == "c1"
+        assert "filters=%7B%22label%22%3A+%5B%22clanker.instance%3Dabc123%22%5D%7D" in server.paths[-1]
+
+    def it_filters_by_label_key_and_inspects_containers(engine: DockerEngine, fake_daemon):
+        """A label without a value matches any value; missing containers inspect as None."""
+        server, _ = fake_daemon
+        engine.list_containers({"clanker.instance": None})
+
+        assert "%5B%22clanker.instance%22%5D" in server.paths[-1]
+        assert engine.inspect_container("c1")["State"]["Status"] == "running"
+        assert engine.inspect_container("gone") is None
+
+    def it_streams_pull_progress(engine: DockerEngine):
+        """Each progress message reaches the callback in order."""
+        messages = []
+        engine.pull_image("ghcr.io/clankerbot/clankercage:latest", messages.append)
+
+        assert [m["status"] for m in messages] == [
+            "Pulling from clankerbot/clankercage", "Downloading", "Pull complete"
+        ]
+
+    def it_raises_on_pull_errors(engine: DockerEngine):
+        """An error message in the pull stream raises EngineError."""
+        with pytest.raises(EngineError, match="manifest unknown"):
+            engine.pull_image("broken:latest")
+
+    def it_raises_when_daemon_is_unreachable(tmp_path: Path):
+        """A missing socket is reported as EngineError."""
+        client = DockerEngine(UnixHTTPConnection(str(tmp_path / "nope.sock")))
+
+        with pytest.raises(EngineError):
+            client.ping()
+
+
+def describe_from_env():
+    """Unit tests for picking a transport from DOCKER_HOST."""
+
+    def it_falls_back_for_unsupported_hosts(monkeypatch):
+        """ssh:// and TLS hosts are left to the docker CLI."""
+        monkeypatch.setenv("DOCKER_HOST", "ssh://user@remote")
+        assert DockerEngine.from_env() is None
+
+        monkeypatch.setenv("DOCKER_HOST", "tcp://remote:2376")
+        monkeypatch.setenv("DOCKER_TLS_VERIFY", "1")
+        assert DockerEngine.from_env() is None
+
+    def it_uses_unix_sockets_that_exist(monkeypatch, fake_daemon):
+        """A unix:// DOCKER_HOST pointing at a live socket is used."""
+        _, socket_path = fake_daemon
+        monkeypatch.setenv("DOCKER_HOST", f"unix://{socket_path}")
+
+        client = DockerEngine.from_env()
+        assert client is not None
+        client.ping()
+        client.close()
+
+
+def describe_split_image_reference():
+    """Unit tests for split_image_reference."""
+
+    def it_splits_tags_and_keeps_registry_ports():
+        assert split_image_reference("ghcr.io/clankerbot/clankercage:latest") == ("ghcr.io/clankerbot/clankercage", "latest")
+        assert split_image_reference("localhost:5000/img") == ("localhost:5000/img", "latest")
+        assert split_image_reference("img") == ("img", "latest")
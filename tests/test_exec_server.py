@@ -0,0 +1,179 @@
+"""
+Tests for the in-container command server (devcontainer/exec-server.py) and its client.
+
+These tests verify that:
+- Commands get their argv, env, cwd and stdin, and report output and exit status
+- Many commands run concurrently over one connection
+- Unread output pauses a command once the window is full
+- Signals reach the command's whole process group, and a closed connection kills its commands
+- Sessions started with --exec-server run commands through the server
+"""
+
+import asyncio
+import contextlib
+import importlib.util
+import signal
+import time
+from pathlib import Path
+
+import pytest
+
+from clankercage import api
+from clankercage.cli import apply_env_defaults, create_parser, modify_config
+from clankercage.exec_client import EXEC_SOCKET, ExecClient, ExecServerError
+
+SCRIPT = Path(__file__).parent.parent / "src" / "clankercage" / "devcontainer" / "exec-server.py"
+_spec = importlib.util.spec_from_file_location("exec_server", SCRIPT)
+exec_server = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(exec_server)
+
+
+@contextlib.asynccontextmanager
+async def connected(tmp_path: Path):
+    path = tmp_path / EXEC_SOCKET
+    server = asyncio.ensure_future(exec_server.serve(exec_server.listen(str(path))))
+    client = await ExecClient.connect(path)
+    try:
+        yield client
+    finally:
+        await client.close()
+        server.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await server
+
+
+async def read_all(output) -> bytes:
+    data = b""
+    while chunk := await output.read(65536):
+        data += chunk
+    return data
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        return Path(f"/proc/{pid}/stat").read_text().split()[2] != "Z"
+    except OSError:
+        return False
+
+
+class FakeLauncher:
+    workspace_folder = "/"
+
+
+def describe_exec_server():
+    """Unit tests for running commands over the socket."""
+
+    @pytest.mark.asyncio
+    async def it_runs_a_command_with_env_cwd_and_stdin(tmp_path: Path):
+        async with connected(tmp_path) as client:
+            channel = await client.open(["sh", "-c", 'cat; echo "$GREETING" "$PWD"; echo err >&2; exit 4'],
+                                        env={"GREETING": "hi"}, cwd=str(tmp_path), stdin=b"input\n")
+
+            assert await read_all(channel.stdout) == f"input\nhi {tmp_path}\n".encode()
+            assert await read_all(channel.stderr) == b"err\n"
+            assert await channel.wait() == 4
+
+    @pytest.mark.asyncio
+    async def it_reports_commands_that_cannot_start(tmp_path: Path):
+        async with connected(tmp_path) as client:
+            channel = await client.open(["/nonexistent/tool"], stdin=b"")
+
+            assert await channel.wait() == 127
+            assert b"exec-server:" in await read_all(channel.stderr)
+
+    @pytest.mark.asyncio
+    async def it_multiplexes_concurrent_commands_over_one_connection(tmp_path: Path):
+        async with connected(tmp_path) as client:
+            channels = [await client.open(["sh", "-c", f"sleep 0.2; echo {i}"], stdin=b"") for i in range(20)]
+            started = time.monotonic()
+
+            outputs = await asyncio.gather(*(read_all(c.stdout) for c in channels))
+
+            assert outputs == [f"{i}\n".encode() for i in range(20)]
+            assert [await c.wait() for c in channels] == [0] * 20
+            assert time.monotonic() - started < 2
+
+    @pytest.mark.asyncio
+    async def it_keeps_per_command_overhead_low(tmp_path: Path):
+        async with connected(tmp_path) as client:
+            started = time.monotonic()
+            for _ in range(50):
+                channel = await client.open(["true"], stdin=b"")
+                assert await channel.wait() == 0
+
+            # Generous bound for loaded CI machines; typically a few ms each
+            assert (time.monotonic() - started) / 50 < 0.05
+
+    @pytest.mark.asyncio
+    async def it_pauses_a_command_whose_output_is_not_read(tmp_path: Path):
+        done = tmp_path / "done"
+        async with connected(tmp_path) as client:
+            channel = await client.open(["sh", "-c", f"head -c 4000000 /dev/zero; touch {done}"], stdin=b"")
+            await asyncio.sleep(0.5)
+
+            assert not done.exists()
+            assert len(await read_all(channel.stdout)) == 4000000
+            assert await channel.wait() == 0
+            assert done.exists()
+
+    @pytest.mark.asyncio
+    async def it_signals_the_whole_process_group(tmp_path: Path):
+        async with connected(tmp_path) as client:
+            channel = await client.open(["sh", "-c", "sleep 300 & echo $!; wait"], stdin=b"")
+            child = int((await channel.stdout.read(100)).decode())
+
+            await channel.signal(signal.SIGTERM)
+
+            assert await channel.wait() == -signal.SIGTERM
+            await asyncio.sleep(0.1)
+            assert not pid_alive(child)
+
+    @pytest.mark.asyncio
+    async def it_kills_commands_when_the_connection_closes(tmp_path: Path):
+        async with connected(tmp_path) as client:
+            channel = await client.open(["sh", "-c", "echo $$; exec sleep 300"])
+            pid = int((await channel.stdout.read(100)).decode())
+            await client.close()
+
+            with pytest.raises(ExecServerError):
+                await channel.wait()
+            for _ in range(50):
+                if not pid_alive(pid):
+                    break
+                await asyncio.sleep(0.05)
+            assert not pid_alive(pid)
+
+
+def describe_session_over_exec_server():
+    """Unit tests for API sessions using the command server."""
+
+    @pytest.fixture
+    def session(tmp_path: Path, monkeypatch) -> api.Session:
+        monkeypatch.setattr("clankercage.cli.get_instance_runtime_dir", lambda instance_id: tmp_path)
+        monkeypatch.setattr(api, "KILL_GRACE", 1)
+        started = api.Session(tmp_path, ["--exec-server"], instance_id="abc")
+        started._launcher = FakeLauncher()
+        return started
+
+    @pytest.mark.asyncio
+    async def it_runs_commands_through_the_server(tmp_path: Path, session: api.Session):
+        server = asyncio.ensure_future(exec_server.serve(exec_server.listen(str(tmp_path / EXEC_SOCKET))))
+        try:
+            result = await session.run(["sh", "-c", "echo $PWD"])
+            with pytest.raises(api.ExecTimeout):
+                await session.run(["sleep", "300"], timeout=0.2)
+        finally:
+            await session._exec_client.close()
+            server.cancel()
+
+        # No docker on PATH is needed: the command ran as the server's child, in the workspace folder
+        assert (result.returncode, result.stdout) == (0, b"/\n")
+
+    def it_starts_the_server_after_the_firewall(tmp_path: Path, monkeypatch):
+        monkeypatch.setattr("clankercage.cli.get_cache_dir", lambda: tmp_path / "cache")
+        args = create_parser().parse_args(["--exec-server"])
+        apply_env_defaults(args)
+
+        command = modify_config({}, args, tmp_path)["postStartCommand"]
+
+        assert command.index("init-firewall.sh") < command.index("exec-server.py --daemon")
@@ -5,6 +5,9 @@ These tests verify that:
 - Blocked domains are actually blocked
 - Whitelisted domains are accessible
 - Dynamic domain approval works
+- Resolved domains are cached for later starts
+- Allowed domains keep being refreshed in the background
+- Verification reports its result without blocking startup
 """
 
 import pytest
@@ -78,6 +81,21 @@ def describe_firewall():
         if not initial_blocked:
             print("Note: httpbin.org was already accessible (may be in user's approved list)")
 
+    @pytest.mark.integration
+    def it_allows_a_batch_of_domains(devcontainer: DevContainer):
+        """Verify that a list of domains is resolved and allowed in one call."""
+        result = devcontainer.exec(
+            "printf 'httpbin.org\\n# comment\\nexample.org\\nnot-a-real-host.invalid\\n' "
+            "| sudo /usr/local/bin/add-domain-to-firewall.sh --batch",
+            timeout=30,
+        )
+        assert result.returncode == 0, f"Batch approval failed: {result.stderr}"
+        assert "Allowed 2 domains" in result.stdout
+        assert "not-a-real-host.invalid" in result.stderr
+
+        result = devcontainer.exec("curl --connect-timeout 10 -s https://example.org", timeout=20)
+        assert result.returncode == 0, f"Batch-approved domain should be accessible: {result.stderr}"
+
     @pytest.mark.integration
     def it_rejects_invalid_domain_format(devcontainer: DevContainer):
         """Verify that invalid domain formats are rejected."""
@@ -107,3 +125,44 @@ def describe_firewall():
             timeout=10,
         )
         assert result.returncode == 0, "registry.npmjs.org should be in whitelist file"
+
+    @pytest.mark.integration
+    def it_caches_resolved_domains(devcontainer: DevContainer):
+        """Resolved whitelist entries land in the shared DNS cache with an expiry."""
+        if devcontainer.exec("test -d /var/cache/clankercage", timeout=10).returncode != 0:
+            pytest.skip("Firewall cache dir not mounted (container not started by clankercage)")
+
+        result = devcontainer.exec("grep -P '^registry\\.npmjs\\.org\\t' /var/cache/clankercage/dns.tsv", timeout=10)
+        assert result.returncode == 0, "registry.npmjs.org should be cached"
+        _, ip, expires = result.stdout.splitlines()[0].split("\t")
+        assert ip.count(".") == 3
+        assert int(expires) > 0
+
+    @pytest.mark.integration
+    def it_tracks_allowed_domains_for_refresh(devcontainer: DevContainer):
+        """The DNS refresh daemon runs and tracks whitelisted and approved domains."""
+        result = devcontainer.exec("pgrep -f /usr/local/bin/dns-refresh.sh", timeout=10)
+        assert result.returncode == 0, "dns-refresh.sh should be running"
+
+        result = devcontainer.exec("grep -x 'registry.npmjs.org' /run/dns-refresh/domains.txt", timeout=10)
+        assert result.returncode == 0, "registry.npmjs.org should be tracked"
+
+        devcontainer.exec("sudo /usr/local/bin/add-domain-to-firewall.sh httpbin.org", timeout=30)
+        result = devcontainer.exec("grep -P '^httpbin\\.org\\t' /run/dns-refresh/records.tsv", timeout=10)
+        assert result.returncode == 0, "Approved domains should be tracked with their IPs"
+
+    @pytest.mark.integration
+    def it_reports_verification_in_the_status_file(devcontainer: DevContainer):
+        """The structural check passed and the background probes report their result."""
+        if devcontainer.exec("test -d /run/clankercage", timeout=10).returncode != 0:
+            pytest.skip("Runtime dir not mounted (container not started by clankercage)")
+
+        result = devcontainer.exec(
+            "for i in $(seq 30); do grep -qx probes=done /run/clankercage/firewall-status && break; sleep 0.5; done; "
+            "cat /run/clankercage/firewall-status",
+            timeout=30,
+        )
+        status = dict(line.split("=", 1) for line in result.stdout.split())
+        assert status["structural"] == "ok"
+        assert status["probes"] == "done"
+        assert status["blocked"] == "ok"
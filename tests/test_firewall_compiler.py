@@ -0,0 +1,206 @@
+"""
+Tests for the host-side firewall compiler.
+
+These tests verify that:
+- The ruleset is deterministic and leaves only the container-specific parts as placeholders
+- Rulesets are cached by a hash of their inputs, with no shared "current" ruleset
+- Domains missing from the DNS cache are resolved and merged into it
+- Stub mode keeps wildcard patterns and leaves resolution to the container
+- Pruning keeps rulesets of live instances and compiles in progress
+"""
+
+import os
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from clankercage.firewall import KEEP_RULESETS, build_ruleset, compile_ruleset, load_domains, read_dns_cache
+
+CACHE = {
+    "api.example.com": [("10.0.0.2", 100), ("10.0.0.10", 100)],
+    "cdn.example.com": [("10.0.0.2", 100)],
+    "unused.example.com": [("10.9.9.9", 100)],
+}
+
+
+def write_inputs(tmp_path: Path) -> tuple[Path, Path]:
+    cache_dir = tmp_path / "firewall"
+    cache_dir.mkdir()
+    (cache_dir / "github-cidrs.txt").write_text("140.82.112.0/20\n")
+    (cache_dir / "dns.tsv").write_text(
+        "api.example.com\t10.0.0.2\t100\n"
+        "cdn.example.com\t10.0.0.3\t100\n"
+    )
+    whitelist = tmp_path / "whitelisted-domains.txt"
+    whitelist.write_text("# comment\napi.example.com\n\ncdn.example.com\n")
+    return cache_dir, whitelist
+
+
+def describe_load_domains():
+    """Unit tests for load_domains."""
+
+    def it_skips_comments_blank_lines_and_invalid_entries(tmp_path: Path):
+        path = tmp_path / "domains.txt"
+        path.write_text("# comment\n\nexample.com\n  padded.example.com  \nbad domain\n-bad.com\n")
+
+        assert load_domains(path) == ["example.com", "padded.example.com"]
+
+    def it_keeps_wildcards_only_when_asked(tmp_path: Path):
+        path = tmp_path / "domains.txt"
+        path.write_text("*.example.com\nexample.org\n*bad.example.com\n")
+
+        assert load_domains(path) == ["example.org"]
+        assert load_domains(path, wildcards=True) == ["*.example.com", "example.org"]
+
+    def it_returns_nothing_for_a_missing_file(tmp_path: Path):
+        assert load_domains(tmp_path / "missing.txt") == []
+
+
+def describe_compile_ruleset():
+    """Unit tests for compile_ruleset."""
+
+    def it_builds_a_sorted_deduplicated_allowlist():
+        ruleset = compile_ruleset(["cdn.example.com", "api.example.com"], ["140.82.112.0/20"], CACHE)
+
+        assert ruleset["ipset.restore"].splitlines() == [
+            "create allowed-domains hash:net",
+            "create allowed-domains-new hash:net",
+            "flush allowed-domains-new",
+            "add allowed-domains-new 10.0.0.2",
+            "add allowed-domains-new 10.0.0.10",
+            "add allowed-domains-new 140.82.112.0/20",
+            "swap allowed-domains-new allowed-domains",
+            "destroy allowed-domains-new",
+        ]
+        assert ruleset["domains.txt"] == "api.example.com\ncdn.example.com\n"
+
+    def it_is_deterministic():
+        first = compile_ruleset(["a.example.com", "api.example.com"], [], CACHE)
+        second = compile_ruleset(["api.example.com", "a.example.com", "api.example.com"], [], CACHE)
+
+        assert first == second
+
+    def it_leaves_the_container_specific_parts_as_placeholders():
+        rules = compile_ruleset([], [], {})["iptables.rules"]
+
+        assert "-A OUTPUT -d @HOST_NETWORK@ -j ACCEPT" in rules
+        assert "@DOCKER_DNS_RULES@" in rules
+        assert "-A OUTPUT -m set --match-set allowed-domains dst -j ACCEPT" in rules
+
+    def it_leaves_domain_addresses_to_the_stub_in_stub_mode():
+        ruleset = compile_ruleset(["api.example.com", "*.example.net"], ["140.82.112.0/20"], CACHE, stub=True)
+
+        assert ruleset["ipset.restore"].splitlines()[:4] == [
+            "create allowed-domains hash:net timeout 0",
+            "create allowed-domains-new hash:net timeout 0",
+            "flush allowed-domains-new",
+            "add allowed-domains-new 140.82.112.0/20",
+        ]
+        assert "10.0.0.2" not in ruleset["ipset.restore"]
+        assert ruleset["domains.txt"] == "*.example.net\napi.example.com\n"
+        assert ruleset["resolver"] == "stub\n"
+
+
+def describe_build_ruleset():
+    """Unit tests for the cached build."""
+
+    def it_writes_the_ruleset(tmp_path: Path):
+        cache_dir, whitelist = write_inputs(tmp_path)
+        ruleset_dir = build_ruleset(cache_dir, [whitelist], resolve=False)
+
+        assert ruleset_dir.parent == cache_dir / "rulesets"
+        assert "add allowed-domains-new 10.0.0.3" in (ruleset_dir / "ipset.restore").read_text()
+        assert (ruleset_dir / "iptables.rules").exists()
+
+    def it_reuses_the_ruleset_for_unchanged_inputs(tmp_path: Path):
+        cache_dir, whitelist = write_inputs(tmp_path)
+        first = build_ruleset(cache_dir, [whitelist], resolve=False)
+        with patch("clankercage.firewall.compile_ruleset") as compile_mock:
+            second = build_ruleset(cache_dir, [whitelist], resolve=False)
+
+        assert first == second
+        compile_mock.assert_not_called()
+
+    def it_compiles_a_new_ruleset_when_inputs_change(tmp_path: Path):
+        cache_dir, whitelist = write_inputs(tmp_path)
+        first = build_ruleset(cache_dir, [whitelist], resolve=False)
+        (cache_dir / "github-cidrs.txt").write_text("140.82.112.0/20\n192.30.252.0/22\n")
+        second = build_ruleset(cache_dir, [whitelist], resolve=False)
+
+        assert first != second
+        assert first.is_dir() and second.is_dir()
+
+    def it_leaves_other_modes_rulesets_in_place(tmp_path: Path):
+        """A stub compile after a static one doesn't change what the static instance applies."""
+        cache_dir, whitelist = write_inputs(tmp_path)
+        static = build_ruleset(cache_dir, [whitelist], resolve=False)
+        stub = build_ruleset(cache_dir, [whitelist], resolve=False, stub=True)
+
+        assert static != stub
+        assert (static / "resolver").read_text() == "static\n"
+        assert (stub / "resolver").read_text() == "stub\n"
+        assert not (cache_dir / "ruleset").exists()
+
+    def it_ignores_cache_expiry_times(tmp_path: Path):
+        cache_dir, whitelist = write_inputs(tmp_path)
+        first = build_ruleset(cache_dir, [whitelist], resolve=False)
+        (cache_dir / "dns.tsv").write_text(
+            "api.example.com\t10.0.0.2\t999\n"
+            "cdn.example.com\t10.0.0.3\t999\n"
+        )
+
+        assert build_ruleset(cache_dir, [whitelist], resolve=False) == first
+
+    def it_resolves_and_caches_domains_missing_from_the_cache(tmp_path: Path):
+        cache_dir, whitelist = write_inputs(tmp_path)
+        (tmp_path / "approved").write_text("new.example.com\n")
+
+        with patch("clankercage.firewall.resolve_domains", return_value={"new.example.com": ["10.0.0.4"]}) as resolve:
+            ruleset_dir = build_ruleset(cache_dir, [whitelist, tmp_path / "approved"])
+
+        resolve.assert_called_once_with(["new.example.com"])
+        cached = read_dns_cache(cache_dir)
+        assert [ip for ip, _ in cached["new.example.com"]] == ["10.0.0.4"]
+        assert cached["new.example.com"][0][1] > time.time()
+        assert cached["api.example.com"] == [("10.0.0.2", 100)]
+        assert "add allowed-domains-new 10.0.0.4" in (ruleset_dir / "ipset.restore").read_text()
+
+    def it_keeps_rulesets_in_use_and_compiles_in_progress(tmp_path: Path):
+        cache_dir, whitelist = write_inputs(tmp_path)
+        rulesets_dir = cache_dir / "rulesets"
+        for name in ["0" * 16, *(f"{i:016x}" for i in range(1, KEEP_RULESETS + 2))]:
+            (rulesets_dir / name).mkdir(parents=True)
+        os.utime(rulesets_dir / ("0" * 16), (0, 0))
+        (rulesets_dir / ".abc.123").mkdir()
+        os.utime(rulesets_dir / ".abc.123", (0, 0))
+        run_dir = tmp_path / "run"
+        (run_dir / "live").mkdir(parents=True)
+        (run_dir / "live" / "ruleset").write_text("0" * 16 + "\n")
+
+        current = build_ruleset(cache_dir, [whitelist], resolve=False, run_dir=run_dir)
+
+        assert current.is_dir()
+        assert (rulesets_dir / ("0" * 16)).is_dir()
+        assert (rulesets_dir / ".abc.123").is_dir()
+        assert len([p for p in rulesets_dir.iterdir() if not p.name.startswith(".")]) == KEEP_RULESETS + 1
+
+    def it_fails_when_the_ruleset_could_not_be_written(tmp_path: Path):
+        cache_dir, whitelist = write_inputs(tmp_path)
+
+        with patch("clankercage.firewall.os.rename", side_effect=OSError("disk full")), \
+             pytest.raises(OSError, match="Failed to write"):
+            build_ruleset(cache_dir, [whitelist], resolve=False)
+
+    def it_skips_resolution_in_stub_mode(tmp_path: Path):
+        cache_dir, whitelist = write_inputs(tmp_path)
+        static = build_ruleset(cache_dir, [whitelist], resolve=False)
+        (tmp_path / "approved").write_text("new.example.com\n*.example.net\n")
+
+        with patch("clankercage.firewall.resolve_domains") as resolve:
+            ruleset_dir = build_ruleset(cache_dir, [whitelist, tmp_path / "approved"], stub=True)
+
+        resolve.assert_not_called()
+        assert ruleset_dir != static
+        assert "*.example.net" in (ruleset_dir / "domains.txt").read_text().splitlines()
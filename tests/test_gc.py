@@ -0,0 +1,117 @@
+"""
+Tests for clankercage gc.
+
+These tests verify that:
+- Workspaces are removed by age and LRU, but never while in use
+- Runtime directories of removed containers are cleaned up, but kept when Docker can't be asked
+- Only stopped containers and orphaned volumes past the max age are picked
+"""
+
+import os
+import time
+from pathlib import Path
+from unittest import mock
+
+from clankercage.gc import (
+    STARTUP_GRACE,
+    collect,
+    parse_docker_time,
+    select_containers,
+    select_runtime_dirs,
+    select_volumes,
+    select_workspaces,
+)
+
+DAY = 86400
+
+
+def make_dir(path: Path, age: float) -> Path:
+    path.mkdir(parents=True)
+    mtime = time.time() - age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def describe_select_workspaces():
+    """Unit tests for workspace age/LRU selection."""
+
+    def it_removes_workspaces_older_than_max_age(tmp_path: Path):
+        old = make_dir(tmp_path / "workspace-old", 10 * DAY)
+        make_dir(tmp_path / "workspace-new", 60)
+
+        assert select_workspaces(tmp_path, 7 * DAY, keep=50, in_use=set()) == [old]
+
+    def it_keeps_only_the_most_recently_used(tmp_path: Path):
+        make_dir(tmp_path / "workspace-a", 60)
+        b = make_dir(tmp_path / "workspace-b", 120)
+        c = make_dir(tmp_path / "workspace-c", 180)
+
+        assert select_workspaces(tmp_path, 7 * DAY, keep=1, in_use=set()) == [b, c]
+
+    def it_never_removes_workspaces_in_use(tmp_path: Path):
+        old = make_dir(tmp_path / "workspace-old", 10 * DAY)
+
+        assert select_workspaces(tmp_path, 7 * DAY, keep=0, in_use={old}) == []
+
+    def it_removes_abandoned_temp_dirs(tmp_path: Path):
+        abandoned = make_dir(tmp_path / ".workspace-abc.1234", STARTUP_GRACE + 60)
+        make_dir(tmp_path / ".workspace-def.5678", 1)
+
+        assert select_workspaces(tmp_path, 7 * DAY, keep=50, in_use=set()) == [abandoned]
+
+
+def describe_select_runtime_dirs():
+    """Unit tests for runtime directory selection."""
+
+    def it_removes_dirs_without_a_container(tmp_path: Path):
+        make_dir(tmp_path / "run" / "live", STARTUP_GRACE + 60)
+        gone = make_dir(tmp_path / "run" / "gone", STARTUP_GRACE + 60)
+        make_dir(tmp_path / "run" / "starting", 1)
+
+        assert select_runtime_dirs(tmp_path, {"live"}) == [gone]
+
+
+def describe_collect():
+    """Unit tests for a whole gc run."""
+
+    def it_keeps_runtime_dirs_when_docker_is_unreachable(tmp_path: Path):
+        """No container list means no way to tell live instances from orphans."""
+        live = make_dir(tmp_path / "run" / "live", STARTUP_GRACE + 60)
+        messages = []
+
+        with mock.patch("clankercage.gc._docker_json", return_value=None):
+            result = collect(tmp_path, 7 * DAY, 50, set(), log=messages.append)
+
+        assert result.runtime_dirs == []
+        assert live.is_dir()
+        assert "runtime directories are kept" in messages[0]
+
+
+def describe_select_containers():
+    """Unit tests for container selection."""
+
+    def it_picks_stopped_containers_past_max_age():
+        now = parse_docker_time("2025-01-15T10:30:00Z")
+        containers = [
+            {"Id": "running", "State": {"Running": True, "FinishedAt": "0001-01-01T00:00:00Z"}},
+            {"Id": "stale", "State": {"Running": False, "FinishedAt": "2025-01-01T10:30:00.123456789Z"}},
+            {"Id": "recent", "State": {"Running": False, "FinishedAt": "2025-01-15T09:30:00Z"}},
+            {"Id": "never_started", "State": {"FinishedAt": "0001-01-01T00:00:00Z"}, "Created": "2025-01-02T00:00:00Z"},
+        ]
+
+        selected = select_containers(containers, 7 * DAY, now)
+        assert [c["Id"] for c in selected] == ["stale", "never_started"]
+
+
+def describe_select_volumes():
+    """Unit tests for volume selection."""
+
+    def it_picks_old_bash_history_volumes_only():
+        now = parse_docker_time("2025-01-15T10:30:00Z")
+        volumes = [
+            {"Name": "claude-code-bashhistory-abc", "CreatedAt": "2025-01-01T10:30:00+01:00"},
+            {"Name": "claude-code-bashhistory-new", "CreatedAt": "2025-01-15T10:00:00Z"},
+            {"Name": "unrelated", "CreatedAt": "2024-01-01T10:30:00Z"},
+        ]
+
+        assert [v["Name"] for v in select_volumes(volumes, 7 * DAY, now)] == ["claude-code-bashhistory-abc"]
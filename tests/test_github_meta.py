@@ -0,0 +1,115 @@
+"""
+Tests for the cached GitHub meta fetch.
+
+These tests run against a local HTTP stand-in for api.github.com/meta and verify that:
+- Ranges are aggregated into IPv4 CIDRs for the container
+- The cached list is used without a request within the refresh interval
+- Revalidation sends If-None-Match and handles 304
+- Failed fetches fall back to the cached list
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from clankercage.github_meta import GitHubMetaError, aggregate_cidrs, refresh_github_cidrs
+
+META = {
+    "web": ["192.30.252.0/22", "185.199.108.0/22", "2a0a:a440::/29"],
+    "api": ["192.30.252.0/23", "140.82.112.0/20"],
+    "git": ["192.30.252.0/22", "140.82.112.0/21"],
+    "hooks": ["10.0.0.0/8"],
+}
+ETAG = '"abc123"'
+
+
+class FakeGitHubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.headers.get("If-None-Match"))
+        if self.server.fail:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(META).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def fake_github():
+    """A local HTTP server serving a GitHub meta fixture."""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGitHubHandler)
+    server.requests = []
+    server.fail = False
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server, f"http://127.0.0.1:{server.server_address[1]}/meta"
+    server.shutdown()
+    server.server_close()
+
+
+def describe_aggregate_cidrs():
+    """Unit tests for aggregate_cidrs."""
+
+    def it_collapses_ipv4_ranges_from_web_api_and_git():
+        assert aggregate_cidrs(META) == ["140.82.112.0/20", "185.199.108.0/22", "192.30.252.0/22"]
+
+    def it_rejects_payloads_without_required_fields():
+        with pytest.raises(ValueError, match="git"):
+            aggregate_cidrs({"web": [], "api": []})
+
+
+def describe_refresh_github_cidrs():
+    """Unit tests for the cached, conditional fetch."""
+
+    def it_writes_the_list_for_the_container(tmp_path: Path, fake_github):
+        _, url = fake_github
+        cidrs = refresh_github_cidrs(tmp_path, url=url)
+
+        assert cidrs == ["140.82.112.0/20", "185.199.108.0/22", "192.30.252.0/22"]
+        assert (tmp_path / "github-cidrs.txt").read_text().splitlines() == cidrs
+
+    def it_skips_the_request_within_the_interval(tmp_path: Path, fake_github):
+        server, url = fake_github
+        for _ in range(3):
+            refresh_github_cidrs(tmp_path, interval=3600, url=url)
+
+        assert server.requests == [None]
+
+    def it_revalidates_with_the_etag(tmp_path: Path, fake_github):
+        server, url = fake_github
+        refresh_github_cidrs(tmp_path, interval=0, url=url)
+        cidrs = refresh_github_cidrs(tmp_path, interval=0, url=url)
+
+        assert server.requests == [None, ETAG]
+        assert cidrs == ["140.82.112.0/20", "185.199.108.0/22", "192.30.252.0/22"]
+
+    def it_falls_back_to_the_cache_when_the_fetch_fails(tmp_path: Path, fake_github):
+        server, url = fake_github
+        refresh_github_cidrs(tmp_path, interval=0, url=url)
+        server.fail = True
+
+        assert refresh_github_cidrs(tmp_path, interval=0, url=url) == [
+            "140.82.112.0/20", "185.199.108.0/22", "192.30.252.0/22"
+        ]
+
+    def it_raises_without_a_cache_to_fall_back_to(tmp_path: Path, fake_github):
+        server, url = fake_github
+        server.fail = True
+
+        with pytest.raises(GitHubMetaError):
+            refresh_github_cidrs(tmp_path, url=url)
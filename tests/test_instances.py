@@ -0,0 +1,146 @@
+"""
+Tests for finding instances to list and attach to.
+
+These tests verify that:
+- Inspect output is turned into instances, with the project from labels or the workspace mount
+- Attach picks an instance by ID prefix, or the newest running one for the project
+- Idle pool members and stopped containers are not attached to
+- The attach command runs as the container's user in its workspace
+- Uptimes are formatted compactly
+- ps and attach report an unreadable registry instead of a traceback
+"""
+
+import sqlite3
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from clankercage import instances
+from clankercage.cli import attach_main, ps_main
+
+
+def container(instance_id: str, started: str = "2025-01-15T10:00:00.123456789Z", status: str = "running",
+              labels: dict | None = None, mounts: list | None = None) -> dict:
+    return {
+        "Id": f"c-{instance_id}",
+        "Config": {"Labels": {"clanker.instance": instance_id, **(labels or {})}, "User": "node",
+                   "WorkingDir": "/workspace"},
+        "State": {"Status": status, "StartedAt": started},
+        "Mounts": mounts or [],
+    }
+
+
+def instance(instance_id: str, project: str = "/p", started: float = 100.0, state: str = "running",
+             pooled: bool = False) -> instances.Instance:
+    return instances.Instance(instance_id, f"c-{instance_id}", project, state, started, pooled=pooled)
+
+
+def describe_from_container():
+    """Unit tests for reading inspect output."""
+
+    def it_takes_the_project_from_the_workspace_mount():
+        found = instances.from_container(container("abc", mounts=[
+            {"Source": "/home/me/.cache/x", "Destination": "/run/clankercage"},
+            {"Source": "/home/me/api", "Destination": "/workspace"},
+        ]))
+
+        assert (found.instance_id, found.project, found.user, found.workspace_folder) == \
+               ("abc", "/home/me/api", "node", "/workspace")
+        assert found.started == pytest.approx(1736935200.123, abs=0.001)
+
+    def it_prefers_the_devcontainer_cli_label():
+        found = instances.from_container(container("abc", labels={"devcontainer.local_folder": "/home/me/web"}))
+
+        assert found.project == "/home/me/web"
+
+    def it_marks_idle_pool_members():
+        assert instances.from_container(container("abc"), idle={"abc"}).pooled
+
+
+def describe_find_instance():
+    """Unit tests for picking the instance to attach to."""
+
+    def it_finds_an_instance_by_prefix():
+        found = [instance("abc123"), instance("def456")]
+
+        assert instances.find_instance(found, "abc").instance_id == "abc123"
+
+    @pytest.mark.parametrize("ref, message", [("zzz", "No instance matches"), ("a", "several"), ("s", "not running")])
+    def it_rejects_unusable_references(ref: str, message: str):
+        found = [instance("abc123"), instance("abd456"), instance("stopped", state="exited")]
+
+        with pytest.raises(instances.InstanceNotFound, match=message):
+            instances.find_instance(found, ref)
+
+    def it_picks_the_newest_running_session_of_the_project():
+        # list_instances sorts newest first
+        found = [instance("pool", pooled=True), instance("other", project="/q"), instance("gone", state="exited"),
+                 instance("new"), instance("old")]
+
+        assert instances.find_instance(found, project=Path("/p")).instance_id == "new"
+
+    def it_reports_projects_without_sessions():
+        with pytest.raises(instances.InstanceNotFound, match="No running instance for /p"):
+            instances.find_instance([instance("pool", pooled=True)], project=Path("/p"))
+
+
+def describe_format_uptime():
+    """Unit tests for uptimes."""
+
+    @pytest.mark.parametrize("seconds, text", [(5, "5s"), (125, "2m"), (3 * 3600 + 300, "3h05m"), (2 * 86400 + 4 * 3600, "2d04h")])
+    def it_formats_durations(seconds: float, text: str):
+        assert instances.format_uptime(seconds) == text
+
+    def it_shows_the_state_of_stopped_instances():
+        assert instances.uptime(instance("a", state="exited"), now=200) == "exited"
+        assert instances.uptime(instance("a"), now=200) == "1m"
+
+
+def describe_commands():
+    """Unit tests for `clankercage ps` and `clankercage attach`."""
+
+    def it_lists_instances_with_uptime(capsys):
+        found = [instance("abc123", started=1000.0), instance("pool1", pooled=True, started=1000.0)]
+        with patch("clankercage.cli.instances.list_instances", return_value=found), \
+             patch("clankercage.cli.time.time", return_value=1090.0):
+            ps_main([])
+
+        lines = capsys.readouterr().out.splitlines()
+        assert lines[1].split() == ["abc123", "running", "1m", "/p"]
+        assert "idle (pool)" in lines[2]
+
+    def it_execs_into_the_instance_with_claude_continue(tmp_path: Path):
+        found = [instance("abc123", project=str(tmp_path))]
+        with patch("clankercage.cli.instances.list_instances", return_value=found), \
+             patch("clankercage.cli.os.execvp") as execvp:
+            attach_main(["--project", str(tmp_path), "--", "--model", "opus"])
+
+        cmd = execvp.call_args.args[1]
+        assert cmd[:2] == ["docker", "exec"]
+        assert cmd[cmd.index("-u"):cmd.index("c-abc123") + 1] == ["-u", "node", "-w", "/workspace", "c-abc123"]
+        assert cmd[cmd.index("c-abc123") + 1:] == ["claude", "--dangerously-skip-permissions", "--continue",
+                                                   "--model", "opus"]
+
+    def it_opens_a_shell_when_asked():
+        with patch("clankercage.cli.instances.list_instances", return_value=[instance("abc123")]), \
+             patch("clankercage.cli.os.execvp") as execvp:
+            attach_main(["abc", "--shell"])
+
+        assert execvp.call_args.args[1][-3:] == ["sh", "-c", 'exec "${SHELL:-bash}" -l']
+
+    def it_exits_when_nothing_matches(capsys):
+        with patch("clankercage.cli.instances.list_instances", return_value=[]), pytest.raises(SystemExit):
+            attach_main(["abc"])
+
+        assert "No instance matches" in capsys.readouterr().err
+
+    def it_reports_an_unavailable_registry(capsys):
+        for command in (ps_main, attach_main):
+            with patch("clankercage.cli.instances.list_instances",
+                       side_effect=sqlite3.OperationalError("database is locked")), \
+                 pytest.raises(SystemExit) as exit_info:
+                command([])
+
+            assert exit_info.value.code == 1
+            assert "Error: instance registry unavailable: database is locked" in capsys.readouterr().err
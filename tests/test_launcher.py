@@ -0,0 +1,176 @@
+"""
+Tests for the native Docker launcher.
+
+These tests verify that:
+- devcontainer.json variables are substituted like the devcontainers CLI does
+- The config subset is rendered into the expected docker create arguments
+- Running containers are reused without re-running postStartCommand
+- remoteUser is remapped to the host uid/gid on Linux, once per image
+"""
+
+import subprocess
+from pathlib import Path
+from unittest import mock
+
+from clankercage.launcher import NativeLauncher, get_devcontainer_id
+
+
+def make_launcher(tmp_path: Path, **overrides) -> NativeLauncher:
+    config = {
+        "image": "ghcr.io/clankerbot/clankercage:latest",
+        "runArgs": ["--cap-add=NET_ADMIN", "--memory=8g"],
+        "remoteUser": "node",
+        "mounts": ["source=${localEnv:HOME}/.claude,target=/home/node/.claude,type=bind,readonly",
+                   "source=history-${devcontainerId},target=/commandhistory,type=volume"],
+        "containerEnv": {"CLAUDE_CONFIG_DIR": "/home/node/.claude"},
+        "workspaceMount": "source=${localWorkspaceFolder},target=/workspace,type=bind",
+        "workspaceFolder": "/workspace",
+        "postStartCommand": "sudo /usr/local/bin/init-firewall.sh",
+        "waitFor": "postStartCommand",
+    }
+    config.update(overrides)
+    return NativeLauncher(config, tmp_path, tmp_path / "project", {"clanker.instance": "abc123"})
+
+
+def fake_docker(id_output: str, remapped_exists: bool = False):
+    """subprocess.run stand-in for the docker calls remap_user_image makes."""
+    def run(cmd, **kwargs):
+        if cmd[:3] == ["docker", "image", "inspect"] and "--format" in cmd:
+            return subprocess.CompletedProcess(cmd, 0, "sha256:abc|node\n", "")
+        if cmd[:3] == ["docker", "image", "inspect"]:
+            return subprocess.CompletedProcess(cmd, 0 if remapped_exists else 1, "", "")
+        if cmd[:2] == ["docker", "run"]:
+            return subprocess.CompletedProcess(cmd, 0, id_output, "")
+        return subprocess.CompletedProcess(cmd, 0, "", "")
+    return run
+
+
+def describe_get_devcontainer_id():
+    """Unit tests for get_devcontainer_id."""
+
+    def it_is_stable_and_label_order_independent():
+        """The same labels always map to the same 52-char id."""
+        first = get_devcontainer_id({"a": "1", "b": "2"})
+
+        assert first == get_devcontainer_id({"b": "2", "a": "1"})
+        assert len(first) == 52
+        assert first != get_devcontainer_id({"a": "1", "b": "3"})
+
+
+def describe_create_args():
+    """Unit tests for rendering docker create arguments."""
+
+    def it_substitutes_variables(tmp_path: Path, monkeypatch):
+        """${localEnv:HOME}, ${localWorkspaceFolder} and ${devcontainerId} are resolved."""
+        monkeypatch.setenv("HOME", "/home/tester")
+        args = make_launcher(tmp_path).create_args("img")
+
+        assert "source=/home/tester/.claude,target=/home/node/.claude,type=bind,readonly" in args
+        assert f"source={tmp_path / 'project'},target=/workspace,type=bind" in args
+        devcontainer_id = get_devcontainer_id({"clanker.instance": "abc123"})
+        assert f"source=history-{devcontainer_id},target=/commandhistory,type=volume" in args
+
+    def it_renders_labels_env_and_run_args(tmp_path: Path):
+        """Id labels, containerEnv and runArgs end up on the command line."""
+        args = make_launcher(tmp_path).create_args("img")
+
+        assert args[:4] == ["docker", "create", "--label", "clanker.instance=abc123"]
+        assert "CLAUDE_CONFIG_DIR=/home/node/.claude" in args
+        assert "--cap-add=NET_ADMIN" in args and "--memory=8g" in args
+        assert args[args.index("--entrypoint") + 2] == "img"
+
+
+def describe_up():
+    """Unit tests for starting containers."""
+
+    def it_reuses_a_running_container(tmp_path: Path):
+        """A running container is returned without start or postStartCommand."""
+        launcher = make_launcher(tmp_path)
+
+        with mock.patch.object(launcher, "find_container", return_value=("c1", "running")), \
+                mock.patch("subprocess.run") as run:
+            assert launcher.up() == "c1"
+
+        run.assert_not_called()
+
+    def it_restarts_a_stopped_container_and_runs_post_start(tmp_path: Path):
+        """A stopped container is started and postStartCommand re-run."""
+        launcher = make_launcher(tmp_path)
+
+        with mock.patch.object(launcher, "find_container", return_value=("c1", "exited")), \
+                mock.patch("subprocess.run") as run:
+            launcher.up()
+
+        commands = [call.args[0] for call in run.call_args_list]
+        assert commands[0] == ["docker", "start", "c1"]
+        assert commands[1] == ["docker", "exec", "-u", "node", "-w", "/workspace", "c1",
+                               "/bin/sh", "-c", "sudo /usr/local/bin/init-firewall.sh"]
+
+
+def describe_remap_user_image():
+    """Unit tests for the updateRemoteUserUID equivalent."""
+
+    def it_builds_a_derived_image_when_the_ids_differ(tmp_path: Path, monkeypatch):
+        """The host uid/gid are passed to a build on top of the image, which keeps its USER."""
+        monkeypatch.setattr("sys.platform", "linux")
+        monkeypatch.setattr("os.getuid", lambda: 1234)
+        monkeypatch.setattr("os.getgid", lambda: 1235)
+        launcher = make_launcher(tmp_path)
+
+        with mock.patch("subprocess.run", side_effect=fake_docker("uid=1000(node) gid=1000(node)")) as run:
+            image = launcher.remap_user_image("img")
+
+        assert image.startswith("clankercage-uid:")
+        build = run.call_args_list[-1].args[0]
+        assert build[:4] == ["docker", "build", "-t", image] and build[-1] == "-"
+        for arg in ["BASE_IMAGE=img", "REMOTE_USER=node", "NEW_UID=1234", "NEW_GID=1235", "IMAGE_USER=node"]:
+            assert arg in build
+
+    def it_tags_the_image_when_the_ids_already_match(tmp_path: Path, monkeypatch):
+        """Matching ids need no build; the tag makes later starts skip the check."""
+        monkeypatch.setattr("sys.platform", "linux")
+        monkeypatch.setattr("os.getuid", lambda: 1000)
+        monkeypatch.setattr("os.getgid", lambda: 1000)
+        launcher = make_launcher(tmp_path)
+
+        with mock.patch("subprocess.run", side_effect=fake_docker("uid=1000(node) gid=1000(node)")) as run:
+            image = launcher.remap_user_image("img")
+
+        assert run.call_args_list[-1].args[0] == ["docker", "tag", "img", image]
+
+    def it_reuses_an_existing_derived_image(tmp_path: Path, monkeypatch):
+        """A derived image for this base image and these ids is used without running anything."""
+        monkeypatch.setattr("sys.platform", "linux")
+        monkeypatch.setattr("os.getuid", lambda: 1234)
+        launcher = make_launcher(tmp_path)
+
+        with mock.patch("subprocess.run", side_effect=fake_docker("", remapped_exists=True)) as run:
+            image = launcher.remap_user_image("img")
+
+        assert image.startswith("clankercage-uid:")
+        assert all(call.args[0][:2] == ["docker", "image"] for call in run.call_args_list)
+
+    def it_leaves_the_image_alone_off_linux_or_when_disabled(tmp_path: Path, monkeypatch):
+        """macOS/Windows hosts and updateRemoteUserUID: false keep the image as-is."""
+        monkeypatch.setattr("os.getuid", lambda: 1234)
+        with mock.patch("subprocess.run") as run:
+            monkeypatch.setattr("sys.platform", "darwin")
+            assert make_launcher(tmp_path).remap_user_image("img") == "img"
+            monkeypatch.setattr("sys.platform", "linux")
+            assert make_launcher(tmp_path, updateRemoteUserUID=False).remap_user_image("img") == "img"
+
+        run.assert_not_called()
+
+
+def describe_exec_command():
+    """Unit tests for rendering docker exec arguments."""
+
+    def it_runs_as_remote_user_in_workspace(tmp_path: Path):
+        """Exec uses remoteUser, the workspace folder and a TTY only when asked."""
+        launcher = make_launcher(tmp_path)
+
+        with mock.patch.object(launcher, "find_container", return_value=("c1", "running")):
+            assert launcher.exec_command(["claude"], tty=True) == [
+                "docker", "exec", "-i", "-t", "-u", "node", "-w", "/workspace", "c1", "claude"
+            ]
+            assert "-t" not in launcher.exec_command(["claude"], tty=False)
@@ -0,0 +1,140 @@
+"""
+Tests for the session metrics exporter.
+
+These tests verify that:
+- Denied-egress snapshots are encoded as cumulative OTLP sums per destination
+- Overflowing destinations are exported as one "other" data point
+- cgroup samples are encoded as counters and gauges, without unlimited limits
+- Each running instance is its own resource, stale snapshots are skipped
+"""
+
+import json
+from pathlib import Path
+from unittest.mock import patch
+
+from clankercage import cgroups, metrics
+
+SNAPSHOT = {
+    "started": 100.0,
+    "updated": 1000.0,
+    "destinations": [
+        {"ip": "203.0.113.5", "proto": "tcp", "port": 443, "domain": "blocked.example.com", "count": 3, "last": 900.0},
+        {"ip": "198.51.100.7", "proto": "udp", "port": 123, "domain": "", "count": 1, "last": 950.0},
+    ],
+    "overflow": 0,
+}
+
+
+STATS = {
+    "cpu_user_usec": 3000000,
+    "cpu_system_usec": 500000,
+    "cpu_throttled_usec": 0,
+    "memory_current": 1048576,
+    "memory_max": None,
+    "oom_kills": 0,
+    "pids_current": 42,
+    "pids_max": 500,
+    "io": {"rbytes": 1500, "wbytes": 2000, "rios": 15, "wios": 20},
+    "pressure": {"cpu": {"some": 1200000}, "memory": {"some": 0, "full": 0}, "io": {}},
+}
+
+
+def attributes(point: dict) -> dict:
+    return {a["key"]: next(iter(a["value"].values())) for a in point["attributes"]}
+
+
+def by_name(metric_list: list[dict]) -> dict:
+    return {m["name"]: m for m in metric_list}
+
+
+def write_snapshot(run_dir: Path, instance: str, snapshot: dict) -> None:
+    (run_dir / instance).mkdir(parents=True)
+    (run_dir / instance / metrics.DENIED_FILE).write_text(json.dumps(snapshot))
+
+
+def describe_denied_metrics():
+    """Unit tests for the OTLP encoding."""
+
+    def it_encodes_a_cumulative_sum_per_destination():
+        metric, = metrics.denied_metrics(SNAPSHOT)
+
+        assert metric["name"] == "clankercage.firewall.denied"
+        assert metric["sum"]["aggregationTemporality"] == 2
+        assert metric["sum"]["isMonotonic"] is True
+        points = metric["sum"]["dataPoints"]
+        assert [p["asInt"] for p in points] == ["3", "1"]
+        assert attributes(points[0]) == {
+            "destination.address": "203.0.113.5",
+            "destination.port": "443",
+            "network.transport": "tcp",
+            "destination.domain": "blocked.example.com",
+        }
+        assert attributes(points[1])["destination.domain"] == "unknown"
+        assert points[0]["startTimeUnixNano"] == str(100 * 10**9)
+        assert points[0]["timeUnixNano"] == str(1000 * 10**9)
+
+    def it_exports_overflow_as_other():
+        metric, = metrics.denied_metrics({**SNAPSHOT, "destinations": [], "overflow": 7})
+
+        point, = metric["sum"]["dataPoints"]
+        assert attributes(point)["destination.address"] == "other"
+        assert point["asInt"] == "7"
+
+
+def describe_container_metrics():
+    """Unit tests for encoding cgroup samples."""
+
+    def it_encodes_counters_in_seconds_and_bytes():
+        encoded = by_name(metrics.container_metrics(STATS, started=100.0, now=1000.0))
+
+        cpu = encoded["clankercage.container.cpu.time"]["sum"]["dataPoints"]
+        assert [(attributes(p)["cpu.mode"], p["asDouble"]) for p in cpu] == [("user", 3.0), ("system", 0.5)]
+        assert cpu[0]["startTimeUnixNano"] == str(100 * 10**9)
+        io = encoded["clankercage.container.io"]["sum"]["dataPoints"]
+        assert [p["asInt"] for p in io] == ["1500", "2000"]
+        stall = encoded["clankercage.container.pressure.stall_time"]["sum"]["dataPoints"]
+        assert [(attributes(p)["resource"], attributes(p)["level"], p["asDouble"]) for p in stall] == [
+            ("cpu", "some", 1.2), ("memory", "some", 0.0), ("memory", "full", 0.0),
+        ]
+
+    def it_reports_usage_and_limits_as_gauges_when_set():
+        encoded = by_name(metrics.container_metrics(STATS, started=100.0, now=1000.0))
+
+        assert encoded["clankercage.container.memory.usage"]["gauge"]["dataPoints"][0]["asInt"] == "1048576"
+        assert encoded["clankercage.container.pids.limit"]["gauge"]["dataPoints"][0]["asInt"] == "500"
+        assert "clankercage.container.memory.limit" not in encoded
+
+
+def describe_collect():
+    """Unit tests for gathering the instances' snapshots."""
+
+    def it_exports_each_running_instance_as_a_resource(tmp_path: Path):
+        write_snapshot(tmp_path, "abc123", SNAPSHOT)
+        write_snapshot(tmp_path, "old456", {**SNAPSHOT, "updated": 1000.0 - metrics.STALE_AFTER - 1})
+        (tmp_path / "nosnapshot").mkdir()
+        write_snapshot(tmp_path, "broken", {})
+        (tmp_path / "broken" / metrics.DENIED_FILE).write_text("{")
+
+        payload = metrics.collect(tmp_path, now=1000.0)
+
+        resource, = payload["resourceMetrics"]
+        assert attributes(resource["resource"]) == {"service.name": "clankercage", "clanker.instance": "abc123"}
+
+    def it_combines_cgroup_samples_and_snapshots_per_instance(tmp_path: Path):
+        write_snapshot(tmp_path / "run", "abc123", SNAPSHOT)
+        instances = [
+            cgroups.Instance("c1", "abc123", "/home/me/project", 100.0, tmp_path / "cg1"),
+            cgroups.Instance("c2", "def456", "/home/me/other", 100.0, tmp_path / "cg2"),
+            cgroups.Instance("c3", "ghi789", "", 100.0, None),
+        ]
+        with patch("clankercage.cgroups.read_stats", side_effect=lambda path: STATS if path.name == "cg1" else None):
+            payload = metrics.collect(tmp_path / "run", instances, now=1000.0)
+
+        resource, = payload["resourceMetrics"]
+        assert attributes(resource["resource"])["clanker.project"] == "/home/me/project"
+        names = [m["name"] for m in resource["scopeMetrics"][0]["metrics"]]
+        assert names[0] == "clankercage.firewall.denied"
+        assert "clankercage.container.cpu.time" in names
+
+    def it_handles_a_missing_run_directory(tmp_path: Path):
+        assert metrics.collect(tmp_path / "missing") == {"resourceMetrics": []}
@@ -0,0 +1,104 @@
+"""
+Tests for the pre-warmed container pool.
+
+These tests verify that:
+- Idle members are claimed at most once, even under concurrent claims
+- Only members with a matching config fingerprint are handed out
+- Expired or outdated members are reaped
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from clankercage import pool
+
+
+@pytest.fixture
+def pool_dir(tmp_path: Path) -> Path:
+    return tmp_path / "pool"
+
+
+@pytest.fixture(autouse=True)
+def containers_running():
+    """Pretend every member's container is up."""
+    with mock.patch("clankercage.pool._container_running", return_value=True):
+        yield
+
+
+def describe_claim_member():
+    """Unit tests for claiming idle pool members."""
+
+    def it_claims_each_member_once(pool_dir: Path):
+        """Two members can be claimed, then the pool is empty."""
+        pool.register_member(pool_dir, "aaa", "fp", Path("/cfg/a.json"))
+        pool.register_member(pool_dir, "bbb", "fp", Path("/cfg/b.json"))
+
+        first = pool.claim_member(pool_dir, "fp")
+        second = pool.claim_member(pool_dir, "fp")
+
+        assert {first[0], second[0]} == {"aaa", "bbb"}
+        assert pool.claim_member(pool_dir, "fp") is None
+        assert not pool.has_idle_members(pool_dir)
+
+    def it_ignores_members_with_other_fingerprints(pool_dir: Path):
+        """A member booted with different options is never handed out."""
+        pool.register_member(pool_dir, "aaa", "other", Path("/cfg/a.json"))
+
+        assert pool.claim_member(pool_dir, "fp") is None
+        assert pool.idle_count(pool_dir, "other") == 1
+
+    def it_is_safe_under_concurrent_claims(pool_dir: Path):
+        """Many racing claimers never get the same member twice."""
+        for i in range(5):
+            pool.register_member(pool_dir, f"m{i}", "fp", Path(f"/cfg/{i}.json"))
+
+        with ThreadPoolExecutor(max_workers=20) as executor:
+            results = list(executor.map(lambda _: pool.claim_member(pool_dir, "fp"), range(20)))
+
+        claimed = [r[0] for r in results if r is not None]
+        assert sorted(claimed) == [f"m{i}" for i in range(5)]
+
+    def it_skips_members_whose_container_is_gone(pool_dir: Path):
+        """A member whose container was removed is discarded, not returned."""
+        pool.register_member(pool_dir, "gone", "fp", Path("/cfg/a.json"))
+
+        with mock.patch("clankercage.pool._container_running", return_value=False), \
+                mock.patch("clankercage.pool.remove_container") as remove:
+            assert pool.claim_member(pool_dir, "fp") is None
+
+        remove.assert_called_once_with("gone")
+
+
+def describe_reap_members():
+    """Unit tests for recycling idle members."""
+
+    def it_reaps_expired_and_outdated_members(pool_dir: Path):
+        """Members past the TTL or with a stale fingerprint are reaped."""
+        pool.register_member(pool_dir, "fresh", "fp", Path("/cfg/a.json"))
+        pool.register_member(pool_dir, "stale", "old-fp", Path("/cfg/b.json"))
+        pool.register_member(pool_dir, "expired", "fp", Path("/cfg/c.json"))
+        expired = pool_dir / "expired.idle"
+        member = json.loads(expired.read_text())
+        member["created"] = time.time() - 7200
+        expired.write_text(json.dumps(member))
+
+        reaped = pool.reap_members(pool_dir, "fp", ttl=3600)
+
+        assert sorted(reaped) == ["expired", "stale"]
+        assert pool.idle_count(pool_dir, "fp") == 1
+
+
+def describe_fill_lock():
+    """Unit tests for the refill lock."""
+
+    def it_allows_only_one_filler(pool_dir: Path):
+        """A second filler skips while the first holds the lock."""
+        with pool.fill_lock(pool_dir) as first:
+            with pool.fill_lock(pool_dir) as second:
+                assert first is True
+                assert second is False
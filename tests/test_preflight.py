@@ -0,0 +1,115 @@
+"""
+Tests for the concurrent pre-flight stage.
+
+These tests verify that:
+- Tasks run after their dependencies and receive their results
+- Independent tasks overlap
+- The reported error doesn't depend on which task failed first
+- Pre-flight failures exit with the Docker banner or an error message
+"""
+
+import argparse
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from clankercage.cli import DockerUnavailable, run_preflight
+from clankercage.preflight import run_tasks
+
+
+def make_args(**overrides) -> argparse.Namespace:
+    defaults = {"build": False, "ssh_key_file": None, "reuse": False, "dns_stub": False}
+    return argparse.Namespace(**{**defaults, **overrides})
+
+
+def describe_run_tasks():
+    """Unit tests for the pre-flight task graph."""
+
+    def it_passes_dependency_results():
+        order = []
+
+        def record(name, value):
+            def fn(inputs):
+                order.append(name)
+                return value(inputs)
+            return fn
+
+        results = run_tasks({
+            "image_pull": (("docker_check",), record("image_pull", lambda r: r["docker_check"] + ":pulled")),
+            "docker_check": ((), record("docker_check", lambda r: "image")),
+        })
+
+        assert results == {"docker_check": "image", "image_pull": "image:pulled"}
+        assert order == ["docker_check", "image_pull"]
+
+    def it_overlaps_independent_tasks():
+        """Two tasks that wait for each other can only finish if they run concurrently."""
+        barrier = threading.Barrier(2, timeout=5)
+
+        results = run_tasks({
+            "config": ((), lambda _: barrier.wait() is not None),
+            "docker_check": ((), lambda _: barrier.wait() is not None),
+        })
+
+        assert results == {"config": True, "docker_check": True}
+
+    def it_raises_the_first_declared_error():
+        """A slow failure listed first wins over a fast one listed later."""
+        def slow_failure(_):
+            time.sleep(0.1)
+            raise ValueError("ssh key")
+
+        def fast_failure(_):
+            raise RuntimeError("docker")
+
+        with pytest.raises(ValueError, match="ssh key"):
+            run_tasks({"ssh_key": ((), slow_failure), "docker_check": ((), fast_failure)})
+
+    def it_skips_dependents_of_failed_tasks():
+        ran = []
+
+        def fail(_):
+            raise RuntimeError("docker")
+
+        with pytest.raises(RuntimeError):
+            run_tasks({"docker_check": ((), fail), "image_pull": (("docker_check",), ran.append)})
+        assert ran == []
+
+    def it_rejects_unknown_dependencies():
+        with pytest.raises(ValueError, match="unknown"):
+            run_tasks({"image_pull": (("docker",), lambda _: None)})
+
+
+def describe_run_preflight():
+    """Unit tests for error handling in run_preflight."""
+
+    def it_shows_the_docker_banner(tmp_path: Path, capsys):
+        with patch("clankercage.cli.DockerEngine.from_env", return_value=None), \
+             patch("clankercage.cli.probe_docker", side_effect=DockerUnavailable("down")), \
+             patch("clankercage.cli.prepare_config", return_value=({}, tmp_path)), \
+             patch("clankercage.cli.prepare_workspace", return_value=(tmp_path, tmp_path / "devcontainer.json")), \
+             patch("clankercage.cli.refresh_github_ranges", return_value=None), \
+             patch("clankercage.cli.compile_firewall"), \
+             patch("clankercage.cli.maintain_audit_log", return_value=None), \
+             pytest.raises(SystemExit):
+            run_preflight(make_args(), tmp_path)
+
+        assert "Docker is not running" in capsys.readouterr().err
+
+    def it_reports_a_missing_ssh_key_before_docker_errors(tmp_path: Path, capsys):
+        with patch("clankercage.cli.DockerEngine.from_env", return_value=None), \
+             patch("clankercage.cli.probe_docker", side_effect=DockerUnavailable("down")), \
+             patch("clankercage.cli.prepare_config", return_value=({}, tmp_path)), \
+             patch("clankercage.cli.prepare_workspace", return_value=(tmp_path, tmp_path / "devcontainer.json")), \
+             patch("clankercage.cli.refresh_github_ranges", return_value=None), \
+             patch("clankercage.cli.compile_firewall"), \
+             patch("clankercage.cli.maintain_audit_log", return_value=None), \
+             pytest.raises(SystemExit):
+            run_preflight(make_args(ssh_key_file=str(tmp_path / "missing")), tmp_path)
+
+        err = capsys.readouterr().err
+        assert "Error: SSH key not found" in err
+        assert "Docker is not running" not in err
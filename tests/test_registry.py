@@ -0,0 +1,188 @@
+"""
+Tests for the SQLite instance registry.
+
+These tests verify that:
+- Lifecycle steps create and update rows without losing earlier fields
+- Lookups by project, state and ID prefix go through indexes and stay fast with many instances
+- A full Docker scan marks instances without a container as removed
+- Docker events update known instances and pull in unknown ones
+- sync() reads only new events, and falls back to a full scan when they may be incomplete
+- Concurrent writers don't lose updates, and a broken database only warns
+"""
+
+import threading
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from clankercage import instances, registry
+
+
+def event(action: str, instance_id: str, at: float = 1000.0) -> dict:
+    return {"Type": "container", "Action": action, "id": f"c-{instance_id}", "timeNano": int(at * 1e9),
+            "Actor": {"ID": f"c-{instance_id}", "Attributes": {"clanker.instance": instance_id}}}
+
+
+def scanned(instance_id: str, state: str = registry.RUNNING, project: str = "/p") -> registry.Instance:
+    return registry.Instance(instance_id, f"c-{instance_id}", project, state, 500.0)
+
+
+@pytest.fixture
+def reg() -> registry.Registry:
+    with registry.Registry() as opened:
+        yield opened
+
+
+def describe_record():
+    """Unit tests for lifecycle writes."""
+
+    def it_creates_a_starting_row_and_updates_it(reg: registry.Registry):
+        reg.record("abc", project="/p", config_hash="f00", workspace="/ws", flags=["--reuse"], reuse=True)
+        reg.record("abc", state=registry.RUNNING, started=123.0)
+
+        found = reg.get("abc")
+        assert (found.state, found.started, found.project, found.config_hash, found.flags, found.reuse) == \
+               (registry.RUNNING, 123.0, "/p", "f00", ["--reuse"], True)
+        assert found.created <= found.updated
+
+    def it_warns_instead_of_failing_when_the_database_is_unusable(tmp_path: Path, capsys):
+        (tmp_path / "instances.db").mkdir()
+
+        registry.record("abc", path=tmp_path / "instances.db", state=registry.RUNNING)
+
+        assert "instance registry not updated" in capsys.readouterr().err
+
+    def it_keeps_every_update_from_concurrent_writers(reg: registry.Registry):
+        def write(worker: int) -> None:
+            with registry.Registry() as own:
+                for i in range(20):
+                    own.record(f"w{worker}-{i}", project=f"/p{worker}")
+
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(reg.query()) == 80
+
+
+def describe_query():
+    """Unit tests for indexed lookups."""
+
+    def it_filters_by_project_state_reuse_and_prefix(reg: registry.Registry):
+        reg.record("abc1", project="/p", state=registry.RUNNING, started=1.0, reuse=True)
+        reg.record("abc2", project="/p", state=registry.RUNNING, started=2.0)
+        reg.record("abd3", project="/p", state=registry.REMOVED, started=3.0)
+        reg.record("xyz4", project="/q", state=registry.RUNNING, started=4.0)
+
+        assert [i.instance_id for i in reg.query(project="/p", states=registry.LIVE_STATES)] == ["abc2", "abc1"]
+        assert [i.instance_id for i in reg.query(reuse=True)] == ["abc1"]
+        assert [i.instance_id for i in reg.query(prefix="ab")] == ["abd3", "abc2", "abc1"]
+
+    def it_uses_the_indexes(reg: registry.Registry):
+        plan = " ".join(row[-1] for row in reg._db.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM instances WHERE project = ? AND state IN (?, ?)", ("/p", "a", "b")))
+
+        assert "instances_project_state" in plan
+
+    def it_answers_status_queries_over_many_instances_quickly(reg: registry.Registry):
+        with reg._transaction():
+            for i in range(1000):
+                reg._upsert(f"i{i:04d}", {"project": f"/p{i % 50}", "state": registry.REMOVED if i % 3 else registry.RUNNING,
+                                          "started": float(i)}, time.time())
+
+        started = time.monotonic()
+        for _ in range(20):
+            found = reg.query(project="/p7", states=registry.LIVE_STATES)
+
+        assert len(found) == 7
+        # Generous bound for loaded CI machines; typically well under a millisecond each
+        assert (time.monotonic() - started) / 20 < 0.05
+
+
+def describe_reconcile():
+    """Unit tests for applying Docker scans and events."""
+
+    def it_marks_instances_missing_from_a_scan_as_removed(reg: registry.Registry):
+        reg.record("gone", state=registry.RUNNING)
+        reg.record("booting")
+
+        reg.apply_scan([scanned("new", project="/q")], now=time.time())
+
+        assert reg.get("gone").state == registry.REMOVED
+        assert reg.get("booting").state == registry.STARTING
+        assert (reg.get("new").state, reg.get("new").project) == (registry.RUNNING, "/q")
+
+    def it_applies_events_to_known_instances(reg: registry.Registry):
+        reg.record("abc", project="/p")
+
+        reg.apply_events([event("start", "abc", at=1000.5), event("die", "abc")], until=2000.0)
+
+        found = reg.get("abc")
+        assert (found.state, found.started, found.container_id, found.project) == \
+               (registry.STOPPED, 1000.5, "c-abc", "/p")
+        assert reg.checkpoint("events") == 2000.0
+
+    def it_inspects_instances_it_does_not_know(reg: registry.Registry):
+        inspected = []
+
+        def inspect(container_id: str) -> registry.Instance:
+            inspected.append(container_id)
+            return scanned("new", project="/q")
+
+        reg.apply_events([event("start", "new"), event("destroy", "unknown")], until=2000.0, inspect=inspect)
+
+        assert inspected == ["c-new"]
+        assert reg.get("new").project == "/q"
+        assert reg.get("unknown") is None
+
+    def it_prunes_old_removed_instances(reg: registry.Registry):
+        reg.record("old", state=registry.REMOVED)
+        reg.record("live", state=registry.RUNNING)
+
+        assert reg.prune(time.time() + 1) == 1
+        assert [i.instance_id for i in reg.query()] == ["live"]
+
+
+def describe_sync():
+    """Unit tests for bringing the registry up to date with Docker."""
+
+    def it_starts_with_a_full_scan(reg: registry.Registry):
+        with patch("clankercage.instances._inspect_all", return_value=[]) as inspect_all, \
+             patch("clankercage.instances._events") as events:
+            assert instances.sync(reg, now=5000.0)
+
+        inspect_all.assert_called_once()
+        events.assert_not_called()
+        assert reg.checkpoint("scanned") == 5000.0
+
+    def it_then_reads_only_the_events_since_the_last_sync(reg: registry.Registry):
+        reg.apply_scan([], now=5000.0)
+        reg.record("abc")
+
+        with patch("clankercage.instances._inspect_all") as inspect_all, \
+             patch("clankercage.instances._events", return_value=[event("start", "abc")]) as events:
+            assert instances.sync(reg, now=5010.0)
+
+        events.assert_called_once_with(5000.0, 5010.0)
+        inspect_all.assert_not_called()
+        assert reg.get("abc").state == registry.RUNNING
+
+    def it_scans_again_when_events_may_have_been_dropped(reg: registry.Registry):
+        reg.apply_scan([], now=5000.0)
+        flood = [event("start", f"i{i}") for i in range(registry.EVENT_BUFFER)]
+
+        with patch("clankercage.instances._inspect_all", return_value=[]) as inspect_all, \
+             patch("clankercage.instances._events", return_value=flood):
+            assert instances.sync(reg, now=5010.0)
+
+        inspect_all.assert_called_once()
+
+    def it_reports_an_unreachable_docker(reg: registry.Registry):
+        reg.apply_scan([], now=5000.0)
+
+        with patch("clankercage.instances._events", return_value=None):
+            assert not instances.sync(reg, now=5010.0)
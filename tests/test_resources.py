@@ -0,0 +1,190 @@
+"""
+Tests for container resource sizing.
+
+These tests verify that:
+- cpuset lists are parsed and formatted
+- auto limits split the host between instances within the profile bounds
+- CPU slices are disjoint and contiguous when possible
+- Reservations of live instances are respected, reused instances keep theirs
+- The Docker host's CPUs and memory come from the daemon when it runs elsewhere
+- New instances wait while the host is short of memory, without holding the lock
+- modify_config applies profiles and the auto variables
+"""
+
+import argparse
+import fcntl
+import json
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from clankercage import resources
+from clankercage.cli import modify_config
+
+GIB = resources.GIB
+
+
+def make_args(**overrides) -> argparse.Namespace:
+    defaults = {
+        "build": False, "ssh_key_file": None, "gpg_key_id": None, "git_user_name": None, "git_user_email": None,
+        "gh_token": None, "port": None, "volume": None, "env": None, "verify_firewall": "async",
+        "dns_stub": False, "exec_server": False, "no_shared_cache": True, "resources": "standard",
+    }
+    return argparse.Namespace(**{**defaults, **overrides})
+
+
+def base_config() -> dict:
+    return {
+        "runArgs": ["--cap-add=NET_ADMIN", "--memory=8g", "--cpus=4", "--pids-limit=500"],
+        "containerEnv": {"NODE_OPTIONS": "--max-old-space-size=4096"},
+    }
+
+
+def reserve(run_dir: Path, instance: str, cpuset: str, pinned: bool = True, reserved: float | None = None) -> None:
+    (run_dir / instance).mkdir(parents=True)
+    (run_dir / instance / resources.RESOURCES_FILE).write_text(json.dumps({
+        "cpus": 4, "memory": 8 * GIB, "pids": 500, "cpuset": cpuset, "pinned": pinned,
+        "reserved": time.time() if reserved is None else reserved,
+    }))
+
+
+def describe_cpusets():
+    """Unit tests for cpuset lists."""
+
+    def it_round_trips_ranges():
+        assert resources.parse_cpuset("0-3,8,10-11") == [0, 1, 2, 3, 8, 10, 11]
+        assert resources.format_cpuset([11, 0, 1, 2, 3, 8, 10]) == "0-3,8,10-11"
+
+    def it_prefers_a_contiguous_slice():
+        assert resources.allocate_cpus(list(range(8)), {0, 2}, 3) == [3, 4, 5]
+
+    def it_falls_back_to_scattered_cpus():
+        assert resources.allocate_cpus(list(range(6)), {1, 3}, 3) == [0, 2, 4]
+
+    def it_returns_nothing_when_too_few_are_free():
+        assert resources.allocate_cpus(list(range(4)), {0, 1, 2}, 2) == []
+
+
+def describe_auto_limits():
+    """Unit tests for splitting the host."""
+
+    def it_gives_a_lone_instance_up_to_the_large_profile():
+        limits = resources.auto_limits(32, 64 * GIB, others=0)
+
+        assert (limits.cpus, limits.memory, limits.pids) == (8, 16 * GIB, 1000)
+
+    def it_splits_the_host_between_instances():
+        limits = resources.auto_limits(16, 64 * GIB, others=5)
+
+        assert limits.cpus == 2
+        assert limits.memory == 8 * GIB
+        assert limits.node_heap_mb == 4096
+
+    def it_never_exceeds_a_small_host():
+        limits = resources.auto_limits(1, 4 * GIB, others=0)
+
+        assert limits.cpus == 1
+        assert limits.memory == 3 * GIB
+
+
+def describe_size_instance():
+    """Unit tests for reserving resources for an instance."""
+
+    @pytest.fixture
+    def host():
+        with patch("clankercage.resources._daemon_info", return_value=None), \
+             patch("clankercage.resources.host_cpus", return_value=list(range(16))), \
+             patch("clankercage.resources.read_meminfo", return_value={"MemTotal": 64 * GIB, "MemAvailable": 40 * GIB}), \
+             patch("clankercage.resources.memory_pressure", return_value=0.0), \
+             patch("clankercage.resources._running_instances", return_value={"running1"}) as running:
+            yield running
+
+    def it_avoids_the_slices_of_live_instances(tmp_path: Path, host):
+        reserve(tmp_path, "running1", "0-3")
+        reserve(tmp_path, "starting", "4-7")
+        reserve(tmp_path, "stopped", "8-11", reserved=0)
+        reserve(tmp_path, "unpinned", "0-15", pinned=False)
+
+        limits = resources.size_instance(tmp_path, "new")
+
+        # running1, starting and unpinned are live: 16 CPUs / 4 instances
+        assert limits.cpus == 4
+        assert limits.cpuset == "8-11"
+        saved = json.loads((tmp_path / "new" / resources.RESOURCES_FILE).read_text())
+        assert saved["pinned"] is True
+        assert limits.env()["CLANKERCAGE_CPUSET"] == "8-11"
+
+    def it_keeps_the_reservation_of_a_reused_instance(tmp_path: Path, host):
+        reserve(tmp_path, "reused", "12-15")
+
+        assert resources.size_instance(tmp_path, "reused").cpuset == "12-15"
+
+    def it_shares_all_cpus_when_no_slice_is_free(tmp_path: Path, host):
+        for i in range(4):
+            reserve(tmp_path, f"busy{i}", f"{i * 4}-{i * 4 + 3}")
+
+        limits = resources.size_instance(tmp_path, "new")
+
+        assert limits.cpuset == "0-15"
+        assert json.loads((tmp_path / "new" / resources.RESOURCES_FILE).read_text())["pinned"] is False
+
+    def it_waits_while_the_host_is_short_of_memory(tmp_path: Path, host):
+        notices = []
+        with patch("clankercage.resources.read_meminfo",
+                   side_effect=[{"MemTotal": 64 * GIB}, {"MemAvailable": GIB}, {"MemAvailable": 4 * GIB}]), \
+             patch("clankercage.resources.time.sleep") as sleep:
+            resources.size_instance(tmp_path, "new", notify=notices.append)
+
+        assert sleep.call_count == 1
+        assert len(notices) == 1
+
+    def it_does_not_hold_the_lock_while_waiting(tmp_path: Path, host):
+        def check_lock(_):
+            with open(tmp_path / ".resources.lock", "w") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+        with patch("clankercage.resources.read_meminfo",
+                   side_effect=[{"MemTotal": 64 * GIB}, {"MemAvailable": GIB}, {"MemAvailable": 4 * GIB}]), \
+             patch("clankercage.resources.time.sleep", side_effect=check_lock):
+            resources.size_instance(tmp_path, "new", notify=lambda _: None)
+
+    def it_sizes_from_a_remote_daemon_without_waiting_on_local_memory(tmp_path: Path, host):
+        info = {"NCPU": 6, "MemTotal": 16 * GIB, "Name": "docker-desktop"}
+        with patch("clankercage.resources._daemon_info", return_value=info), \
+             patch("clankercage.resources.memory_pressure", return_value=50.0):
+            limits = resources.size_instance(tmp_path, "new", queue_timeout=0)
+
+        # 6 CPUs and 3/4 of 16 GiB, split with running1
+        assert limits.cpus == 3
+        assert limits.memory == 6 * GIB
+        assert limits.cpuset == "0-2"
+
+    def it_gives_up_after_the_queue_timeout(tmp_path: Path, host):
+        with patch("clankercage.resources.memory_pressure", return_value=50.0):
+            with pytest.raises(resources.QueueTimeout):
+                resources.size_instance(tmp_path, "new", queue_timeout=0, notify=lambda _: None)
+
+        assert not (tmp_path / "new" / resources.RESOURCES_FILE).exists()
+
+
+def describe_modify_config():
+    """Unit tests for applying resource limits to the config."""
+
+    @pytest.fixture(autouse=True)
+    def cache_dir(tmp_path: Path, monkeypatch):
+        monkeypatch.setattr("clankercage.cli.get_cache_dir", lambda: tmp_path / "cache")
+
+    def it_replaces_the_limits_with_a_profile(tmp_path: Path):
+        result = modify_config(base_config(), make_args(resources="large"), tmp_path)
+
+        assert result["runArgs"] == ["--cap-add=NET_ADMIN", "--memory=16384m", "--cpus=8", "--pids-limit=1000"]
+        assert result["containerEnv"]["NODE_OPTIONS"] == "--max-old-space-size=8192"
+
+    def it_refers_to_per_instance_variables_in_auto_mode(tmp_path: Path):
+        result = modify_config(base_config(), make_args(resources="auto"), tmp_path)
+
+        assert "--cpuset-cpus=${localEnv:CLANKERCAGE_CPUSET}" in result["runArgs"]
+        assert "--memory=8g" not in result["runArgs"]
+        assert result["containerEnv"]["NODE_OPTIONS"] == "--max-old-space-size=${localEnv:CLANKERCAGE_NODE_HEAP_MB}"
@@ -0,0 +1,129 @@
+"""
+Tests for startup phase timing.
+
+These tests verify that:
+- Spans nest and render into a breakdown table
+- Phases reported by the container are merged in
+- Spans export as JSON and OTLP
+- postStartCommand steps report their duration without changing exit status
+"""
+
+import subprocess
+import threading
+import time
+from pathlib import Path
+
+from clankercage.cli import timed_command
+from clankercage.timings import Tracer
+
+
+def describe_tracer():
+    """Unit tests for the Tracer."""
+
+    def it_records_nested_spans():
+        """Inner spans are children of the span that was open."""
+        tracer = Tracer()
+        tracer.enable()
+        with tracer.span("container.up"):
+            with tracer.span("container.create"):
+                pass
+
+        outer, inner = tracer.spans
+        assert inner.parent == 0 and inner.depth == 1
+        assert outer.start_ns <= inner.start_ns <= inner.end_ns <= outer.end_ns
+
+    def it_records_nothing_when_disabled():
+        tracer = Tracer()
+        with tracer.span("preflight.docker_check"):
+            pass
+
+        assert tracer.spans == []
+
+    def it_nests_spans_from_worker_threads_under_the_adopted_context():
+        tracer = Tracer()
+        tracer.enable()
+        with tracer.span("preflight"):
+            context = tracer.context()
+
+            def worker():
+                with tracer.adopt(context), tracer.span("preflight.image_pull"):
+                    pass
+
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join()
+            with tracer.span("preflight.config"):
+                pass
+
+        assert [(s.name, s.parent) for s in tracer.spans] == [
+            ("preflight", None), ("preflight.image_pull", 0), ("preflight.config", 0)
+        ]
+
+    def it_merges_container_phases_and_skips_stale_ones():
+        """Wall-clock phases from the container land on the same timeline."""
+        tracer = Tracer()
+        tracer.enable()
+        now = time.time()
+        tracer.add_wall_span("firewall.dns_resolve", now, now + 0.5)
+        tracer.add_wall_span("firewall.dns_resolve", now - 3600, now - 3599)
+
+        assert len(tracer.spans) == 1
+        assert abs(tracer.spans[0].duration_ns - 500_000_000) < 1_000_000
+        assert tracer.spans[0].source == "container"
+
+    def it_formats_a_breakdown_table():
+        tracer = Tracer()
+        tracer.enable()
+        with tracer.span("preflight.docker_check"):
+            pass
+
+        table = tracer.format_table()
+        assert table.startswith("Startup timings (total")
+        assert "preflight.docker_check" in table
+
+    def it_exports_json_and_otlp():
+        tracer = Tracer()
+        tracer.enable()
+        with tracer.span("container.up", launcher="native"):
+            with tracer.span("container.start"):
+                pass
+
+        assert [s["name"] for s in tracer.to_json()["spans"]] == ["container.up", "container.start"]
+        assert tracer.to_json()["spans"][1]["parent"] == "container.up"
+
+        otlp = tracer.to_otlp({"service.name": "clankercage"})
+        spans = otlp["resourceSpans"][0]["scopeSpans"][0]["spans"]
+        assert spans[1]["parentSpanId"] == spans[0]["spanId"]
+        assert spans[0]["traceId"] == spans[1]["traceId"]
+        assert int(spans[0]["endTimeUnixNano"]) >= int(spans[0]["startTimeUnixNano"])
+
+
+def describe_timed_command():
+    """Unit tests for timing postStartCommand steps."""
+
+    def it_reports_the_step_duration(tmp_path: Path):
+        phases = tmp_path / "phases.tsv"
+        result = subprocess.run(["sh", "-c", timed_command("git_user_name", "true", str(phases))])
+
+        assert result.returncode == 0
+        name, start, end = phases.read_text().strip().split("\t")
+        assert name == "bootstrap.git_user_name"
+        assert float(end) >= float(start)
+
+    def it_preserves_failures(tmp_path: Path):
+        """A failing step still fails the chain and reports nothing."""
+        phases = tmp_path / "phases.tsv"
+        command = timed_command("gh_auth", "false", str(phases)) + " && echo reached"
+        result = subprocess.run(["sh", "-c", command], capture_output=True, text=True)
+
+        assert result.returncode != 0
+        assert "reached" not in result.stdout
+        assert not phases.exists()
+
+    def it_ignores_a_missing_runtime_dir(tmp_path: Path):
+        """Reporting into a directory that isn't mounted never breaks startup."""
+        command = timed_command("firewall", "true", str(tmp_path / "missing" / "phases.tsv"))
+        result = subprocess.run(["sh", "-c", command], capture_output=True, text=True)
+
+        assert result.returncode == 0
+        assert result.stderr == ""